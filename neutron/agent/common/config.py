@@ -64,6 +64,17 @@ USE_NAMESPACES_OPTS = [
 IPTABLES_OPTS = [
     cfg.BoolOpt('comment_iptables_rules', default=True,
                 help=_("Add comments to iptables rules.")),
+    cfg.BoolOpt('iptables_incremental_apply', default=False,
+                help=_("Only send the changed chains of modified tables to "
+                       "iptables-restore instead of rewriting every table on "
+                       "each apply. Tables whose rules did not change in "
+                       "memory are not checked against the kernel state.")),
+    cfg.IntOpt('iptables_state_check_interval', default=60,
+               help=_("When iptables_incremental_apply is enabled, maximum "
+                      "time in seconds the rules written by the agent are "
+                      "trusted to still match the kernel state before they "
+                      "are checked again with iptables-save. Use 0 to run "
+                      "iptables-save on every apply.")),
 ]
 
 PROCESS_MONITOR_OPTS = [
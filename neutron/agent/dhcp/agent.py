@@ -54,6 +54,8 @@ class DhcpAgent(manager.Manager):
     def __init__(self, host=None, conf=None):
         super(DhcpAgent, self).__init__(host=host)
         self.needs_resync_reasons = collections.defaultdict(list)
+        # networks whose allocations reload is delayed to batch port events
+        self._pending_reloads = set()
         self.conf = conf or cfg.CONF
         self.cache = NetworkCache()
         self.dhcp_driver_cls = importutils.import_class(self.conf.dhcp_driver)
@@ -104,6 +106,8 @@ class DhcpAgent(manager.Manager):
         """Invoke an action on a DHCP driver instance."""
         LOG.debug('Calling driver for network: %(net)s action: %(action)s',
                   {'net': network.id, 'action': action})
+        # Any action writes the allocations of all the ports of the network
+        self._pending_reloads.discard(network.id)
         try:
             # the Driver expects something that is duck typed similar to
             # the base models.
@@ -322,22 +326,49 @@ class DhcpAgent(manager.Manager):
         if network:
             self.refresh_dhcp_helper(network.id)
 
+    def _reload_allocations_later(self, network):
+        """Reload the allocations of a network once port events stop coming
+
+        The ports are already updated in the cache, the reload of a network
+        is delayed by port_events_batch_interval so that a burst of port
+        events results in a single rewrite of the dnsmasq files and reload.
+        """
+        interval = self.conf.port_events_batch_interval
+        if interval <= 0:
+            self.call_driver('reload_allocations', network)
+        elif network.id not in self._pending_reloads:
+            self._pending_reloads.add(network.id)
+            eventlet.spawn_after(interval, self._reload_allocations,
+                                 network.id)
+
+    @utils.synchronized('dhcp-agent')
+    def _reload_allocations(self, network_id):
+        if network_id not in self._pending_reloads:
+            # another driver action already took the ports into account
+            return
+        self._pending_reloads.discard(network_id)
+        network = self.cache.get_network_by_id(network_id)
+        if network:
+            self.call_driver('reload_allocations', network)
+
     @utils.synchronized('dhcp-agent')
     def port_update_end(self, context, payload):
         """Handle the port.update.end notification event."""
         updated_port = dhcp.DictModel(payload['port'])
         network = self.cache.get_network_by_id(updated_port.network_id)
         if network:
-            driver_action = 'reload_allocations'
+            restart = False
             if self._is_port_on_this_agent(updated_port):
                 orig = self.cache.get_port_by_id(updated_port['id'])
                 # assume IP change if not in cache
                 old_ips = {i['ip_address'] for i in orig['fixed_ips'] or []}
                 new_ips = {i['ip_address'] for i in updated_port['fixed_ips']}
-                if old_ips != new_ips:
-                    driver_action = 'restart'
+                restart = old_ips != new_ips
             self.cache.put_port(updated_port)
-            self.call_driver(driver_action, network)
+            if restart:
+                self.call_driver('restart', network)
+            else:
+                self._reload_allocations_later(network)
 
     def _is_port_on_this_agent(self, port):
         thishost = utils.get_dhcp_agent_device_id(
@@ -354,7 +385,7 @@ class DhcpAgent(manager.Manager):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+            self._reload_allocations_later(network)
 
     def enable_isolated_metadata_proxy(self, network):
 
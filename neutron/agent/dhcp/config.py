@@ -31,7 +31,13 @@ DHCP_AGENT_OPTS = [
                        "dedicated network. Requires "
                        "enable_isolated_metadata = True")),
     cfg.IntOpt('num_sync_threads', default=4,
-               help=_('Number of threads to use during sync process.'))
+               help=_('Number of threads to use during sync process.')),
+    cfg.FloatOpt('port_events_batch_interval', default=0.5,
+                 help=_('Seconds to wait after a port event before reloading '
+                        'the DHCP allocations of its network, the port '
+                        'events received meanwhile are applied by the same '
+                        'reload. 0 reloads the allocations on every port '
+                        'event.')),
 ]
 
 DHCP_OPTS = [
@@ -57,6 +57,10 @@ class FirewallDriver(object):
       remote_group_id will also remaining membership update management
     """
 
+    # Drivers programming the integration bridge of the OVS agent get it
+    # passed when they are created
+    requires_integration_bridge = False
+
     def prepare_port_filter(self, port):
         """Prepare filters for the port.
 
@@ -83,6 +83,7 @@ class L3PluginApi(object):
         1.6 - Added process_prefix_update
         1.7 - DVR support: new L3 plugin methods added.
               - delete_agent_gateway_port
+        1.8 - Added sync_routers_page
     """
 
     def __init__(self, topic, host):
@@ -96,6 +97,24 @@ class L3PluginApi(object):
         return cctxt.call(context, 'sync_routers', host=self.host,
                           router_ids=router_ids)
 
+    def get_routers_page(self, context, marker=None, snapshot=None,
+                         page_size=None):
+        """Make a remote process call to retrieve a page of the routers.
+
+        Returns the routers of the page, the snapshot to pass back with the
+        marker of the next page, which is None after the last page.
+        """
+        try:
+            cctxt = self.client.prepare(version='1.8')
+            return cctxt.call(context, 'sync_routers_page', host=self.host,
+                              marker=marker, snapshot=snapshot,
+                              page_size=page_size)
+        except oslo_messaging.UnsupportedVersion:
+            # The server has not been upgraded yet, all the routers come in
+            # a single page.
+            return {'routers': self.get_routers(context),
+                    'snapshot': None, 'next_marker': None}
+
     def get_external_network_id(self, context):
         """Make a remote process call to retrieve the external network id.
 
@@ -460,66 +479,84 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         ri.process(self)
         registry.notify(resources.ROUTER, events.AFTER_UPDATE, self, router=ri)
 
-    def _process_router_update(self):
-        for rp, update in self._queue.each_update_to_next_router():
-            LOG.debug("Starting router update for %s, action %s, priority %s",
-                      update.id, update.action, update.priority)
-            if update.action == queue.PD_UPDATE:
-                self.pd.process_prefix_update()
-                continue
-            router = update.router
-            if update.action != queue.DELETE_ROUTER and not router:
-                try:
-                    update.timestamp = timeutils.utcnow()
-                    routers = self.plugin_rpc.get_routers(self.context,
-                                                          [update.id])
-                except Exception:
-                    msg = _LE("Failed to fetch router information for '%s'")
-                    LOG.exception(msg, update.id)
-                    self.fullsync = True
-                    continue
-
-                if routers:
-                    router = routers[0]
-
-            if not router:
-                removed = self._safe_router_removed(update.id)
-                if not removed:
-                    # TODO(Carl) Stop this fullsync non-sense.  Just retry this
-                    # one router by sticking the update at the end of the queue
-                    # at a lower priority.
-                    self.fullsync = True
-                else:
-                    # need to update timestamp of removed router in case
-                    # there are older events for the same router in the
-                    # processing queue (like events from fullsync) in order to
-                    # prevent deleted router re-creation
-                    rp.fetched_and_processed(update.timestamp)
-                continue
-
+    def _process_router_update(self, lanes=queue.LANES):
+        for rp, update in self._queue.each_update_to_next_router(lanes):
+            started = timeutils.utcnow()
+            try:
+                self._process_one_router_update(rp, update)
+            finally:
+                self._queue.metrics.record(update, started,
+                                           timeutils.utcnow())
+                if update.id not in self.router_info:
+                    self._queue.metrics.forget(update.id)
+
+    def _process_one_router_update(self, rp, update):
+        LOG.debug("Starting router update for %s, action %s, priority %s",
+                  update.id, update.action, update.priority)
+        if update.action == queue.PD_UPDATE:
+            self.pd.process_prefix_update()
+            return
+        router = update.router
+        if update.action != queue.DELETE_ROUTER and not router:
             try:
-                self._process_router_if_compatible(router)
-            except n_exc.RouterNotCompatibleWithAgent as e:
-                LOG.exception(e.msg)
-                # Was the router previously handled by this agent?
-                if router['id'] in self.router_info:
-                    LOG.error(_LE("Removing incompatible router '%s'"),
-                              router['id'])
-                    self._safe_router_removed(router['id'])
+                update.timestamp = timeutils.utcnow()
+                routers = self.plugin_rpc.get_routers(self.context,
+                                                      [update.id])
             except Exception:
-                msg = _LE("Failed to process compatible router '%s'")
+                msg = _LE("Failed to fetch router information for '%s'")
                 LOG.exception(msg, update.id)
                 self.fullsync = True
-                continue
+                return
+
+            if routers:
+                router = routers[0]
+
+        if not router:
+            removed = self._safe_router_removed(update.id)
+            if not removed:
+                # TODO(Carl) Stop this fullsync non-sense.  Just retry this
+                # one router by sticking the update at the end of the queue
+                # at a lower priority.
+                self.fullsync = True
+            else:
+                # need to update timestamp of removed router in case
+                # there are older events for the same router in the
+                # processing queue (like events from fullsync) in order to
+                # prevent deleted router re-creation
+                rp.fetched_and_processed(update.timestamp)
+            return
+
+        try:
+            self._process_router_if_compatible(router)
+        except n_exc.RouterNotCompatibleWithAgent as e:
+            LOG.exception(e.msg)
+            # Was the router previously handled by this agent?
+            if router['id'] in self.router_info:
+                LOG.error(_LE("Removing incompatible router '%s'"),
+                          router['id'])
+                self._safe_router_removed(router['id'])
+        except Exception:
+            msg = _LE("Failed to process compatible router '%s'")
+            LOG.exception(msg, update.id)
+            self.fullsync = True
+            return
 
-            LOG.debug("Finished a router update for %s", update.id)
-            rp.fetched_and_processed(update.timestamp)
+        LOG.debug("Finished a router update for %s", update.id)
+        rp.fetched_and_processed(update.timestamp)
+
+    def _process_routers_pool(self, size, lanes):
+        pool = eventlet.GreenPool(size=size)
+        while True:
+            pool.spawn_n(self._process_router_update, lanes)
 
     def _process_routers_loop(self):
         LOG.debug("Starting _process_routers_loop")
-        pool = eventlet.GreenPool(size=8)
-        while True:
-            pool.spawn_n(self._process_router_update)
+        # The update workers are kept for the updates notified over RPC, the
+        # resync workers serve every lane, the RPC updates first.
+        eventlet.spawn_n(self._process_routers_pool,
+                         self.conf.router_update_workers, [queue.LANE_UPDATE])
+        self._process_routers_pool(self.conf.router_resync_workers,
+                                   queue.LANES)
 
     # NOTE(kevinbenton): this is set to 1 second because the actual interval
     # is controlled by a FixedIntervalLoopingCall in neutron/service.py that
@@ -546,40 +583,53 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         except n_exc.AbortSyncRouters:
             self.fullsync = True
 
+    def _fetch_router_pages(self, context):
+        if not self.conf.use_namespaces:
+            yield self.plugin_rpc.get_routers(context, [self.conf.router_id])
+            return
+        marker = snapshot = None
+        while True:
+            page = self.plugin_rpc.get_routers_page(
+                context, marker=marker, snapshot=snapshot,
+                page_size=self.conf.sync_routers_page_size)
+            yield page['routers']
+            marker = page['next_marker']
+            if not marker:
+                return
+            snapshot = page['snapshot']
+
     def fetch_and_sync_all_routers(self, context, ns_manager):
         prev_router_ids = set(self.router_info)
+        curr_router_ids = set()
         timestamp = timeutils.utcnow()
 
         try:
-            if self.conf.use_namespaces:
-                routers = self.plugin_rpc.get_routers(context)
-            else:
-                routers = self.plugin_rpc.get_routers(context,
-                                                      [self.conf.router_id])
-
+            # The routers of a page are queued before the next page is
+            # fetched, so the workers start processing them in the meantime.
+            for routers in self._fetch_router_pages(context):
+                LOG.debug('Processing :%r', routers)
+                for r in routers:
+                    curr_router_ids.add(r['id'])
+                    ns_manager.keep_router(r['id'])
+                    if r.get('distributed'):
+                        # need to keep fip namespaces as well
+                        ext_net_id = (r['external_gateway_info'] or {}).get(
+                            'network_id')
+                        if ext_net_id:
+                            ns_manager.keep_ext_net(ext_net_id)
+                    update = queue.RouterUpdate(
+                        r['id'],
+                        queue.PRIORITY_SYNC_ROUTERS_TASK,
+                        router=r,
+                        timestamp=timestamp)
+                    self._queue.add(update)
         except oslo_messaging.MessagingException:
             LOG.exception(_LE("Failed synchronizing routers due to RPC error"))
             raise n_exc.AbortSyncRouters()
         else:
-            LOG.debug('Processing :%r', routers)
-            for r in routers:
-                ns_manager.keep_router(r['id'])
-                if r.get('distributed'):
-                    # need to keep fip namespaces as well
-                    ext_net_id = (r['external_gateway_info'] or {}).get(
-                        'network_id')
-                    if ext_net_id:
-                        ns_manager.keep_ext_net(ext_net_id)
-                update = queue.RouterUpdate(r['id'],
-                                            queue.PRIORITY_SYNC_ROUTERS_TASK,
-                                            router=r,
-                                            timestamp=timestamp)
-                self._queue.add(update)
             self.fullsync = False
             LOG.debug("periodic_sync_routers_task successfully completed")
 
-            curr_router_ids = set([r['id'] for r in routers])
-
             # Delete routers that have disappeared since the last sync
             for router_id in prev_router_ids - curr_router_ids:
                 ns_manager.keep_router(router_id)
@@ -658,6 +708,11 @@ class L3NATAgentWithStateReport(L3NATAgent):
         configurations['ex_gw_ports'] = num_ex_gw_ports
         configurations['interfaces'] = num_interfaces
         configurations['floating_ips'] = num_floating_ips
+        router_processing = self._queue.metrics.get_lane_stats()
+        for lane in queue.LANES:
+            router_processing.setdefault(lane, {})['queued'] = (
+                self._queue.qsize(lane))
+        configurations['router_processing'] = router_processing
         try:
             self.state_rpc.report_state(self.context, self.agent_state,
                                         self.use_call)
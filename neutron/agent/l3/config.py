@@ -99,4 +99,17 @@ OPTS = [
                help=_('Iptables mangle mark used to mark ingress from '
                       'external network. This mark will be masked with '
                       '0xffff so that only the lower 16 bits will be used.')),
+    cfg.IntOpt('router_update_workers', default=4, min=1,
+               help=_('Number of workers processing only the router updates '
+                      'notified by the server, so that they are not delayed '
+                      'by a resync of all the routers.')),
+    cfg.IntOpt('router_resync_workers', default=4, min=1,
+               help=_('Number of workers processing the router updates of '
+                      'resyncs and prefix delegation. They also process the '
+                      'updates notified by the server, which keep '
+                      'precedence.')),
+    cfg.IntOpt('sync_routers_page_size', default=64, min=1,
+               help=_('Number of routers fetched from the server per RPC '
+                      'call during a full sync. The routers of a page are '
+                      'processed while the next page is fetched.')),
 ]
@@ -13,11 +13,16 @@
 #    under the License.
 #
 
+import collections
 import datetime
-from six.moves import queue as Queue
+import heapq
+import threading
 
+from oslo_log import log as logging
 from oslo_utils import timeutils
 
+LOG = logging.getLogger(__name__)
+
 # Lower value is higher priority
 PRIORITY_RPC = 0
 PRIORITY_SYNC_ROUTERS_TASK = 1
@@ -25,6 +30,12 @@ PRIORITY_PD_UPDATE = 2
 DELETE_ROUTER = 1
 PD_UPDATE = 2
 
+# Updates notified over RPC, usually the result of a user request, go through
+# their own lane so that they never wait behind a full resync of the routers.
+LANE_UPDATE = 'update'
+LANE_RESYNC = 'resync'
+LANES = (LANE_UPDATE, LANE_RESYNC)
+
 
 class RouterUpdate(object):
     """Encapsulates a router update
@@ -41,6 +52,14 @@ class RouterUpdate(object):
         self.id = router_id
         self.action = action
         self.router = router
+        # Set by the RouterProcessingQueue, used to measure the queue wait
+        self.enqueued_at = None
+
+    @property
+    def lane(self):
+        if self.priority == PRIORITY_RPC:
+            return LANE_UPDATE
+        return LANE_RESYNC
 
     def __lt__(self, other):
         """Implements priority among updates
@@ -137,21 +156,114 @@ class ExclusiveRouterProcessor(object):
                     yield update
 
 
+class RouterProcessingStats(object):
+    """Queue wait and processing times of the updates of a router or lane"""
+    def __init__(self):
+        self.count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_processing = 0.0
+        self.max_processing = 0.0
+
+    def record(self, wait, processing):
+        self.count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.total_processing += processing
+        self.max_processing = max(self.max_processing, processing)
+
+    def to_dict(self):
+        count = self.count or 1
+        return {'updates': self.count,
+                'avg_wait': round(self.total_wait / count, 3),
+                'max_wait': round(self.max_wait, 3),
+                'avg_processing': round(self.total_processing / count, 3),
+                'max_processing': round(self.max_processing, 3)}
+
+
+class RouterProcessingMetrics(object):
+    """Collects the queue wait and processing time of router updates
+
+    The queue wait is the time between an update being added to the
+    RouterProcessingQueue and a worker starting to process it, the processing
+    time is how long the worker took to apply it.  Both are kept per router
+    and aggregated per lane.
+    """
+    def __init__(self):
+        self._routers = collections.defaultdict(RouterProcessingStats)
+        self._lanes = collections.defaultdict(RouterProcessingStats)
+
+    def record(self, update, started, finished):
+        wait = 0.0
+        if update.enqueued_at:
+            wait = max(0.0, timeutils.delta_seconds(update.enqueued_at,
+                                                    started))
+        processing = timeutils.delta_seconds(started, finished)
+        self._routers[update.id].record(wait, processing)
+        self._lanes[update.lane].record(wait, processing)
+        LOG.debug("Router update for %(router)s waited %(wait).3f seconds "
+                  "in the %(lane)s lane and took %(processing).3f seconds "
+                  "to process", {'router': update.id, 'wait': wait,
+                                 'lane': update.lane,
+                                 'processing': processing})
+
+    def forget(self, router_id):
+        self._routers.pop(router_id, None)
+
+    def get_router_stats(self, router_id):
+        if router_id in self._routers:
+            return self._routers[router_id].to_dict()
+
+    def get_lane_stats(self):
+        return dict((lane, stats.to_dict())
+                    for lane, stats in self._lanes.items())
+
+
 class RouterProcessingQueue(object):
-    """Manager of the queue of routers to process."""
+    """Manager of the queue of routers to process.
+
+    Updates are kept in one priority queue per lane.  A worker asks for the
+    next update among the lanes it serves, so that some workers can be kept
+    for the updates notified over RPC while the others work through a resync.
+    """
     def __init__(self):
-        self._queue = Queue.PriorityQueue()
+        self._lanes = dict((lane, []) for lane in LANES)
+        self._cond = threading.Condition()
+        self.metrics = RouterProcessingMetrics()
 
     def add(self, update):
-        self._queue.put(update)
-
-    def each_update_to_next_router(self):
+        update.enqueued_at = timeutils.utcnow()
+        with self._cond:
+            heapq.heappush(self._lanes[update.lane], update)
+            self._cond.notify_all()
+
+    def empty(self):
+        return not any(self._lanes.values())
+
+    def qsize(self, lane=None):
+        if lane:
+            return len(self._lanes[lane])
+        return sum(len(updates) for updates in self._lanes.values())
+
+    def _get(self, lanes):
+        with self._cond:
+            while True:
+                heads = [self._lanes[lane] for lane in lanes
+                         if self._lanes[lane]]
+                if heads:
+                    return heapq.heappop(min(heads, key=lambda h: h[0]))
+                self._cond.wait()
+
+    def each_update_to_next_router(self, lanes=LANES):
         """Grabs the next router from the queue and processes
 
         This method uses a for loop to process the router repeatedly until
-        updates stop bubbling to the front of the queue.
+        updates stop bubbling to the front of the queue.  Only the updates
+        of the given lanes are grabbed, the one with the highest priority
+        first.  Updates of other lanes queued for the router while it is
+        processed are handled by this worker too, see ExclusiveRouterProcessor.
         """
-        next_update = self._queue.get()
+        next_update = self._get(lanes)
 
         with ExclusiveRouterProcessor(next_update.id) as rp:
             # Queue the update whether this worker is the master or not.
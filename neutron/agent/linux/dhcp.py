@@ -54,6 +54,10 @@ WIN2k3_STATIC_DNS = 249
 NS_PREFIX = 'qdhcp-'
 DNSMASQ_SERVICE_NAME = 'dnsmasq'
 
+# The lines of the host and addn_hosts files generated for a port
+HostEntry = collections.namedtuple('HostEntry',
+                                   ['port', 'hosts', 'addn_hosts'])
+
 
 class DictModel(dict):
     """Convert dict into an object that provides attribute access to values."""
@@ -285,6 +289,11 @@ class Dnsmasq(DhcpLocalProcess):
 
     _ID = 'id:'
 
+    # network id -> (subnets key, {mac address: HostEntry}).  The entries of
+    # the ports which were not updated since the files were last written are
+    # reused instead of being formatted again.
+    _host_indexes = {}
+
     @classmethod
     def check_version(cls):
         pass
@@ -409,6 +418,7 @@ class Dnsmasq(DhcpLocalProcess):
         """Spawn the process, if it's not spawned already."""
         # we only need to generate the lease file the first time dnsmasq starts
         # rather than on every reload since dnsmasq will keep the file current
+        self._host_indexes.pop(self.network.id, None)
         self._output_init_lease_file()
         self._spawn_or_reload_process(reload_with_HUP=False)
 
@@ -430,6 +440,10 @@ class Dnsmasq(DhcpLocalProcess):
                                       service_name=DNSMASQ_SERVICE_NAME,
                                       monitored_process=pm)
 
+    def disable(self, retain_port=False):
+        self._host_indexes.pop(self.network.id, None)
+        super(Dnsmasq, self).disable(retain_port)
+
     def _release_lease(self, mac_address, ip, client_id):
         """Release a DHCP lease."""
         if netaddr.IPAddress(ip).version == constants.IP_VERSION_6:
@@ -517,41 +531,47 @@ class Dnsmasq(DhcpLocalProcess):
             no_opts,  # A flag indication that options shouldn't be written
         )
         """
-        v6_nets = dict((subnet.id, subnet) for subnet in
-                       self.network.subnets if subnet.ip_version == 6)
-
+        v6_nets = self._get_v6_nets()
         for port in self.network.ports:
-            fixed_ips = self._sort_fixed_ips_for_dnsmasq(port.fixed_ips,
-                                                         v6_nets)
-            # Confirm whether Neutron server supports dns_name attribute in the
-            # ports API
-            dns_assignment = getattr(port, 'dns_assignment', None)
+            for host_tuple in self._iter_port_hosts(port, v6_nets):
+                yield host_tuple
+
+    def _get_v6_nets(self):
+        return dict((subnet.id, subnet) for subnet in
+                    self.network.subnets if subnet.ip_version == 6)
+
+    def _iter_port_hosts(self, port, v6_nets):
+        """Iterate over the hosts of a port, see _iter_hosts."""
+        fixed_ips = self._sort_fixed_ips_for_dnsmasq(port.fixed_ips, v6_nets)
+        # Confirm whether Neutron server supports dns_name attribute in the
+        # ports API
+        dns_assignment = getattr(port, 'dns_assignment', None)
+        if dns_assignment:
+            dns_ip_map = {d.ip_address: d for d in dns_assignment}
+        for alloc in fixed_ips:
+            no_dhcp = False
+            no_opts = False
+            if alloc.subnet_id in v6_nets:
+                addr_mode = v6_nets[alloc.subnet_id].ipv6_address_mode
+                no_dhcp = addr_mode in (constants.IPV6_SLAAC,
+                                        constants.DHCPV6_STATELESS)
+                # we don't setup anything for SLAAC. It doesn't make sense
+                # to provide options for a client that won't use DHCP
+                no_opts = addr_mode == constants.IPV6_SLAAC
+
+            # If dns_name attribute is supported by ports API, return the
+            # dns_assignment generated by the Neutron server. Otherwise,
+            # generate hostname and fqdn locally (previous behaviour)
             if dns_assignment:
-                dns_ip_map = {d.ip_address: d for d in dns_assignment}
-            for alloc in fixed_ips:
-                no_dhcp = False
-                no_opts = False
-                if alloc.subnet_id in v6_nets:
-                    addr_mode = v6_nets[alloc.subnet_id].ipv6_address_mode
-                    no_dhcp = addr_mode in (constants.IPV6_SLAAC,
-                                            constants.DHCPV6_STATELESS)
-                    # we don't setup anything for SLAAC. It doesn't make sense
-                    # to provide options for a client that won't use DHCP
-                    no_opts = addr_mode == constants.IPV6_SLAAC
-
-                # If dns_name attribute is supported by ports API, return the
-                # dns_assignment generated by the Neutron server. Otherwise,
-                # generate hostname and fqdn locally (previous behaviour)
-                if dns_assignment:
-                    hostname = dns_ip_map[alloc.ip_address].hostname
-                    fqdn = dns_ip_map[alloc.ip_address].fqdn
-                else:
-                    hostname = 'host-%s' % alloc.ip_address.replace(
-                        '.', '-').replace(':', '-')
-                    fqdn = hostname
-                    if self.conf.dhcp_domain:
-                        fqdn = '%s.%s' % (fqdn, self.conf.dhcp_domain)
-                yield (port, alloc, hostname, fqdn, no_dhcp, no_opts)
+                hostname = dns_ip_map[alloc.ip_address].hostname
+                fqdn = dns_ip_map[alloc.ip_address].fqdn
+            else:
+                hostname = 'host-%s' % alloc.ip_address.replace(
+                    '.', '-').replace(':', '-')
+                fqdn = hostname
+                if self.conf.dhcp_domain:
+                    fqdn = '%s.%s' % (fqdn, self.conf.dhcp_domain)
+            yield (port, alloc, hostname, fqdn, no_dhcp, no_opts)
 
     def _get_port_extra_dhcp_opts(self, port):
         return getattr(port, edo_ext.EXTRADHCPOPTS, False)
@@ -626,15 +646,51 @@ class Dnsmasq(DhcpLocalProcess):
         should receive a dhcp lease, the hosts resolution in itself is
         defined by the `_output_addn_hosts_file` method.
         """
-        buf = six.StringIO()
         filename = self.get_conf_file_name('host')
 
         LOG.debug('Building host file: %s', filename)
-        dhcp_enabled_subnet_ids = [s.id for s in self.network.subnets
-                                   if s.enable_dhcp]
         # NOTE(ihrachyshka): the loop should not log anything inside it, to
         # avoid potential performance drop when lots of hosts are dumped
-        for host_tuple in self._iter_hosts():
+        contents = ''.join(entry.hosts for entry in self._get_host_entries())
+        utils.replace_file(filename, contents)
+        LOG.debug('Done building host file %s with contents:\n%s', filename,
+                  contents)
+        return filename
+
+    def _get_host_entries(self):
+        """Returns the host files entries of the ports of the network.
+
+        The entries are kept in an index keyed by MAC address, only the ports
+        which were updated since the files were last written, and thus are
+        new objects in the network, are formatted again.
+        """
+        dhcp_enabled_subnet_ids = [s.id for s in self.network.subnets
+                                   if s.enable_dhcp]
+        v6_nets = self._get_v6_nets()
+        subnets_key = (self.conf.dhcp_domain, tuple(
+            (s.id, s.enable_dhcp, getattr(s, 'ipv6_address_mode', None))
+            for s in self.network.subnets))
+        key, index = self._host_indexes.get(self.network.id, (None, {}))
+        if key != subnets_key:
+            index = {}
+        entries = []
+        new_index = {}
+        for port in self.network.ports:
+            entry = index.get(port.mac_address)
+            if entry is None or entry.port is not port:
+                host_tuples = list(self._iter_port_hosts(port, v6_nets))
+                entry = HostEntry(
+                    port,
+                    self._format_hosts(host_tuples, dhcp_enabled_subnet_ids),
+                    self._format_addn_hosts(host_tuples))
+            new_index[port.mac_address] = entry
+            entries.append(entry)
+        self._host_indexes[self.network.id] = (subnets_key, new_index)
+        return entries
+
+    def _format_hosts(self, host_tuples, dhcp_enabled_subnet_ids):
+        buf = six.StringIO()
+        for host_tuple in host_tuples:
             port, alloc, hostname, name, no_dhcp, no_opts = host_tuple
             if no_dhcp:
                 if not no_opts and self._get_port_extra_dhcp_opts(port):
@@ -665,11 +721,17 @@ class Dnsmasq(DhcpLocalProcess):
             else:
                 buf.write('%s,%s,%s\n' %
                           (port.mac_address, name, ip_address))
+        return buf.getvalue()
 
-        utils.replace_file(filename, buf.getvalue())
-        LOG.debug('Done building host file %s with contents:\n%s', filename,
-                  buf.getvalue())
-        return filename
+    def _format_addn_hosts(self, host_tuples):
+        buf = six.StringIO()
+        for host_tuple in host_tuples:
+            port, alloc, hostname, fqdn, no_dhcp, no_opts = host_tuple
+            # It is compulsory to write the `fqdn` before the `hostname` in
+            # order to obtain it in PTR responses.
+            if alloc:
+                buf.write('%s\t%s %s\n' % (alloc.ip_address, fqdn, hostname))
+        return buf.getvalue()
 
     def _get_client_id(self, port):
         if self._get_port_extra_dhcp_opts(port):
@@ -729,15 +791,10 @@ class Dnsmasq(DhcpLocalProcess):
         Each line in this file is in the same form as a standard /etc/hosts
         file.
         """
-        buf = six.StringIO()
-        for host_tuple in self._iter_hosts():
-            port, alloc, hostname, fqdn, no_dhcp, no_opts = host_tuple
-            # It is compulsory to write the `fqdn` before the `hostname` in
-            # order to obtain it in PTR responses.
-            if alloc:
-                buf.write('%s\t%s %s\n' % (alloc.ip_address, fqdn, hostname))
+        contents = ''.join(entry.addn_hosts
+                           for entry in self._get_host_entries())
         addn_hosts = self.get_conf_file_name('addn_hosts')
-        utils.replace_file(addn_hosts, buf.getvalue())
+        utils.replace_file(addn_hosts, contents)
         return addn_hosts
 
     def _output_opts_file(self):
@@ -11,9 +11,11 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import contextlib
 import copy
 
 import netaddr
+from oslo_utils import excutils
 
 from neutron.agent.linux import utils as linux_utils
 from neutron.common import utils
@@ -29,12 +31,40 @@ class IpsetManager(object):
 
        Keeps track of ip addresses per set, using bulk
        or single ip add/remove for smaller changes.
+
+       While application is deferred, membership changes of every set are
+       collected and applied with a single ipset restore when deferral is
+       turned off.
     """
 
     def __init__(self, execute=None, namespace=None):
         self.execute = execute or linux_utils.execute
         self.namespace = namespace
         self.ipset_sets = {}
+        # ipset restore commands collected while application is deferred,
+        # None when changes are applied right away
+        self._deferred_commands = None
+        self._deferred_sets = set()
+
+    @contextlib.contextmanager
+    def defer_apply(self):
+        """Defer apply context."""
+        self.defer_apply_on()
+        try:
+            yield
+        finally:
+            self.defer_apply_off()
+
+    def defer_apply_on(self):
+        if self._deferred_commands is None:
+            self._deferred_commands = []
+
+    @utils.synchronized('ipset', external=True)
+    def defer_apply_off(self):
+        try:
+            self._apply_deferred_commands()
+        finally:
+            self._deferred_commands = None
 
     def _sanitize_addresses(self, addresses):
         """This method converts any address to ipset format.
@@ -88,7 +118,9 @@ class IpsetManager(object):
     @utils.synchronized('ipset', external=True)
     def set_members_mutate(self, id, ethertype, member_ips):
         set_name = self.get_name(id, ethertype)
-        if not self.set_exists(id, ethertype):
+        if self._deferred_commands is not None:
+            self._defer_set_members(set_name, ethertype, member_ips)
+        elif not self.set_exists(id, ethertype):
             # The initial creation is handled with create/refresh to
             # avoid any downtime for existing sets (i.e. avoiding
             # a flush/restore), as the restore operation of ipset is
@@ -111,8 +143,63 @@ class IpsetManager(object):
     @utils.synchronized('ipset', external=True)
     def destroy(self, id, ethertype, forced=False):
         set_name = self.get_name(id, ethertype)
+        if set_name in self._deferred_sets:
+            # the set can't be destroyed before its pending changes are
+            # applied, or they would recreate it
+            self._apply_deferred_commands()
         self._destroy(set_name, forced)
 
+    def _defer_set_members(self, set_name, ethertype, member_ips):
+        if set_name not in self.ipset_sets:
+            # As in the non deferred case, the set may already exist on the
+            # system, so it is created and then refreshed by swapping.
+            self._deferred_commands.append(
+                self._get_create_command(set_name, ethertype))
+            self._defer_refresh_set(set_name, member_ips, ethertype)
+        else:
+            add_ips = self._get_new_set_ips(set_name, member_ips)
+            del_ips = self._get_deleted_set_ips(set_name, member_ips)
+            if (len(add_ips) + len(del_ips) < IPSET_ADD_BULK_THRESHOLD):
+                self._deferred_commands.extend(
+                    'add %s %s' % (set_name, ip) for ip in add_ips)
+                self._deferred_commands.extend(
+                    'del %s %s' % (set_name, ip) for ip in del_ips)
+            else:
+                self._defer_refresh_set(set_name, member_ips, ethertype)
+        self._deferred_sets.add(set_name)
+        self.ipset_sets[set_name] = copy.copy(member_ips)
+
+    def _defer_refresh_set(self, set_name, member_ips, ethertype):
+        new_set_name = set_name + SWAP_SUFFIX
+        self._deferred_commands.append(
+            self._get_create_command(new_set_name, ethertype))
+        # the temporary set could be left over from a failed refresh
+        self._deferred_commands.append('flush %s' % new_set_name)
+        self._deferred_commands.extend(
+            'add %s %s' % (new_set_name, ip) for ip in member_ips)
+        self._deferred_commands.append('swap %s %s' % (new_set_name,
+                                                       set_name))
+        self._deferred_commands.append('destroy %s' % new_set_name)
+
+    def _apply_deferred_commands(self):
+        commands, self._deferred_commands = self._deferred_commands, []
+        deferred_sets, self._deferred_sets = self._deferred_sets, set()
+        if not commands:
+            return
+        try:
+            self._restore_sets(commands)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                # ipset restore stops at the first failing command, so the
+                # state of these sets is unknown. Forget them so their next
+                # update recreates them from scratch.
+                for set_name in deferred_sets:
+                    self.ipset_sets.pop(set_name, None)
+
+    def _get_create_command(self, set_name, ethertype):
+        return 'create %s hash:net family %s' % (
+            set_name, self._get_ipset_set_type(ethertype))
+
     def _add_member_to_set(self, set_name, member_ip):
         cmd = ['ipset', 'add', '-exist', set_name, member_ip]
         self._apply(cmd)
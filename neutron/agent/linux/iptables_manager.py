@@ -20,9 +20,11 @@
 
 import collections
 import contextlib
+import difflib
 import os
 import re
 import sys
+import time
 
 from oslo_concurrency import lockutils
 from oslo_config import cfg
@@ -130,6 +132,14 @@ class IptablesTable(object):
         self.unwrapped_chains = set()
         self.remove_chains = set()
         self.wrap_name = binary_name[:16]
+        # Names of the chains, as seen by iptables, whose rules changed
+        # since the last apply. Only used for incremental applies.
+        self.dirty_chains = set()
+
+    def _mark_dirty(self, chain, wrap=True):
+        if wrap:
+            chain = '%s-%s' % (self.wrap_name, chain)
+        self.dirty_chains.add(chain)
 
     def add_chain(self, name, wrap=True):
         """Adds a named chain to the table.
@@ -148,6 +158,7 @@ class IptablesTable(object):
             self.chains.add(name)
         else:
             self.unwrapped_chains.add(name)
+        self._mark_dirty(name, wrap)
 
     def _select_chain_set(self, wrap):
         if wrap:
@@ -173,6 +184,7 @@ class IptablesTable(object):
             return
 
         chain_set.remove(name)
+        self._mark_dirty(name, wrap)
 
         if not wrap:
             # non-wrapped chains and rules need to be dealt with specially,
@@ -194,6 +206,9 @@ class IptablesTable(object):
             jump_snippet = '-j %s-%s' % (self.wrap_name, name)
 
         # finally, remove rules from list that have a matching jump chain
+        for r in self.rules:
+            if jump_snippet in r.rule:
+                self._mark_dirty(r.chain, r.wrap)
         self.rules = [r for r in self.rules
                       if jump_snippet not in r.rule]
 
@@ -219,6 +234,7 @@ class IptablesTable(object):
 
         self.rules.append(IptablesRule(chain, rule, wrap, top, self.wrap_name,
                                        tag, comment))
+        self._mark_dirty(chain, wrap)
 
     def _wrap_target_chain(self, s, wrap):
         if s.startswith('$'):
@@ -243,6 +259,7 @@ class IptablesTable(object):
             self.rules.remove(IptablesRule(chain, rule, wrap, top,
                                            self.wrap_name,
                                            comment=comment))
+            self._mark_dirty(chain, wrap)
             if not wrap:
                 self.remove_rules.append(IptablesRule(chain, rule, wrap, top,
                                                       self.wrap_name,
@@ -263,6 +280,8 @@ class IptablesTable(object):
         chained_rules = self._get_chain_rules(chain, wrap)
         for rule in chained_rules:
             self.rules.remove(rule)
+        if chained_rules:
+            self._mark_dirty(get_chain_name(chain, wrap), wrap)
 
     def clear_rules_by_tag(self, tag):
         if not tag:
@@ -270,6 +289,7 @@ class IptablesTable(object):
         rules = [rule for rule in self.rules if rule.tag == tag]
         for rule in rules:
             self.rules.remove(rule)
+            self._mark_dirty(rule.chain, rule.wrap)
 
 
 class IptablesManager(object):
@@ -306,6 +326,10 @@ class IptablesManager(object):
         self.namespace = namespace
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
+        # iptables-save lines of each table and the time they were last
+        # checked against the kernel, per command, as left by the last
+        # incremental apply
+        self._snapshots = {}
 
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
@@ -426,6 +450,8 @@ class IptablesManager(object):
             lock_name += '-' + self.namespace
 
         with lockutils.lock(lock_name, utils.SYNCHRONIZED_PREFIX, True):
+            if cfg.CONF.AGENT.iptables_incremental_apply:
+                return self._apply_incremental_synchronized()
             return self._apply_synchronized()
 
     def get_rules_for_table(self, table):
@@ -460,34 +486,173 @@ class IptablesManager(object):
                 all_lines[start:end] = self._modify_rules(
                     all_lines[start:end], table, table_name)
 
-            args = ['%s-restore' % (cmd,), '-c']
+            self._restore(cmd, ['-c'], all_lines)
+            for table in tables.values():
+                table.dirty_chains.clear()
+        LOG.debug("IPTablesManager.apply completed with success")
+
+    def _apply_incremental_synchronized(self):
+        """Apply only the changes made to the in-memory rules.
+
+        Tables without dirty chains are skipped. For the others, the rules
+        of the dirty chains are diffed against the current kernel state and
+        only the resulting -N/-I/-A/-D/-X commands are sent to
+        iptables-restore -n. If a chain we did not touch no longer matches
+        what we expect, or if the deltas fail to apply, the kernel state has
+        drifted and the affected tables are fully restored instead.
+
+        The state left by the last apply is kept in memory and used instead
+        of iptables-save output as long as it was checked against the
+        kernel less than iptables_state_check_interval seconds ago and only
+        chains owned by this manager changed.
+
+        """
+        s = [('iptables', self.ipv4)]
+        if self.use_ipv6:
+            s += [('ip6tables', self.ipv6)]
+
+        for cmd, tables in s:
+            dirty_tables = sorted(name for name, table in tables.items()
+                                  if table.dirty_chains)
+            if not dirty_tables:
+                continue
+
+            if self._is_snapshot_usable(cmd, tables, dirty_tables):
+                # _modify_rules consumes the pending removals, keep them
+                # around in case we have to start over from iptables-save
+                pending_removes = dict(
+                    (name, (set(tables[name].remove_chains),
+                            list(tables[name].remove_rules)))
+                    for name in dirty_tables)
+                snapshot = self._snapshots[cmd][0]
+                new_tables = self._apply_tables(cmd, tables, dirty_tables,
+                                                snapshot, resync=False)
+                if new_tables is not None:
+                    snapshot.update(new_tables)
+                    for table_name in dirty_tables:
+                        tables[table_name].dirty_chains.clear()
+                    continue
+                LOG.debug("Cached %s state is stale, reloading it", cmd)
+                for name, (chains, rules) in pending_removes.items():
+                    tables[name].remove_chains = chains
+                    tables[name].remove_rules = rules
+
+            self._snapshots.pop(cmd, None)
+            args = ['%s-save' % (cmd,), '-c']
             if self.namespace:
                 args = ['ip', 'netns', 'exec', self.namespace] + args
+            checked_at = time.time()
+            all_lines = self.execute(args, run_as_root=True).split('\n')
+            snapshot = {}
+            for table_name in tables:
+                start, end = self._find_table(all_lines, table_name)
+                snapshot[table_name] = all_lines[start:end]
+            snapshot.update(self._apply_tables(cmd, tables, dirty_tables,
+                                               snapshot))
+            self._snapshots[cmd] = (snapshot, checked_at)
+
+            for table_name in dirty_tables:
+                tables[table_name].dirty_chains.clear()
+        LOG.debug("IPTablesManager.apply completed with success")
+
+    def _is_snapshot_usable(self, cmd, tables, table_names):
+        if cmd not in self._snapshots:
+            return False
+        checked_at = self._snapshots[cmd][1]
+        max_age = cfg.CONF.AGENT.iptables_state_check_interval
+        if time.time() - checked_at >= max_age:
+            return False
+        # Other tools may have changed the rules of chains we share with
+        # them, so rule positions in those chains cannot be trusted.
+        prefix = '%s-' % self.wrap_name
+        return all(chain.startswith(prefix)
+                   for table_name in table_names
+                   for chain in tables[table_name].dirty_chains)
+
+    def _apply_tables(self, cmd, tables, table_names, old_tables,
+                      resync=True):
+        """Apply the changes of the given tables on top of old_tables.
+
+        old_tables maps table names to their iptables-save lines. Returns
+        the same mapping for the new state of the given tables. If resync
+        is False and the changes can not be applied as deltas, nothing is
+        restored and None is returned instead.
+
+        """
+        commands = []
+        new_tables = {}
+        delta_tables = []
+        resync_tables = []
+        for table_name in table_names:
+            table = tables[table_name]
+            old_rules = old_tables[table_name]
+            new_rules = self._modify_rules(old_rules, table, table_name)
+            new_tables[table_name] = new_rules
+            changes = _generate_path_between_rules(
+                old_rules, new_rules, table.dirty_chains)
+            if changes is None:
+                if not resync:
+                    return
+                LOG.debug("Kernel state of %(cmd)s table %(table)s "
+                          "drifted, doing a full resync",
+                          {'cmd': cmd, 'table': table_name})
+                resync_tables.append(table_name)
+            elif changes:
+                delta_tables.append(table_name)
+                commands += (['# Generated by iptables_manager',
+                              '*%s' % table_name] + changes +
+                             ['COMMIT', '# Completed by iptables_manager'])
+
+        if commands:
             try:
-                self.execute(args, process_input='\n'.join(all_lines),
-                             run_as_root=True)
+                self._restore(cmd, ['-n'], commands + [''],
+                              log_failure=False)
             except RuntimeError as r_error:
-                with excutils.save_and_reraise_exception():
-                    try:
-                        line_no = int(re.search(
-                            'iptables-restore: line ([0-9]+?) failed',
-                            str(r_error)).group(1))
-                        context = IPTABLES_ERROR_LINES_OF_CONTEXT
-                        log_start = max(0, line_no - context)
-                        log_end = line_no + context
-                    except AttributeError:
-                        # line error wasn't found, print all lines instead
-                        log_start = 0
-                        log_end = len(all_lines)
-                    log_lines = ('%7d. %s' % (idx, l)
-                                 for idx, l in enumerate(
-                                     all_lines[log_start:log_end],
-                                     log_start + 1)
-                                 )
-                    LOG.error(_LE("IPTablesManager.apply failed to apply the "
-                                  "following set of iptables rules:\n%s"),
-                              '\n'.join(log_lines))
-        LOG.debug("IPTablesManager.apply completed with success")
+                if not resync:
+                    return
+                LOG.warn(_LW("Incremental %(cmd)s apply failed, doing a "
+                             "full resync: %(error)s"),
+                         {'cmd': cmd, 'error': r_error})
+                resync_tables += delta_tables
+
+        if resync_tables:
+            resync_lines = []
+            for table_name in sorted(resync_tables):
+                resync_lines += new_tables[table_name]
+            self._restore(cmd, ['-c'], resync_lines)
+        return new_tables
+
+    def _restore(self, cmd, restore_args, lines, log_failure=True):
+        args = ['%s-restore' % (cmd,)] + restore_args
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        try:
+            self.execute(args, process_input='\n'.join(lines),
+                         run_as_root=True)
+        except RuntimeError as r_error:
+            with excutils.save_and_reraise_exception():
+                if log_failure:
+                    self._log_restore_failure(lines, r_error)
+
+    def _log_restore_failure(self, lines, r_error):
+        try:
+            line_no = int(re.search(
+                'iptables-restore: line ([0-9]+?) failed',
+                str(r_error)).group(1))
+            context = IPTABLES_ERROR_LINES_OF_CONTEXT
+            log_start = max(0, line_no - context)
+            log_end = line_no + context
+        except AttributeError:
+            # line error wasn't found, print all lines instead
+            log_start = 0
+            log_end = len(lines)
+        log_lines = ('%7d. %s' % (idx, l)
+                     for idx, l in enumerate(lines[log_start:log_end],
+                                             log_start + 1)
+                     )
+        LOG.error(_LE("IPTablesManager.apply failed to apply the "
+                      "following set of iptables rules:\n%s"),
+                  '\n'.join(log_lines))
 
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
@@ -759,3 +924,89 @@ def make_filter_map(filter_list):
                 filter_map[alt_key].append(data)
     # return a regular dict so readers don't accidentally add entries
     return dict(filter_map)
+
+
+def _strip_counters(line):
+    # strip any [packet:byte] counts at the start of a rule
+    if line.startswith('['):
+        line = line.split('] ', 1)[1]
+    return line.strip()
+
+
+def _get_rules_by_chain(lines):
+    """Split an iptables-save table into its chains and per-chain rules.
+
+    Rules are returned without their '-A <chain>' prefix and without
+    [packet:byte] counts.
+    """
+    chains = set()
+    rules_by_chain = collections.defaultdict(list)
+    for line in lines:
+        line = _strip_counters(line)
+        if line.startswith(':'):
+            chains.add(line[1:].split(' ', 1)[0])
+        elif line.startswith('-A '):
+            rule = line.split(' ', 2)
+            rules_by_chain[rule[1]].append(rule[2] if len(rule) > 2 else '')
+    return chains, rules_by_chain
+
+
+def _generate_chain_diff_iptables_commands(chain, old_chain_rules,
+                                           new_chain_rules):
+    """Generate the commands turning old_chain_rules into new_chain_rules."""
+    statements = []
+    # rule positions are 1-based and shift as rules are deleted and
+    # inserted, so keep track of the offset from the old positions
+    offset = 0
+    length = len(old_chain_rules)
+    matcher = difflib.SequenceMatcher(None, old_chain_rules, new_chain_rules,
+                                      autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        position = i1 + offset + 1
+        if tag in ('delete', 'replace'):
+            statements += ['-D %s %d' % (chain, position)] * (i2 - i1)
+            offset -= i2 - i1
+            length -= i2 - i1
+        if tag in ('insert', 'replace'):
+            for index, rule in enumerate(new_chain_rules[j1:j2], position):
+                if index > length:
+                    statement = '-A %s %s' % (chain, rule)
+                else:
+                    statement = '-I %s %d %s' % (chain, index, rule)
+                statements.append(statement.strip())
+                length += 1
+            offset += j2 - j1
+    return statements
+
+
+def _generate_path_between_rules(old_rules, new_rules, dirty_chains):
+    """Generate the iptables-restore commands to get from old to new rules.
+
+    Only the chains in dirty_chains are expected to differ. If any other
+    chain does, the kernel state has drifted from what was last applied and
+    None is returned so the caller can fall back to a full restore.
+    """
+    old_chains, old_by_chain = _get_rules_by_chain(old_rules)
+    new_chains, new_by_chain = _get_rules_by_chain(new_rules)
+    added_chains = new_chains - old_chains
+    removed_chains = old_chains - new_chains
+
+    # referenced chains have to exist before any rule jumps to them
+    statements = ['-N %s' % chain for chain in sorted(added_chains)]
+    for chain in sorted(set(old_by_chain) | set(new_by_chain)):
+        if chain in removed_chains:
+            continue
+        old_chain_rules = old_by_chain.get(chain, [])
+        new_chain_rules = new_by_chain.get(chain, [])
+        if old_chain_rules == new_chain_rules:
+            continue
+        if chain not in dirty_chains and chain not in added_chains:
+            return None
+        statements += _generate_chain_diff_iptables_commands(
+            chain, old_chain_rules, new_chain_rules)
+    # chains can only be deleted once nothing jumps to them anymore
+    for chain in sorted(removed_chains):
+        statements += ['-F %s' % chain, '-X %s' % chain]
+    return statements
@@ -0,0 +1,468 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Security group firewall driver built on nftables.
+
+The whole ruleset lives in a single ``bridge`` family table and is always
+programmed atomically with one ``nft -f`` transaction:
+
+* the ``ingress-ports`` and ``egress-ports`` verdict maps dispatch a frame
+  to the chain of the port it is leaving or entering through with a single
+  hash lookup, whatever the number of ports on the host;
+* the members of every remote security group are kept in one interval set
+  per group and ethertype, so membership changes never touch the port
+  chains and are sent to the kernel as element deltas only.
+
+Connection tracking in the bridge family requires the nf_conntrack_bridge
+module (Linux 5.3 or later) and nftables 0.9.3 or later.
+"""
+
+import collections
+
+import netaddr
+from oslo_log import log as logging
+
+from neutron.agent import firewall
+from neutron.agent.linux import utils
+from neutron.common import constants
+from neutron.extensions import portsecurity as psec
+from neutron.i18n import _LI
+
+
+LOG = logging.getLogger(__name__)
+
+NFT_FAMILY = 'bridge'
+NFT_TABLE = 'neutron'
+# older kernels limit chain and set names to 32 bytes including the NUL
+NFT_NAME_MAX_LENGTH = 31
+INGRESS_MAP = 'ingress-ports'
+EGRESS_MAP = 'egress-ports'
+SPOOF_FILTER = 'spoof-filter'
+CHAIN_NAME_PREFIX = {firewall.INGRESS_DIRECTION: 'i',
+                     firewall.EGRESS_DIRECTION: 'o',
+                     SPOOF_FILTER: 's'}
+DIRECTION_IP_PREFIX = {firewall.INGRESS_DIRECTION: 'source_ip_prefix',
+                       firewall.EGRESS_DIRECTION: 'dest_ip_prefix'}
+DIRECTION_ADDR = {firewall.INGRESS_DIRECTION: 'saddr',
+                  firewall.EGRESS_DIRECTION: 'daddr'}
+NFT_ETHERTYPE = {constants.IPv4: 'ip', constants.IPv6: 'ip6'}
+NFT_PROTO_MATCH = {constants.IPv4: 'ip protocol',
+                   constants.IPv6: 'ip6 nexthdr'}
+NFT_ADDR_TYPE = {constants.IPv4: 'ipv4_addr', constants.IPv6: 'ipv6_addr'}
+SET_NAME_PREFIX = {constants.IPv4: 'v4-', constants.IPv6: 'v6-'}
+LINUX_DEV_LEN = 14
+
+
+def get_name(name):
+    return name[:NFT_NAME_MAX_LENGTH]
+
+
+def get_set_name(sg_id, ethertype):
+    """Returns the name of the set holding the members of a remote group."""
+    return get_name(SET_NAME_PREFIX[ethertype] + sg_id)
+
+
+def _format_elements(elements):
+    return '{ %s }' % ', '.join(elements)
+
+
+class NftablesFirewallDriver(firewall.FirewallDriver):
+    """Driver which enforces security groups through nftables rules."""
+
+    def __init__(self, namespace=None):
+        self.namespace = namespace
+        # list of port which has security group
+        self.filtered_ports = {}
+        self.unfiltered_ports = {}
+        self._defer_apply = False
+        # List of security group rules for ports residing on this host
+        self.sg_rules = {}
+        # List of security group member ips for ports residing on this host
+        self.sg_members = collections.defaultdict(
+            lambda: collections.defaultdict(list))
+        # rendered rules of a security group, by (sg_id, direction)
+        self._sg_rules_cache = {}
+        # what was last programmed into the kernel: the table without set
+        # elements, and the elements of every set
+        self._applied_chains = None
+        self._applied_sets = {}
+
+    @property
+    def ports(self):
+        return dict(self.filtered_ports, **self.unfiltered_ports)
+
+    def security_group_updated(self, action_type, sec_group_ids,
+                               device_ids=None):
+        # the ruleset is rebuilt from sg_rules and sg_members on every
+        # apply, nothing has to be tracked here
+        pass
+
+    def update_security_group_rules(self, sg_id, sg_rules):
+        LOG.debug("Update rules of security group (%s)", sg_id)
+        self.sg_rules[sg_id] = sg_rules
+        for direction in (firewall.INGRESS_DIRECTION,
+                          firewall.EGRESS_DIRECTION):
+            self._sg_rules_cache.pop((sg_id, direction), None)
+
+    def update_security_group_members(self, sg_id, sg_members):
+        LOG.debug("Update members of security group (%s)", sg_id)
+        self.sg_members[sg_id] = collections.defaultdict(list, sg_members)
+
+    def _ps_enabled(self, port):
+        return port.get(psec.PORTSECURITY, True)
+
+    def _set_ports(self, port):
+        if not self._ps_enabled(port):
+            self.unfiltered_ports[port['device']] = port
+            self.filtered_ports.pop(port['device'], None)
+        else:
+            self.filtered_ports[port['device']] = port
+            self.unfiltered_ports.pop(port['device'], None)
+
+    def _unset_ports(self, port):
+        self.unfiltered_ports.pop(port['device'], None)
+        self.filtered_ports.pop(port['device'], None)
+
+    def prepare_port_filter(self, port):
+        LOG.debug("Preparing device (%s) filter", port['device'])
+        self._set_ports(port)
+        self._apply()
+
+    def update_port_filter(self, port):
+        LOG.debug("Updating device (%s) filter", port['device'])
+        if port['device'] not in self.ports:
+            LOG.info(_LI('Attempted to update port filter which is not '
+                         'filtered %s'), port['device'])
+            return
+        self._set_ports(port)
+        self._apply()
+
+    def remove_port_filter(self, port):
+        LOG.debug("Removing device (%s) filter", port['device'])
+        if port['device'] not in self.ports:
+            LOG.info(_LI('Attempted to remove port filter which is not '
+                         'filtered %r'), port)
+            return
+        self._unset_ports(port)
+        self._apply()
+
+    def filter_defer_apply_on(self):
+        self._defer_apply = True
+
+    def filter_defer_apply_off(self):
+        if self._defer_apply:
+            self._defer_apply = False
+            self._apply()
+
+    def _get_device_name(self, port):
+        return port['device']
+
+    def _port_chain_name(self, port, direction):
+        return get_name(
+            '%s%s' % (CHAIN_NAME_PREFIX[direction], port['device'][3:]))
+
+    def _apply(self):
+        if self._defer_apply:
+            return
+        chains, sets = self._build_ruleset()
+        if (chains == self._applied_chains and
+                set(sets) == set(self._applied_sets)):
+            commands = self._generate_set_delta_commands(sets)
+            if not commands:
+                return
+        else:
+            commands = self._generate_table_commands(chains, sets)
+        self._execute(commands)
+        self._applied_chains = chains
+        self._applied_sets = sets
+
+    def _execute(self, commands):
+        args = ['nft', '-f', '-']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        utils.execute(args, process_input='\n'.join(commands) + '\n',
+                      run_as_root=True)
+
+    def _generate_table_commands(self, chains, sets):
+        """Replace the whole table in a single transaction.
+
+        Adding the table first makes the deletion succeed on the first run,
+        and since nft -f commits the file atomically, packets either see the
+        old ruleset or the new one.
+        """
+        table = '%s %s' % (NFT_FAMILY, NFT_TABLE)
+        commands = ['add table %s' % table,
+                    'delete table %s' % table,
+                    'table %s {' % table]
+        for set_name in sorted(sets):
+            set_type, elements = sets[set_name]
+            commands += ['set %s {' % set_name,
+                         'type %s' % set_type,
+                         'flags interval']
+            if elements:
+                commands.append('elements = %s' %
+                                _format_elements(sorted(elements)))
+            commands.append('}')
+        commands += chains
+        commands.append('}')
+        return commands
+
+    def _generate_set_delta_commands(self, sets):
+        commands = []
+        for set_name in sorted(sets):
+            elements = sets[set_name][1]
+            old_elements = self._applied_sets[set_name][1]
+            target = '%s %s %s' % (NFT_FAMILY, NFT_TABLE, set_name)
+            removed = old_elements - elements
+            added = elements - old_elements
+            if removed:
+                commands.append('delete element %s %s' % (
+                    target, _format_elements(sorted(removed))))
+            if added:
+                commands.append('add element %s %s' % (
+                    target, _format_elements(sorted(added))))
+        return commands
+
+    def _build_ruleset(self):
+        """Render the table, except for the set elements.
+
+        Returns the list of chain and map definitions, and a dict of
+        set name to (set type, frozenset of elements) for every remote
+        group referenced by a port on this host.
+        """
+        sets = {}
+        port_chains = []
+        ingress_elements = []
+        egress_elements = []
+        for device in sorted(self.filtered_ports):
+            port = self.filtered_ports[device]
+            device_name = self._get_device_name(port)
+            for direction, elements in (
+                    (firewall.INGRESS_DIRECTION, ingress_elements),
+                    (firewall.EGRESS_DIRECTION, egress_elements)):
+                chain_name = self._port_chain_name(port, direction)
+                elements.append('"%s" : jump %s' % (device_name, chain_name))
+                port_chains += self._build_port_chain(
+                    port, direction, chain_name, sets)
+
+        chains = []
+        for map_name, elements in ((INGRESS_MAP, ingress_elements),
+                                   (EGRESS_MAP, egress_elements)):
+            chains += ['map %s {' % map_name, 'type ifname : verdict']
+            if elements:
+                chains.append('elements = %s' % _format_elements(elements))
+            chains.append('}')
+        # Only IP traffic is filtered, like with the iptables driver.
+        # Frames going to the host itself only traverse the input hook.
+        chains += ['chain forward {',
+                   'type filter hook forward priority 0; policy accept;',
+                   'ether type != { ip, ip6 } accept',
+                   'oifname vmap @%s' % INGRESS_MAP,
+                   'iifname vmap @%s' % EGRESS_MAP,
+                   '}',
+                   'chain input {',
+                   'type filter hook input priority 0; policy accept;',
+                   'ether type != { ip, ip6 } accept',
+                   'iifname vmap @%s' % EGRESS_MAP,
+                   '}']
+        # chains have to be defined before the rules jumping to them
+        return port_chains + chains, sets
+
+    def _build_port_chain(self, port, direction, chain_name, sets):
+        chains = []
+        rules = []
+        if direction == firewall.EGRESS_DIRECTION:
+            chains += self._add_fixed_egress_rules(port, rules)
+        else:
+            rules += self._accept_inbound_icmpv6()
+        # Port chains are entered with jump from the base chains, so that
+        # both the egress chain of the sender and the ingress chain of the
+        # receiver are traversed: accepted packets return, the others are
+        # dropped at the end of the chain.
+        rules.append('ct state established,related return')
+        rules += self._select_sg_rules_for_port(port, direction, sets)
+        rules.append('drop')
+        return chains + ['chain %s {' % chain_name] + rules + ['}']
+
+    def _accept_inbound_icmpv6(self):
+        # Allow multicast listener, neighbor solicitation and
+        # neighbor advertisement into the instance
+        return ['ip6 nexthdr icmpv6 icmpv6 type %s return' % _format_elements(
+            [str(icmp6_type)
+             for icmp6_type in constants.ICMPV6_ALLOWED_TYPES])]
+
+    def _add_fixed_egress_rules(self, port, rules):
+        """Add the anti-spoofing and DHCP rules, return the spoof chain."""
+        spoof_chain_name = self._port_chain_name(port, SPOOF_FILTER)
+        spoof_rules = self._spoofing_rules(port)
+        # Allow dhcp client packets
+        rules.append('ip protocol udp udp sport 68 udp dport 67 return')
+        if spoof_rules[constants.IPv4] or spoof_rules[None]:
+            rules.append('ether type ip jump %s' % spoof_chain_name)
+        # Drop Router Advts from the port.
+        rules.append('ip6 nexthdr icmpv6 icmpv6 type %s drop' %
+                     constants.ICMPV6_TYPE_RA)
+        rules.append('ip6 nexthdr icmpv6 return')
+        rules.append('ip6 nexthdr udp udp sport 546 udp dport 547 return')
+        if spoof_rules[constants.IPv6] or spoof_rules[None]:
+            rules.append('ether type ip6 jump %s' % spoof_chain_name)
+        #Note(nati) Drop dhcp packet from VM
+        rules.append('ip protocol udp udp sport 67 udp dport 68 drop')
+        rules.append('ip6 nexthdr udp udp sport 547 udp dport 546 drop')
+        if not any(spoof_rules.values()):
+            return []
+        return (['chain %s {' % spoof_chain_name] +
+                spoof_rules[constants.IPv4] + spoof_rules[constants.IPv6] +
+                spoof_rules[None] + ['drop', '}'])
+
+    def _spoofing_rules(self, port):
+        """Return the allowed source mac/ip pairs, by ethertype.
+
+        The rules only matching the mac address, when the port has no
+        fixed ips, are listed under None and apply to both ethertypes.
+        """
+        spoof_rules = {constants.IPv4: [], constants.IPv6: [], None: []}
+        if isinstance(port.get('allowed_address_pairs'), list):
+            for address_pair in port['allowed_address_pairs']:
+                self._add_mac_ip_rule(address_pair['mac_address'],
+                                      address_pair['ip_address'],
+                                      spoof_rules)
+        for ip in port['fixed_ips']:
+            self._add_mac_ip_rule(port['mac_address'], ip, spoof_rules)
+        if not port['fixed_ips']:
+            # If fixed_ips is [] this rule will be added to the end
+            # of the list after the allowed_address_pair rules.
+            mac = str(netaddr.EUI(port['mac_address'],
+                                  dialect=netaddr.mac_unix_expanded))
+            spoof_rules[None].append('ether saddr %s return' % mac)
+        return spoof_rules
+
+    def _add_mac_ip_rule(self, mac, ip_address, spoof_rules):
+        mac = str(netaddr.EUI(mac, dialect=netaddr.mac_unix_expanded))
+        ip = netaddr.IPNetwork(ip_address)
+        ethertype = constants.IPv4 if ip.version == 4 else constants.IPv6
+        spoof_rules[ethertype].append('ether saddr %s %s saddr %s return' %
+                                      (mac, NFT_ETHERTYPE[ethertype], ip.cidr))
+
+    def _select_sg_rules_for_port(self, port, direction, sets):
+        """Render the port rules and the rules of its security groups."""
+        port_rules = [rule
+                      for rule in port.get('security_group_rules', [])
+                      if rule['direction'] == direction]
+        rules = self._convert_sgr_to_nft_rules(port_rules, direction, sets)
+        for sg_id in port.get('security_groups', []):
+            key = (sg_id, direction)
+            if key not in self._sg_rules_cache:
+                sg_rules = [rule for rule in self.sg_rules.get(sg_id, [])
+                            if rule['direction'] == direction]
+                self._sg_rules_cache[key] = self._convert_sgr_to_nft_rules(
+                    sg_rules, direction, {})
+            rules += self._sg_rules_cache[key]
+            self._add_remote_group_sets(sg_id, direction, sets)
+        return rules
+
+    def _add_remote_group_sets(self, sg_id, direction, sets):
+        for rule in self.sg_rules.get(sg_id, []):
+            remote_gid = rule.get('remote_group_id')
+            if remote_gid and rule['direction'] == direction:
+                self._add_remote_group_set(remote_gid, rule['ethertype'],
+                                           sets)
+
+    def _add_remote_group_set(self, remote_gid, ethertype, sets):
+        set_name = get_set_name(remote_gid, ethertype)
+        if set_name not in sets:
+            members = self.sg_members[remote_gid][ethertype]
+            # overlapping elements are rejected in interval sets
+            elements = frozenset(
+                str(cidr) for cidr in netaddr.cidr_merge(members))
+            sets[set_name] = (NFT_ADDR_TYPE[ethertype], elements)
+
+    def _convert_sgr_to_nft_rules(self, security_group_rules, direction,
+                                  sets):
+        nft_rules = []
+        for rule in security_group_rules:
+            ethertype = rule.get('ethertype')
+            if ethertype not in NFT_ETHERTYPE:
+                continue
+            remote_gid = rule.get('remote_group_id')
+            if remote_gid:
+                self._add_remote_group_set(remote_gid, ethertype, sets)
+            nft_rules.append(' '.join(
+                self._convert_sg_rule_to_nft_args(rule, direction)))
+        return nft_rules
+
+    def _convert_sg_rule_to_nft_args(self, sg_rule, direction):
+        ethertype = sg_rule['ethertype']
+        family = NFT_ETHERTYPE[ethertype]
+        args = []
+        remote_gid = sg_rule.get('remote_group_id')
+        ip_prefix = sg_rule.get(DIRECTION_IP_PREFIX[direction])
+        if remote_gid:
+            args += ['%s %s' % (family, DIRECTION_ADDR[direction]),
+                     '@%s' % get_set_name(remote_gid, ethertype)]
+        elif ip_prefix and not ip_prefix.endswith('/0'):
+            args += ['%s %s' % (family, DIRECTION_ADDR[direction]),
+                     str(netaddr.IPNetwork(ip_prefix).cidr)]
+        protocol = sg_rule.get('protocol')
+        if protocol == 'icmp' and ethertype == constants.IPv6:
+            protocol = 'icmpv6'
+        args += self._protocol_and_port_args(sg_rule, ethertype, protocol)
+        if not args:
+            args = ['ether type %s' % family]
+        args.append('return')
+        return args
+
+    def _protocol_and_port_args(self, sg_rule, ethertype, protocol):
+        if not protocol:
+            return []
+        port_min = sg_rule.get('port_range_min')
+        port_max = sg_rule.get('port_range_max')
+        # the bridge family has no implicit network layer, transport
+        # header matches always follow an explicit protocol match
+        args = ['%s %s' % (NFT_PROTO_MATCH[ethertype], protocol)]
+        if protocol in ('icmp', 'icmpv6') and port_min is not None:
+            # port_range_min/port_range_max represent icmp type/code
+            # icmp code can be 0 so we cannot use "if port_max" here
+            args.append('%s type %s' % (protocol, port_min))
+            if port_max is not None:
+                args.append('%s code %s' % (protocol, port_max))
+        elif protocol in ('tcp', 'udp'):
+            args += self._port_arg(
+                protocol, 'sport', sg_rule.get('source_port_range_min'),
+                sg_rule.get('source_port_range_max'))
+            args += self._port_arg(protocol, 'dport', port_min, port_max)
+        return args
+
+    def _port_arg(self, protocol, direction, port_range_min, port_range_max):
+        if port_range_min is None:
+            return []
+        if port_range_max is None or port_range_min == port_range_max:
+            return ['%s %s %s' % (protocol, direction, port_range_min)]
+        return ['%s %s %s-%s' % (protocol, direction, port_range_min,
+                                 port_range_max)]
+
+
+class OVSHybridNftablesFirewallDriver(NftablesFirewallDriver):
+    """Nftables driver for the OVS hybrid plugging.
+
+    Ports are filtered on the tap device plugged into the per port Linux
+    bridge.
+    """
+
+    def _port_chain_name(self, port, direction):
+        return get_name(
+            '%s%s' % (CHAIN_NAME_PREFIX[direction], port['device']))
+
+    def _get_device_name(self, port):
+        return ('tap' + port['device'])[:LINUX_DEV_LEN]
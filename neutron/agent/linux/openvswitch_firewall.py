@@ -0,0 +1,571 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Security group firewall driver built on OpenFlow and conntrack.
+
+Ports are plugged directly into br-int, without the per port Linux bridge
+needed by OVSHybridIptablesFirewallDriver. Open vSwitch 2.5 or later is
+required for the ct() action.
+
+Pipeline, for a port with ofport P on local VLAN V:
+
+* TRANSIENT_TABLE: reached by the traffic which passed the checks of the
+  agent in LOCAL_SWITCHING and in the anti-spoofing table. Traffic from P
+  gets P loaded in REG_PORT and V in REG_NET, V is also the conntrack
+  zone. Traffic from a local port which is not filtered gets V loaded in
+  REG_NET and goes to ACCEPT_OR_INGRESS_TABLE. Traffic from tunnels and
+  physical bridges, tagged with V, towards a mac of P gets P and V loaded
+  and goes to the ingress tables;
+* BASE_EGRESS_TABLE: anti-spoofing, DHCP and RA handling, then ct();
+* RULES_EGRESS_TABLE: security group rules, accepted traffic is committed;
+* ACCEPT_OR_INGRESS_TABLE: traffic towards another filtered port on this
+  host goes to its ingress tables, the rest is switched with NORMAL;
+* BASE_INGRESS_TABLE and RULES_INGRESS_TABLE: the same for ingress, the
+  accepted traffic is output to P.
+
+Broadcast and multicast traffic on V goes through the ingress tables of
+every filtered port on V before being switched with NORMAL. The filtered
+ports are excluded from the flooding of NORMAL with the no-flood port flag.
+
+Rules with a remote group are implemented with conjunctive matches: one
+flow per member address plus one flow per rule, instead of one flow per
+member and rule.
+
+Ports owned by the network, like router and DHCP ports, and ports with
+port security disabled are not filtered.
+"""
+
+import collections
+import contextlib
+import itertools
+
+import netaddr
+from oslo_log import log as logging
+
+from neutron.agent import firewall
+from neutron.common import constants
+from neutron.common import utils
+from neutron.extensions import portsecurity as psec
+from neutron.i18n import _LI, _LW
+from neutron.plugins.ml2.drivers.openvswitch.agent.common import constants \
+    as ovs_consts
+
+
+LOG = logging.getLogger(__name__)
+
+REG_PORT = 5
+REG_NET = 6
+CT_ZONE = 'zone=NXM_NX_REG%d[0..15]' % REG_NET
+CONJ_PRIORITY = 71
+RULE_PRIORITY = 70
+MULTICAST_MAC = '01:00:00:00:00:00/01:00:00:00:00:00'
+
+ETHERTYPE_PROTO = {constants.IPv4: 'ip', constants.IPv6: 'ipv6'}
+PROTOCOL_PROTO = {
+    constants.IPv4: {'tcp': 'tcp', 'udp': 'udp', 'icmp': 'icmp'},
+    constants.IPv6: {'tcp': 'tcp6', 'udp': 'udp6', 'icmp': 'icmp6',
+                     'icmpv6': 'icmp6'}}
+DIRECTION_IP_PREFIX = {firewall.INGRESS_DIRECTION: 'source_ip_prefix',
+                       firewall.EGRESS_DIRECTION: 'dest_ip_prefix'}
+REMOTE_IP_FIELD = {
+    firewall.INGRESS_DIRECTION: {constants.IPv4: 'nw_src',
+                                 constants.IPv6: 'ipv6_src'},
+    firewall.EGRESS_DIRECTION: {constants.IPv4: 'nw_dst',
+                                constants.IPv6: 'ipv6_dst'}}
+RULES_TABLE = {firewall.INGRESS_DIRECTION: ovs_consts.RULES_INGRESS_TABLE,
+               firewall.EGRESS_DIRECTION: ovs_consts.RULES_EGRESS_TABLE}
+PORT_TABLES = (ovs_consts.BASE_EGRESS_TABLE,
+               ovs_consts.RULES_EGRESS_TABLE,
+               ovs_consts.BASE_INGRESS_TABLE,
+               ovs_consts.RULES_INGRESS_TABLE)
+
+
+def port_rule_masking(port_min, port_max):
+    """Translate a port range into the value/mask pairs covering it."""
+    matches = []
+    while port_min <= port_max:
+        size = 1
+        while (port_min % (size * 2) == 0 and
+               port_min + size * 2 - 1 <= port_max):
+            size *= 2
+        if size == 1:
+            matches.append(str(port_min))
+        else:
+            matches.append('0x%04x/0x%04x' % (port_min,
+                                              0xffff & ~(size - 1)))
+        port_min += size
+    return matches
+
+
+def _flow_key(flow):
+    return (flow['table'], flow['priority'],
+            frozenset((k, v) for k, v in flow.items()
+                      if k not in ('table', 'priority', 'actions')))
+
+
+def _delete_match(key):
+    table, _priority, match = key
+    return dict(match, table=table)
+
+
+def _is_trusted(port):
+    return bool(port.get('device_owner')) and utils.is_port_trusted(port)
+
+
+class OFPort(object):
+    def __init__(self, port, port_name, ofport, vlan_tag):
+        self.device = port['device']
+        self.port_name = port_name
+        self.ofport = ofport
+        self.vlan_tag = vlan_tag
+        self.mac = port['mac_address']
+        self.port = port
+
+
+class OVSFirewallDriver(firewall.FirewallDriver):
+    """Driver which enforces security groups with OpenFlow rules.
+
+    The flows are programmed through the integration bridge of the OVS
+    agent, either flavour of its OpenFlow bridge classes.
+    """
+
+    requires_integration_bridge = True
+
+    def __init__(self, integration_bridge):
+        self.int_br = integration_bridge
+        self.filtered_ports = {}
+        self.unfiltered_ports = {}
+        self.sg_rules = {}
+        self.sg_members = collections.defaultdict(
+            lambda: collections.defaultdict(list))
+        # flows programmed for every port, by flow key
+        self._port_flows = {}
+        # ports whose ingress traffic is filtered, by device
+        self._of_ports = {}
+        # broadcast and multicast flows of every local VLAN, by flow key
+        self._vlan_flows = {}
+        # conjunction ids, by (device, remote group, direction, ethertype)
+        self._conj_ids = {}
+        self._conj_id_counter = itertools.count(1)
+        self._deferred_br = None
+        with self._flows() as br:
+            self._initialize_tables(br)
+
+    @property
+    def ports(self):
+        return dict(self.filtered_ports, **self.unfiltered_ports)
+
+    def security_group_updated(self, action_type, sec_group_ids,
+                               device_ids=None):
+        # flows are recomputed from sg_rules and sg_members when the port
+        # filters are updated, nothing has to be tracked here
+        pass
+
+    def update_security_group_rules(self, sg_id, sg_rules):
+        LOG.debug("Update rules of security group (%s)", sg_id)
+        self.sg_rules[sg_id] = sg_rules
+
+    def update_security_group_members(self, sg_id, sg_members):
+        LOG.debug("Update members of security group (%s)", sg_id)
+        self.sg_members[sg_id] = collections.defaultdict(list, sg_members)
+
+    def filter_defer_apply_on(self):
+        if self._deferred_br is None:
+            self._deferred_br = self.int_br.deferred(full_ordered=True)
+
+    def filter_defer_apply_off(self):
+        if self._deferred_br is not None:
+            deferred_br, self._deferred_br = self._deferred_br, None
+            deferred_br.apply_flows()
+
+    @contextlib.contextmanager
+    def _flows(self):
+        if self._deferred_br is not None:
+            yield self._deferred_br
+        else:
+            with self.int_br.deferred(full_ordered=True) as deferred_br:
+                yield deferred_br
+
+    def prepare_port_filter(self, port):
+        LOG.debug("Preparing device (%s) filter", port['device'])
+        # the flows might be gone, e.g. after an Open vSwitch restart
+        self._set_port_filter(port, reinstall=True)
+
+    def update_port_filter(self, port):
+        LOG.debug("Updating device (%s) filter", port['device'])
+        if port['device'] not in self.ports:
+            LOG.info(_LI('Attempted to update port filter which is not '
+                         'filtered %s'), port['device'])
+            return
+        self._set_port_filter(port)
+
+    def remove_port_filter(self, port):
+        LOG.debug("Removing device (%s) filter", port['device'])
+        if port['device'] not in self.ports:
+            LOG.info(_LI('Attempted to remove port filter which is not '
+                         'filtered %r'), port)
+            return
+        self.unfiltered_ports.pop(port['device'], None)
+        self._remove_port_flows(port['device'])
+        self.filtered_ports.pop(port['device'], None)
+
+    def _set_port_filter(self, port, reinstall=False):
+        device = port['device']
+        filtered = port.get(psec.PORTSECURITY, True) and not _is_trusted(port)
+        if filtered:
+            self.unfiltered_ports.pop(device, None)
+            self.filtered_ports[device] = port
+        else:
+            self.filtered_ports.pop(device, None)
+            self.unfiltered_ports[device] = port
+        of_port = self._get_of_port(port)
+        if of_port is None:
+            return
+        if filtered:
+            flow_list = self._port_flow_list(of_port)
+        else:
+            flow_list = self._unfiltered_flow_list(of_port)
+        flows = dict((_flow_key(flow), flow) for flow in flow_list)
+        old_flows = self._port_flows.get(device, {})
+        removed = set(old_flows) - set(flows)
+        old_of_port = self._of_ports.pop(device, None)
+        if filtered:
+            self._of_ports[device] = of_port
+            # NORMAL must not deliver traffic to the port, which would skip
+            # its ingress tables, the flag is lost on Open vSwitch restarts
+            if reinstall or old_of_port is None:
+                self._set_port_flood(of_port, False)
+        elif old_of_port is not None:
+            self._set_port_flood(of_port, True)
+        vlans = set([of_port.vlan_tag])
+        if old_of_port is not None:
+            vlans.add(old_of_port.vlan_tag)
+        with self._flows() as br:
+            if reinstall:
+                self._initialize_tables(br)
+            for key in removed:
+                br.delete_flows(**_delete_match(key))
+            for key, flow in flows.items():
+                # deleting without priority can remove more specific flows
+                # of the port as well, re-add all of them in that case
+                if reinstall or removed or old_flows.get(key) != flow:
+                    br.add_flow(**dict(flow))
+            self._update_vlan_flows(br, vlans, reinstall)
+        self._port_flows[device] = flows
+
+    def _remove_port_flows(self, device):
+        flows = self._port_flows.pop(device, None)
+        of_port = self._of_ports.pop(device, None)
+        for key in list(self._conj_ids):
+            if key[0] == device:
+                del self._conj_ids[key]
+        if not flows:
+            return
+        with self._flows() as br:
+            for key in flows:
+                br.delete_flows(**_delete_match(key))
+            if of_port is not None:
+                self._update_vlan_flows(br, [of_port.vlan_tag])
+
+    def _update_vlan_flows(self, br, vlans, reinstall=False):
+        for vlan in vlans:
+            flows = dict((_flow_key(flow), flow)
+                         for flow in self._vlan_flow_list(vlan))
+            old_flows = self._vlan_flows.pop(vlan, {})
+            for key in set(old_flows) - set(flows):
+                br.delete_flows(**_delete_match(key))
+            for key, flow in flows.items():
+                if reinstall or old_flows.get(key) != flow:
+                    br.add_flow(**dict(flow))
+            if flows:
+                self._vlan_flows[vlan] = flows
+
+    def _set_port_flood(self, of_port, flood):
+        self.int_br.run_ofctl(
+            'mod-port', [of_port.port_name, 'flood' if flood else 'no-flood'])
+
+    def _get_of_port(self, port):
+        vif_port = self.int_br.get_vif_port_by_id(port['device'])
+        if not vif_port:
+            LOG.warning(_LW("Port %s is not on the integration bridge, "
+                            "its filter is not applied"), port['device'])
+            return None
+        # the agent records the local VLAN of the port when binding it,
+        # before setting its tag
+        port_info = self.int_br.get_ports_attributes(
+            "Port", columns=["name", "tag", "other_config"],
+            ports=[vif_port.port_name], if_exists=True)
+        vlan_tag = None
+        if port_info:
+            vlan_tag = port_info[0]['other_config'].get('tag')
+            if vlan_tag is None:
+                vlan_tag = port_info[0]['tag']
+        if vlan_tag is None or vlan_tag == []:
+            LOG.warning(_LW("Port %s has no local VLAN, its filter is not "
+                            "applied"), port['device'])
+            return None
+        return OFPort(port, vif_port.port_name, vif_port.ofport, int(vlan_tag))
+
+    def _initialize_tables(self, br):
+        for table in PORT_TABLES:
+            br.add_flow(table=table, priority=0, actions='drop')
+        br.add_flow(table=ovs_consts.ACCEPT_OR_INGRESS_TABLE, priority=0,
+                    actions='normal')
+
+    def _port_flow_list(self, of_port):
+        flows = self._classification_flows(of_port)
+        flows += self._egress_flows(of_port)
+        flows += self._ingress_flows(of_port)
+        for direction in (firewall.INGRESS_DIRECTION,
+                          firewall.EGRESS_DIRECTION):
+            flows += self._rules_flows(of_port, direction)
+        return flows
+
+    def _classification_flows(self, of_port):
+        load_port = 'load:%s->NXM_NX_REG%d[],' % (of_port.ofport, REG_PORT)
+        load_net = 'load:%s->NXM_NX_REG%d[],' % (of_port.vlan_tag, REG_NET)
+        to_egress = 'resubmit(,%d)' % ovs_consts.BASE_EGRESS_TABLE
+        to_ingress = 'resubmit(,%d)' % ovs_consts.BASE_INGRESS_TABLE
+        flows = [dict(table=ovs_consts.TRANSIENT_TABLE, priority=100,
+                      in_port=of_port.ofport,
+                      actions=load_port + load_net + to_egress)]
+        for mac in self._allowed_macs(of_port.port):
+            flows.append(dict(
+                table=ovs_consts.TRANSIENT_TABLE, priority=90,
+                dl_vlan=of_port.vlan_tag, dl_dst=mac,
+                actions=load_port + load_net + 'strip_vlan,' + to_ingress))
+            accept_or_ingress = dict(
+                table=ovs_consts.ACCEPT_OR_INGRESS_TABLE, priority=100,
+                dl_dst=mac, actions=load_port + to_ingress)
+            accept_or_ingress['reg%d' % REG_NET] = of_port.vlan_tag
+            flows.append(accept_or_ingress)
+        return flows
+
+    def _unfiltered_flow_list(self, of_port):
+        return [dict(table=ovs_consts.TRANSIENT_TABLE, priority=100,
+                     in_port=of_port.ofport,
+                     actions='load:%s->NXM_NX_REG%d[],resubmit(,%d)' % (
+                         of_port.vlan_tag, REG_NET,
+                         ovs_consts.ACCEPT_OR_INGRESS_TABLE))]
+
+    def _vlan_flow_list(self, vlan):
+        """Pass the broadcast and multicast traffic of a VLAN to its ports."""
+        ofports = sorted(of_port.ofport for of_port in self._of_ports.values()
+                         if of_port.vlan_tag == vlan)
+        if not ofports:
+            return []
+        to_ingress = ''.join(
+            'load:%s->NXM_NX_REG%d[],resubmit(,%d),' % (
+                ofport, REG_PORT, ovs_consts.BASE_INGRESS_TABLE)
+            for ofport in ofports)
+        accept_or_ingress = dict(table=ovs_consts.ACCEPT_OR_INGRESS_TABLE,
+                                 priority=90, dl_dst=MULTICAST_MAC,
+                                 actions=to_ingress + 'normal')
+        accept_or_ingress['reg%d' % REG_NET] = vlan
+        return [
+            dict(table=ovs_consts.TRANSIENT_TABLE, priority=80,
+                 dl_vlan=vlan, dl_dst=MULTICAST_MAC,
+                 actions='load:%s->NXM_NX_REG%d[],strip_vlan,%s'
+                         'mod_vlan_vid:%s,normal' % (
+                             vlan, REG_NET, to_ingress, vlan)),
+            accept_or_ingress]
+
+    def _port_flow(self, of_port, table, priority, actions, **match):
+        match['reg%d' % REG_PORT] = of_port.ofport
+        return dict(table=table, priority=priority, actions=actions, **match)
+
+    def _egress_flows(self, of_port):
+        table = ovs_consts.BASE_EGRESS_TABLE
+        accept = 'resubmit(,%d)' % ovs_consts.ACCEPT_OR_INGRESS_TABLE
+        to_conntrack = 'ct(table=%d,%s)' % (ovs_consts.RULES_EGRESS_TABLE,
+                                            CT_ZONE)
+        flows = [
+            # Drop Router Advts from the port, allow other ICMPv6
+            self._port_flow(of_port, table, 95, 'drop', proto='icmp6',
+                            icmp_type=constants.ICMPV6_TYPE_RA),
+            self._port_flow(of_port, table, 90, accept, proto='icmp6'),
+            # Allow dhcp client packets, drop dhcp server ones
+            self._port_flow(of_port, table, 80, accept, proto='udp',
+                            tp_src=68, tp_dst=67),
+            self._port_flow(of_port, table, 80, accept, proto='udp6',
+                            tp_src=546, tp_dst=547),
+            self._port_flow(of_port, table, 70, 'drop', proto='udp',
+                            tp_src=67, tp_dst=68),
+            self._port_flow(of_port, table, 70, 'drop', proto='udp6',
+                            tp_src=547, tp_dst=546)]
+        for mac, ip in self._allowed_pairs(of_port.port):
+            if ip is None:
+                flows += [
+                    self._port_flow(of_port, table, 65, accept, proto='arp',
+                                    dl_src=mac),
+                    self._port_flow(of_port, table, 65, to_conntrack,
+                                    proto='ip', dl_src=mac),
+                    self._port_flow(of_port, table, 65, to_conntrack,
+                                    proto='ipv6', dl_src=mac)]
+            elif ip.version == 4:
+                flows += [
+                    self._port_flow(of_port, table, 65, accept, proto='arp',
+                                    dl_src=mac, arp_spa=str(ip)),
+                    self._port_flow(of_port, table, 65, to_conntrack,
+                                    proto='ip', dl_src=mac,
+                                    nw_src=str(ip))]
+            else:
+                flows.append(
+                    self._port_flow(of_port, table, 65, to_conntrack,
+                                    proto='ipv6', dl_src=mac,
+                                    ipv6_src=str(ip)))
+        return flows
+
+    def _allowed_macs(self, port):
+        macs = [port['mac_address']]
+        for mac, _ip in self._allowed_pairs(port):
+            if mac not in macs:
+                macs.append(mac)
+        return macs
+
+    def _allowed_pairs(self, port):
+        pairs = []
+        if isinstance(port.get('allowed_address_pairs'), list):
+            for address_pair in port['allowed_address_pairs']:
+                pairs.append((address_pair['mac_address'],
+                              netaddr.IPNetwork(address_pair['ip_address'])))
+        for ip in port['fixed_ips']:
+            pairs.append((port['mac_address'], netaddr.IPNetwork(ip)))
+        if not port['fixed_ips']:
+            pairs.append((port['mac_address'], None))
+        return pairs
+
+    def _ingress_flows(self, of_port):
+        table = ovs_consts.BASE_INGRESS_TABLE
+        output = 'output:%s' % of_port.ofport
+        flows = [self._port_flow(of_port, table, 100, output, proto='arp')]
+        # Allow multicast listener, neighbor solicitation and
+        # neighbor advertisement into the instance
+        for icmp6_type in constants.ICMPV6_ALLOWED_TYPES:
+            flows.append(self._port_flow(of_port, table, 100, output,
+                                         proto='icmp6', icmp_type=icmp6_type))
+        for proto in ETHERTYPE_PROTO.values():
+            flows.append(self._port_flow(
+                of_port, table, 90,
+                'ct(table=%d,%s)' % (ovs_consts.RULES_INGRESS_TABLE, CT_ZONE),
+                proto=proto))
+        return flows
+
+    def _rules_flows(self, of_port, direction):
+        table = RULES_TABLE[direction]
+        if direction == firewall.INGRESS_DIRECTION:
+            accept = 'output:%s' % of_port.ofport
+        else:
+            accept = 'resubmit(,%d)' % ovs_consts.ACCEPT_OR_INGRESS_TABLE
+        commit = 'ct(commit,%s),%s' % (CT_ZONE, accept)
+        flows = [
+            self._port_flow(of_port, table, 90, accept,
+                            ct_state='-new+est-rel-inv'),
+            self._port_flow(of_port, table, 90, accept,
+                            ct_state='-new-est+rel-inv'),
+            self._port_flow(of_port, table, 90, 'drop',
+                            ct_state='+trk+inv')]
+        # flows of different rules can share their match, their
+        # conjunction actions are then merged
+        conj_actions = collections.OrderedDict()
+        remote_groups = {}
+        for rule in self._select_rules(of_port.port, direction):
+            ethertype = rule['ethertype']
+            remote_gid = rule.get('remote_group_id')
+            for match in self._rule_matches(rule, direction):
+                if not remote_gid:
+                    flows.append(self._port_flow(
+                        of_port, table, RULE_PRIORITY, commit,
+                        ct_state='+new-est', **match))
+                    continue
+                conj_id = self._get_conj_id(of_port.device, remote_gid,
+                                            direction, ethertype)
+                remote_groups[(remote_gid, ethertype)] = conj_id
+                conj_actions.setdefault(
+                    frozenset(match.items()), set()).add(
+                        'conjunction(%d,2/2)' % conj_id)
+        for (remote_gid, ethertype), conj_id in sorted(remote_groups.items()):
+            flows.append(dict(table=table, priority=RULE_PRIORITY,
+                              conj_id=conj_id, actions=commit))
+            for ip in self.sg_members[remote_gid][ethertype]:
+                match = {'proto': ETHERTYPE_PROTO[ethertype],
+                         REMOTE_IP_FIELD[direction][ethertype]: ip}
+                conj_actions.setdefault(
+                    frozenset(match.items()), set()).add(
+                        'conjunction(%d,1/2)' % conj_id)
+        for match, actions in conj_actions.items():
+            flows.append(self._port_flow(
+                of_port, table, CONJ_PRIORITY, ','.join(sorted(actions)),
+                ct_state='+new-est', **dict(match)))
+        return flows
+
+    def _select_rules(self, port, direction):
+        rules = [rule for rule in port.get('security_group_rules', [])
+                 if rule['direction'] == direction]
+        for sg_id in port.get('security_groups', []):
+            rules += [rule for rule in self.sg_rules.get(sg_id, [])
+                      if rule['direction'] == direction]
+        return [rule for rule in rules
+                if rule.get('ethertype') in ETHERTYPE_PROTO]
+
+    def _get_conj_id(self, device, remote_gid, direction, ethertype):
+        key = (device, remote_gid, direction, ethertype)
+        if key not in self._conj_ids:
+            self._conj_ids[key] = next(self._conj_id_counter)
+        return self._conj_ids[key]
+
+    def _rule_matches(self, rule, direction):
+        """Translate a security group rule into flow matches.
+
+        Port ranges are covered by masked matches, so one rule can need
+        several flows.
+        """
+        ethertype = rule['ethertype']
+        protocol = rule.get('protocol')
+        match = {}
+        proto = PROTOCOL_PROTO[ethertype].get(protocol)
+        if proto:
+            match['proto'] = proto
+        else:
+            match['proto'] = ETHERTYPE_PROTO[ethertype]
+            if protocol:
+                match['nw_proto'] = protocol
+        ip_prefix = rule.get(DIRECTION_IP_PREFIX[direction])
+        if ip_prefix and not rule.get('remote_group_id'):
+            ip_prefix = str(netaddr.IPNetwork(ip_prefix).cidr)
+            if not ip_prefix.endswith('/0'):
+                match[REMOTE_IP_FIELD[direction][ethertype]] = ip_prefix
+        port_min = rule.get('port_range_min')
+        port_max = rule.get('port_range_max')
+        if proto in ('icmp', 'icmp6'):
+            # port_range_min/port_range_max represent icmp type/code
+            if port_min is not None:
+                match['icmp_type'] = port_min
+                if port_max is not None:
+                    match['icmp_code'] = port_max
+            return [match]
+        if proto not in ('tcp', 'udp', 'tcp6', 'udp6'):
+            return [match]
+        matches = [match]
+        for field, range_min, range_max in (
+                ('tp_src', rule.get('source_port_range_min'),
+                 rule.get('source_port_range_max')),
+                ('tp_dst', port_min, port_max)):
+            if range_min is None:
+                continue
+            if range_max is None:
+                range_max = range_min
+            matches = [dict(m, **{field: value}) for m in matches
+                       for value in port_rule_masking(range_min, range_max)]
+        return matches
@@ -85,13 +85,14 @@ class SecurityGroupAgentRpc(object):
     """Enables SecurityGroup agent support in agent implementations."""
 
     def __init__(self, context, plugin_rpc, local_vlan_map=None,
-                 defer_refresh_firewall=False,):
+                 defer_refresh_firewall=False, integration_bridge=None):
         self.context = context
         self.plugin_rpc = plugin_rpc
-        self.init_firewall(defer_refresh_firewall)
+        self.init_firewall(defer_refresh_firewall, integration_bridge)
         self.local_vlan_map = local_vlan_map
 
-    def init_firewall(self, defer_refresh_firewall=False):
+    def init_firewall(self, defer_refresh_firewall=False,
+                      integration_bridge=None):
         firewall_driver = cfg.CONF.SECURITYGROUP.firewall_driver
         LOG.debug("Init firewall settings (driver=%s)", firewall_driver)
         if not _is_valid_driver_combination():
@@ -99,7 +100,12 @@ class SecurityGroupAgentRpc(object):
                          "with enable_security_group"))
         if not firewall_driver:
             firewall_driver = 'neutron.agent.firewall.NoopFirewallDriver'
-        self.firewall = importutils.import_object(firewall_driver)
+        firewall_class = importutils.import_class(firewall_driver)
+        if firewall_class.requires_integration_bridge:
+            self.firewall = firewall_class(
+                integration_bridge=integration_bridge)
+        else:
+            self.firewall = firewall_class()
         # The following flag will be set to true if port filter must not be
         # applied as soon as a rule or membership notification is received
         self.defer_refresh_firewall = defer_refresh_firewall
@@ -109,6 +115,13 @@ class SecurityGroupAgentRpc(object):
         # Flag raised when a global refresh is needed
         self.global_refresh_firewall = False
         self._use_enhanced_rpc = None
+        # Member IPs and versions of the remote security groups, used to
+        # apply the member changes sent by the server in place
+        self.sg_member_ips = {}
+        self.sg_member_versions = {}
+        # Remote security groups whose members changed while the firewall
+        # refresh is deferred
+        self.sgs_with_updated_members = set()
 
     @property
     def use_enhanced_rpc(self):
@@ -153,6 +166,8 @@ class SecurityGroupAgentRpc(object):
             devices = devices_info['devices']
             security_groups = devices_info['security_groups']
             security_group_member_ips = devices_info['sg_member_ips']
+            security_group_member_versions = devices_info.get(
+                'sg_member_versions', {})
         else:
             devices = self.plugin_rpc.security_group_rules_for_devices(
                 self.context, list(device_ids))
@@ -164,16 +179,45 @@ class SecurityGroupAgentRpc(object):
                 LOG.debug("Update security group information for ports %s",
                           devices.keys())
                 self._update_security_group_info(
-                    security_groups, security_group_member_ips)
+                    security_groups, security_group_member_ips,
+                    security_group_member_versions)
 
     def _update_security_group_info(self, security_groups,
-                                    security_group_member_ips):
+                                    security_group_member_ips,
+                                    security_group_member_versions=None):
         LOG.debug("Update security group information")
+        versions = security_group_member_versions or {}
         for sg_id, sg_rules in security_groups.items():
             self.firewall.update_security_group_rules(sg_id, sg_rules)
         for remote_sg_id, member_ips in security_group_member_ips.items():
             self.firewall.update_security_group_members(
                 remote_sg_id, member_ips)
+            self._set_security_group_member_ips(
+                remote_sg_id, member_ips, versions.get(remote_sg_id))
+
+    def _set_security_group_member_ips(self, sg_id, member_ips, version):
+        if version is None:
+            # the server doesn't version the members, deltas can't be
+            # applied to them
+            self.sg_member_ips.pop(sg_id, None)
+            self.sg_member_versions.pop(sg_id, None)
+            return
+        self.sg_member_ips[sg_id] = dict(
+            (ethertype, set(ips)) for ethertype, ips in member_ips.items())
+        self.sg_member_versions[sg_id] = version
+
+    def _get_security_group_member_ips(self, sg_id):
+        return dict((ethertype, sorted(ips)) for ethertype, ips in
+                    self.sg_member_ips[sg_id].items())
+
+    def _prune_security_group_member_ips(self):
+        remote_sg_ids = set()
+        for device in self.firewall.ports.values():
+            remote_sg_ids.update(
+                device.get('security_group_source_groups', []))
+        for sg_id in set(self.sg_member_ips) - remote_sg_ids:
+            del self.sg_member_ips[sg_id]
+            self.sg_member_versions.pop(sg_id, None)
 
     def security_groups_rule_updated(self, security_groups):
         LOG.info(_LI("Security group "
@@ -183,14 +227,85 @@ class SecurityGroupAgentRpc(object):
             'security_groups',
             'sg_rule')
 
-    def security_groups_member_updated(self, security_groups):
+    def security_groups_member_updated(self, security_groups,
+                                       member_updates=None):
         LOG.info(_LI("Security group "
                  "member updated %r"), security_groups)
+        if member_updates:
+            security_groups = self._apply_security_group_member_updates(
+                security_groups, member_updates)
+            if not security_groups:
+                return
         self._security_group_updated(
             security_groups,
             'security_group_source_groups',
             'sg_member')
 
+    def _apply_security_group_member_updates(self, security_groups,
+                                             member_updates):
+        """Apply the member IP changes of security groups in place.
+
+        A change is applied when its version follows the one of the member
+        IPs known locally. Outdated changes are ignored. The groups which
+        aren't tracked locally or show a gap in their versions are
+        returned, their information has to be fetched from the server.
+        """
+        updated_sg_ids = set()
+        refetch_sg_ids = []
+        for sg_id in security_groups:
+            update = member_updates.get(sg_id)
+            known_version = self.sg_member_versions.get(sg_id)
+            if update is None or known_version is None:
+                refetch_sg_ids.append(sg_id)
+            elif update['version'] <= known_version:
+                LOG.debug("Ignoring outdated member update %(version)s of "
+                          "security group %(sg_id)s",
+                          {'version': update['version'], 'sg_id': sg_id})
+            elif update['version'] == known_version + 1:
+                member_ips = self.sg_member_ips[sg_id]
+                for ethertype, ips in update['added'].items():
+                    member_ips.setdefault(ethertype, set()).update(ips)
+                for ethertype, ips in update['removed'].items():
+                    member_ips.setdefault(ethertype, set()).difference_update(
+                        ips)
+                self.sg_member_versions[sg_id] = update['version']
+                updated_sg_ids.add(sg_id)
+            else:
+                LOG.debug("Missed member updates of security group "
+                          "%(sg_id)s, version %(version)s follows "
+                          "%(known)s", {'sg_id': sg_id,
+                                        'version': update['version'],
+                                        'known': known_version})
+                del self.sg_member_versions[sg_id]
+                refetch_sg_ids.append(sg_id)
+        if updated_sg_ids:
+            if self.defer_refresh_firewall:
+                self.sgs_with_updated_members |= updated_sg_ids
+            else:
+                self._refresh_security_group_members(updated_sg_ids)
+        return refetch_sg_ids
+
+    def _refresh_security_group_members(self, sg_ids):
+        """Push locally updated member IPs to the firewall.
+
+        Only the ports using the groups as remote groups are refreshed, with
+        the information the firewall already has about them.
+        """
+        sg_ids = set(sg_id for sg_id in sg_ids if sg_id in self.sg_member_ips)
+        devices = [device for device in self.firewall.ports.values()
+                   if sg_ids & set(device.get('security_group_source_groups',
+                                              []))]
+        if not devices:
+            return
+        LOG.debug("Update members of security groups %s in place", sg_ids)
+        self.firewall.security_group_updated('sg_member', sg_ids)
+        with self.firewall.defer_apply():
+            for sg_id in sg_ids:
+                self.firewall.update_security_group_members(
+                    sg_id, self._get_security_group_member_ips(sg_id))
+            for device in devices:
+                self.firewall.update_port_filter(device)
+
     def _security_group_updated(self, security_groups, attribute, action_type):
         devices = []
         sec_grp_set = set(security_groups)
@@ -227,6 +342,7 @@ class SecurityGroupAgentRpc(object):
                 if not device:
                     continue
                 self.firewall.remove_port_filter(device)
+        self._prune_security_group_member_ips()
 
     @skip_if_noopfirewall_or_firewall_disabled
     def refresh_firewall(self, device_ids=None):
@@ -242,6 +358,8 @@ class SecurityGroupAgentRpc(object):
             devices = devices_info['devices']
             security_groups = devices_info['security_groups']
             security_group_member_ips = devices_info['sg_member_ips']
+            security_group_member_versions = devices_info.get(
+                'sg_member_versions', {})
         else:
             devices = self.plugin_rpc.security_group_rules_for_devices(
                 self.context, device_ids)
@@ -254,10 +372,12 @@ class SecurityGroupAgentRpc(object):
                 LOG.debug("Update security group information for ports %s",
                           devices.keys())
                 self._update_security_group_info(
-                    security_groups, security_group_member_ips)
+                    security_groups, security_group_member_ips,
+                    security_group_member_versions)
 
     def firewall_refresh_needed(self):
-        return self.global_refresh_firewall or self.devices_to_refilter
+        return (self.global_refresh_firewall or self.devices_to_refilter or
+                self.sgs_with_updated_members)
 
     def setup_port_filters(self, new_devices, updated_devices):
         """Configure port filters for devices.
@@ -274,8 +394,10 @@ class SecurityGroupAgentRpc(object):
         # losing updates occurring during firewall refresh
         devices_to_refilter = self.devices_to_refilter
         global_refresh_firewall = self.global_refresh_firewall
+        sgs_with_updated_members = self.sgs_with_updated_members
         self.devices_to_refilter = set()
         self.global_refresh_firewall = False
+        self.sgs_with_updated_members = set()
         # We must call prepare_devices_filter() after we've grabbed
         # self.devices_to_refilter since an update for a new port
         # could arrive while we're processing, and we need to make
@@ -291,6 +413,9 @@ class SecurityGroupAgentRpc(object):
             LOG.debug("Refreshing firewall for all filtered devices")
             self.refresh_firewall()
         else:
+            if sgs_with_updated_members:
+                self._refresh_security_group_members(
+                    sgs_with_updated_members)
             self.firewall.security_group_updated('sg_member', [],
                                                  updated_devices)
             # If a device is both in new and updated devices
@@ -13,10 +13,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import bisect
+import time
+
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
 from oslo_serialization import jsonutils
+from oslo_utils import uuidutils
 import six
 
 from neutron.common import constants
@@ -33,6 +37,12 @@ from neutron.plugins.common import constants as plugin_constants
 
 LOG = logging.getLogger(__name__)
 
+# Number of routers returned by a sync_routers_page call when the agent does
+# not ask for a page size
+SYNC_ROUTERS_PAGE_SIZE = 64
+# Seconds a sync snapshot is kept after it was last used by an agent
+SYNC_ROUTERS_SNAPSHOT_TTL = 300
+
 
 class L3RpcCallback(object):
     """L3 agent RPC callback in plugin implementations."""
@@ -46,7 +56,12 @@ class L3RpcCallback(object):
     # 1.5 Added update_ha_routers_states
     # 1.6 Added process_prefix_update to support IPv6 Prefix Delegation
     # 1.7 Added method delete_agent_gateway_port for DVR Routers
-    target = oslo_messaging.Target(version='1.7')
+    # 1.8 Added sync_routers_page for paginated full syncs
+    target = oslo_messaging.Target(version='1.8')
+
+    def __init__(self):
+        # snapshot id -> (sorted router ids, last use)
+        self._sync_snapshots = {}
 
     @property
     def plugin(self):
@@ -73,14 +88,82 @@ class L3RpcCallback(object):
         router_ids = kwargs.get('router_ids')
         host = kwargs.get('host')
         context = neutron_context.get_admin_context()
+        if self.l3plugin and cfg.CONF.router_auto_schedule and (
+                utils.is_extension_supported(
+                    self.l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS)):
+            self.l3plugin.auto_schedule_routers(context, host, router_ids)
+        return self._get_sync_routers(context, host, router_ids)
+
+    @db_api.retry_db_errors
+    def sync_routers_page(self, context, **kwargs):
+        """Sync the routers of an agent one page at a time.
+
+        The first call takes a snapshot of the ids of the routers hosted by
+        the agent, the following ones pass the snapshot id back with the
+        marker, the id of the last router of the previous page, so that the
+        pages are cut from the same list of routers.  If the snapshot expired
+        or was taken by another server, a new one is taken and paging goes on
+        from the marker.
+
+        @param context: contain user information
+        @param kwargs: host, marker, snapshot, page_size
+        @return: a dict with the routers of the page, with their interfaces
+                 and floating_ips, the snapshot id and the marker of the
+                 next page, None after the last page
+        """
+        host = kwargs.get('host')
+        marker = kwargs.get('marker')
+        page_size = kwargs.get('page_size') or SYNC_ROUTERS_PAGE_SIZE
+        context = neutron_context.get_admin_context()
+        snapshot, router_ids = self._get_sync_snapshot(
+            context, host, kwargs.get('snapshot'))
+        start = bisect.bisect_right(router_ids, marker) if marker else 0
+        page_ids = router_ids[start:start + page_size]
+        next_marker = None
+        if start + page_size < len(router_ids):
+            next_marker = page_ids[-1]
+        else:
+            self._sync_snapshots.pop(snapshot, None)
+        routers = []
+        if page_ids:
+            routers = self._get_sync_routers(context, host, page_ids)
+        return {'routers': routers,
+                'snapshot': snapshot,
+                'next_marker': next_marker}
+
+    def _get_sync_snapshot(self, context, host, snapshot):
+        now = time.time()
+        for snapshot_id, (ids, last_use) in list(
+                self._sync_snapshots.items()):
+            if now - last_use > SYNC_ROUTERS_SNAPSHOT_TTL:
+                del self._sync_snapshots[snapshot_id]
+        if snapshot in self._sync_snapshots:
+            router_ids = self._sync_snapshots[snapshot][0]
+        else:
+            snapshot = uuidutils.generate_uuid()
+            router_ids = sorted(self._list_sync_router_ids(context, host))
+        self._sync_snapshots[snapshot] = (router_ids, now)
+        return snapshot, router_ids
+
+    def _list_sync_router_ids(self, context, host):
+        if not self.l3plugin:
+            return []
+        if utils.is_extension_supported(
+                self.l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
+            if cfg.CONF.router_auto_schedule:
+                self.l3plugin.auto_schedule_routers(context, host, None)
+            return self.l3plugin.list_router_ids_on_active_l3_agent(context,
+                                                                    host)
+        return [router['id'] for router in
+                self.l3plugin.get_routers(context, fields=['id'])]
+
+    def _get_sync_routers(self, context, host, router_ids):
         if not self.l3plugin:
             routers = {}
             LOG.error(_LE('No plugin for L3 routing registered! Will reply '
                           'to l3 agent with empty router dictionary.'))
         elif utils.is_extension_supported(
                 self.l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
-            if cfg.CONF.router_auto_schedule:
-                self.l3plugin.auto_schedule_routers(context, host, router_ids)
             routers = (
                 self.l3plugin.list_active_sync_routers_on_active_l3_agent(
                     context, host, router_ids))
@@ -105,6 +105,7 @@ class SecurityGroupServerRpcCallback(object):
         sg_info{
           'security_groups': {sg_id: [rule1, rule2]}
           'sg_member_ips': {sg_id: {'IPv4': set(), 'IPv6': set()}}
+          'sg_member_versions': {sg_id: version}
           'devices': {device_id: {device_info}}
         }
 
@@ -144,15 +145,23 @@ class SecurityGroupAgentRpcApiMixin(object):
         cctxt.cast(context, 'security_groups_rule_updated',
                    security_groups=security_groups)
 
-    def security_groups_member_updated(self, context, security_groups):
-        """Notify member updated security groups."""
+    def security_groups_member_updated(self, context, security_groups,
+                                       member_updates=None):
+        """Notify member updated security groups.
+
+        member_updates optionally carries the IPs added to and removed from
+        each group along with its version. Agents which don't know about it
+        ignore the argument and re-fetch the security group information.
+        """
         if not security_groups:
             return
+        kwargs = {'security_groups': security_groups}
+        if member_updates is not None:
+            kwargs['member_updates'] = member_updates
         cctxt = self.client.prepare(version=self.SG_RPC_VERSION,
                                     topic=self._get_security_group_topic(),
                                     fanout=True)
-        cctxt.cast(context, 'security_groups_member_updated',
-                   security_groups=security_groups)
+        cctxt.cast(context, 'security_groups_member_updated', **kwargs)
 
     def security_groups_provider_updated(self, context,
                                          devices_to_update=None):
@@ -197,13 +206,19 @@ class SecurityGroupAgentRpcCallbackMixin(object):
         """Callback for security group member update.
 
         :param security_groups: list of updated security_groups
+        :param member_updates: optional member IP changes by security group
         """
         security_groups = kwargs.get('security_groups', [])
+        member_updates = kwargs.get('member_updates')
         LOG.debug("Security group member updated on remote: %s",
                   security_groups)
         if not self.sg_agent:
             return self._security_groups_agent_not_set()
-        self.sg_agent.security_groups_member_updated(security_groups)
+        if member_updates is None:
+            self.sg_agent.security_groups_member_updated(security_groups)
+        else:
+            self.sg_agent.security_groups_member_updated(
+                security_groups, member_updates=member_updates)
 
     def security_groups_provider_updated(self, context, **kwargs):
         """Callback for security group provider update."""
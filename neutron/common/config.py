@@ -136,6 +136,14 @@ core_opts = [
                        'when the network\'s preferred MTU is known.')),
     cfg.StrOpt('ipam_driver', default=None,
                help=_('IPAM driver to use.')),
+    cfg.IntOpt('availability_ranges_repair_interval', default=600,
+               help=_('Seconds between two consistency checks of the '
+                      'availability ranges of subnets, rebuilding the '
+                      'ranges which do not match the IP allocations. The '
+                      'ranges are maintained as IP addresses are allocated '
+                      'and deallocated, the checks only repair them after '
+                      'an upgrade or a failure. Set to 0 to disable the '
+                      'checks.')),
     cfg.BoolOpt('vlan_transparent', default=False,
                 help=_('If True, then allow plugins that support it to '
                        'create VLAN transparent networks.')),
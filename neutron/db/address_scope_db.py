@@ -100,7 +100,8 @@ class AddressScopeDbMixin(ext_address_scope.AddressScopePluginBase):
     def get_address_scopes(self, context, filters=None, fields=None,
                            sorts=None, limit=None, marker=None,
                            page_reverse=False):
-        marker_obj = self._get_marker_obj(context, 'addrscope', limit, marker)
+        marker_obj = self._get_marker_obj(context, 'address_scope', limit,
+                                          marker)
         collection = self._get_collection(context, AddressScope,
                                           self._make_address_scope_dict,
                                           filters=filters, fields=fields,
@@ -57,6 +57,10 @@ class CommonDbMixin(object):
     # TODO(salvatore-orlando): Avoid using class-level variables
     _dict_extend_functions = {}
 
+    # This dictionary will store, for the methods of _dict_extend_functions
+    # which declared them, the attributes they add to api resources
+    _dict_extend_fields = {}
+
     @classmethod
     def register_model_query_hook(cls, model, name, query_hook, filter_hook,
                                   result_filters=None):
@@ -79,8 +83,19 @@ class CommonDbMixin(object):
             'result_filters': result_filters}
 
     @classmethod
-    def register_dict_extend_funcs(cls, resource, funcs):
+    def register_dict_extend_funcs(cls, resource, funcs, fields=None):
+        """Register methods extending the dicts of an api resource.
+
+        When fields, the attributes the methods add to the dicts, are
+        declared the methods are skipped when building dicts which are
+        filtered on other attributes. Methods not declaring them are always
+        invoked.
+        """
         cls._dict_extend_functions.setdefault(resource, []).extend(funcs)
+        if fields is not None:
+            extend_fields = cls._dict_extend_fields.setdefault(resource, {})
+            for func in funcs:
+                extend_fields[func] = frozenset(fields)
 
     @property
     def safe_reference(self):
@@ -239,9 +254,13 @@ class CommonDbMixin(object):
         return query
 
     def _apply_dict_extend_functions(self, resource_type,
-                                     response, db_object):
+                                     response, db_object, fields=None):
+        extend_fields = self._dict_extend_fields.get(resource_type, {})
         for func in self._dict_extend_functions.get(
             resource_type, []):
+            if (fields and func in extend_fields and
+                    extend_fields[func].isdisjoint(fields)):
+                continue
             args = (response, db_object)
             if isinstance(func, six.string_types):
                 func = getattr(self, func, None)
@@ -277,6 +296,33 @@ class CommonDbMixin(object):
             items.reverse()
         return items
 
+    def _get_column_dicts(self, query, model, fields, column_fields):
+        """Build the dicts of the results of query from their columns only.
+
+        column_fields are the attributes of the resource copied as is from
+        the columns of the same name of model. When only such fields are
+        requested, the query is restricted to these columns, so that
+        neither the DB objects nor their eagerly loaded relationships are
+        loaded and no dict extend function is invoked. Otherwise None is
+        returned and the caller has to build the dicts from the DB objects.
+        """
+        if not fields or not set(fields).issubset(column_fields):
+            return None
+        fields = list(set(fields))
+        primary_key = list(model.__table__.primary_key.columns)
+        query = query.with_entities(
+            *(primary_key + [getattr(model, field) for field in fields]))
+        items = []
+        keys = set()
+        for row in query:
+            key = tuple(row[:len(primary_key)])
+            # Joins on filters may return the same object several times
+            if key in keys:
+                continue
+            keys.add(key)
+            items.append(dict(zip(fields, row[len(primary_key):])))
+        return items
+
     def _get_collection_count(self, context, model, filters=None):
         return self._get_collection_query(context, model, filters).count()
 
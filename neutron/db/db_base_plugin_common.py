@@ -178,7 +178,7 @@ class DbBasePluginCommon(common_db_mixin.CommonDbMixin):
         # Call auxiliary extend functions, if any
         if process_extensions:
             self._apply_dict_extend_functions(
-                attributes.PORTS, res, port)
+                attributes.PORTS, res, port, fields)
         return self._fields(res, fields)
 
     def _get_network(self, context, id):
@@ -14,11 +14,13 @@
 #    under the License.
 
 import functools
+import random
 
 import netaddr
 from oslo_config import cfg
 from oslo_db import exception as db_exc
 from oslo_log import log as logging
+from oslo_service import loopingcall
 from oslo_utils import excutils
 from oslo_utils import uuidutils
 from sqlalchemy import and_
@@ -30,6 +32,7 @@ from neutron.callbacks import events
 from neutron.callbacks import exceptions
 from neutron.callbacks import registry
 from neutron.callbacks import resources
+from neutron.common import config
 from neutron.common import constants
 from neutron.common import exceptions as n_exc
 from neutron.common import ipv6_utils
@@ -50,6 +53,7 @@ from neutron.ipam import subnet_alloc
 from neutron import manager
 from neutron import neutron_plugin_base_v2
 from neutron.plugins.common import constants as service_constants
+from neutron import worker
 
 
 LOG = logging.getLogger(__name__)
@@ -63,6 +67,10 @@ LOG = logging.getLogger(__name__)
 # IP allocations being cleaned up by cascade.
 AUTO_DELETE_PORT_OWNERS = [constants.DEVICE_OWNER_DHCP]
 
+# Port attributes copied as is from the columns of the ports table
+PORT_COLUMN_FIELDS = ('id', 'name', 'network_id', 'tenant_id', 'mac_address',
+                      'admin_state_up', 'status', 'device_id', 'device_owner')
+
 DNS_DOMAIN_DEFAULT = 'openstacklocal.'
 FQDN_MAX_LEN = 255
 
@@ -76,6 +84,35 @@ def _check_subnet_not_used(context, subnet_id):
         raise n_exc.SubnetInUse(subnet_id=subnet_id, reason=e)
 
 
+class AvailabilityRangesRepairWorker(worker.NeutronWorker):
+    """Periodically repair the availability ranges of all the subnets."""
+
+    def __init__(self, plugin, interval):
+        self._plugin = plugin
+        self._interval = interval
+        self._loop = None
+
+    def start(self):
+        super(AvailabilityRangesRepairWorker, self).start()
+        self._loop = loopingcall.FixedIntervalLoopingCall(
+            self._plugin._repair_availability_ranges)
+        # random initial delay to offset multiple servers
+        self._loop.start(interval=self._interval,
+                         initial_delay=random.randint(1, self._interval))
+
+    def wait(self):
+        if self._loop:
+            self._loop.wait()
+
+    def stop(self):
+        if self._loop:
+            self._loop.stop()
+
+    @staticmethod
+    def reset():
+        config.reset_service()
+
+
 class NeutronDbPluginV2(db_base_plugin_common.DbBasePluginCommon,
                         neutron_plugin_base_v2.NeutronPluginBaseV2,
                         rbac_mixin.RbacPluginMixin):
@@ -187,6 +224,26 @@ class NeutronDbPluginV2(db_base_plugin_common.DbBasePluginCommon,
         else:
             self.ipam = ipam_non_pluggable_backend.IpamNonPluggableBackend()
 
+    def get_availability_ranges_repair_workers(self):
+        """Return the worker repairing the availability ranges, if enabled.
+
+        Plugins add it to the workers they return from get_workers, so
+        that the repair runs in a single process of each server.
+        """
+        interval = cfg.CONF.availability_ranges_repair_interval
+        if interval <= 0:
+            LOG.info(_LI("Skipping periodic availability ranges repair "
+                         "because availability_ranges_repair_interval is "
+                         "not positive"))
+            return []
+        return [AvailabilityRangesRepairWorker(self, interval)]
+
+    def _repair_availability_ranges(self):
+        try:
+            self.ipam.repair_availability_ranges(ctx.get_admin_context())
+        except Exception:
+            LOG.exception(_LE("Failed to repair availability ranges"))
+
     def _validate_host_route(self, route, ip_version):
         try:
             netaddr.IPNetwork(route['destination'])
@@ -852,10 +909,19 @@ class NeutronDbPluginV2(db_base_plugin_common.DbBasePluginCommon,
                     raise n_exc.SubnetInUse(subnet_id=id)
 
             context.session.delete(subnet)
+            self._release_subnet_prefix(context, subnet)
             # Delete related ipam subnet manually,
             # since there is no FK relationship
             self.ipam.delete_subnet(context, id)
 
+    def _release_subnet_prefix(self, context, subnet):
+        """Give the prefix of a deleted subnet back to its subnet pool."""
+        subnetpool_id = subnet['subnetpool_id']
+        if subnetpool_id and not subnetpool_id == constants.IPV6_PD_POOL_ID:
+            subnetpool = self._get_subnetpool(context, subnetpool_id)
+            allocator = subnet_alloc.SubnetAllocator(subnetpool, context)
+            allocator.release_subnet(subnet['cidr'])
+
     def get_subnet(self, context, id, fields=None):
         subnet = self._get_subnet(context, id)
         return self._make_subnet_dict(subnet, fields, context=context)
@@ -962,6 +1028,9 @@ class NeutronDbPluginV2(db_base_plugin_common.DbBasePluginCommon,
         with context.session.begin(subtransactions=True):
             context.session.query(models_v2.SubnetPoolPrefix).filter_by(
                 subnetpool_id=id).delete()
+            # The free prefixes are rebuilt by the next subnet allocation
+            context.session.query(models_v2.SubnetPoolFreePrefix).filter_by(
+                subnetpool_id=id).delete()
             for prefix in prefix_list:
                 model_prefix = models_v2.SubnetPoolPrefix(cidr=prefix,
                                                       subnetpool_id=id)
@@ -1300,13 +1369,16 @@ class NeutronDbPluginV2(db_base_plugin_common.DbBasePluginCommon,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
                                       page_reverse=page_reverse)
-        items = []
-        for c in query:
-            if (('dns-integration' in self.supported_extension_aliases and
-                 'dns_name' in c)):
-                c['dns_assignment'] = self._get_dns_name_for_port_get(context,
-                                                                      c)
-            items.append(self._make_port_dict(c, fields))
+        items = self._get_column_dicts(query, models_v2.Port, fields,
+                                       PORT_COLUMN_FIELDS)
+        if items is None:
+            items = []
+            for c in query:
+                if (('dns-integration' in self.supported_extension_aliases and
+                     'dns_name' in c)):
+                    c['dns_assignment'] = self._get_dns_name_for_port_get(
+                        context, c)
+                items.append(self._make_port_dict(c, fields))
         if limit and page_reverse:
             items.reverse()
         return items
@@ -121,6 +121,12 @@ class FlavorManager(common_db_mixin.CommonDbMixin):
 
     supported_extension_aliases = ["flavors"]
 
+    # This attribute specifies whether the plugin supports or not
+    # pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     def __init__(self, manager=None):
         # manager = None is UT usage where FlavorManager is loaded as
         # a core plugin
@@ -217,10 +223,11 @@ class FlavorManager(common_db_mixin.CommonDbMixin):
 
     def get_flavors(self, context, filters=None, fields=None,
                     sorts=None, limit=None, marker=None, page_reverse=False):
+        marker_obj = self._get_marker_obj(context, 'flavor', limit, marker)
         return self._get_collection(context, Flavor, self._make_flavor_dict,
                                     filters=filters, fields=fields,
                                     sorts=sorts, limit=limit,
-                                    marker_obj=marker,
+                                    marker_obj=marker_obj,
                                     page_reverse=page_reverse)
 
     def create_flavor_service_profile(self, context,
@@ -350,9 +357,11 @@ class FlavorManager(common_db_mixin.CommonDbMixin):
     def get_service_profiles(self, context, filters=None, fields=None,
                              sorts=None, limit=None, marker=None,
                              page_reverse=False):
+        marker_obj = self._get_marker_obj(context, 'service_profile', limit,
+                                          marker)
         return self._get_collection(context, ServiceProfile,
                                     self._make_service_profile_dict,
                                     filters=filters, fields=fields,
                                     sorts=sorts, limit=limit,
-                                    marker_obj=marker,
+                                    marker_obj=marker_obj,
                                     page_reverse=page_reverse)
@@ -47,6 +47,14 @@ class IpamBackendMixin(db_base_plugin_common.DbBasePluginCommon):
         """
         pass
 
+    def repair_availability_ranges(self, context):
+        """Rebuild availability ranges out of sync with IP allocations.
+
+        Should be redefined by the backends maintaining availability
+        ranges.
+        """
+        pass
+
     @staticmethod
     def _gateway_ip_str(subnet, cidr_net):
         if subnet.get('gateway_ip') is attributes.ATTR_NOT_SPECIFIED:
@@ -418,11 +426,14 @@ class IpamBackendMixin(db_base_plugin_common.DbBasePluginCommon):
         # Use of the ORM mapper is needed for ensuring appropriate resource
         # tracking; otherwise SQL Alchemy events won't be triggered.
         # For more info check 'caveats' in doc/source/devref/quota.rst
+        port = query.first()
         try:
-            context.session.delete(query.first())
+            context.session.delete(port)
         except orm_exc.UnmappedInstanceError:
             LOG.debug("Port %s was not found and therefore no delete "
                       "operation was performed", port_id)
+            return
+        return port
 
     def _save_subnet(self, context,
                      network,
@@ -26,8 +26,10 @@ from neutron.common import exceptions as n_exc
 from neutron.common import ipv6_utils
 from neutron.db import ipam_backend_mixin
 from neutron.db import models_v2
+from neutron.i18n import _LW
 from neutron.ipam import requests as ipam_req
 from neutron.ipam import subnet_alloc
+from neutron.ipam import utils as ipam_utils
 
 LOG = logging.getLogger(__name__)
 
@@ -39,6 +41,9 @@ class IpamNonPluggableBackend(ipam_backend_mixin.IpamBackendMixin):
         try:
             return IpamNonPluggableBackend._try_generate_ip(context, subnets)
         except n_exc.IpAddressGenerationFailure:
+            # Deallocated addresses are given back to the availability ranges
+            # at once, but the ranges left by earlier releases, or by the
+            # allocation blocks driver, may still miss free addresses
             IpamNonPluggableBackend._rebuild_availability_ranges(context,
                                                                  subnets)
 
@@ -85,8 +90,10 @@ class IpamNonPluggableBackend(ipam_backend_mixin.IpamBackendMixin):
     def _rebuild_availability_ranges(context, subnets):
         """Rebuild availability ranges.
 
-        This method is called only when there's no more IP available or by
-        _update_subnet_allocation_pools. Calling
+        This method is called by _update_subnet_allocation_pools, by
+        _generate_ip when the ranges are exhausted, or by
+        repair_availability_ranges for ranges out of sync with the
+        allocations of their subnet. Calling
         _update_subnet_allocation_pools before calling this function deletes
         the IPAllocationPools associated with the subnet that is updating,
         which will result in deleting the IPAvailabilityRange too.
@@ -172,6 +179,91 @@ class IpamNonPluggableBackend(ipam_backend_mixin.IpamBackendMixin):
                     context.session.add(new_ip_range)
                     return
 
+    @staticmethod
+    def _release_ip(context, subnet_id, ip_address):
+        """Give a deallocated IP address back to the availability ranges.
+
+        The ranges right before and after the address are extended, or
+        merged, instead of rebuilding the ranges from all the allocations
+        of the subnet.
+        """
+        ip = netaddr.IPAddress(ip_address)
+        pool_qry = context.session.query(
+            models_v2.IPAllocationPool).options(
+                orm.noload('available_ranges'))
+        for pool in pool_qry.filter_by(subnet_id=subnet_id):
+            if (netaddr.IPAddress(pool['first_ip']) <= ip <=
+                    netaddr.IPAddress(pool['last_ip'])):
+                break
+        else:
+            return
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).filter_by(
+                allocation_pool_id=pool['id']).with_lockmode('update')
+        adjacent_ranges = ipam_utils.get_adjacent_ranges(range_qry,
+                                                         ip_address)
+        if not adjacent_ranges:
+            return
+        before, after = adjacent_ranges
+        if before and after:
+            last_ip = after['last_ip']
+            # Flush the deletion first, the last IP of a range is unique
+            context.session.delete(after)
+            context.session.flush()
+            before['last_ip'] = last_ip
+        elif before:
+            before['last_ip'] = ip_address
+        elif after:
+            after['first_ip'] = ip_address
+        else:
+            context.session.add(models_v2.IPAvailabilityRange(
+                allocation_pool_id=pool['id'],
+                first_ip=ip_address,
+                last_ip=ip_address))
+        LOG.debug("Released IP %(ip_address)s to the availability ranges "
+                  "of subnet %(subnet_id)s",
+                  {'ip_address': ip_address, 'subnet_id': subnet_id})
+
+    def repair_availability_ranges(self, context):
+        """Rebuild the availability ranges out of sync with allocations.
+
+        Ranges are maintained as addresses are allocated and deallocated,
+        this is only a background consistency check. The ranges of a
+        subnet are checked without locking, and only rebuilt if they do
+        not match its allocations.
+        """
+        pool_qry = context.session.query(
+            models_v2.IPAllocationPool).options(
+                orm.noload('available_ranges'))
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(models_v2.IPAllocationPool)
+        ip_qry = context.session.query(models_v2.IPAllocation.ip_address)
+        subnet_ids = set(pool['subnet_id'] for pool in pool_qry)
+        for subnet_id in sorted(subnet_ids):
+            pools = [netaddr.IPRange(pool['first_ip'], pool['last_ip'])
+                     for pool in pool_qry.filter_by(subnet_id=subnet_id)]
+            ip_ranges = [netaddr.IPRange(r['first_ip'], r['last_ip'])
+                         for r in range_qry.filter(
+                             models_v2.IPAllocationPool.subnet_id ==
+                             subnet_id)]
+            allocations = [ip for ip, in ip_qry.filter_by(
+                subnet_id=subnet_id)]
+            if ipam_utils.check_availability_ranges(pools, ip_ranges,
+                                                    allocations):
+                continue
+            LOG.warning(_LW("Availability ranges of subnet %s do not match "
+                            "its allocations, rebuilding them"), subnet_id)
+            with context.session.begin(subtransactions=True):
+                pool_ids = context.session.query(
+                    models_v2.IPAllocationPool.id).filter_by(
+                        subnet_id=subnet_id).with_lockmode('update')
+                context.session.query(models_v2.IPAvailabilityRange).filter(
+                    models_v2.IPAvailabilityRange.allocation_pool_id.in_(
+                        [pool_id for pool_id, in pool_ids])).delete(
+                            synchronize_session='fetch')
+                self._rebuild_availability_ranges(context,
+                                                  [{'id': subnet_id}])
+
     @staticmethod
     def _check_unique_ip(context, network_id, subnet_id, ip_address):
         """Validate that the IP address on the subnet is not in use."""
@@ -330,6 +422,11 @@ class IpamNonPluggableBackend(ipam_backend_mixin.IpamBackendMixin):
         if to_add:
             LOG.debug("Port update. Adding %s", to_add)
             added = self._allocate_fixed_ips(context, to_add, mac_address)
+        # Released after the allocations, so that the port does not get
+        # back an address it gives up
+        for ip in changes.remove:
+            IpamNonPluggableBackend._release_ip(context, ip['subnet_id'],
+                                                ip['ip_address'])
         return self.Changes(add=added,
                             original=changes.original,
                             remove=changes.remove)
@@ -395,6 +492,16 @@ class IpamNonPluggableBackend(ipam_backend_mixin.IpamBackendMixin):
 
         return ips
 
+    def delete_port(self, context, port_id):
+        ip_qry = context.session.query(models_v2.IPAllocation).filter_by(
+            port_id=port_id)
+        ips = [(ip['subnet_id'], ip['ip_address']) for ip in ip_qry]
+        if super(IpamNonPluggableBackend, self).delete_port(context,
+                                                            port_id):
+            for subnet_id, ip_address in ips:
+                IpamNonPluggableBackend._release_ip(context, subnet_id,
+                                                    ip_address)
+
     def add_auto_addrs_on_network_ports(self, context, subnet, ipam_subnet):
         """For an auto-address subnet, add addrs for ports on the net."""
         with context.session.begin(subtransactions=True):
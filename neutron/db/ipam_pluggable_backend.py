@@ -279,12 +279,22 @@ class IpamPluggableBackend(ipam_backend_mixin.IpamBackendMixin):
             port['device_owner'])
 
         ipam_driver = driver.Pool.get_instance(None, context)
-        if changes.remove:
-            removed = self._ipam_deallocate_ips(context, ipam_driver, port,
-                                                changes.remove)
+        # Deallocated after the allocations, so that the port does not get
+        # back an address it gives up
         if to_add:
             added = self._ipam_allocate_ips(context, ipam_driver,
                                             changes, to_add)
+        if changes.remove:
+            try:
+                removed = self._ipam_deallocate_ips(context, ipam_driver,
+                                                    port, changes.remove)
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    if added:
+                        LOG.debug("Reverting IP allocation.")
+                        self._ipam_deallocate_ips(context, ipam_driver,
+                                                  port, added,
+                                                  revert_on_fail=False)
         return self.Changes(add=added,
                             original=changes.original,
                             remove=removed)
@@ -350,6 +360,13 @@ class IpamPluggableBackend(ipam_backend_mixin.IpamBackendMixin):
         self._ipam_deallocate_ips(context, ipam_driver, port,
                                   port['fixed_ips'])
 
+    def repair_availability_ranges(self, context):
+        ipam_driver = driver.Pool.get_instance(None, context)
+        # Only the drivers maintaining availability ranges in the Neutron
+        # database have something to repair
+        if hasattr(ipam_driver, 'repair_availability_ranges'):
+            ipam_driver.repair_availability_ranges()
+
     def update_db_subnet(self, context, id, s, old_pools):
         ipam_driver = driver.Pool.get_instance(None, context)
         if "allocation_pools" in s:
@@ -318,12 +318,13 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
 
         return self.get_sync_data(context, router_ids=router_ids, active=True)
 
-    def list_active_sync_routers_on_active_l3_agent(
-            self, context, host, router_ids):
+    def _get_active_l3_agent(self, context, host):
         agent = self._get_agent_by_type_and_host(
             context, constants.AGENT_TYPE_L3, host)
-        if not agentschedulers_db.services_available(agent.admin_state_up):
-            return []
+        if agentschedulers_db.services_available(agent.admin_state_up):
+            return agent
+
+    def _list_router_ids_on_l3_agent(self, context, agent, router_ids):
         query = context.session.query(RouterL3AgentBinding.router_id)
         query = query.filter(
             RouterL3AgentBinding.l3_agent_id == agent.id)
@@ -331,7 +332,21 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
         if router_ids:
             query = query.filter(
                 RouterL3AgentBinding.router_id.in_(router_ids))
-        router_ids = [item[0] for item in query]
+        return [item[0] for item in query]
+
+    def list_router_ids_on_active_l3_agent(self, context, host):
+        agent = self._get_active_l3_agent(context, host)
+        if not agent:
+            return []
+        return self._list_router_ids_on_l3_agent(context, agent, None)
+
+    def list_active_sync_routers_on_active_l3_agent(
+            self, context, host, router_ids):
+        agent = self._get_active_l3_agent(context, host)
+        if not agent:
+            return []
+        router_ids = self._list_router_ids_on_l3_agent(context, agent,
+                                                       router_ids)
         if router_ids:
             return self._get_active_l3_agent_routers_sync_data(context, host,
                                                                agent,
@@ -1059,6 +1059,9 @@ class L3_NAT_dbonly_mixin(l3.RouterPluginBase):
             for key, val in six.iteritems(API_TO_DB_COLUMN_MAP):
                 if key in filters:
                     filters[val] = filters.pop(key)
+        if sorts is not None:
+            sorts = [(API_TO_DB_COLUMN_MAP.get(key, key), direction)
+                     for key, direction in sorts]
 
         return self._get_collection(context, FloatingIP,
                                     self._make_floatingip_dict,
@@ -0,0 +1,34 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add rules version to securitygroups
+
+Revision ID: 3f5a9c2e7b41
+Revises: d4a7b3e9f2c1
+Create Date: 2015-11-05 14:27:09.631508
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f5a9c2e7b41'
+down_revision = 'd4a7b3e9f2c1'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('securitygroups',
+                  sa.Column('rules_version', sa.Integer(),
+                            server_default='0', nullable=False))
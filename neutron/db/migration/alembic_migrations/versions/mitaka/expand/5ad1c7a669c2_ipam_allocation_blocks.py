@@ -0,0 +1,42 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add ipam allocation blocks
+
+Revision ID: 5ad1c7a669c2
+Revises: d6f0a1897f43
+Create Date: 2015-10-22 09:41:12.318542
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5ad1c7a669c2'
+down_revision = 'd6f0a1897f43'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'ipamallocationblocks',
+        sa.Column('allocation_pool_id', sa.String(length=36), nullable=False),
+        sa.Column('block_index', sa.BigInteger(), autoincrement=False,
+                  nullable=False),
+        sa.Column('free', sa.Integer(), nullable=False),
+        sa.Column('bitmap', sa.String(length=64), nullable=False),
+        sa.ForeignKeyConstraint(['allocation_pool_id'],
+                                ['ipamallocationpools.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('allocation_pool_id', 'block_index'))
@@ -0,0 +1,43 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add subnetpool free prefixes
+
+Revision ID: b12a3ef66e62
+Revises: 5ad1c7a669c2
+Create Date: 2015-10-27 16:02:51.746301
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b12a3ef66e62'
+down_revision = '5ad1c7a669c2'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'subnetpoolfreeprefixes',
+        sa.Column('subnetpool_id', sa.String(length=36), nullable=False),
+        sa.Column('cidr', sa.String(length=64), nullable=False),
+        sa.Column('prefixlen', sa.Integer(), nullable=False),
+        sa.Column('network', sa.String(length=32), nullable=False),
+        sa.ForeignKeyConstraint(['subnetpool_id'], ['subnetpools.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('subnetpool_id', 'cidr'))
+    op.create_index('ix_subnetpoolfreeprefixes_subnetpool_id_prefixlen',
+                    'subnetpoolfreeprefixes',
+                    ['subnetpool_id', 'prefixlen', 'network'])
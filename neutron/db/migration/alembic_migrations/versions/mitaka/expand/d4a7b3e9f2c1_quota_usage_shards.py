@@ -0,0 +1,40 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add quota usage shards
+
+Revision ID: d4a7b3e9f2c1
+Revises: b12a3ef66e62
+Create Date: 2015-11-03 10:41:27.318042
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7b3e9f2c1'
+down_revision = 'b12a3ef66e62'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'quotausageshards',
+        sa.Column('resource', sa.String(length=255), nullable=False),
+        sa.Column('tenant_id', sa.String(length=255), nullable=False),
+        sa.Column('shard', sa.Integer(), nullable=False,
+                  autoincrement=False),
+        sa.Column('in_use', sa.Integer(), nullable=False,
+                  server_default='0'),
+        sa.PrimaryKeyConstraint('resource', 'tenant_id', 'shard'))
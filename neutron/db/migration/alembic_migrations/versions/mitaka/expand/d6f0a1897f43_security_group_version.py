@@ -0,0 +1,34 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add version to securitygroups
+
+Revision ID: d6f0a1897f43
+Revises: 59cb5b6cf4d
+Create Date: 2015-10-20 10:12:45.218731
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd6f0a1897f43'
+down_revision = '59cb5b6cf4d'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column('securitygroups',
+                  sa.Column('version', sa.Integer(),
+                            server_default='0', nullable=False))
@@ -226,6 +226,32 @@ class SubnetPoolPrefix(model_base.BASEV2):
                               primary_key=True)
 
 
+class SubnetPoolFreePrefix(model_base.BASEV2):
+    """Represents a free prefix of a neutron subnet pool
+
+    The free space of a subnet pool is kept as the largest aligned prefixes
+    it is made of, as the free blocks of a buddy allocator. network is the
+    first address of the prefix as a fixed width hexadecimal string, so that
+    the free prefixes of a given length can be ordered by address.
+    """
+
+    __tablename__ = 'subnetpoolfreeprefixes'
+
+    subnetpool_id = sa.Column(sa.String(36),
+                              sa.ForeignKey('subnetpools.id',
+                                            ondelete='CASCADE'),
+                              nullable=False,
+                              primary_key=True)
+    cidr = sa.Column(sa.String(64), nullable=False, primary_key=True)
+    prefixlen = sa.Column(sa.Integer, nullable=False)
+    network = sa.Column(sa.String(32), nullable=False)
+    __table_args__ = (
+        sa.Index('ix_subnetpoolfreeprefixes_subnetpool_id_prefixlen',
+                 'subnetpool_id', 'prefixlen', 'network'),
+        model_base.BASEV2.__table_args__
+    )
+
+
 class SubnetPool(model_base.BASEV2, HasId, HasTenant):
     """Represents a neutron subnet pool.
     """
@@ -22,9 +22,11 @@ from neutron.extensions import portsecurity as psec
 class PortSecurityDbMixin(portsecurity_db_common.PortSecurityDbCommon):
     # Register dict extend functions for ports and networks
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attrs.NETWORKS, ['_extend_port_security_dict'])
+        attrs.NETWORKS, ['_extend_port_security_dict'],
+        fields=[psec.PORTSECURITY])
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attrs.PORTS, ['_extend_port_security_dict'])
+        attrs.PORTS, ['_extend_port_security_dict'],
+        fields=[psec.PORTSECURITY])
 
     def _extend_port_security_dict(self, response_data, db_data):
         if ('port-security' in
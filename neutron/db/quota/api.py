@@ -15,6 +15,7 @@
 import collections
 import datetime
 
+import six
 import sqlalchemy as sa
 from sqlalchemy.orm import exc as orm_exc
 from sqlalchemy import sql
@@ -60,27 +61,65 @@ def get_quota_usage_by_resource_and_tenant(context, resource, tenant_id,
     result = query.first()
     if not result:
         return
+    shards_in_use = _get_quota_usage_shards_in_use(
+        context, resource=resource, tenant_id=tenant_id)
     return QuotaUsageInfo(result.resource,
                           result.tenant_id,
-                          result.in_use,
+                          result.in_use + shards_in_use.get(
+                              (resource, tenant_id), 0),
                           result.dirty)
 
 
+def _get_quota_usage_shards_in_use(context, **filters):
+    """Return the amounts in use of the shards of quota usages.
+
+    The amounts are summed with an aggregate query, so that updates of the
+    shards issued outside of the ORM are always accounted for.
+
+    :returns: a dict mapping (resource, tenant_id) to the amount in use
+    """
+    query = context.session.query(
+        quota_models.QuotaUsageShard.resource,
+        quota_models.QuotaUsageShard.tenant_id,
+        sql.func.sum(quota_models.QuotaUsageShard.in_use))
+    query = query.filter_by(**filters).group_by(
+        quota_models.QuotaUsageShard.resource,
+        quota_models.QuotaUsageShard.tenant_id)
+    return dict(((resource, tenant_id), in_use)
+                for (resource, tenant_id, in_use) in query)
+
+
+def _get_quota_usage_shards(context, resource, tenant_id):
+    """Return the amounts in use of the shards of a quota usage.
+
+    :returns: a dict mapping the shards to their amount in use
+    """
+    query = context.session.query(quota_models.QuotaUsageShard.shard,
+                                  quota_models.QuotaUsageShard.in_use)
+    query = query.filter_by(resource=resource, tenant_id=tenant_id)
+    return dict((shard, in_use) for (shard, in_use) in query)
+
+
 def get_quota_usage_by_resource(context, resource):
     query = common_db_api.model_query(context, quota_models.QuotaUsage)
     query = query.filter_by(resource=resource)
+    shards_in_use = _get_quota_usage_shards_in_use(context, resource=resource)
     return [QuotaUsageInfo(item.resource,
                            item.tenant_id,
-                           item.in_use,
+                           item.in_use + shards_in_use.get(
+                               (item.resource, item.tenant_id), 0),
                            item.dirty) for item in query]
 
 
 def get_quota_usage_by_tenant_id(context, tenant_id):
     query = common_db_api.model_query(context, quota_models.QuotaUsage)
     query = query.filter_by(tenant_id=tenant_id)
+    shards_in_use = _get_quota_usage_shards_in_use(context,
+                                                   tenant_id=tenant_id)
     return [QuotaUsageInfo(item.resource,
                            item.tenant_id,
-                           item.in_use,
+                           item.in_use + shards_in_use.get(
+                               (item.resource, item.tenant_id), 0),
                            item.dirty) for item in query]
 
 
@@ -108,19 +147,73 @@ def set_quota_usage(context, resource, tenant_id,
                 resource=resource,
                 tenant_id=tenant_id)
             context.session.add(usage_data)
+        shards = _get_quota_usage_shards(context, resource, tenant_id)
+        shards_in_use = sum(shards.values())
         # Perform explicit comparison with None as 0 is a valid value
         if in_use is not None:
             if delta:
-                in_use = usage_data.in_use + in_use
+                in_use = usage_data.in_use + shards_in_use + in_use
             usage_data.in_use = in_use
+            # The amounts read from the shards are folded into the quota
+            # usage. They are subtracted rather than reset, so that the
+            # amounts added by concurrent transactions since are not lost
+            for shard, shard_in_use in six.iteritems(shards):
+                if not shard_in_use:
+                    continue
+                query = context.session.query(quota_models.QuotaUsageShard)
+                query.filter_by(
+                    resource=resource, tenant_id=tenant_id, shard=shard
+                ).update({'in_use': (quota_models.QuotaUsageShard.in_use -
+                                     shard_in_use)},
+                         synchronize_session=False)
+            shards_in_use = 0
         # After an explicit update the dirty bit should always be reset
         usage_data.dirty = False
     return QuotaUsageInfo(usage_data.resource,
                           usage_data.tenant_id,
-                          usage_data.in_use,
+                          usage_data.in_use + shards_in_use,
                           usage_data.dirty)
 
 
+def create_quota_usage_shards(context, resource, tenant_id, shards):
+    """Create the missing shards of a quota usage.
+
+    :param resource: name of the resource for which usage is tracked
+    :param tenant_id: tenant identifier
+    :param shards: number of shards the usage is spread over
+    """
+    with db_api.autonested_transaction(context.session):
+        query = context.session.query(quota_models.QuotaUsageShard.shard)
+        query = query.filter_by(resource=resource, tenant_id=tenant_id)
+        existing_shards = set(shard for (shard,) in query)
+        for shard in range(shards):
+            if shard not in existing_shards:
+                context.session.add(quota_models.QuotaUsageShard(
+                    resource=resource, tenant_id=tenant_id, shard=shard,
+                    in_use=0))
+
+
+def update_quota_usage_shard(connection, resource, tenant_id, shard, delta):
+    """Apply a delta to the amount in use of a shard of a quota usage.
+
+    The update is executed on connection, within the transaction altering
+    the resources, as from the handlers of ORM events.
+
+    :param connection: the connection of the transaction
+    :param resource: name of the resource for which usage is tracked
+    :param tenant_id: tenant identifier
+    :param shard: the shard to update
+    :param delta: the number of resources created, or deleted if negative
+    :returns: 1 if the shard was updated, 0 if it does not exist.
+    """
+    table = quota_models.QuotaUsageShard.__table__
+    result = connection.execute(table.update().where(sa.and_(
+        table.c.resource == resource,
+        table.c.tenant_id == tenant_id,
+        table.c.shard == shard)).values(in_use=table.c.in_use + delta))
+    return result.rowcount
+
+
 def set_quota_usage_dirty(context, resource, tenant_id, dirty=True):
     """Set quota usage dirty bit for a given resource and tenant.
 
@@ -13,17 +13,58 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo_config import cfg
 from oslo_db import api as oslo_db_api
 from oslo_log import log
+from oslo_service import loopingcall
 
+from neutron.common import config
 from neutron.common import exceptions
+from neutron import context as n_context
 from neutron.db import api as db_api
 from neutron.db.quota import api as quota_api
 from neutron.db.quota import models as quota_models
+from neutron.i18n import _LE
+from neutron import worker
 
 LOG = log.getLogger(__name__)
 
 
+class ReservationCleanupWorker(worker.NeutronWorker):
+    """Periodically remove the expired reservations of all tenants."""
+
+    def __init__(self, interval):
+        self._interval = interval
+        self._loop = None
+
+    def start(self):
+        super(ReservationCleanupWorker, self).start()
+        self._loop = loopingcall.FixedIntervalLoopingCall(
+            self._remove_expired_reservations)
+        self._loop.start(interval=self._interval)
+
+    def wait(self):
+        if self._loop:
+            self._loop.wait()
+
+    def stop(self):
+        if self._loop:
+            self._loop.stop()
+
+    @staticmethod
+    def reset():
+        config.reset_service()
+
+    def _remove_expired_reservations(self):
+        context = n_context.get_admin_context()
+        try:
+            with context.session.begin():
+                count = quota_api.remove_expired_reservations(context)
+            LOG.debug("Deleted %d expired reservations", count)
+        except Exception:
+            LOG.exception(_LE("Failed to delete expired reservations"))
+
+
 class DbQuotaDriver(object):
     """Driver to perform necessary checks to enforce quotas and obtain quota
     information.
@@ -126,31 +167,21 @@ class DbQuotaDriver(object):
 
         return dict((k, v) for k, v in quotas.items())
 
-    def _handle_expired_reservations(self, context, tenant_id):
-        LOG.debug("Deleting expired reservations for tenant:%s" % tenant_id)
-        # Delete expired reservations (we don't want them to accrue
-        # in the database)
-        quota_api.remove_expired_reservations(
-            context, tenant_id=tenant_id)
-
     @oslo_db_api.wrap_db_retry(max_retries=db_api.MAX_RETRIES,
                                retry_interval=0.1,
                                inc_retry_interval=True,
                                retry_on_request=True,
                                exception_checker=db_api.is_deadlock)
     def make_reservation(self, context, tenant_id, resources, deltas, plugin):
-        # Lock current reservation table
-        # NOTE(salv-orlando): This routine uses DB write locks.
-        # These locks are acquired by the count() method invoked on resources.
-        # Please put your shotguns aside.
-        # A non locking algorithm for handling reservation is feasible, however
-        # it will require two database writes even in cases when there are not
-        # concurrent reservations.
-        # For this reason it might be advisable to handle contention using
-        # this kind of locks and paying the cost of a write set certification
-        # failure when a mysql galera cluster is employed. Also, this class of
-        # locks should be ok to use when support for sending "hotspot" writes
-        # to a single node will be avaialable.
+        # NOTE: This routine does not lock usage data. The usage of tracked
+        # resources is spread over shards updated by the transactions
+        # creating and deleting the resources, and summed by the count()
+        # method invoked on resources. Concurrent reservations might
+        # therefore both be accepted while only one of them fits in the
+        # headroom, in exchange for reservations of the same tenant not
+        # being serialized on a single row.
+        # Expired reservations are not accounted for, and are removed for all
+        # tenants at once by a ReservationCleanupWorker.
         requested_resources = deltas.keys()
         with db_api.autonested_transaction(context.session):
             # get_tenant_quotes needs in input a dictionary mapping resource
@@ -178,16 +209,10 @@ class DbQuotaDriver(object):
                 (resource, resources[resource].count(
                     context, plugin, tenant_id, resync_usage=False)) for
                 resource in requested_resources)
-            # Adjust for expired reservations. Apparently it is cheaper than
-            # querying everytime for active reservations and counting overall
-            # quantity of resources reserved
-            expired_deltas = quota_api.get_reservations_for_resources(
-                context, tenant_id, requested_resources, expired=True)
             # Verify that the request can be accepted with current limits
             resources_over_limit = []
             for resource in requested_resources:
-                expired_reservations = expired_deltas.get(resource, 0)
-                total_usage = current_usages[resource] - expired_reservations
+                total_usage = current_usages[resource]
                 res_headroom = current_limits[resource] - total_usage
                 LOG.debug(("Attempting to reserve %(delta)d items for "
                            "resource %(resource)s. Total usage: %(total)d; "
@@ -199,8 +224,6 @@ class DbQuotaDriver(object):
                            'headroom': res_headroom})
                 if res_headroom < deltas[resource]:
                     resources_over_limit.append(resource)
-                if expired_reservations:
-                    self._handle_expired_reservations(context, tenant_id)
 
             if resources_over_limit:
                 raise exceptions.OverQuota(overs=sorted(resources_over_limit))
@@ -222,6 +245,10 @@ class DbQuotaDriver(object):
         quota_api.remove_reservation(context, reservation_id,
                                      set_dirty=True)
 
+    def get_workers(self):
+        return [ReservationCleanupWorker(
+            cfg.CONF.QUOTAS.reservation_cleanup_interval)]
+
     def limit_check(self, context, tenant_id, resources, values):
         """Check simple quota limits.
 
@@ -63,3 +63,19 @@ class QuotaUsage(model_base.BASEV2):
                        server_default="0")
     reserved = sa.Column(sa.Integer, nullable=False,
                          server_default="0")
+
+
+class QuotaUsageShard(model_base.BASEV2):
+    """Represents a share of the current usage for a given resource.
+
+    The resources created or deleted since the quota usage was last set are
+    counted in one of several shards, so that concurrent transactions seldom
+    update the same row. The usage is the sum of the in_use amounts of the
+    quota usage and of its shards.
+    """
+
+    resource = sa.Column(sa.String(255), nullable=False, primary_key=True)
+    tenant_id = sa.Column(sa.String(255), nullable=False, primary_key=True)
+    shard = sa.Column(sa.Integer, nullable=False, primary_key=True,
+                      autoincrement=False)
+    in_use = sa.Column(sa.Integer, nullable=False, server_default="0")
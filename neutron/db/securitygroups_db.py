@@ -48,6 +48,13 @@ class SecurityGroup(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
 
     name = sa.Column(sa.String(255))
     description = sa.Column(sa.String(255))
+    # Bumped whenever the member IPs of the group change, so that every
+    # server process can tell its cached copy is outdated. Agents apply the
+    # member deltas of a group in the order of this version.
+    version = sa.Column(sa.Integer, server_default='0', nullable=False)
+    # Bumped whenever the rules of the group change
+    rules_version = sa.Column(sa.Integer, server_default='0',
+                              nullable=False)
 
 
 class DefaultSecurityGroup(model_base.BASEV2):
@@ -638,7 +645,8 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
 
     # Register dict extend functions for ports
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attributes.PORTS, ['_extend_port_dict_security_group'])
+        attributes.PORTS, ['_extend_port_dict_security_group'],
+        fields=[ext_sg.SECURITYGROUPS])
 
     def _process_port_create_security_group(self, context, port,
                                             security_group_ids):
@@ -17,12 +17,14 @@ import netaddr
 from oslo_log import log as logging
 from sqlalchemy.orm import exc
 
+from neutron.api.v2 import attributes
 from neutron.common import constants as n_const
 from neutron.common import ipv6_utils as ipv6
 from neutron.common import utils
 from neutron.db import allowedaddresspairs_db as addr_pair
 from neutron.db import models_v2
 from neutron.db import securitygroups_db as sg_db
+from neutron.extensions import allowedaddresspairs as ext_addr_pair
 from neutron.extensions import securitygroup as ext_sg
 from neutron.i18n import _LW
 
@@ -38,6 +40,14 @@ DHCP_RULE_PORT = {4: (67, 68, n_const.IPv4), 6: (547, 546, n_const.IPv6)}
 class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
     """Mixin class to add agent-based security group implementation."""
 
+    # Plugins which report every rule and membership change through the
+    # methods of this mixin can answer security_group_info_for_ports from a
+    # per security group cache of rules and member IPs. Cached rules and
+    # member IPs are validated against SecurityGroup.rules_version and
+    # SecurityGroup.version, which are bumped on each of those changes, so
+    # the cache stays coherent across server processes.
+    cache_security_group_info = False
+
     def get_port_from_device(self, context, device):
         """Get port dict from device name on an agent.
 
@@ -73,6 +83,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                      self).create_security_group_rule(context,
                                                       security_group_rule)
         sgids = [rule['security_group_id']]
+        self._bump_security_group_rules_versions(context, sgids)
         self.notifier.security_groups_rule_updated(context, sgids)
         return rule
 
@@ -81,6 +92,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                       self).create_security_group_rule_bulk_native(
                           context, security_group_rules)
         sgids = set([r['security_group_id'] for r in rules])
+        self._bump_security_group_rules_versions(context, sgids)
         self.notifier.security_groups_rule_updated(context, list(sgids))
         return rules
 
@@ -88,6 +100,8 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.get_security_group_rule(context, sgrid)
         super(SecurityGroupServerRpcMixin,
               self).delete_security_group_rule(context, sgrid)
+        self._bump_security_group_rules_versions(
+            context, [rule['security_group_id']])
         self.notifier.security_groups_rule_updated(context,
                                                    [rule['security_group_id']])
 
@@ -99,8 +113,12 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         if sg_change:
             self.notify_security_groups_member_updated_bulk(
                 context, [original_port, updated_port])
-        elif original_port['fixed_ips'] != updated_port['fixed_ips']:
-            self.notify_security_groups_member_updated(context, updated_port)
+        elif (original_port['fixed_ips'] != updated_port['fixed_ips'] or
+              original_port.get(ext_addr_pair.ADDRESS_PAIRS) !=
+              updated_port.get(ext_addr_pair.ADDRESS_PAIRS)):
+            # the original port tells which member IPs went away
+            self.notify_security_groups_member_updated_bulk(
+                context, [original_port, updated_port])
 
     def is_security_group_member_updated(self, context,
                                          original_port, updated_port):
@@ -132,7 +150,9 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         """
         sg_provider_updated_networks = set()
         sec_groups = set()
+        member_groups = set()
         for port in ports:
+            member_groups |= set(port.get(ext_sg.SECURITYGROUPS) or [])
             if port['device_owner'] == n_const.DEVICE_OWNER_DHCP:
                 sg_provider_updated_networks.add(
                     port['network_id'])
@@ -146,6 +166,14 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
             else:
                 sec_groups |= set(port.get(ext_sg.SECURITYGROUPS))
 
+        with context.session.begin(subtransactions=True):
+            # the version rows stay locked until the end of the transaction,
+            # so concurrent updates of a group compute their deltas in the
+            # order of their versions
+            versions = self._bump_security_group_versions(context,
+                                                          member_groups)
+            member_updates = self._get_security_group_member_updates(
+                context, ports, sec_groups, versions)
         if sg_provider_updated_networks:
             ports_query = context.session.query(models_v2.Port.id).filter(
                 models_v2.Port.network_id.in_(
@@ -155,12 +183,254 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                 context, ports_to_update)
         if sec_groups:
             self.notifier.security_groups_member_updated(
-                context, list(sec_groups))
+                context, list(sec_groups), member_updates=member_updates)
 
     def notify_security_groups_member_updated(self, context, port):
         self.notify_security_groups_member_updated_bulk(context, [port])
 
+    def _bump_security_group_versions(self, context, sg_ids):
+        """Invalidate the cached member IPs of sg_ids.
+
+        The version lives in the database so that the caches of all the
+        server processes notice the change, not only the local one.
+
+        :returns: the new version of each of the groups, by group ID
+        """
+        if not sg_ids:
+            return {}
+        with context.session.begin(subtransactions=True):
+            self._increment_security_group_counter(
+                context, sg_ids, sg_db.SecurityGroup.version)
+            return self._select_security_group_versions(context, sg_ids)
+
+    def _bump_security_group_rules_versions(self, context, sg_ids):
+        """Invalidate the cached rules of sg_ids.
+
+        Rules have their own version, so that rule changes do not break
+        the sequence of member versions the agents apply deltas against.
+        """
+        if not sg_ids:
+            return
+        self._increment_security_group_counter(
+            context, sg_ids, sg_db.SecurityGroup.rules_version)
+
+    def _increment_security_group_counter(self, context, sg_ids, counter):
+        cache = self._get_security_group_info_cache()
+        for sg_id in sg_ids:
+            cache.pop(sg_id, None)
+        query = context.session.query(sg_db.SecurityGroup)
+        query = query.filter(sg_db.SecurityGroup.id.in_(sg_ids))
+        query.update({counter: counter + 1}, synchronize_session=False)
+
+    def _select_security_group_versions(self, context, sg_ids):
+        if not sg_ids:
+            return {}
+        query = context.session.query(sg_db.SecurityGroup.id,
+                                      sg_db.SecurityGroup.version)
+        query = query.filter(sg_db.SecurityGroup.id.in_(sg_ids))
+        return dict(query)
+
+    def _get_port_member_ips(self, port):
+        ips = set(fixed_ip['ip_address']
+                  for fixed_ip in port.get('fixed_ips', []))
+        address_pairs = port.get(ext_addr_pair.ADDRESS_PAIRS)
+        if attributes.is_attr_set(address_pairs):
+            ips |= set(pair['ip_address'] for pair in address_pairs)
+        return ips
+
+    def _get_security_group_member_updates(self, context, ports, sg_ids,
+                                           versions):
+        """Compute the member IP changes ports caused in sg_ids.
+
+        Every IP of the ports is reported as added to or removed from the
+        groups of the ports, depending on whether the group still has a
+        member with this IP. Agents apply these deltas in place as long as
+        the version of a group follows the one they know.
+
+        :returns: {sg_id: {'version': version,
+                           'added': {'IPv4': [ip], 'IPv6': [ip]},
+                           'removed': {'IPv4': [ip], 'IPv6': [ip]}}}
+        """
+        candidate_ips = dict((sg_id, set()) for sg_id in sg_ids
+                             if sg_id in versions)
+        for port in ports:
+            port_ips = self._get_port_member_ips(port)
+            for sg_id in port.get(ext_sg.SECURITYGROUPS) or []:
+                if sg_id in candidate_ips:
+                    candidate_ips[sg_id] |= port_ips
+        all_ips = set()
+        for ips in candidate_ips.values():
+            all_ips |= ips
+        member_ips = self._select_member_ips_among(
+            context, list(candidate_ips), all_ips)
+        member_updates = {}
+        for sg_id, ips in candidate_ips.items():
+            update = {'version': versions[sg_id],
+                      'added': {n_const.IPv4: [], n_const.IPv6: []},
+                      'removed': {n_const.IPv4: [], n_const.IPv6: []}}
+            for ip in sorted(ips):
+                ethertype = 'IPv%d' % netaddr.IPNetwork(ip).version
+                change = 'added' if ip in member_ips[sg_id] else 'removed'
+                update[change][ethertype].append(ip)
+            member_updates[sg_id] = update
+        return member_updates
+
+    def _bump_port_security_group_versions(self, context, port_ids):
+        """Invalidate the cached member IPs of the groups of port_ids.
+
+        For the IP changes which don't go through update_port, like the
+        addresses of an auto-address subnet.
+        """
+        if not port_ids:
+            return
+        sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+        sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
+        query = context.session.query(sg_binding_sgid).distinct()
+        query = query.filter(sg_binding_port.in_(port_ids))
+        self._bump_security_group_versions(context,
+                                           [sg_id for sg_id, in query])
+
+    def _get_security_group_info_cache(self):
+        cache = getattr(self, '_security_group_info_cache', None)
+        if cache is None:
+            cache = self._security_group_info_cache = {}
+        return cache
+
+    def _get_security_group_cache_entries(self, context, sg_ids):
+        """Return the cache entries of sg_ids, resetting outdated ones.
+
+        An entry holds the rules of the group and its member IPs by
+        ethertype, with the versions they were loaded for. Rules and member
+        IPs are None until they are loaded, or once they are outdated.
+        Groups which no longer exist are evicted.
+        """
+        entries = {}
+        if not sg_ids:
+            return entries
+        cache = self._get_security_group_info_cache()
+        query = context.session.query(sg_db.SecurityGroup.id,
+                                      sg_db.SecurityGroup.version,
+                                      sg_db.SecurityGroup.rules_version)
+        query = query.filter(sg_db.SecurityGroup.id.in_(sg_ids))
+        for sg_id, version, rules_version in query:
+            entry = cache.setdefault(sg_id, {'version': version,
+                                             'rules_version': rules_version,
+                                             'rules': None,
+                                             'member_ips': None})
+            if entry['version'] != version:
+                entry['version'] = version
+                entry['member_ips'] = None
+            if entry['rules_version'] != rules_version:
+                entry['rules_version'] = rules_version
+                entry['rules'] = None
+            entries[sg_id] = entry
+        for sg_id in set(sg_ids) - set(entries):
+            cache.pop(sg_id, None)
+        return entries
+
+    def _load_security_group_rules(self, context, entries):
+        sg_ids = [sg_id for sg_id, entry in entries.items()
+                  if entry['rules'] is None]
+        if not sg_ids:
+            return
+        rules = dict((sg_id, []) for sg_id in sg_ids)
+        sgr_sgid = sg_db.SecurityGroupRule.security_group_id
+        query = context.session.query(sg_db.SecurityGroupRule)
+        query = query.filter(sgr_sgid.in_(sg_ids))
+        for rule_in_db in query:
+            rule_dict = self._make_rule_dict_for_agent(rule_in_db)
+            sg_rules = rules[rule_in_db['security_group_id']]
+            if rule_dict not in sg_rules:
+                sg_rules.append(rule_dict)
+        for sg_id, sg_rules in rules.items():
+            entries[sg_id]['rules'] = sg_rules
+
+    def _load_security_group_member_ips(self, context, entries):
+        sg_ids = [sg_id for sg_id, entry in entries.items()
+                  if entry['member_ips'] is None]
+        if not sg_ids:
+            return
+        ips = self._select_ips_for_remote_group(context, sg_ids)
+        for sg_id, member_ips in ips.items():
+            ips_by_ethertype = {n_const.IPv4: set(), n_const.IPv6: set()}
+            for ip in member_ips:
+                ethertype = 'IPv%d' % netaddr.IPNetwork(ip).version
+                ips_by_ethertype[ethertype].add(ip)
+            entries[sg_id]['member_ips'] = ips_by_ethertype
+
+    def _make_rule_dict_for_agent(self, rule_in_db):
+        direction = rule_in_db['direction']
+        rule_dict = {
+            'direction': direction,
+            'ethertype': rule_in_db['ethertype']}
+
+        for key in ('protocol', 'port_range_min', 'port_range_max',
+                    'remote_ip_prefix', 'remote_group_id'):
+            if rule_in_db.get(key) is not None:
+                if key == 'remote_ip_prefix':
+                    direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
+                    rule_dict[direction_ip_prefix] = rule_in_db[key]
+                    continue
+                rule_dict[key] = rule_in_db[key]
+        return rule_dict
+
+    def _cached_security_group_info_for_ports(self, context, ports):
+        sg_info = {'devices': ports,
+                   'security_groups': {},
+                   'sg_member_ips': {}}
+        sgs_by_port = {}
+        for port_id, sg_id in self._select_port_sg_bindings(context, ports):
+            sgs_by_port.setdefault(port_id, []).append(sg_id)
+        sg_ids = set(sg_id for port_sg_ids in sgs_by_port.values()
+                     for sg_id in port_sg_ids)
+        entries = self._get_security_group_cache_entries(context, sg_ids)
+        self._load_security_group_rules(context, entries)
+
+        remote_security_group_info = {}
+        for port_id, port_sg_ids in sgs_by_port.items():
+            port = sg_info['devices'][port_id]
+            for sg_id in port_sg_ids:
+                entry = entries.get(sg_id)
+                if entry is None:
+                    continue
+                sg_info['security_groups'].setdefault(sg_id,
+                                                      list(entry['rules']))
+                for rule in entry['rules']:
+                    source_groups = port.setdefault(
+                        'security_group_source_groups', [])
+                    remote_gid = rule.get('remote_group_id')
+                    if not remote_gid:
+                        continue
+                    if remote_gid not in source_groups:
+                        source_groups.append(remote_gid)
+                    # this set will be serialized into a list by rpc code
+                    remote_security_group_info.setdefault(
+                        remote_gid, {}).setdefault(rule['ethertype'], set())
+
+        remote_entries = dict(
+            (sg_id, entries[sg_id])
+            for sg_id in remote_security_group_info if sg_id in entries)
+        remote_entries.update(self._get_security_group_cache_entries(
+            context, set(remote_security_group_info) - set(remote_entries)))
+        self._load_security_group_member_ips(context, remote_entries)
+        for remote_gid, member_ips in remote_security_group_info.items():
+            entry = remote_entries.get(remote_gid)
+            if entry is None:
+                continue
+            for ethertype, ips in member_ips.items():
+                ips.update(entry['member_ips'].get(ethertype, ()))
+        sg_info['sg_member_ips'] = remote_security_group_info
+        sg_info['sg_member_versions'] = dict(
+            (sg_id, entry['version'])
+            for sg_id, entry in remote_entries.items())
+        # the provider rules do not belong to any security group, so these
+        # rules still reside in sg_info['devices'] [port_id]
+        self._apply_provider_rule(context, sg_info['devices'])
+        return sg_info
+
     def security_group_info_for_ports(self, context, ports):
+        if self.cache_security_group_info:
+            return self._cached_security_group_info_for_ports(context, ports)
         sg_info = {'devices': ports,
                    'security_groups': {},
                    'sg_member_ips': {}}
@@ -187,19 +457,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                     # this set will be serialized into a list by rpc code
                     remote_security_group_info[remote_gid][ethertype] = set()
 
-            direction = rule_in_db['direction']
-            rule_dict = {
-                'direction': direction,
-                'ethertype': ethertype}
-
-            for key in ('protocol', 'port_range_min', 'port_range_max',
-                        'remote_ip_prefix', 'remote_group_id'):
-                if rule_in_db.get(key) is not None:
-                    if key == 'remote_ip_prefix':
-                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                        rule_dict[direction_ip_prefix] = rule_in_db[key]
-                        continue
-                    rule_dict[key] = rule_in_db[key]
+            rule_dict = self._make_rule_dict_for_agent(rule_in_db)
             if security_group_id not in sg_info['security_groups']:
                 sg_info['security_groups'][security_group_id] = []
             if rule_dict not in sg_info['security_groups'][security_group_id]:
@@ -219,6 +477,10 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         return self._get_security_group_member_ips(context, sg_info)
 
     def _get_security_group_member_ips(self, context, sg_info):
+        # versions are read first, a change committed in between is then
+        # applied again by the agent instead of being missed
+        sg_info['sg_member_versions'] = self._select_security_group_versions(
+            context, list(sg_info['sg_member_ips']))
         ips = self._select_ips_for_remote_group(
             context, sg_info['sg_member_ips'].keys())
         for sg_id, member_ips in ips.items():
@@ -237,6 +499,15 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         query = query.filter(sg_binding_port.in_(ports.keys()))
         return query.all()
 
+    def _select_port_sg_bindings(self, context, ports):
+        if not ports:
+            return []
+        sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+        sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
+        query = context.session.query(sg_binding_port, sg_binding_sgid)
+        query = query.filter(sg_binding_port.in_(ports.keys()))
+        return query.all()
+
     def _select_rules_for_ports(self, context, ports):
         if not ports:
             return []
@@ -285,6 +556,34 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                 ips_by_group[security_group_id].add(allowed_addr_ip)
         return ips_by_group
 
+    def _select_member_ips_among(self, context, sg_ids, ips):
+        """Return which of ips belong to members of each of sg_ids."""
+        ips_by_group = dict((sg_id, set()) for sg_id in sg_ids)
+        if not sg_ids or not ips:
+            return ips_by_group
+        ip_port = models_v2.IPAllocation.port_id
+        pair_port = addr_pair.AllowedAddressPair.port_id
+        sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+        sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
+
+        fixed_query = context.session.query(
+            sg_binding_sgid, models_v2.IPAllocation.ip_address)
+        fixed_query = fixed_query.join(models_v2.IPAllocation,
+                                       ip_port == sg_binding_port)
+        fixed_query = fixed_query.filter(
+            sg_binding_sgid.in_(sg_ids),
+            models_v2.IPAllocation.ip_address.in_(ips))
+        pair_query = context.session.query(
+            sg_binding_sgid, addr_pair.AllowedAddressPair.ip_address)
+        pair_query = pair_query.join(addr_pair.AllowedAddressPair,
+                                     pair_port == sg_binding_port)
+        pair_query = pair_query.filter(
+            sg_binding_sgid.in_(sg_ids),
+            addr_pair.AllowedAddressPair.ip_address.in_(ips))
+        for security_group_id, ip_address in fixed_query.union(pair_query):
+            ips_by_group[security_group_id].add(ip_address)
+        return ips_by_group
+
     def _select_remote_group_ids(self, ports):
         remote_group_ids = []
         for port in ports.values():
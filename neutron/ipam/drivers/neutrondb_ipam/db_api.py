@@ -13,14 +13,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo_db import exception as db_exc
 from oslo_log import log
 from oslo_utils import uuidutils
+from sqlalchemy import orm
 
+from neutron.db import api as db_api
 from neutron.ipam.drivers.neutrondb_ipam import db_models
 
 LOG = log.getLogger(__name__)
 # Database operations for Neutron's DB-backed IPAM driver
 
+# Number of addresses of an IpamAllocationBlock, one per bit of its bitmap
+BLOCK_SIZE = 256
+
 
 class IpamSubnetManager(object):
 
@@ -29,6 +35,10 @@ class IpamSubnetManager(object):
         return session.query(db_models.IpamSubnet).filter_by(
             neutron_subnet_id=neutron_subnet_id).first()
 
+    @classmethod
+    def load_all(cls, session):
+        return session.query(db_models.IpamSubnet)
+
     def __init__(self, ipam_subnet_id, neutron_subnet_id):
         self._ipam_subnet_id = ipam_subnet_id
         self._neutron_subnet_id = neutron_subnet_id
@@ -67,7 +77,7 @@ class IpamSubnetManager(object):
         return session.query(db_models.IpamSubnet).filter_by(
             neutron_subnet_id=neutron_subnet_id).delete()
 
-    def create_pool(self, session, pool_start, pool_end):
+    def create_pool(self, session, pool_start, pool_end, create_range=True):
         """Create an allocation pool and availability ranges for the subnet.
 
         This method does not perform any validation on parameters; it simply
@@ -75,6 +85,8 @@ class IpamSubnetManager(object):
 
         :param pool_start: string expressing the start of the pool
         :param pool_end: string expressing the end of the pool
+        :param create_range: whether to create the availability range of
+            the pool
         :return: the newly created pool object.
         """
         ip_pool = db_models.IpamAllocationPool(
@@ -82,11 +94,12 @@ class IpamSubnetManager(object):
             first_ip=pool_start,
             last_ip=pool_end)
         session.add(ip_pool)
-        ip_range = db_models.IpamAvailabilityRange(
-            allocation_pool=ip_pool,
-            first_ip=pool_start,
-            last_ip=pool_end)
-        session.add(ip_range)
+        if create_range:
+            ip_range = db_models.IpamAvailabilityRange(
+                allocation_pool=ip_pool,
+                first_ip=pool_start,
+                last_ip=pool_end)
+            session.add(ip_range)
         return ip_pool
 
     def delete_allocation_pools(self, session):
@@ -145,10 +158,13 @@ class IpamSubnetManager(object):
         :return: list of availability ranges as instances of
             neutron.ipam.drivers.neutrondb_ipam.db_models.IpamAvailabilityRange
         """
-        return session.query(
+        range_qry = session.query(
             db_models.IpamAvailabilityRange).join(
             db_models.IpamAllocationPool).filter_by(
             id=allocation_pool_id)
+        if locking:
+            range_qry = range_qry.with_lockmode('update')
+        return range_qry
 
     def create_range(self, session, allocation_pool_id,
                      range_start, range_end):
@@ -171,6 +187,130 @@ class IpamSubnetManager(object):
         session.add(new_ip_range)
         return new_ip_range
 
+    def _block_query(self, session, allocation_pool_id):
+        # populate_existing() so that blocks updated with compare-and-swap
+        # are not returned with the bitmap of a previous read
+        return (session.query(db_models.IpamAllocationBlock).
+                populate_existing().
+                filter_by(allocation_pool_id=allocation_pool_id))
+
+    def get_block(self, session, allocation_pool_id, block_index):
+        """Return a block of a pool, or None if it was not created yet."""
+        return self._block_query(session, allocation_pool_id).filter_by(
+            block_index=block_index).first()
+
+    def get_next_free_block(self, session, allocation_pool_id, block_index):
+        """Return the first block of a pool with free addresses.
+
+        The search starts at block_index and wraps around.
+        """
+        block_model = db_models.IpamAllocationBlock
+        free_qry = self._block_query(session, allocation_pool_id).filter(
+            block_model.free > 0).order_by(block_model.block_index)
+        return (free_qry.filter(block_model.block_index >= block_index).first()
+                or free_qry.filter(
+                    block_model.block_index < block_index).first())
+
+    def get_missing_block_index(self, session, allocation_pool_id,
+                                block_count):
+        """Return the lowest index of a block of a pool not created yet.
+
+        :param block_count: number of blocks of the pool
+        :returns: the index, or None if all the blocks of the pool exist
+        """
+        block_model = db_models.IpamAllocationBlock
+        if not self.get_block(session, allocation_pool_id, 0):
+            return 0
+        next_block = orm.aliased(block_model)
+        index = (session.query(block_model.block_index + 1).
+                 outerjoin(next_block,
+                           (next_block.allocation_pool_id ==
+                            block_model.allocation_pool_id) &
+                           (next_block.block_index ==
+                            block_model.block_index + 1)).
+                 filter(block_model.allocation_pool_id == allocation_pool_id,
+                        next_block.block_index.is_(None)).
+                 order_by(block_model.block_index).first())
+        if index and index[0] < block_count:
+            return index[0]
+
+    def create_block(self, session, allocation_pool_id, block_index, free,
+                     bitmap):
+        """Create a block, or return it if it was created concurrently.
+
+        The availability ranges of the pool are deleted, so that the
+        allocations made from blocks are not handed out again if the
+        subnet goes back to availability ranges. RetryRequest is raised
+        if the block was created by a transaction this one can't see.
+
+        :param bitmap: allocation bitmap of the block, as an integer
+        """
+        try:
+            with db_api.autonested_transaction(session):
+                block = db_models.IpamAllocationBlock(
+                    allocation_pool_id=allocation_pool_id,
+                    block_index=block_index,
+                    free=free,
+                    bitmap='%064x' % bitmap)
+                session.add(block)
+                session.query(db_models.IpamAvailabilityRange).filter_by(
+                    allocation_pool_id=allocation_pool_id).delete(
+                        synchronize_session=False)
+            return block
+        except db_exc.DBDuplicateEntry as e:
+            LOG.debug("Block %(index)s of allocation pool %(pool)s was "
+                      "created concurrently",
+                      {'index': block_index, 'pool': allocation_pool_id})
+            block = self.get_block(session, allocation_pool_id, block_index)
+            if block is None:
+                # The block was created by a transaction this one can't see
+                # yet, with the REPEATABLE READ isolation level.
+                raise db_exc.RetryRequest(e)
+            return block
+
+    def update_block(self, session, block, bitmap, free):
+        """Compare-and-swap the bitmap of a block.
+
+        The block is only updated if its bitmap is still the one it was
+        read with.
+
+        :param bitmap: new allocation bitmap of the block, as an integer
+        :returns: whether the block was updated
+        """
+        count = session.query(db_models.IpamAllocationBlock).filter_by(
+            allocation_pool_id=block.allocation_pool_id,
+            block_index=block.block_index,
+            bitmap=block.bitmap).update(
+                {'bitmap': '%064x' % bitmap, 'free': free},
+                synchronize_session=False)
+        return bool(count)
+
+    def delete_ranges(self, session):
+        """Remove the availability ranges of all the pools of the subnet."""
+        pool_ids = [pool_id for pool_id, in session.query(
+            db_models.IpamAllocationPool.id).filter_by(
+                ipam_subnet_id=self._ipam_subnet_id).with_lockmode('update')]
+        if pool_ids:
+            session.query(db_models.IpamAvailabilityRange).filter(
+                db_models.IpamAvailabilityRange.allocation_pool_id.in_(
+                    pool_ids)).delete(synchronize_session='fetch')
+
+    def delete_allocation_blocks(self, session):
+        """Remove the allocation blocks of all the pools of the subnet."""
+        pool_ids = session.query(db_models.IpamAllocationPool.id).filter_by(
+            ipam_subnet_id=self._ipam_subnet_id)
+        session.query(db_models.IpamAllocationBlock).filter(
+            db_models.IpamAllocationBlock.allocation_pool_id.in_(
+                pool_ids.subquery())).delete(synchronize_session=False)
+
+    def list_allocated_addresses(self, session, ip_addresses):
+        """Return which of the given IP addresses are allocated."""
+        allocation_model = db_models.IpamAllocation
+        return set(ip_address for ip_address, in session.query(
+            allocation_model.ip_address).filter(
+                allocation_model.ipam_subnet_id == self._ipam_subnet_id,
+                allocation_model.ip_address.in_(ip_addresses)))
+
     def check_unique_allocation(self, session, ip_address):
         """Validate that the IP address on the subnet is not in use."""
         iprequest = session.query(db_models.IpamAllocation).filter_by(
@@ -109,3 +109,24 @@ class IpamAllocation(model_base.BASEV2):
                                              ondelete="CASCADE"),
                                primary_key=True,
                                nullable=False)
+
+
+class IpamAllocationBlock(model_base.BASEV2):
+    """Allocation bitmap of a block of addresses of an allocation pool.
+
+    Block block_index covers up to 256 consecutive addresses of its pool,
+    starting block_index * 256 addresses after the first address of the
+    pool. The bitmap is stored as a hexadecimal string, with one bit per
+    address of the block set when the address is allocated, and free
+    is the number of bits left unset.
+    """
+
+    allocation_pool_id = sa.Column(sa.String(36),
+                                   sa.ForeignKey('ipamallocationpools.id',
+                                                 ondelete="CASCADE"),
+                                   nullable=False,
+                                   primary_key=True)
+    block_index = sa.Column(sa.BigInteger, nullable=False, primary_key=True,
+                            autoincrement=False)
+    free = sa.Column(sa.Integer, nullable=False)
+    bitmap = sa.Column(sa.String(64), nullable=False)
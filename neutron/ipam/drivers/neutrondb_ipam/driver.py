@@ -13,14 +13,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import random
+
 import netaddr
+from oslo_db import exception as db_exc
 from oslo_log import log
 from oslo_utils import uuidutils
 
 from neutron.common import exceptions as n_exc
 from neutron.common import ipv6_utils
 from neutron.db import api as db_api
-from neutron.i18n import _LE
+from neutron.i18n import _LE, _LW
 from neutron.ipam import driver as ipam_base
 from neutron.ipam.drivers.neutrondb_ipam import db_api as ipam_db_api
 from neutron.ipam import exceptions as ipam_exc
@@ -237,8 +240,8 @@ class NeutronDbSubnet(ipam_base.Subnet):
         """Rebuild availability ranges.
 
         This method should be called only when the availability ranges are
-        exhausted or when the subnet's allocation pools are updated,
-        which may trigger a deletion of the availability ranges.
+        exhausted, or out of sync with the allocations of the subnet, which
+        is repaired by repair_availability_ranges.
 
         For this operation to complete successfully, this method uses a
         locking query to ensure that no IP is allocated while the regeneration
@@ -290,10 +293,72 @@ class NeutronDbSubnet(ipam_base.Subnet):
         try:
             return self._try_generate_ip(session)
         except ipam_exc.IpAddressGenerationFailure:
+            # Deallocated addresses are given back to the availability ranges
+            # at once, but the ranges left by earlier releases, or by the
+            # allocation blocks driver, may still miss free addresses
             self._rebuild_availability_ranges(session)
 
         return self._try_generate_ip(session)
 
+    def _release_ip(self, session, ip_address):
+        """Give a deallocated IP address back to the availability ranges.
+
+        The ranges right before and after the address are extended, or
+        merged, instead of rebuilding the ranges from all the allocations
+        of the subnet.
+        """
+        ip = netaddr.IPAddress(ip_address)
+        for pool in self.subnet_manager.list_pools(session):
+            if (netaddr.IPAddress(pool['first_ip']) <= ip <=
+                    netaddr.IPAddress(pool['last_ip'])):
+                break
+        else:
+            return
+        av_ranges = self.subnet_manager.list_ranges_by_allocation_pool(
+            session, pool['id'], locking=True)
+        adjacent_ranges = ipam_utils.get_adjacent_ranges(av_ranges,
+                                                         ip_address)
+        if not adjacent_ranges:
+            return
+        before, after = adjacent_ranges
+        if before and after:
+            before['last_ip'] = after['last_ip']
+            session.delete(after)
+        elif before:
+            before['last_ip'] = ip_address
+        elif after:
+            after['first_ip'] = ip_address
+        else:
+            self.subnet_manager.create_range(session, pool['id'],
+                                             ip_address, ip_address)
+        LOG.debug("Released IP %(ip_address)s to the availability ranges "
+                  "of subnet %(subnet_id)s",
+                  {'ip_address': ip_address,
+                   'subnet_id': self.subnet_manager.neutron_id})
+
+    def repair_availability_ranges(self, session):
+        """Rebuild the availability ranges if they are out of sync.
+
+        The ranges are checked against the allocations of the subnet
+        without locking, and only rebuilt if they do not match.
+        """
+        pools = [netaddr.IPRange(pool['first_ip'], pool['last_ip'])
+                 for pool in self.subnet_manager.list_pools(session)]
+        ip_ranges = [netaddr.IPRange(r['first_ip'], r['last_ip'])
+                     for r in self.subnet_manager.list_ranges_by_subnet_id(
+                         session)]
+        allocations = [allocation['ip_address'] for allocation in
+                       self.subnet_manager.list_allocations(session)]
+        if ipam_utils.check_availability_ranges(pools, ip_ranges,
+                                                allocations):
+            return
+        LOG.warning(_LW("Availability ranges of subnet %s do not match its "
+                        "allocations, rebuilding them"),
+                    self.subnet_manager.neutron_id)
+        with session.begin(subtransactions=True):
+            self.subnet_manager.delete_ranges(session)
+            self._rebuild_availability_ranges(session)
+
     def _try_generate_ip(self, session):
         """Generate an IP address from availability ranges."""
         ip_range = self.subnet_manager.get_first_range(session, locking=True)
@@ -351,6 +416,7 @@ class NeutronDbSubnet(ipam_base.Subnet):
             raise ipam_exc.IpAddressAllocationNotFound(
                 subnet_id=self.subnet_manager.neutron_id,
                 ip_address=address)
+        self._release_ip(session, address)
 
     def update_allocation_pools(self, pools, cidr):
         # Pools have already been validated in the subnet request object which
@@ -368,6 +434,218 @@ class NeutronDbSubnet(ipam_base.Subnet):
             self._cidr, self._gateway_ip, self._pools)
 
 
+class NeutronDbBlockSubnet(NeutronDbSubnet):
+    """Manage IP addresses with allocation bitmaps.
+
+    The addresses of each allocation pool are split in blocks, whose
+    allocation state is a bitmap stored in an IpamAllocationBlock row.
+    Addresses are generated from a block picked at random, and claimed
+    with a compare-and-swap update of its bitmap instead of locking the
+    availability ranges shared by all the allocations of the subnet, so
+    that concurrent allocations only conflict when they pick the same
+    block. Deallocated addresses are given back to their block at once.
+
+    Blocks are only created when first used, from the allocations of
+    their addresses, so subnets created with availability ranges can be
+    managed by this class too.
+    """
+
+    # Blocks tried by an allocation before restarting the transaction
+    MAX_BLOCK_ATTEMPTS = 10
+
+    @classmethod
+    def create_allocation_pools(cls, subnet_manager, session, pools, cidr):
+        for pool in pools:
+            ip_version = cidr.version
+            subnet_manager.create_pool(
+                session,
+                netaddr.IPAddress(pool.first, ip_version).format(),
+                netaddr.IPAddress(pool.last, ip_version).format(),
+                create_range=False)
+
+    def _list_pools(self, session):
+        return [(pool['id'], netaddr.IPRange(pool['first_ip'],
+                                             pool['last_ip']))
+                for pool in self.subnet_manager.list_pools(session)]
+
+    @staticmethod
+    def _block_count(ip_range):
+        return (ip_range.size - 1) // ipam_db_api.BLOCK_SIZE + 1
+
+    @staticmethod
+    def _block_range(ip_range, block_index):
+        first = ip_range.first + block_index * ipam_db_api.BLOCK_SIZE
+        last = min(first + ipam_db_api.BLOCK_SIZE - 1, ip_range.last)
+        return first, last
+
+    @property
+    def _ip_version(self):
+        return netaddr.IPNetwork(self._cidr).version
+
+    def _create_block(self, session, pool_id, ip_range, block_index):
+        first, last = self._block_range(ip_range, block_index)
+        ip_version = self._ip_version
+        addresses = [str(netaddr.IPAddress(ip, ip_version))
+                     for ip in range(first, last + 1)]
+        allocated = self.subnet_manager.list_allocated_addresses(session,
+                                                                 addresses)
+        bitmap = 0
+        for offset, address in enumerate(addresses):
+            if address in allocated:
+                bitmap |= 1 << offset
+        return self.subnet_manager.create_block(
+            session, pool_id, block_index, len(addresses) - len(allocated),
+            bitmap)
+
+    def _find_free_block(self, session, pool_id, ip_range, block_index):
+        """Return a block of a pool with free addresses, or None.
+
+        The block block_index is returned if it has free addresses,
+        otherwise the next existing block with free addresses, otherwise
+        the first block which has not been created yet.
+        """
+        block = (self.subnet_manager.get_block(session, pool_id, block_index)
+                 or self._create_block(session, pool_id, ip_range,
+                                       block_index))
+        if block.free:
+            return block
+        block = self.subnet_manager.get_next_free_block(session, pool_id,
+                                                        block_index)
+        if block:
+            return block
+        block_count = self._block_count(ip_range)
+        while True:
+            block_index = self.subnet_manager.get_missing_block_index(
+                session, pool_id, block_count)
+            if block_index is None:
+                return
+            block = self._create_block(session, pool_id, ip_range,
+                                       block_index)
+            if block.free:
+                return block
+
+    def _claim_free_ip(self, session, block, ip_range):
+        first, last = self._block_range(ip_range, block.block_index)
+        bitmap = int(block.bitmap, 16)
+        offsets = [offset for offset in range(last - first + 1)
+                   if not bitmap & 1 << offset]
+        if not offsets:
+            return
+        offset = random.choice(offsets)
+        if self.subnet_manager.update_block(session, block,
+                                            bitmap | 1 << offset,
+                                            len(offsets) - 1):
+            return str(netaddr.IPAddress(first + offset, self._ip_version))
+
+    def _generate_ip(self, session):
+        """Generate an IP address from the blocks of the allocation pools.
+
+        The search starts at a random address of the pools, so that
+        concurrent allocations look for free addresses in different
+        blocks.
+        """
+        pools = self._list_pools(session)
+        if not pools:
+            raise ipam_exc.IpAddressGenerationFailure(
+                subnet_id=self.subnet_manager.neutron_id)
+        for attempt in range(self.MAX_BLOCK_ATTEMPTS):
+            offset = random.randrange(sum(ip_range.size
+                                          for pool_id, ip_range in pools))
+            for index, (pool_id, ip_range) in enumerate(pools):
+                if offset < ip_range.size:
+                    break
+                offset -= ip_range.size
+            block_index = offset // ipam_db_api.BLOCK_SIZE
+            for pool_id, ip_range in pools[index:] + pools[:index]:
+                block = self._find_free_block(session, pool_id, ip_range,
+                                              block_index)
+                if block:
+                    break
+                block_index = 0
+            else:
+                LOG.debug("All IPs from subnet %(subnet_id)s allocated",
+                          {'subnet_id': self.subnet_manager.neutron_id})
+                raise ipam_exc.IpAddressGenerationFailure(
+                    subnet_id=self.subnet_manager.neutron_id)
+            ip_address = self._claim_free_ip(session, block, ip_range)
+            if ip_address:
+                LOG.debug("Allocated IP - %(ip_address)s from block "
+                          "%(block)s of pool %(pool)s",
+                          {'ip_address': ip_address,
+                           'block': block.block_index, 'pool': pool_id})
+                return ip_address
+        # Every block tried was updated concurrently, or this transaction
+        # only sees outdated bitmaps.
+        raise db_exc.RetryRequest(ipam_exc.IpAddressGenerationFailure(
+            subnet_id=self.subnet_manager.neutron_id))
+
+    def _update_ip_bit(self, session, ip_address, allocated):
+        """Set or clear the bit of an address in its block.
+
+        Addresses outside of the allocation pools have no block. Blocks
+        not created yet are left alone on deallocation, as they will be
+        created from the remaining allocations.
+        """
+        ip = int(netaddr.IPAddress(ip_address))
+        for pool_id, ip_range in self._list_pools(session):
+            if ip_range.first <= ip <= ip_range.last:
+                break
+        else:
+            return
+        block_index = (ip - ip_range.first) // ipam_db_api.BLOCK_SIZE
+        mask = 1 << (ip - ip_range.first) % ipam_db_api.BLOCK_SIZE
+        for attempt in range(self.MAX_BLOCK_ATTEMPTS):
+            block = self.subnet_manager.get_block(session, pool_id,
+                                                  block_index)
+            if not block:
+                if not allocated:
+                    return
+                block = self._create_block(session, pool_id, ip_range,
+                                           block_index)
+            bitmap = int(block.bitmap, 16)
+            if bool(bitmap & mask) == allocated:
+                if allocated:
+                    raise ipam_exc.IpAddressAlreadyAllocated(
+                        subnet_id=self.subnet_manager.neutron_id,
+                        ip=ip_address)
+                return
+            if allocated:
+                updated = self.subnet_manager.update_block(
+                    session, block, bitmap | mask, block.free - 1)
+            else:
+                updated = self.subnet_manager.update_block(
+                    session, block, bitmap & ~mask, block.free + 1)
+            if updated:
+                return
+        raise db_exc.RetryRequest(ipam_exc.IpAddressGenerationFailure(
+            subnet_id=self.subnet_manager.neutron_id))
+
+    def allocate(self, address_request):
+        session = self._context.session
+        if isinstance(address_request, ipam_req.SpecificAddressRequest):
+            ip_address = str(address_request.address)
+            self._verify_ip(session, ip_address)
+            self._update_ip_bit(session, ip_address, True)
+        else:
+            ip_address = self._generate_ip(session)
+        self.subnet_manager.create_allocation(session, ip_address)
+        return ip_address
+
+    def _release_ip(self, session, ip_address):
+        self._update_ip_bit(session, ip_address, False)
+
+    def repair_availability_ranges(self, session):
+        # There are no availability ranges to repair, the blocks are
+        # created from the allocations of the subnet.
+        pass
+
+    def update_allocation_pools(self, pools, cidr):
+        session = db_api.get_session()
+        self.subnet_manager.delete_allocation_blocks(session)
+        super(NeutronDbBlockSubnet, self).update_allocation_pools(pools,
+                                                                  cidr)
+
+
 class NeutronDbPool(subnet_alloc.SubnetAllocator):
     """Subnet pools backed by Neutron Database.
 
@@ -375,13 +653,15 @@ class NeutronDbPool(subnet_alloc.SubnetAllocator):
     operations are either trivial or no-ops.
     """
 
+    subnet_class = NeutronDbSubnet
+
     def get_subnet(self, subnet_id):
         """Retrieve an IPAM subnet.
 
         :param subnet_id: Neutron subnet identifier
         :returns: a NeutronDbSubnet instance
         """
-        return NeutronDbSubnet.load(subnet_id, self._context)
+        return self.subnet_class.load(subnet_id, self._context)
 
     def allocate_subnet(self, subnet_request):
         """Create an IPAMSubnet object for the provided cidr.
@@ -400,8 +680,8 @@ class NeutronDbPool(subnet_alloc.SubnetAllocator):
         if not isinstance(subnet_request, ipam_req.SpecificSubnetRequest):
             raise ipam_exc.InvalidSubnetRequestType(
                 subnet_type=type(subnet_request))
-        return NeutronDbSubnet.create_from_subnet_request(subnet_request,
-                                                          self._context)
+        return self.subnet_class.create_from_subnet_request(subnet_request,
+                                                            self._context)
 
     def update_subnet(self, subnet_request):
         """Update subnet info the in the IPAM driver.
@@ -418,11 +698,21 @@ class NeutronDbPool(subnet_alloc.SubnetAllocator):
                       "new allocation pools, there is nothing to do",
                       subnet_request.subnet_id)
             return
-        subnet = NeutronDbSubnet.load(subnet_request.subnet_id, self._context)
+        subnet = self.subnet_class.load(subnet_request.subnet_id,
+                                        self._context)
         cidr = netaddr.IPNetwork(subnet._cidr)
         subnet.update_allocation_pools(subnet_request.allocation_pools, cidr)
         return subnet
 
+    def repair_availability_ranges(self):
+        """Repair the availability ranges of all the IPAM subnets."""
+        session = self._context.session
+        for ipam_subnet in ipam_db_api.IpamSubnetManager.load_all(session):
+            subnet = self.subnet_class(ipam_subnet['id'], self._context,
+                                       subnet_id=ipam_subnet[
+                                           'neutron_subnet_id'])
+            subnet.repair_availability_ranges(session)
+
     def remove_subnet(self, subnet_id):
         """Remove data structures for a given subnet.
 
@@ -436,3 +726,9 @@ class NeutronDbPool(subnet_alloc.SubnetAllocator):
                           "Neutron subnet %s does not exist"),
                       subnet_id)
             raise n_exc.SubnetNotFound(subnet_id=subnet_id)
+
+
+class NeutronDbBlockPool(NeutronDbPool):
+    """Subnet pools backed by Neutron Database, using allocation bitmaps."""
+
+    subnet_class = NeutronDbBlockSubnet
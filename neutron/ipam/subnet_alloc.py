@@ -111,48 +111,141 @@ class SubnetAllocator(driver.Pool):
             if used + requested_units > quota:
                 raise n_exc.SubnetPoolQuotaExceeded()
 
+    def _get_free_prefix_query(self):
+        return self._context.session.query(
+            models_v2.SubnetPoolFreePrefix).filter_by(
+                subnetpool_id=self._subnetpool['id'])
+
+    def _add_free_prefix(self, prefix):
+        self._context.session.add(models_v2.SubnetPoolFreePrefix(
+            subnetpool_id=self._subnetpool['id'],
+            cidr=str(prefix),
+            prefixlen=prefix.prefixlen,
+            network='%032x' % prefix.first))
+
+    def _rebuild_free_prefixes(self):
+        """Rebuild the free prefixes of the pool from its subnets."""
+        self._get_free_prefix_query().delete(synchronize_session='fetch')
+        for prefix in self._get_available_prefix_list():
+            self._add_free_prefix(prefix)
+
+    def _find_free_prefix(self, query):
+        """Return the first free prefix matching query.
+
+        Free prefixes are not tracked for pools created before they were,
+        and a pool without free prefixes can't be told from a full one: the
+        free prefixes are rebuilt once before giving up.
+        """
+        free_prefix = query().first()
+        if free_prefix is None:
+            self._rebuild_free_prefixes()
+            free_prefix = query().first()
+        return free_prefix
+
+    def _take_free_prefix(self, free_prefix, cidr):
+        """Allocate cidr from the free prefix containing it.
+
+        The free prefix is halved down to the length of cidr, the halves
+        not containing cidr are kept free.
+        """
+        self._context.session.delete(free_prefix)
+        prefix = netaddr.IPNetwork(free_prefix.cidr)
+        for prefixlen in range(prefix.prefixlen + 1, cidr.prefixlen + 1):
+            lower, upper = prefix.subnet(prefixlen)
+            if cidr.first <= lower.last:
+                prefix, buddy = lower, upper
+            else:
+                prefix, buddy = upper, lower
+            self._add_free_prefix(buddy)
+
     def _allocate_any_subnet(self, request):
+        model = models_v2.SubnetPoolFreePrefix
+
+        def query():
+            # The smallest free prefix large enough, the same one as the
+            # first one of _get_available_prefix_list
+            return self._get_free_prefix_query().filter(
+                model.prefixlen <= request.prefixlen).order_by(
+                    model.prefixlen.desc(), model.network)
+
         with self._context.session.begin(subtransactions=True):
             self._lock_subnetpool()
             self._check_subnetpool_tenant_quota(request.tenant_id,
                                                 request.prefixlen)
-            prefix_pool = self._get_available_prefix_list()
-            for prefix in prefix_pool:
-                if request.prefixlen >= prefix.prefixlen:
-                    subnet = next(prefix.subnet(request.prefixlen))
-                    gateway_ip = request.gateway_ip
-                    if not gateway_ip:
-                        gateway_ip = subnet.network + 1
-                    pools = ipam_utils.generate_pools(subnet.cidr,
-                                                      gateway_ip)
-
-                    return IpamSubnet(request.tenant_id,
-                                      request.subnet_id,
-                                      subnet.cidr,
-                                      gateway_ip=gateway_ip,
-                                      allocation_pools=pools)
+            free_prefix = self._find_free_prefix(query)
+            if free_prefix is not None:
+                prefix = netaddr.IPNetwork(free_prefix.cidr)
+                subnet = next(prefix.subnet(request.prefixlen))
+                self._take_free_prefix(free_prefix, subnet)
+                gateway_ip = request.gateway_ip
+                if not gateway_ip:
+                    gateway_ip = subnet.network + 1
+                pools = ipam_utils.generate_pools(subnet.cidr,
+                                                  gateway_ip)
+
+                return IpamSubnet(request.tenant_id,
+                                  request.subnet_id,
+                                  subnet.cidr,
+                                  gateway_ip=gateway_ip,
+                                  allocation_pools=pools)
             msg = _("Insufficient prefix space to allocate subnet size /%s")
             raise n_exc.SubnetAllocationError(reason=msg %
                                               str(request.prefixlen))
 
     def _allocate_specific_subnet(self, request):
+        model = models_v2.SubnetPoolFreePrefix
+        cidr = request.subnet_cidr.cidr
+        supernets = [str(prefix) for prefix in [cidr] + cidr.supernet()]
+
+        def query():
+            return self._get_free_prefix_query().filter(
+                model.cidr.in_(supernets))
+
         with self._context.session.begin(subtransactions=True):
             self._lock_subnetpool()
             self._check_subnetpool_tenant_quota(request.tenant_id,
                                                 request.prefixlen)
-            cidr = request.subnet_cidr
-            available = self._get_available_prefix_list()
-            matched = netaddr.all_matching_cidrs(cidr, available)
-            if len(matched) is 1 and matched[0].prefixlen <= cidr.prefixlen:
+            free_prefix = self._find_free_prefix(query)
+            if free_prefix is not None:
+                self._take_free_prefix(free_prefix, cidr)
                 return IpamSubnet(request.tenant_id,
                                   request.subnet_id,
-                                  cidr,
+                                  request.subnet_cidr,
                                   gateway_ip=request.gateway_ip,
                                   allocation_pools=request.allocation_pools)
             msg = _("Cannot allocate requested subnet from the available "
                     "set of prefixes")
             raise n_exc.SubnetAllocationError(reason=msg)
 
+    def release_subnet(self, cidr):
+        """Give the prefix of a deleted subnet back to the pool.
+
+        The prefix is merged with its free buddies, up to the largest free
+        prefix containing it.
+        """
+        model = models_v2.SubnetPoolFreePrefix
+        prefix = netaddr.IPNetwork(cidr).cidr
+        supernets = [str(net) for net in [prefix] + prefix.supernet()]
+        with self._context.session.begin(subtransactions=True):
+            self._lock_subnetpool()
+            query = self._get_free_prefix_query()
+            if (not query.first() or
+                    query.filter(model.cidr.in_(supernets)).first()):
+                # NOTE: free prefixes are either not tracked yet and will be
+                # rebuilt by the next allocation, or were rebuilt after the
+                # deletion of the subnet
+                return
+            while prefix.prefixlen:
+                supernet = prefix.supernet(prefix.prefixlen - 1)[0]
+                lower, upper = supernet.subnet(prefix.prefixlen)
+                buddy = upper if prefix == lower else lower
+                free_buddy = query.filter_by(cidr=str(buddy)).first()
+                if free_buddy is None:
+                    break
+                self._context.session.delete(free_buddy)
+                prefix = supernet
+            self._add_free_prefix(prefix)
+
     def allocate_subnet(self, request):
         max_prefixlen = int(self._subnetpool['max_prefixlen'])
         min_prefixlen = int(self._subnetpool['min_prefixlen'])
@@ -15,6 +15,8 @@
 
 import netaddr
 
+from neutron.common import ipv6_utils
+
 
 def check_subnet_ip(cidr, ip_address):
     """Validate that the IP address is on the subnet."""
@@ -59,3 +61,50 @@ def generate_pools(cidr, gateway_ip):
     if gateway_ip:
         ipset.remove(netaddr.IPAddress(gateway_ip, ip_version))
     return list(ipset.iter_ipranges())
+
+
+def get_adjacent_ranges(ip_ranges, ip_address):
+    """Find the availability ranges a released IP address joins.
+
+    :param ip_ranges: availability ranges of the allocation pool of the
+        address, as objects with first_ip and last_ip attributes
+    :param ip_address: the IP address given back to the pool
+    :returns: a tuple with the range ending right before the address and
+        the range starting right after it, either of them None if there is
+        no such range, or None if the address is already available
+    """
+    ip = netaddr.IPAddress(ip_address)
+    before = after = None
+    for ip_range in ip_ranges:
+        first = netaddr.IPAddress(ip_range['first_ip'])
+        last = netaddr.IPAddress(ip_range['last_ip'])
+        if first <= ip <= last:
+            return
+        if last + 1 == ip:
+            before = ip_range
+        elif first - 1 == ip:
+            after = ip_range
+    return before, after
+
+
+def check_availability_ranges(pools, ip_ranges, allocations):
+    """Validate that availability ranges match the allocations of a subnet.
+
+    The ranges must hold exactly the addresses of the pools which are not
+    allocated. EUI-64 addresses are ignored, they are not taken out of the
+    ranges when they are allocated.
+
+    :param pools: allocation pools of the subnet, as netaddr.IPRange
+    :param ip_ranges: availability ranges of the subnet, as netaddr.IPRange
+    :param allocations: IP addresses allocated on the subnet
+    """
+    allocated = netaddr.IPSet(allocations)
+    eui64 = netaddr.IPSet(ip for ip in allocations
+                          if ipv6_utils.is_eui64_address(ip))
+    available = netaddr.IPSet()
+    for ip_range in ip_ranges:
+        available.add(ip_range)
+    free = netaddr.IPSet()
+    for pool in pools:
+        free.add(pool)
+    return free - allocated == available - eui64
@@ -59,7 +59,15 @@ ml2_opts = [
                       "will have the same type as tenant networks. Allowed "
                       "values for external_network_type config option depend "
                       "on the network type values configured in type_drivers "
-                      "config option."))
+                      "config option.")),
+    cfg.StrOpt('tunnel_allocation_layout', default='dense',
+               choices=['dense', 'sparse'],
+               help=_("Layout of the allocation tables of the tunnel type "
+                      "drivers. 'dense' stores one row per tunnel id of the "
+                      "configured ranges, allocated or not. 'sparse' stores "
+                      "only the allocated tunnel ids and looks for free ones "
+                      "in the gaps between them. The tables are converted "
+                      "when neutron-server starts with another layout."))
 ]
 
 
@@ -244,6 +244,15 @@ def get_port(session, port_id):
             return
 
 
+def get_ports_by_ids(session, port_ids):
+    """Get the port records with the given non-truncated ids."""
+
+    if not port_ids:
+        return []
+    return (session.query(models_v2.Port).
+            filter(models_v2.Port.id.in_(port_ids)).all())
+
+
 def get_port_from_device_mac(context, device_mac):
     LOG.debug("get_port_from_device_mac() called for mac %s", device_mac)
     qry = context.session.query(models_v2.Port).filter_by(
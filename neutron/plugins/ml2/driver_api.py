@@ -877,6 +877,12 @@ class MechanismDriver(object):
         bind_port, or else must ensure that such state changes are
         eventually cleaned up.
 
+        Drivers whose binding results only depend on the host, the
+        network, binding:vnic_type and binding:profile of the port may
+        set a supports_bulk_binding attribute to True. Ports created
+        in bulk are then bound by calling bind_port once per group of
+        ports sharing these values.
+
         Implementing this method explicitly declares the mechanism
         driver as having the intention to bind ports. This is inspected
         by the QoS service to identify the available QoS rules you
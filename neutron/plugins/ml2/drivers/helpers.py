@@ -13,11 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
 import random
 
 from oslo_config import cfg
 from oslo_db import exception as db_exc
 from oslo_log import log
+import sqlalchemy as sa
 
 from neutron.common import exceptions as exc
 from neutron.common import utils
@@ -26,7 +28,8 @@ from neutron.plugins.ml2 import driver_api as api
 
 LOG = log.getLogger(__name__)
 
-IDPOOL_SELECT_SIZE = 100
+# Number of free segments claimed at once in the local pool of a process
+IDPOOL_SELECT_SIZE = 10
 
 
 class BaseTypeDriver(api.TypeDriver):
@@ -49,6 +52,12 @@ class SegmentTypeDriver(BaseTypeDriver):
 
     Provide methods helping to perform segment allocation fully or partially
     specified.
+
+    Partially specified segments are taken from a pool of free segments local
+    to the process. The pool is refilled by batches read from the segment
+    table, starting at a random point of the id space and then walking it, so
+    that API workers allocating concurrently pick segments from different
+    parts of the id space instead of competing for the same rows.
     """
 
     def __init__(self, model):
@@ -56,6 +65,17 @@ class SegmentTypeDriver(BaseTypeDriver):
         self.model = model
         self.primary_keys = set(dict(model.__table__.columns))
         self.primary_keys.remove("allocated")
+        self.segment_id_column = next(
+            column.name for column in model.__table__.primary_key.columns
+            if isinstance(column.type, sa.Integer))
+        self._reset_segment_pools()
+
+    def _reset_segment_pools(self):
+        # Free segments claimed by this process and the segment id where the
+        # next batch starts, both per allocation filters.
+        self._pools_pid = os.getpid()
+        self._segment_pools = {}
+        self._segment_cursors = {}
 
     def allocate_fully_specified_segment(self, session, **raw_segment):
         """Allocate segment fully specified by raw_segment.
@@ -113,45 +133,102 @@ class SegmentTypeDriver(BaseTypeDriver):
 
         return alloc
 
-    def allocate_partially_specified_segment(self, session, **filters):
-        """Allocate model segment from pool partially specified by filters.
+    def _get_segment_pool(self, filters):
+        if self._pools_pid != os.getpid():
+            # Forked API worker, do not share the pools of the parent
+            self._reset_segment_pools()
+        key = tuple(sorted(filters.items()))
+        return key, self._segment_pools.setdefault(key, [])
 
-        Return allocated db object or None.
+    def _claim_free_segments(self, session, filters):
+        """Read the next batch of free segments into the local pool.
+
+        Return the number of claimed segments, 0 if none is free.
         """
 
-        network_type = self.get_type()
-        with session.begin(subtransactions=True):
-            select = (session.query(self.model).
-                      filter_by(allocated=False, **filters))
+        key, pool = self._get_segment_pool(filters)
+        column = getattr(self.model, self.segment_id_column)
+        select = (session.query(self.model).
+                  filter_by(allocated=False, **filters))
+        cursor = self._segment_cursors.get(key)
+        if cursor is None:
+            low, high = select.with_entities(
+                sa.func.min(column), sa.func.max(column)).one()
+            if low is None:
+                # No resource available
+                return 0
+            cursor = random.randint(low, high)
+
+        allocs = (select.filter(column >= cursor).order_by(column).
+                  limit(IDPOOL_SELECT_SIZE).all())
+        if len(allocs) < IDPOOL_SELECT_SIZE:
+            # End of the id space reached, wrap to its beginning
+            allocs += (select.filter(column < cursor).order_by(column).
+                       limit(IDPOOL_SELECT_SIZE - len(allocs)).all())
+        if not allocs:
+            self._segment_cursors.pop(key, None)
+            return 0
+
+        self._segment_cursors[key] = allocs[-1][self.segment_id_column] + 1
+        # Segments are popped from the end of the pool, another greenthread
+        # may have claimed the same batch meanwhile
+        for alloc in reversed(allocs):
+            raw_segment = dict((k, alloc[k]) for k in self.primary_keys)
+            if raw_segment not in pool:
+                pool.append(raw_segment)
+        return len(pool)
 
-            # Selected segment can be allocated before update by someone else,
-            allocs = select.limit(IDPOOL_SELECT_SIZE).all()
+    def _try_allocate_segment(self, session, raw_segment):
+        """Mark raw_segment allocated if it is still free.
 
-            if not allocs:
-                # No resource available
-                return
+        Return True on success, False if it has been allocated or deleted
+        since it was claimed.
+        """
 
-            alloc = random.choice(allocs)
-            raw_segment = dict((k, alloc[k]) for k in self.primary_keys)
+        network_type = self.get_type()
+        LOG.debug("%(type)s segment allocate from pool "
+                  "started with %(segment)s ",
+                  {"type": network_type,
+                   "segment": raw_segment})
+        count = (session.query(self.model).
+                 filter_by(allocated=False, **raw_segment).
+                 update({"allocated": True}))
+        if count:
             LOG.debug("%(type)s segment allocate from pool "
-                      "started with %(segment)s ",
+                      "success with %(segment)s ",
                       {"type": network_type,
                        "segment": raw_segment})
-            count = (session.query(self.model).
-                     filter_by(allocated=False, **raw_segment).
-                     update({"allocated": True}))
-            if count:
-                LOG.debug("%(type)s segment allocate from pool "
-                          "success with %(segment)s ",
-                          {"type": network_type,
-                           "segment": raw_segment})
-                return alloc
-
-            # Segment allocated since select
-            LOG.debug("Allocate %(type)s segment from pool "
-                      "failed with segment %(segment)s",
-                      {"type": network_type,
-                       "segment": raw_segment})
-            # saving real exception in case we exceeded amount of attempts
-            raise db_exc.RetryRequest(
-                exc.NoNetworkFoundInMaximumAllowedAttempts())
+            return True
+
+        # Segment allocated since claimed
+        LOG.debug("Allocate %(type)s segment from pool "
+                  "failed with segment %(segment)s",
+                  {"type": network_type,
+                   "segment": raw_segment})
+        return False
+
+    def allocate_partially_specified_segment(self, session, **filters):
+        """Allocate model segment from pool partially specified by filters.
+
+        Return allocated db object or None.
+        """
+
+        with session.begin(subtransactions=True):
+            pool = self._get_segment_pool(filters)[1]
+            claimed = False
+            while True:
+                if not pool:
+                    if claimed:
+                        # A whole batch got allocated by someone else,
+                        # saving real exception in case we exceeded amount
+                        # of attempts
+                        raise db_exc.RetryRequest(
+                            exc.NoNetworkFoundInMaximumAllowedAttempts())
+                    if not self._claim_free_segments(session, filters):
+                        # No resource available
+                        return
+                    claimed = True
+
+                raw_segment = pool.pop()
+                if self._try_allocate_segment(session, raw_segment):
+                    return self.model(allocated=True, **raw_segment)
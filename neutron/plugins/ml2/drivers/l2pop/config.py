@@ -20,6 +20,23 @@ l2_population_options = [
     cfg.IntOpt('agent_boot_time', default=180,
                help=_('Delay within which agent is expected to update '
                       'existing ports whent it restarts')),
+    cfg.FloatOpt('fdb_batch_interval', default=0.5,
+                 help=_('Seconds during which the fdb entries added and '
+                        'removed by port events are merged before being '
+                        'sent to the agents as one message per interval. '
+                        'If <= 0, each port event is sent immediately.')),
+    cfg.BoolOpt('targeted_fdb_notifications', default=True,
+                help=_('Send the fdb entries of a network only to the agents '
+                       'having active ports on it, instead of on the fanout '
+                       'topic every agent listens to.')),
+    cfg.IntOpt('network_hosts_cache_ttl', default=0,
+               help=_('Seconds during which the hosts having active ports '
+                      'on a network are cached for targeted fdb '
+                      'notifications. The cache is only updated by the port '
+                      'events handled by the same neutron-server process, '
+                      'when several processes handle them a host may miss '
+                      'fdb entries for up to this delay. If <= 0, the hosts '
+                      'are read from the database for each port event.')),
 ]
 
 cfg.CONF.register_opts(l2_population_options, "l2pop")
@@ -92,6 +92,17 @@ class L2populationDbMixin(base_db.CommonDbMixin):
                                      l2_const.SUPPORTED_AGENT_TYPES))
             return query
 
+    def get_active_network_hosts(self, session, network_id):
+        """Return the hosts of the agents with active ports on network_id."""
+        with session.begin(subtransactions=True):
+            hosts = set()
+            for query in (
+                    self.get_nondvr_active_network_ports(session, network_id),
+                    self.get_dvr_active_network_ports(session, network_id)):
+                query = query.with_entities(agents_db.Agent.host).distinct()
+                hosts.update(host for host, in query)
+            return hosts
+
     def get_agent_network_active_port_count(self, session, agent_host,
                                             network_id):
         with session.begin(subtransactions=True):
@@ -15,6 +15,7 @@
 
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import timeutils
 
 from neutron.common import constants as const
 from neutron import context as n_context
@@ -40,6 +41,38 @@ class L2populationMechanismDriver(api.MechanismDriver,
         LOG.debug("Experimental L2 population driver")
         self.rpc_ctx = n_context.get_admin_context_without_session()
         self.migrated_ports = {}
+        # Hosts with active ports per network, along with the time they have
+        # been read from the database: {<uuid>: (timestamp, set of hosts)}
+        self.network_hosts = {}
+
+    def _get_network_hosts(self, network_id):
+        """Return the hosts to send the fdb entries of network_id to.
+
+        The result maps network_id to the hosts of the agents having active
+        ports on it, it is None if the fdb entries are sent on the fanout
+        topic.
+        """
+        if not cfg.CONF.l2pop.targeted_fdb_notifications:
+            return
+        ttl = cfg.CONF.l2pop.network_hosts_cache_ttl
+        cached = self.network_hosts.get(network_id)
+        if cached and not timeutils.is_older_than(cached[0], ttl):
+            return {network_id: set(cached[1])}
+
+        session = db_api.get_session()
+        hosts = self.get_active_network_hosts(session, network_id)
+        if ttl > 0:
+            self.network_hosts[network_id] = (timeutils.utcnow(), hosts)
+        return {network_id: set(hosts)}
+
+    def _update_network_hosts(self, network_id, host, active):
+        """Add host to or remove it from the cached hosts of network_id."""
+        cached = self.network_hosts.get(network_id)
+        if cached:
+            if active:
+                cached[1].add(host)
+            else:
+                cached[1].discard(host)
 
     def _get_port_fdb_entries(self, port):
         return [l2pop_rpc.PortInfo(mac_address=port['mac_address'],
@@ -51,8 +84,13 @@ class L2populationMechanismDriver(api.MechanismDriver,
         agent_host = context.host
 
         fdb_entries = self._get_agent_fdb(context, port, agent_host)
-        self.L2populationAgentNotify.remove_fdb_entries(self.rpc_ctx,
-            fdb_entries)
+        self._remove_fdb_entries(fdb_entries, port)
+
+    def _remove_fdb_entries(self, fdb_entries, port):
+        if fdb_entries:
+            self.L2populationAgentNotify.remove_fdb_entries(
+                self.rpc_ctx, fdb_entries,
+                network_hosts=self._get_network_hosts(port['network_id']))
 
     def _get_diff_ips(self, orig, port):
         orig_ips = set([ip['ip_address'] for ip in orig['fixed_ips']])
@@ -95,7 +133,8 @@ class L2populationMechanismDriver(api.MechanismDriver,
             ports['after'] = port_mac_ip
 
         self.L2populationAgentNotify.update_fdb_entries(
-            self.rpc_ctx, {'chg_ip': upd_fdb_entries})
+            self.rpc_ctx, {'chg_ip': upd_fdb_entries},
+            network_hosts=self._get_network_hosts(port['network_id']))
 
         return True
 
@@ -123,8 +162,7 @@ class L2populationMechanismDriver(api.MechanismDriver,
                 agent_host = context.host
                 fdb_entries = self._get_agent_fdb(
                         context, port, agent_host)
-                self.L2populationAgentNotify.remove_fdb_entries(
-                    self.rpc_ctx, fdb_entries)
+                self._remove_fdb_entries(fdb_entries, port)
         elif (context.host != context.original_host
             and context.status == const.PORT_STATUS_ACTIVE
             and not self.migrated_ports.get(orig['id'])):
@@ -139,8 +177,7 @@ class L2populationMechanismDriver(api.MechanismDriver,
             elif context.status == const.PORT_STATUS_DOWN:
                 fdb_entries = self._get_agent_fdb(
                     context, port, context.host)
-                self.L2populationAgentNotify.remove_fdb_entries(
-                    self.rpc_ctx, fdb_entries)
+                self._remove_fdb_entries(fdb_entries, port)
             elif context.status == const.PORT_STATUS_BUILD:
                 orig = self.migrated_ports.pop(port['id'], None)
                 if orig:
@@ -149,8 +186,7 @@ class L2populationMechanismDriver(api.MechanismDriver,
                     # this port has been migrated: remove its entries from fdb
                     fdb_entries = self._get_agent_fdb(
                         context, original_port, original_host)
-                    self.L2populationAgentNotify.remove_fdb_entries(
-                        self.rpc_ctx, fdb_entries)
+                    self._remove_fdb_entries(fdb_entries, original_port)
 
     def _get_port_infos(self, context, port, agent_host):
         if not agent_host:
@@ -252,6 +288,7 @@ class L2populationMechanismDriver(api.MechanismDriver,
 
             # And notify other agents to add flooding entry
             other_fdb_ports[agent_ip].append(const.FLOODING_ENTRY)
+            self._update_network_hosts(network_id, agent_host, True)
 
             if agent_fdb_entries[network_id]['ports'].keys():
                 self.L2populationAgentNotify.add_fdb_entries(
@@ -261,8 +298,9 @@ class L2populationMechanismDriver(api.MechanismDriver,
         if port['device_owner'] != const.DEVICE_OWNER_DVR_INTERFACE:
             other_fdb_ports[agent_ip] += port_fdb_entries
 
-        self.L2populationAgentNotify.add_fdb_entries(self.rpc_ctx,
-                                                     other_fdb_entries)
+        self.L2populationAgentNotify.add_fdb_entries(
+            self.rpc_ctx, other_fdb_entries,
+            network_hosts=self._get_network_hosts(network_id))
 
     def _get_agent_fdb(self, context, port, agent_host):
         port_infos = self._get_port_infos(context, port, agent_host)
@@ -285,6 +323,7 @@ class L2populationMechanismDriver(api.MechanismDriver,
             # other agents needs to be notified to delete their flooding entry.
             other_fdb_entries[network_id]['ports'][agent_ip].append(
                 const.FLOODING_ENTRY)
+            self._update_network_hosts(network_id, agent_host, False)
         # Notify other agents to remove fdb rules for current port
         if port['device_owner'] != const.DEVICE_OWNER_DVR_INTERFACE:
             fdb_entries = port_fdb_entries
@@ -16,11 +16,14 @@
 import collections
 import copy
 
+import eventlet
+from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging
 
 from neutron.common import rpc as n_rpc
 from neutron.common import topics
+from neutron.plugins.ml2.drivers.l2pop import config  # noqa
 
 
 LOG = logging.getLogger(__name__)
@@ -38,6 +41,12 @@ class L2populationAgentNotifyAPI(object):
                                                         topics.UPDATE)
         target = oslo_messaging.Target(topic=topic, version='1.0')
         self.client = n_rpc.get_client(target)
+        # fdb entries added and removed since the last flush, per network:
+        # {<uuid>: {'segment_id': ..., 'network_type': ...,
+        # 'hosts': set of hosts to notify, None for the fanout topic,
+        # 'add': {<ip>: [PortInfo, ...]}, 'remove': {<ip>: [PortInfo, ...]}}}
+        self._pending_fdb_entries = {}
+        self._flush_scheduled = False
 
     def _notification_fanout(self, context, method, fdb_entries):
         LOG.debug('Fanout notify l2population agents at %(topic)s '
@@ -62,29 +71,143 @@ class L2populationAgentNotifyAPI(object):
         cctxt = self.client.prepare(topic=self.topic_l2pop_update, server=host)
         cctxt.cast(context, method, fdb_entries=marshalled_fdb_entries)
 
-    def add_fdb_entries(self, context, fdb_entries, host=None):
+    def _notification_network_hosts(self, context, method, fdb_entries,
+                                    network_hosts):
+        """Send fdb_entries only to the hosts of their networks.
+
+        network_hosts maps network ids to the hosts to notify, the entries of
+        the other networks are sent on the fanout topic.
+        """
+        if not network_hosts:
+            self._notification_fanout(context, method, fdb_entries)
+            return
+        fanout_entries = {}
+        host_entries = collections.defaultdict(dict)
+        for network_id, values in fdb_entries.items():
+            hosts = network_hosts.get(network_id)
+            if hosts is None:
+                fanout_entries[network_id] = values
+                continue
+            for host in hosts:
+                host_entries[host][network_id] = values
+        if fanout_entries:
+            self._notification_fanout(context, method, fanout_entries)
+        for host, entries in host_entries.items():
+            self._notification_host(context, method, entries, host)
+
+    def _merge_fdb_entries(self, action, fdb_entries, network_hosts):
+        """Merge fdb_entries into the pending fdb entries.
+
+        An entry cancels the same entry pending for the opposite action, so
+        that only the last change of an entry is sent.
+        """
+        opposite = 'remove' if action == 'add' else 'add'
+        for network_id, values in fdb_entries.items():
+            hosts = (network_hosts or {}).get(network_id)
+            pending = self._pending_fdb_entries.get(network_id)
+            if pending is None:
+                pending = self._pending_fdb_entries[network_id] = {
+                    'add': {}, 'remove': {},
+                    'hosts': set(hosts) if hosts is not None else None}
+            elif hosts is None:
+                pending['hosts'] = None
+            elif pending['hosts'] is not None:
+                pending['hosts'].update(hosts)
+            pending['segment_id'] = values.get('segment_id')
+            pending['network_type'] = values.get('network_type')
+            for agent_ip, port_infos in values.get('ports', {}).items():
+                entries = pending[action].setdefault(agent_ip, [])
+                opposite_entries = pending[opposite].get(agent_ip, [])
+                for port_info in port_infos:
+                    port_info = PortInfo(*port_info)
+                    if port_info in opposite_entries:
+                        opposite_entries.remove(port_info)
+                    if port_info not in entries:
+                        entries.append(port_info)
+
+    def _pop_pending_fdb_entries(self, action):
+        fdb_entries = {}
+        for network_id, pending in self._pending_fdb_entries.items():
+            ports = dict((agent_ip, port_infos)
+                         for agent_ip, port_infos in pending[action].items()
+                         if port_infos)
+            if ports:
+                fdb_entries[network_id] = {
+                    'segment_id': pending['segment_id'],
+                    'network_type': pending['network_type'],
+                    'ports': ports}
+        return fdb_entries
+
+    def flush_fdb_entries(self, context):
+        """Send the pending fdb entries, removals first."""
+        self._flush_scheduled = False
+        remove_fdb_entries = self._pop_pending_fdb_entries('remove')
+        add_fdb_entries = self._pop_pending_fdb_entries('add')
+        network_hosts = dict(
+            (network_id, pending['hosts'])
+            for network_id, pending in self._pending_fdb_entries.items()
+            if pending['hosts'] is not None)
+        self._pending_fdb_entries = {}
+        if remove_fdb_entries:
+            self._notification_network_hosts(context, 'remove_fdb_entries',
+                                             remove_fdb_entries,
+                                             network_hosts)
+        if add_fdb_entries:
+            self._notification_network_hosts(context, 'add_fdb_entries',
+                                             add_fdb_entries, network_hosts)
+
+    def _notification_later(self, context, method, fdb_entries,
+                            network_hosts):
+        interval = cfg.CONF.l2pop.fdb_batch_interval
+        if interval <= 0:
+            self._notification_network_hosts(context, method, fdb_entries,
+                                             network_hosts)
+            return
+        action = method.split('_', 1)[0]
+        self._merge_fdb_entries(action, fdb_entries, network_hosts)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            eventlet.spawn_after(interval, self.flush_fdb_entries, context)
+
+    def add_fdb_entries(self, context, fdb_entries, host=None,
+                        network_hosts=None):
         if fdb_entries:
             if host:
                 self._notification_host(context, 'add_fdb_entries',
                                         fdb_entries, host)
             else:
-                self._notification_fanout(context, 'add_fdb_entries',
-                                          fdb_entries)
+                self._notification_later(context, 'add_fdb_entries',
+                                         fdb_entries, network_hosts)
 
-    def remove_fdb_entries(self, context, fdb_entries, host=None):
+    def remove_fdb_entries(self, context, fdb_entries, host=None,
+                           network_hosts=None):
         if fdb_entries:
             if host:
                 self._notification_host(context, 'remove_fdb_entries',
                                         fdb_entries, host)
             else:
-                self._notification_fanout(context, 'remove_fdb_entries',
-                                          fdb_entries)
+                self._notification_later(context, 'remove_fdb_entries',
+                                         fdb_entries, network_hosts)
 
-    def update_fdb_entries(self, context, fdb_entries, host=None):
+    def update_fdb_entries(self, context, fdb_entries, host=None,
+                           network_hosts=None):
         if fdb_entries:
+            if self._pending_fdb_entries:
+                # Entries changed by the update may still be pending
+                self.flush_fdb_entries(context)
+            # The entries are grouped by action, then by network
+            network_ids = set(network_id for values in fdb_entries.values()
+                              for network_id in values)
             if host:
                 self._notification_host(context, 'update_fdb_entries',
                                         fdb_entries, host)
+            elif network_hosts and network_ids.issubset(network_hosts):
+                hosts = set()
+                for network_id in network_ids:
+                    hosts.update(network_hosts[network_id])
+                for host in hosts:
+                    self._notification_host(context, 'update_fdb_entries',
+                                            fdb_entries, host)
             else:
                 self._notification_fanout(context, 'update_fdb_entries',
                                           fdb_entries)
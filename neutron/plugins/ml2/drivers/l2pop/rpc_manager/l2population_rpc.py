@@ -156,6 +156,38 @@ class L2populationRpcCallBackTunnelMixin(L2populationRpcCallBackMixin):
         '''
         pass
 
+    def add_fdb_flood_flows(self, br, lvm, flood_ports):
+        '''Add the flooding entries of several remote agents
+
+        This method is used by method fdb_add_tun, once per network, with
+        the flooding entries of every remote agent of the fdb entries.
+        The default implementation calls add_fdb_flow for each of them,
+        agents can override it to update the flooding flow only once.
+
+        :param br: represent the bridge on which add_fdb_flood_flows should
+        be applied.
+        :param lvm: a local VLAN map of network.
+        :param flood_ports: list of (remote_ip, ofport) pairs.
+        '''
+        for remote_ip, ofport in flood_ports:
+            self.add_fdb_flow(br, n_const.FLOODING_ENTRY, remote_ip, lvm,
+                              ofport)
+
+    def del_fdb_flood_flows(self, br, lvm, flood_ports):
+        '''Delete the flooding entries of several remote agents
+
+        This method is used by method fdb_remove_tun, once per network, the
+        same way as add_fdb_flood_flows.
+
+        :param br: represent the bridge on which del_fdb_flood_flows should
+        be applied.
+        :param lvm: a local VLAN map of network.
+        :param flood_ports: list of (remote_ip, ofport) pairs.
+        '''
+        for remote_ip, ofport in flood_ports:
+            self.del_fdb_flow(br, n_const.FLOODING_ENTRY, remote_ip, lvm,
+                              ofport)
+
     @abc.abstractmethod
     def setup_tunnel_port(self, br, remote_ip, network_type):
         '''Setup an added tunnel port.
@@ -226,6 +258,7 @@ class L2populationRpcCallBackTunnelMixin(L2populationRpcCallBackMixin):
 
     @log_helpers.log_method_call
     def fdb_add_tun(self, context, br, lvm, agent_ports, lookup_port):
+        flood_ports = []
         for remote_ip, ports in agent_ports.items():
             # Ensure we have a tunnel port with this remote agent
             ofport = lookup_port(lvm.network_type, remote_ip)
@@ -235,19 +268,30 @@ class L2populationRpcCallBackTunnelMixin(L2populationRpcCallBackMixin):
                 if ofport == 0:
                     continue
             for port in ports:
-                self.add_fdb_flow(br, port, remote_ip, lvm, ofport)
+                if port == n_const.FLOODING_ENTRY:
+                    flood_ports.append((remote_ip, ofport))
+                else:
+                    self.add_fdb_flow(br, port, remote_ip, lvm, ofport)
+        if flood_ports:
+            self.add_fdb_flood_flows(br, lvm, flood_ports)
 
     @log_helpers.log_method_call
     def fdb_remove_tun(self, context, br, lvm, agent_ports, lookup_port):
+        flood_ports = []
         for remote_ip, ports in agent_ports.items():
             ofport = lookup_port(lvm.network_type, remote_ip)
             if not ofport:
                 continue
             for port in ports:
-                self.del_fdb_flow(br, port, remote_ip, lvm, ofport)
                 if port == n_const.FLOODING_ENTRY:
-                    # Check if this tunnel port is still used
-                    self.cleanup_tunnel_port(br, ofport, lvm.network_type)
+                    flood_ports.append((remote_ip, ofport))
+                else:
+                    self.del_fdb_flow(br, port, remote_ip, lvm, ofport)
+        if flood_ports:
+            self.del_fdb_flood_flows(br, lvm, flood_ports)
+            for remote_ip, ofport in flood_ports:
+                # Check if this tunnel port is still used
+                self.cleanup_tunnel_port(br, ofport, lvm.network_type)
 
     @log_helpers.log_method_call
     def fdb_update(self, context, fdb_entries):
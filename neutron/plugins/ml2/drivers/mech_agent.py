@@ -112,8 +112,14 @@ class SimpleAgentMechanismDriverBase(AgentMechanismDriverBase):
     MechanismDrivers using this base class must pass the agent type
     and the values for binding:vif_type and binding:vif_details to
     __init__(), and must implement check_segment_for_agent().
+
+    Since bindings only depend on the agent of the host and the
+    segments of the network, ports created in bulk are bound once per
+    host and network.
     """
 
+    supports_bulk_binding = True
+
     def __init__(self, agent_type, vif_type, vif_details,
                  supported_vnic_types=[portbindings.VNIC_NORMAL]):
         """Initialize base class for specific L2 agent type.
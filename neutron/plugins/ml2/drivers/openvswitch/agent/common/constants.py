@@ -66,6 +66,18 @@ CANARY_TABLE = 23
 # Table for ARP poison/spoofing prevention rules
 ARP_SPOOF_TABLE = 24
 
+# Table switching the traffic which passed the checks of table 0 and of the
+# anti-spoofing table, the openvswitch firewall driver classifies it there
+TRANSIENT_TABLE = 60
+
+# Tables for the openvswitch firewall driver, traffic sent by a port goes
+# through the egress tables, traffic towards a port through the ingress ones
+BASE_EGRESS_TABLE = 71
+RULES_EGRESS_TABLE = 72
+ACCEPT_OR_INGRESS_TABLE = 73
+BASE_INGRESS_TABLE = 81
+RULES_INGRESS_TABLE = 82
+
 # type for ARP reply in ARP header
 ARP_REPLY = '0x2'
 
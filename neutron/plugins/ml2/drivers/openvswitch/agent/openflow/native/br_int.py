@@ -38,7 +38,8 @@ class OVSIntegrationBridge(ovs_bridge.OVSAgentBridge):
     """openvswitch agent br-int specific logic."""
 
     def setup_default_table(self):
-        self.install_normal()
+        self.install_goto(dest_table_id=constants.TRANSIENT_TABLE)
+        self.install_normal(table_id=constants.TRANSIENT_TABLE)
         self.setup_canary_table()
         self.install_drop(table_id=constants.ARP_SPOOF_TABLE)
 
@@ -70,11 +71,14 @@ class OVSIntegrationBridge(ovs_bridge.OVSAgentBridge):
         match = self._local_vlan_match(ofp, ofpp, port, vlan_vid)
         actions += [
             ofpp.OFPActionSetField(vlan_vid=lvid | ofp.OFPVID_PRESENT),
-            ofpp.OFPActionOutput(ofp.OFPP_NORMAL, 0),
         ]
-        self.install_apply_actions(priority=3,
-                                   match=match,
-                                   actions=actions)
+        instructions = [
+            ofpp.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS, actions),
+            ofpp.OFPInstructionGotoTable(table_id=constants.TRANSIENT_TABLE),
+        ]
+        self.install_instructions(priority=3,
+                                  match=match,
+                                  instructions=instructions)
 
     def reclaim_local_vlan(self, port, segmentation_id):
         (_dp, ofp, ofpp) = self._get_dp()
@@ -160,8 +164,9 @@ class OVSIntegrationBridge(ovs_bridge.OVSAgentBridge):
         # that actually belong to the port.
         for ip in ip_addresses:
             masked_ip = self._cidr_to_ryu(ip)
-            self.install_normal(
+            self.install_goto(
                 table_id=constants.ARP_SPOOF_TABLE, priority=2,
+                dest_table_id=constants.TRANSIENT_TABLE,
                 eth_type=ether_types.ETH_TYPE_IPV6,
                 ip_proto=in_proto.IPPROTO_ICMPV6,
                 icmpv6_type=icmpv6.ND_NEIGHBOR_ADVERT,
@@ -181,11 +186,12 @@ class OVSIntegrationBridge(ovs_bridge.OVSAgentBridge):
         # belong to the port.
         for ip in ip_addresses:
             masked_ip = self._cidr_to_ryu(ip)
-            self.install_normal(table_id=constants.ARP_SPOOF_TABLE,
-                                priority=2,
-                                eth_type=ether_types.ETH_TYPE_ARP,
-                                arp_spa=masked_ip,
-                                in_port=port)
+            self.install_goto(table_id=constants.ARP_SPOOF_TABLE,
+                              priority=2,
+                              dest_table_id=constants.TRANSIENT_TABLE,
+                              eth_type=ether_types.ETH_TYPE_ARP,
+                              arp_spa=masked_ip,
+                              in_port=port)
 
         # Now that the rules are ready, direct ARP traffic from the port into
         # the anti-spoof table.
@@ -72,8 +72,20 @@ class OVSAgentBridge(ofswitch.OpenFlowSwitchMixin, ovs_lib.OVSBridge):
                 "port": conf.OVS.of_listen_port,
             }
         ]
-        self.set_protocols("OpenFlow13")
+        # NOTE: OpenFlow 1.0 is only used by ovs-ofctl, for the port flags
+        # OpenFlow 1.3 doesn't have, the controller connection negotiates
+        # OpenFlow 1.3.
+        self.set_protocols(["OpenFlow10", "OpenFlow13"])
         self.set_controller(controllers)
 
+    def run_ofctl(self, cmd, args, process_input=None):
+        # NOTE: flows using Nicira extensions Ryu can't encode, like the
+        # ct() action of the openvswitch firewall, go through ovs-ofctl.
+        # The no-flood port flag used by the same driver only exists in
+        # OpenFlow 1.0.
+        protocol = 'OpenFlow10' if cmd == 'mod-port' else 'OpenFlow13'
+        return super(OVSAgentBridge, self).run_ofctl(
+            cmd, ['-O', protocol] + args, process_input=process_input)
+
     def drop_port(self, in_port):
         self.install_drop(priority=2, in_port=in_port)
@@ -29,7 +29,8 @@ class OVSIntegrationBridge(ovs_bridge.OVSAgentBridge):
     """openvswitch agent br-int specific logic."""
 
     def setup_default_table(self):
-        self.install_normal()
+        self.install_goto(dest_table_id=constants.TRANSIENT_TABLE)
+        self.install_normal(table_id=constants.TRANSIENT_TABLE)
         self.setup_canary_table()
         self.install_drop(table_id=constants.ARP_SPOOF_TABLE)
 
@@ -53,7 +54,8 @@ class OVSIntegrationBridge(ovs_bridge.OVSAgentBridge):
         self.add_flow(priority=3,
                       in_port=port,
                       dl_vlan=dl_vlan,
-                      actions="mod_vlan_vid:%s,normal" % lvid)
+                      actions="mod_vlan_vid:%s,resubmit(,%d)" % (
+                          lvid, constants.TRANSIENT_TABLE))
 
     def reclaim_local_vlan(self, port, segmentation_id):
         if segmentation_id is None:
@@ -114,8 +116,9 @@ class OVSIntegrationBridge(ovs_bridge.OVSAgentBridge):
         # Allow neighbor advertisements as long as they match addresses
         # that actually belong to the port.
         for ip in ip_addresses:
-            self.install_normal(
+            self.install_goto(
                 table_id=constants.ARP_SPOOF_TABLE, priority=2,
+                dest_table_id=constants.TRANSIENT_TABLE,
                 dl_type=const.ETHERTYPE_IPV6, nw_proto=const.PROTO_NUM_ICMP_V6,
                 icmp_type=const.ICMPV6_TYPE_NA, nd_target=ip, in_port=port)
 
@@ -131,8 +134,9 @@ class OVSIntegrationBridge(ovs_bridge.OVSAgentBridge):
         # allow ARPs as long as they match addresses that actually
         # belong to the port.
         for ip in ip_addresses:
-            self.install_normal(
+            self.install_goto(
                 table_id=constants.ARP_SPOOF_TABLE, priority=2,
+                dest_table_id=constants.TRANSIENT_TABLE,
                 proto='arp', arp_spa=ip, in_port=port)
 
         # Now that the rules are ready, direct ARP traffic from the port into
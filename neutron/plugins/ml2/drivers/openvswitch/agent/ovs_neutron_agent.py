@@ -303,7 +303,7 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         # Security group agent support
         self.sg_agent = sg_rpc.SecurityGroupAgentRpc(self.context,
                 self.sg_plugin_rpc, self.local_vlan_map,
-                defer_refresh_firewall=True)
+                defer_refresh_firewall=True, integration_bridge=self.int_br)
 
         # Initialize iteration counter
         self.iter_num = 0
@@ -501,34 +501,38 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
     def _tunnel_port_lookup(self, network_type, remote_ip):
         return self.tun_br_ofports[network_type].get(remote_ip)
 
-    def fdb_add(self, context, fdb_entries):
-        LOG.debug("fdb_add received")
+    def _get_remote_agent_ports(self, fdb_entries):
+        remote_agent_ports = []
         for lvm, agent_ports in self.get_agent_ports(fdb_entries,
                                                      self.local_vlan_map):
             agent_ports.pop(self.local_ip, None)
             if len(agent_ports):
-                if not self.enable_distributed_routing:
-                    with self.tun_br.deferred() as deferred_br:
-                        self.fdb_add_tun(context, deferred_br, lvm,
-                                         agent_ports, self._tunnel_port_lookup)
-                else:
-                    self.fdb_add_tun(context, self.tun_br, lvm,
-                                     agent_ports, self._tunnel_port_lookup)
+                remote_agent_ports.append((lvm, agent_ports))
+        return remote_agent_ports
+
+    def _fdb_apply(self, context, fdb_entries, fdb_apply_tun):
+        # The fdb entries may hold the changes of several networks, the flows
+        # of all of them are applied at once
+        remote_agent_ports = self._get_remote_agent_ports(fdb_entries)
+        if not remote_agent_ports:
+            return
+        if not self.enable_distributed_routing:
+            with self.tun_br.deferred() as deferred_br:
+                for lvm, agent_ports in remote_agent_ports:
+                    fdb_apply_tun(context, deferred_br, lvm,
+                                  agent_ports, self._tunnel_port_lookup)
+        else:
+            for lvm, agent_ports in remote_agent_ports:
+                fdb_apply_tun(context, self.tun_br, lvm,
+                              agent_ports, self._tunnel_port_lookup)
+
+    def fdb_add(self, context, fdb_entries):
+        LOG.debug("fdb_add received")
+        self._fdb_apply(context, fdb_entries, self.fdb_add_tun)
 
     def fdb_remove(self, context, fdb_entries):
         LOG.debug("fdb_remove received")
-        for lvm, agent_ports in self.get_agent_ports(fdb_entries,
-                                                     self.local_vlan_map):
-            agent_ports.pop(self.local_ip, None)
-            if len(agent_ports):
-                if not self.enable_distributed_routing:
-                    with self.tun_br.deferred() as deferred_br:
-                        self.fdb_remove_tun(context, deferred_br, lvm,
-                                            agent_ports,
-                                            self._tunnel_port_lookup)
-                else:
-                    self.fdb_remove_tun(context, self.tun_br, lvm,
-                                        agent_ports, self._tunnel_port_lookup)
+        self._fdb_apply(context, fdb_entries, self.fdb_remove_tun)
 
     def add_fdb_flow(self, br, port_info, remote_ip, lvm, ofport):
         if port_info == n_const.FLOODING_ENTRY:
@@ -544,6 +548,24 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                                       ofport,
                                       port_info.mac_address)
 
+    def add_fdb_flood_flows(self, br, lvm, flood_ports):
+        lvm.tun_ofports.update(ofport for remote_ip, ofport in flood_ports)
+        br.install_flood_to_tun(lvm.vlan, lvm.segmentation_id,
+                                lvm.tun_ofports)
+
+    def del_fdb_flood_flows(self, br, lvm, flood_ports):
+        ofports = set(ofport for remote_ip, ofport in flood_ports)
+        if not ofports & lvm.tun_ofports:
+            LOG.debug("attempt to remove non-existent ports %s", ofports)
+            return
+        lvm.tun_ofports -= ofports
+        if len(lvm.tun_ofports) > 0:
+            br.install_flood_to_tun(lvm.vlan, lvm.segmentation_id,
+                                    lvm.tun_ofports)
+        else:
+            # This local vlan doesn't require any more tunnelling
+            br.delete_flood_to_tun(lvm.vlan)
+
     def del_fdb_flow(self, br, port_info, remote_ip, lvm, ofport):
         if port_info == n_const.FLOODING_ENTRY:
             if ofport not in lvm.tun_ofports:
@@ -794,11 +816,37 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         vlan_mapping = {'net_uuid': net_uuid,
                         'network_type': network_type,
                         'physical_network': physical_network,
-                        'segmentation_id': segmentation_id}
+                        'segmentation_id': segmentation_id,
+                        # the port is only tagged by _bind_devices, after
+                        # its filter is set up with this local VLAN
+                        'tag': str(lvm.vlan)}
         port_other_config.update(vlan_mapping)
         self.int_br.set_db_attribute("Port", port.port_name, "other_config",
                                      port_other_config)
 
+    def _remove_stale_port_flows(self, need_binding_ports):
+        """Remove the flows of the previous binding of the ports.
+
+        This is done before the port filters are set up, as it removes the
+        flows of a firewall driver programming the integration bridge too.
+        Returns the devices whose filter has to be set up again.
+        """
+        if not need_binding_ports:
+            return set()
+        port_names = [p['vif_port'].port_name for p in need_binding_ports]
+        port_info = self.int_br.get_ports_attributes(
+            "Port", columns=["name", "tag"], ports=port_names, if_exists=True)
+        tags_by_name = {x['name']: x['tag'] for x in port_info}
+        stale_devices = set()
+        for port_detail in need_binding_ports:
+            lvm = self.local_vlan_map.get(port_detail['network_id'])
+            port = port_detail['vif_port']
+            cur_tag = tags_by_name.get(port.port_name)
+            if lvm and cur_tag is not None and cur_tag != lvm.vlan:
+                self.int_br.delete_flows(in_port=port.ofport)
+                stale_devices.add(port_detail['device'])
+        return stale_devices
+
     def _bind_devices(self, need_binding_ports):
         devices_up = []
         devices_down = []
@@ -820,8 +868,6 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                 LOG.info(_LI("Port %s was deleted concurrently, skipping it"),
                          port.port_name)
                 continue
-            if cur_tag != lvm.vlan:
-                self.int_br.delete_flows(in_port=port.ofport)
             if self.prevent_arp_spoofing:
                 self.setup_arp_spoofing_protection(self.int_br,
                                                    port, port_detail)
@@ -1472,8 +1518,13 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
 
         # TODO(salv-orlando): Optimize avoiding applying filters
         # unnecessarily, (eg: when there are no IP address changes)
-        added_ports = port_info.get('added', set())
-        if security_disabled_ports:
+        added_ports = (port_info.get('added', set()) |
+                       self._remove_stale_port_flows(need_binding_devices))
+        # The ports with port security disabled are only passed to a firewall
+        # programming the integration bridge, which switches their traffic
+        # towards the filtered ports. Other drivers would drop their traffic.
+        if (security_disabled_ports and
+                not self.sg_agent.firewall.requires_integration_bridge):
             added_ports -= set(security_disabled_ports)
         self.sg_agent.setup_port_filters(added_ports,
                                          port_info.get('updated', set()))
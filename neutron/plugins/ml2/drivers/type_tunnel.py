@@ -14,14 +14,16 @@
 #    under the License.
 import abc
 import itertools
-import operator
+import random
 
 from oslo_config import cfg
 from oslo_db import api as oslo_db_api
 from oslo_db import exception as db_exc
 from oslo_log import log
 from six import moves
+import sqlalchemy as sa
 from sqlalchemy import or_
+from sqlalchemy import orm
 
 from neutron.common import exceptions as exc
 from neutron.common import topics
@@ -52,11 +54,18 @@ class TunnelTypeDriver(helpers.SegmentTypeDriver):
     methods to manage these endpoints.
     """
     BULK_SIZE = 100
+    # Size under which sync_allocations fetches the existing ids of a range
+    SYNC_WINDOW_SIZE = 1000
 
     def __init__(self, model):
         super(TunnelTypeDriver, self).__init__(model)
         self.segmentation_key = next(iter(self.primary_keys))
 
+    @property
+    def sparse_allocations(self):
+        """Whether only allocated tunnels are stored in the table."""
+        return cfg.CONF.ml2.tunnel_allocation_layout == 'sparse'
+
     @abc.abstractmethod
     def add_endpoint(self, ip, host):
         """Register the endpoint in the type_driver database.
@@ -135,42 +144,97 @@ class TunnelTypeDriver(helpers.SegmentTypeDriver):
         LOG.info(_LI("%(type)s ID ranges: %(range)s"),
                  {'type': self.get_type(), 'range': current_range})
 
+    @staticmethod
+    def _merge_tunnel_ranges(tunnel_ranges):
+        """Return sorted tunnel ranges with overlapping ranges merged."""
+        merged = []
+        for tun_min, tun_max in sorted(tunnel_ranges):
+            if merged and tun_min <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], tun_max)
+            else:
+                merged.append([tun_min, tun_max])
+        return [tuple(tunnel_range) for tunnel_range in merged]
+
+    def _remove_unallocatable_tunnels(self, session, tunnel_ranges):
+        """Delete unallocated tunnels outside of tunnel_ranges.
+
+        The tunnels are deleted by chunks, only the ids of a chunk are
+        fetched.
+        """
+
+        tunnel_col = getattr(self.model, self.segmentation_key)
+        select = (session.query(self.model).filter_by(allocated=False).
+                  filter(*[~tunnel_col.between(tun_min, tun_max)
+                           for tun_min, tun_max in tunnel_ranges]).
+                  with_entities(tunnel_col).order_by(tunnel_col))
+        removed = 0
+        while True:
+            chunk = [x for x, in select.limit(self.BULK_SIZE)]
+            if not chunk:
+                return removed
+            session.query(self.model).filter(
+                tunnel_col.in_(chunk)).delete(synchronize_session=False)
+            removed += len(chunk)
+
+    def _add_allocatable_tunnels(self, session, tun_min, tun_max):
+        """Insert the tunnels of [tun_min, tun_max] missing from the table.
+
+        The range is compared to the table with a count query and split in
+        halves until it is either complete, empty or small enough to fetch
+        its existing ids, so that only the missing ids are materialized.
+        """
+
+        tunnel_col = getattr(self.model, self.segmentation_key)
+        in_range = session.query(self.model).filter(
+            tunnel_col.between(tun_min, tun_max))
+        count = in_range.with_entities(sa.func.count(tunnel_col)).scalar()
+        size = tun_max - tun_min + 1
+        if count == size:
+            return 0
+        if not count:
+            missings = moves.range(tun_min, tun_max + 1)
+        elif size > self.SYNC_WINDOW_SIZE:
+            middle = (tun_min + tun_max) // 2
+            return (self._add_allocatable_tunnels(session, tun_min, middle) +
+                    self._add_allocatable_tunnels(session, middle + 1,
+                                                  tun_max))
+        else:
+            existings = {x for x, in in_range.with_entities(tunnel_col)}
+            missings = (x for x in moves.range(tun_min, tun_max + 1)
+                        if x not in existings)
+
+        # Immediately insert tunnels in chunks. This leaves no work for
+        # flush at the end of transaction
+        for chunk in chunks(missings, self.BULK_SIZE):
+            bulk = [{self.segmentation_key: x, 'allocated': False}
+                    for x in chunk]
+            session.execute(self.model.__table__.insert(), bulk)
+        return size - count
+
     @oslo_db_api.wrap_db_retry(
         max_retries=db_api.MAX_RETRIES,
-        exception_checker=db_api.is_deadlock)
+        exception_checker=lambda e: isinstance(e, (db_exc.DBDeadlock,
+                                                   db_exc.DBDuplicateEntry)))
     def sync_allocations(self):
-        # determine current configured allocatable tunnel ids
-        tunnel_ids = set()
-        for tun_min, tun_max in self.tunnel_ranges:
-            tunnel_ids |= set(moves.range(tun_min, tun_max + 1))
-
-        tunnel_id_getter = operator.attrgetter(self.segmentation_key)
-        tunnel_col = getattr(self.model, self.segmentation_key)
+        # Another server can sync the same ranges concurrently, hence the
+        # retry on duplicate entries
+        tunnel_ranges = self._merge_tunnel_ranges(self.tunnel_ranges)
         session = db_api.get_session()
         with session.begin(subtransactions=True):
-            # remove from table unallocated tunnels not currently allocatable
-            # fetch results as list via all() because we'll be iterating
-            # through them twice
-            allocs = (session.query(self.model).
-                      with_lockmode("update").all())
-
-            # collect those vnis that needs to be deleted from db
-            unallocateds = (
-                tunnel_id_getter(a) for a in allocs if not a.allocated)
-            to_remove = (x for x in unallocateds if x not in tunnel_ids)
-            # Immediately delete tunnels in chunks. This leaves no work for
-            # flush at the end of transaction
-            for chunk in chunks(to_remove, self.BULK_SIZE):
-                session.query(self.model).filter(
-                    tunnel_col.in_(chunk)).delete(synchronize_session=False)
-
-            # collect vnis that need to be added
-            existings = {tunnel_id_getter(a) for a in allocs}
-            missings = list(tunnel_ids - existings)
-            for chunk in chunks(missings, self.BULK_SIZE):
-                bulk = [{self.segmentation_key: x, 'allocated': False}
-                        for x in chunk]
-                session.execute(self.model.__table__.insert(), bulk)
+            added = 0
+            if self.sparse_allocations:
+                # Unallocated tunnels are left over by the dense layout
+                removed = self._remove_unallocatable_tunnels(session, [])
+            else:
+                removed = self._remove_unallocatable_tunnels(session,
+                                                             tunnel_ranges)
+                for tun_min, tun_max in tunnel_ranges:
+                    added += self._add_allocatable_tunnels(session,
+                                                           tun_min, tun_max)
+        LOG.debug("%(type)s allocations synced, %(added)d tunnel ids added, "
+                  "%(removed)d removed",
+                  {'type': self.get_type(), 'added': added,
+                   'removed': removed})
 
     def is_partial_segment(self, segment):
         return segment.get(api.SEGMENTATION_ID) is None
@@ -189,6 +253,84 @@ class TunnelTypeDriver(helpers.SegmentTypeDriver):
                        {'key': key, 'tunnel': segment.get(api.NETWORK_TYPE)})
                 raise exc.InvalidInput(error_message=msg)
 
+    def _get_free_tunnel_ids(self, session, tun_min, tun_max, limit):
+        """Return up to limit free tunnel ids of [tun_min, tun_max].
+
+        In the sparse layout, the candidates are tun_min and the ids which
+        follow an allocated tunnel without being allocated themselves, so
+        there is at most one candidate per gap between allocated tunnels.
+        """
+
+        tunnel_col = getattr(self.model, self.segmentation_key)
+        next_alloc = orm.aliased(self.model)
+        next_col = getattr(next_alloc, self.segmentation_key)
+        free_ids = []
+        if not (session.query(self.model).
+                filter(tunnel_col == tun_min).first()):
+            free_ids.append(tun_min)
+        gaps = (session.query(tunnel_col + 1).select_from(self.model).
+                outerjoin(next_alloc, next_col == tunnel_col + 1).
+                filter(next_col.is_(None),
+                       tunnel_col.between(tun_min, tun_max - 1)).
+                order_by(tunnel_col).
+                limit(limit))
+        free_ids.extend(x for x, in gaps)
+        return free_ids[:limit]
+
+    def _allocate_sparse_segment(self, session):
+        """Allocate a free tunnel of the configured ranges.
+
+        The search starts at a random point of the ranges, then walks them
+        and wraps around, so that concurrent API workers look for free ids
+        in different places. Return allocated db object or None.
+        """
+
+        tunnel_ranges = self._merge_tunnel_ranges(self.tunnel_ranges)
+        if not tunnel_ranges:
+            return
+        offset = random.randrange(sum(tun_max - tun_min + 1
+                                      for tun_min, tun_max in tunnel_ranges))
+        for index, (tun_min, tun_max) in enumerate(tunnel_ranges):
+            if offset <= tun_max - tun_min:
+                pivot = tun_min + offset
+                walk = ([(pivot, tun_max)] + tunnel_ranges[index + 1:] +
+                        tunnel_ranges[:index])
+                if pivot > tun_min:
+                    walk.append((tun_min, pivot - 1))
+                break
+            offset -= tun_max - tun_min + 1
+
+        collided = False
+        with session.begin(subtransactions=True):
+            for tun_min, tun_max in walk:
+                for tunnel_id in self._get_free_tunnel_ids(
+                        session, tun_min, tun_max, helpers.IDPOOL_SELECT_SIZE):
+                    alloc = self.model(allocated=True,
+                                       **{self.segmentation_key: tunnel_id})
+                    try:
+                        with db_api.autonested_transaction(session):
+                            session.add(alloc)
+                    except db_exc.DBDuplicateEntry:
+                        # Tunnel allocated since the gap query
+                        LOG.debug("Allocate %(type)s tunnel %(id)s failed: "
+                                  "tunnel has been allocated",
+                                  {'type': self.get_type(), 'id': tunnel_id})
+                        collided = True
+                        continue
+                    return alloc
+
+        if collided:
+            # saving real exception in case we exceeded amount of attempts
+            raise db_exc.RetryRequest(
+                exc.NoNetworkFoundInMaximumAllowedAttempts())
+
+    def allocate_partially_specified_segment(self, session, **filters):
+        if self.sparse_allocations:
+            return self._allocate_sparse_segment(session)
+        return super(TunnelTypeDriver,
+                     self).allocate_partially_specified_segment(session,
+                                                                **filters)
+
     def reserve_provider_segment(self, session, segment):
         if self.is_partial_segment(segment):
             alloc = self.allocate_partially_specified_segment(session)
@@ -217,7 +359,9 @@ class TunnelTypeDriver(helpers.SegmentTypeDriver):
     def release_segment(self, session, segment):
         tunnel_id = segment[api.SEGMENTATION_ID]
 
-        inside = any(lo <= tunnel_id <= hi for lo, hi in self.tunnel_ranges)
+        # Free tunnels are not stored in the sparse layout
+        inside = (not self.sparse_allocations and
+                  any(lo <= tunnel_id <= hi for lo, hi in self.tunnel_ranges))
 
         info = {'type': self.get_type(), 'id': tunnel_id}
         with session.begin(subtransactions=True):
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 from oslo_config import cfg
 from oslo_log import log
 from oslo_utils import excutils
@@ -684,6 +686,58 @@ class MechanismManager(stevedore.named.NamedExtensionManager):
                       {'port': context.current['id'],
                        'host': context.host})
 
+    def bind_ports(self, contexts):
+        """Attempt to bind a batch of ports using registered mechanism drivers.
+
+        :param contexts: list of PortContext instances describing the ports
+
+        Called outside any transaction to attempt to establish the
+        bindings of ports created together. When every mechanism
+        driver able to bind ports sets supports_bulk_binding, the
+        ports are grouped by host, network, binding:vnic_type and
+        binding:profile, the drivers are only called for the first
+        port of each group and its results are copied to the other
+        ports of the group. Otherwise each port is bound on its own.
+        """
+        if not self._supports_bulk_binding():
+            for context in contexts:
+                self.bind_port(context)
+            return
+
+        groups = collections.OrderedDict()
+        for context in contexts:
+            binding = context._binding
+            key = (context.host, context.network.current['id'],
+                   binding.vnic_type, binding.profile)
+            groups.setdefault(key, []).append(context)
+        for group in groups.values():
+            self.bind_port(group[0])
+            for context in group[1:]:
+                self._copy_binding(group[0], context)
+
+    def _supports_bulk_binding(self):
+        return all(getattr(driver.obj, 'supports_bulk_binding', False)
+                   for driver in self.ordered_mech_drivers
+                   if driver.obj._supports_port_binding)
+
+    def _copy_binding(self, source, context):
+        binding = context._binding
+        binding.vif_type = source._binding.vif_type
+        binding.vif_details = source._binding.vif_details
+        context._new_port_status = source._new_port_status
+        context._binding_levels = [
+            models.PortBindingLevel(port_id=context.current['id'],
+                                    host=level.host,
+                                    level=level.level,
+                                    driver=level.driver,
+                                    segment_id=level.segment_id)
+            for level in source._binding_levels]
+        LOG.debug("Bound port %(port)s as port %(source)s of the same "
+                  "group, vif_type: %(vif_type)s",
+                  {'port': context.current['id'],
+                   'source': source.current['id'],
+                   'vif_type': binding.vif_type})
+
     def _bind_port_level(self, context, level, segments_to_bind):
         binding = context._binding
         port_id = context.current['id']
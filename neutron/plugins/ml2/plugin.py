@@ -111,6 +111,10 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
     __native_pagination_support = True
     __native_sorting_support = True
 
+    # Every security group rule and membership change goes through the
+    # notification methods of SecurityGroupServerRpcMixin
+    cache_security_group_info = True
+
     # List of supported extensions
     _supported_extension_aliases = ["provider", "external-net", "binding",
                                     "quotas", "security-group", "agent",
@@ -343,6 +347,13 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         return new_context, need_notify, try_again
 
     def _bind_port(self, orig_context):
+        # Attempt to bind the port and return the context with the
+        # result.
+        new_context = self._make_bind_context(orig_context)
+        self.mechanism_manager.bind_port(new_context)
+        return new_context
+
+    def _make_bind_context(self, orig_context):
         # Construct a new PortContext from the one from the previous
         # transaction.
         port = orig_context.current
@@ -355,100 +366,158 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             vif_details=''
         )
         self._update_port_dict_binding(port, new_binding)
-        new_context = driver_context.PortContext(
+        return driver_context.PortContext(
             self, orig_context._plugin_context, port,
             orig_context.network.current, new_binding, None)
 
-        # Attempt to bind the port and return the context with the
-        # result.
-        self.mechanism_manager.bind_port(new_context)
-        return new_context
+    def _bind_ports_if_needed(self, contexts):
+        """Bind a batch of ports created together.
+
+        The mechanism manager binds the ports as one batch and the
+        results are committed in a single transaction. The ports whose
+        results could not be committed, because they were bound or
+        updated concurrently or failed to bind, are then retried one by
+        one with _bind_port_if_needed().
+        """
+        to_bind = [context for context in contexts
+                   if (context._binding.vif_type ==
+                       portbindings.VIF_TYPE_UNBOUND and
+                       context._binding.host)]
+        if not to_bind:
+            return contexts
+
+        bind_contexts = [self._make_bind_context(context)
+                         for context in to_bind]
+        self.mechanism_manager.bind_ports(bind_contexts)
+        results = self._commit_port_bindings(
+            to_bind[0]._plugin_context,
+            [(context.current['id'], context._binding, bind_context)
+             for context, bind_context in zip(to_bind, bind_contexts)])
+
+        bound_contexts = {}
+        for context, (new_context, did_commit) in zip(to_bind, results):
+            port_id = context.current['id']
+            if not new_context:
+                LOG.debug("Port %s has been deleted concurrently", port_id)
+                bound_contexts[port_id] = context
+            elif did_commit and (new_context._binding.vif_type !=
+                                 portbindings.VIF_TYPE_BINDING_FAILED):
+                bound_contexts[port_id] = new_context
+            else:
+                bound_contexts[port_id] = self._bind_port_if_needed(
+                    new_context)
+        return [bound_contexts.get(context.current['id'], context)
+                for context in contexts]
 
     def _commit_port_binding(self, plugin_context, port_id, orig_binding,
                              new_context):
+        return self._commit_port_bindings(
+            plugin_context, [(port_id, orig_binding, new_context)])[0]
+
+    def _commit_port_bindings(self, plugin_context, bindings):
+        """Commit the results of binding attempts in one transaction.
+
+        :param bindings: list of (port_id, orig_binding, new_context)
+        :returns: list of (cur_context, committed) in the same order,
+                  cur_context is None for ports deleted concurrently
+        """
         session = plugin_context.session
-        new_binding = new_context._binding
+        results = {}
 
-        # After we've attempted to bind the port, we begin a
-        # transaction, get the current port state, and decide whether
-        # to commit the binding results.
+        # After we've attempted to bind the ports, we begin a
+        # transaction, get the current port states, and decide whether
+        # to commit the binding results. Ports are locked in a
+        # consistent order so that concurrent batches don't deadlock.
         with session.begin(subtransactions=True):
-            # Get the current port state and build a new PortContext
-            # reflecting this state as original state for subsequent
-            # mechanism driver update_port_*commit() calls.
-            port_db, cur_binding = db.get_locked_port_and_binding(session,
-                                                                  port_id)
-            if not port_db:
-                # The port has been deleted concurrently.
-                return (None, False)
-            oport = self._make_port_dict(port_db)
-            port = self._make_port_dict(port_db)
-            network = new_context.network.current
-            if port['device_owner'] == const.DEVICE_OWNER_DVR_INTERFACE:
-                # REVISIT(rkukura): The PortBinding instance from the
-                # ml2_port_bindings table, returned as cur_binding
-                # from db.get_locked_port_and_binding() above, is
-                # currently not used for DVR distributed ports, and is
-                # replaced here with the DVRPortBinding instance from
-                # the ml2_dvr_port_bindings table specific to the host
-                # on which the distributed port is being bound. It
-                # would be possible to optimize this code to avoid
-                # fetching the PortBinding instance in the DVR case,
-                # and even to avoid creating the unused entry in the
-                # ml2_port_bindings table. But the upcoming resolution
-                # for bug 1367391 will eliminate the
-                # ml2_dvr_port_bindings table, use the
-                # ml2_port_bindings table to store non-host-specific
-                # fields for both distributed and non-distributed
-                # ports, and introduce a new ml2_port_binding_hosts
-                # table for the fields that need to be host-specific
-                # in the distributed case. Since the PortBinding
-                # instance will then be needed, it does not make sense
-                # to optimize this code to avoid fetching it.
-                cur_binding = db.get_dvr_port_binding_by_host(
-                    session, port_id, orig_binding.host)
-            cur_context = driver_context.PortContext(
-                self, plugin_context, port, network, cur_binding, None,
-                original_port=oport)
-
-            # Commit our binding results only if port has not been
-            # successfully bound concurrently by another thread or
-            # process and no binding inputs have been changed.
-            commit = ((cur_binding.vif_type in
-                       [portbindings.VIF_TYPE_UNBOUND,
-                        portbindings.VIF_TYPE_BINDING_FAILED]) and
-                      orig_binding.host == cur_binding.host and
-                      orig_binding.vnic_type == cur_binding.vnic_type and
-                      orig_binding.profile == cur_binding.profile)
-
+            for port_id, orig_binding, new_context in sorted(
+                    bindings, key=lambda binding: binding[0]):
+                results[port_id] = self._commit_port_binding_locked(
+                    plugin_context, port_id, orig_binding, new_context)
+        results = [results[binding[0]] for binding in bindings]
+        for cur_context, commit in results:
             if commit:
-                # Update the port's binding state with our binding
-                # results.
-                cur_binding.vif_type = new_binding.vif_type
-                cur_binding.vif_details = new_binding.vif_details
-                db.clear_binding_levels(session, port_id, cur_binding.host)
-                db.set_binding_levels(session, new_context._binding_levels)
-                cur_context._binding_levels = new_context._binding_levels
-
-                # Update PortContext's port dictionary to reflect the
-                # updated binding state.
-                self._update_port_dict_binding(port, cur_binding)
-
-                # Update the port status if requested by the bound driver.
-                if (new_context._binding_levels and
-                    new_context._new_port_status):
-                    port_db.status = new_context._new_port_status
-                    port['status'] = new_context._new_port_status
-
-                # Call the mechanism driver precommit methods, commit
-                # the results, and call the postcommit methods.
-                self.mechanism_manager.update_port_precommit(cur_context)
-        if commit:
-            self.mechanism_manager.update_port_postcommit(cur_context)
+                self.mechanism_manager.update_port_postcommit(cur_context)
 
         # Continue, using the port state as of the transaction that
         # just finished, whether that transaction committed new
         # results or discovered concurrent port state changes.
+        return results
+
+    def _commit_port_binding_locked(self, plugin_context, port_id,
+                                    orig_binding, new_context):
+        session = plugin_context.session
+        new_binding = new_context._binding
+
+        # Get the current port state and build a new PortContext
+        # reflecting this state as original state for subsequent
+        # mechanism driver update_port_*commit() calls.
+        port_db, cur_binding = db.get_locked_port_and_binding(session,
+                                                              port_id)
+        if not port_db:
+            # The port has been deleted concurrently.
+            return (None, False)
+        oport = self._make_port_dict(port_db)
+        port = self._make_port_dict(port_db)
+        network = new_context.network.current
+        if port['device_owner'] == const.DEVICE_OWNER_DVR_INTERFACE:
+            # REVISIT(rkukura): The PortBinding instance from the
+            # ml2_port_bindings table, returned as cur_binding
+            # from db.get_locked_port_and_binding() above, is
+            # currently not used for DVR distributed ports, and is
+            # replaced here with the DVRPortBinding instance from
+            # the ml2_dvr_port_bindings table specific to the host
+            # on which the distributed port is being bound. It
+            # would be possible to optimize this code to avoid
+            # fetching the PortBinding instance in the DVR case,
+            # and even to avoid creating the unused entry in the
+            # ml2_port_bindings table. But the upcoming resolution
+            # for bug 1367391 will eliminate the
+            # ml2_dvr_port_bindings table, use the
+            # ml2_port_bindings table to store non-host-specific
+            # fields for both distributed and non-distributed
+            # ports, and introduce a new ml2_port_binding_hosts
+            # table for the fields that need to be host-specific
+            # in the distributed case. Since the PortBinding
+            # instance will then be needed, it does not make sense
+            # to optimize this code to avoid fetching it.
+            cur_binding = db.get_dvr_port_binding_by_host(
+                session, port_id, orig_binding.host)
+        cur_context = driver_context.PortContext(
+            self, plugin_context, port, network, cur_binding, None,
+            original_port=oport)
+
+        # Commit our binding results only if port has not been
+        # successfully bound concurrently by another thread or
+        # process and no binding inputs have been changed.
+        commit = ((cur_binding.vif_type in
+                   [portbindings.VIF_TYPE_UNBOUND,
+                    portbindings.VIF_TYPE_BINDING_FAILED]) and
+                  orig_binding.host == cur_binding.host and
+                  orig_binding.vnic_type == cur_binding.vnic_type and
+                  orig_binding.profile == cur_binding.profile)
+
+        if commit:
+            # Update the port's binding state with our binding
+            # results.
+            cur_binding.vif_type = new_binding.vif_type
+            cur_binding.vif_details = new_binding.vif_details
+            db.clear_binding_levels(session, port_id, cur_binding.host)
+            db.set_binding_levels(session, new_context._binding_levels)
+            cur_context._binding_levels = new_context._binding_levels
+
+            # Update PortContext's port dictionary to reflect the
+            # updated binding state.
+            self._update_port_dict_binding(port, cur_binding)
+
+            # Update the port status if requested by the bound driver.
+            if (new_context._binding_levels and
+                new_context._new_port_status):
+                port_db.status = new_context._new_port_status
+                port['status'] = new_context._new_port_status
+
+            # Call the mechanism driver precommit methods, commit
+            # the results, and call the postcommit methods.
+            self.mechanism_manager.update_port_precommit(cur_context)
         return (cur_context, commit)
 
     def _update_port_dict_binding(self, port, binding):
@@ -491,7 +560,10 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             self._update_port_dict_binding(port_res, port_db.port_binding)
 
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attributes.PORTS, ['_ml2_extend_port_dict_binding'])
+        attributes.PORTS, ['_ml2_extend_port_dict_binding'],
+        fields=[portbindings.VNIC_TYPE, portbindings.PROFILE,
+                portbindings.HOST_ID, portbindings.VIF_TYPE,
+                portbindings.VIF_DETAILS])
 
     # Register extend dict methods for network and port resources.
     # Each mechanism driver that supports extend attribute for the resources
@@ -831,6 +903,13 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         session = context.session
         with session.begin(subtransactions=True):
             result = super(Ml2Plugin, self).create_subnet(context, subnet)
+            if ipv6_utils.is_auto_address_subnet(result):
+                # the ports of the network got an address on the subnet
+                # without going through update_port
+                query = session.query(models_v2.IPAllocation.port_id)
+                query = query.filter_by(subnet_id=result['id'])
+                self._bump_port_security_group_versions(
+                    context, [port_id for port_id, in query])
             self.extension_manager.process_create_subnet(
                 context, subnet[attributes.SUBNET], result)
             network = self.get_network(context, result['network_id'])
@@ -909,6 +988,10 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                 allocated = qry_allocated.all()
                 # Delete all the IPAllocation that can be auto-deleted
                 if allocated:
+                    # update_port doesn't see the IPs removed here as a
+                    # change of the members of the security groups
+                    self._bump_port_security_group_versions(
+                        context, [x.port_id for x in allocated])
                     for x in allocated:
                         session.delete(x)
                 LOG.debug("Ports to auto-deallocate: %s", allocated)
@@ -952,6 +1035,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
                     LOG.debug("Deleting subnet record")
                     session.delete(record)
+                    self._release_subnet_prefix(context, record)
 
                     LOG.debug("Committing transaction")
                     break
@@ -1083,14 +1167,13 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                     resources.PORT, events.AFTER_CREATE, self, **kwargs)
 
         try:
-            for obj in objects:
-                obj['bound_context'] = self._bind_port_if_needed(
-                    obj['mech_context'])
-            return [obj['bound_context'].current for obj in objects]
+            bound_contexts = self._bind_ports_if_needed(
+                [obj['mech_context'] for obj in objects])
+            return [bound_context.current for bound_context in bound_contexts]
         except ml2_exc.MechanismDriverError:
             with excutils.save_and_reraise_exception():
                 resource_ids = [res['result']['id'] for res in objects]
-                LOG.error(_LE("_bind_port_if_needed failed. "
+                LOG.error(_LE("_bind_ports_if_needed failed. "
                               "Deleting all ports from create bulk '%s'"),
                           resource_ids)
                 self._delete_objects(context, attributes.PORT, objects)
@@ -1522,6 +1605,52 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         return port['id']
 
+    def update_port_statuses(self, context, port_ids, status, host=None):
+        """Update the status of many ports in one transaction.
+
+        Returns the set of the given port ids whose port was found and
+        is bound to host, if given. Ports given by a truncated id, DVR
+        ports and ports bound to another host are not handled here and
+        are left to update_port_status().
+        """
+        handled = set()
+        mech_contexts = []
+        networks = {}
+        session = context.session
+        with session.begin(subtransactions=True):
+            for port in db.get_ports_by_ids(session, port_ids):
+                binding = port.port_binding
+                if (port['device_owner'] == const.DEVICE_OWNER_DVR_INTERFACE
+                        or not binding or (host and binding.host != host)):
+                    continue
+                handled.add(port.id)
+                if port.status == status:
+                    continue
+                original_port = self._make_port_dict(port)
+                port.status = status
+                updated_port = self._make_port_dict(port)
+                network_id = original_port['network_id']
+                if network_id not in networks:
+                    networks[network_id] = self.get_network(context,
+                                                            network_id)
+                levels = db.get_binding_levels(session, port.id,
+                                               binding.host)
+                mech_context = driver_context.PortContext(
+                    self, context, updated_port, networks[network_id],
+                    binding, levels, original_port=original_port)
+                self.mechanism_manager.update_port_precommit(mech_context)
+                mech_contexts.append(mech_context)
+
+        for mech_context in mech_contexts:
+            try:
+                self.mechanism_manager.update_port_postcommit(mech_context)
+            except ml2_exc.MechanismDriverError:
+                LOG.exception(_LE("mechanism_manager.update_port_postcommit "
+                                  "failed for port %s"),
+                              mech_context.current['id'])
+                handled.discard(mech_context.current['id'])
+        return handled
+
     def port_bound_to_host(self, context, port_id, host):
         port = db.get_port(context.session, port_id)
         if not port:
@@ -1569,4 +1698,5 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
         return device
 
     def get_workers(self):
-        return self.mechanism_manager.get_workers()
+        return (self.mechanism_manager.get_workers() +
+                self.get_availability_ranges_repair_workers())
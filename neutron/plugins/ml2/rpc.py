@@ -30,6 +30,7 @@ from neutron.extensions import portbindings
 from neutron.extensions import portsecurity as psec
 from neutron.i18n import _LE, _LW
 from neutron import manager
+from neutron.plugins.ml2 import db as ml2_db
 from neutron.plugins.ml2 import driver_api as api
 from neutron.plugins.ml2.drivers import type_tunnel
 from neutron.services.qos import qos_consts
@@ -231,14 +232,62 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
             registry.notify(
                 resources.PORT, events.AFTER_UPDATE, plugin, **kwargs)
 
+    def _update_devices_status(self, rpc_context, devices, status, host):
+        """Update the status of the ports of devices in one transaction.
+
+        Returns a dict mapping the devices whose port status was updated
+        to their port id. The other devices are left to the per device
+        update_device_up and update_device_down handling.
+        """
+        plugin = manager.NeutronManager.get_plugin()
+        port_ids = dict((device, plugin._device_to_port_id(rpc_context,
+                                                           device))
+                        for device in devices)
+        try:
+            updated = plugin.update_port_statuses(
+                rpc_context, list(set(port_ids.values())), status, host)
+        except exc.StaleDataError:
+            LOG.debug("delete_port and update_device_list are being "
+                      "executed concurrently. Updating devices one by one.")
+            return {}
+        except Exception:
+            LOG.exception(_LE("Failed to update the status of devices "
+                              "%s, updating them one by one"), devices)
+            return {}
+        return dict((device, port_id)
+                    for device, port_id in port_ids.items()
+                    if port_id in updated)
+
+    def _notify_devices_up(self, rpc_context, port_ids):
+        plugin = manager.NeutronManager.get_plugin()
+        # NOTE(armax): it's best to remove all objects from the
+        # session, before we try to retrieve the new port objects
+        rpc_context.session.expunge_all()
+        for port in ml2_db.get_ports_by_ids(rpc_context.session, port_ids):
+            kwargs = {
+                'context': rpc_context,
+                'port': port,
+                'update_device_up': True
+            }
+            registry.notify(
+                resources.PORT, events.AFTER_UPDATE, plugin, **kwargs)
+
     def update_device_list(self, rpc_context, **kwargs):
         devices_up = []
         failed_devices_up = []
         devices_down = []
         failed_devices_down = []
+        host = kwargs.get('host')
         devices = kwargs.get('devices_up')
         if devices:
+            updated = self._update_devices_status(
+                rpc_context, devices, n_const.PORT_STATUS_ACTIVE, host)
+            if updated:
+                self._notify_devices_up(rpc_context, set(updated.values()))
             for device in devices:
+                if device in updated:
+                    devices_up.append(device)
+                    continue
                 try:
                     self.update_device_up(
                         rpc_context,
@@ -252,7 +301,12 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
 
         devices = kwargs.get('devices_down')
         if devices:
+            updated = self._update_devices_status(
+                rpc_context, devices, n_const.PORT_STATUS_DOWN, host)
             for device in devices:
+                if device in updated:
+                    devices_down.append({'device': device, 'exists': True})
+                    continue
                 try:
                     dev = self.update_device_down(
                         rpc_context,
@@ -357,6 +357,85 @@ def check(context, action, target, plugin=None, might_not_exist=False,
     return result
 
 
+def _is_credentials_only_rule(rule, rules, visited=None):
+    """Verify that the result of a policy rule does not depend on targets.
+
+    Such rules only match roles, e.g. ``rule:context_is_admin``, so they can
+    be evaluated once for a given set of credentials.
+    """
+    visited = visited or set()
+    # NOTE: oslo_policy.policy does not export the classes of the "@", "!"
+    # and "role:" checks, they are recognized by their policy language form
+    if str(rule) in ('@', '!'):
+        return True
+    if isinstance(rule, policy.Check) and rule.kind == 'role':
+        return True
+    if isinstance(rule, policy.RuleCheck):
+        if rule.match in visited:
+            return True
+        visited.add(rule.match)
+        try:
+            # NOTE: unknown rules fall back to the default rule
+            sub_rule = rules[rule.match]
+        except KeyError:
+            # Unknown rules fail closed whatever the target is
+            return True
+        return _is_credentials_only_rule(sub_rule, rules, visited)
+    if isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        return all(_is_credentials_only_rule(r, rules, visited)
+                   for r in rule.rules)
+    if isinstance(rule, policy.NotCheck):
+        return _is_credentials_only_rule(rule.rule, rules, visited)
+    return False
+
+
+def compile_check(context, action, might_not_exist=False, pluralized=None):
+    """Build a predicate verifying that the action is valid on targets.
+
+    The predicate returns the same results as check() on the targets it is
+    called with, it is meant for checking the same action on many targets,
+    e.g. for every object of a list. The credentials of the context and the
+    rule to match are computed once, and policy files are reloaded once, at
+    compile time. The result of rules matching only roles is computed once
+    as well.
+
+    :param context: neutron context
+    :param action: string representing the action to be checked
+    :param might_not_exist: If True the predicate always returns True if the
+        specified policy does not exist.
+    :param pluralized: pluralized case of resource
+
+    :return: A callable taking a target and returning True if access is
+        permitted else False.
+    """
+    if context.is_admin:
+        return lambda target: True
+    _ENFORCER.load_rules()
+    if might_not_exist and not (_ENFORCER.rules and action in _ENFORCER.rules):
+        return lambda target: True
+    if get_resource_and_action(action, pluralized)[1]:
+        # The rule to match of write actions depends on the target
+        return lambda target: check(context, action, target,
+                                    might_not_exist=might_not_exist,
+                                    pluralized=pluralized)
+    match_rule, target, credentials = _prepare_check(context, action, {},
+                                                     pluralized)
+    if _is_credentials_only_rule(match_rule, _ENFORCER.rules):
+        result = match_rule(target, credentials, _ENFORCER)
+        if not result:
+            log_rule_list(match_rule)
+        return lambda target: result
+
+    def _check(target):
+        if target is None:
+            target = {}
+        result = match_rule(target, credentials, _ENFORCER)
+        if not result:
+            log_rule_list(match_rule)
+        return result
+    return _check
+
+
 def enforce(context, action, target, plugin=None, pluralized=None):
     """Verifies that the action is valid on the target in this context.
 
@@ -67,6 +67,18 @@ quota_opts = [
                 help=_('Keep in track in the database of current resource'
                        'quota usage. Plugins which do not leverage the '
                        'neutron database should set this flag to False')),
+    cfg.IntOpt('quota_usage_shards',
+               default=8, min=1,
+               help=_('Number of database rows the tracked usage of a '
+                      'resource by a tenant is spread over. Concurrent '
+                      'creations and deletions of resources of a tenant '
+                      'update one of these rows at random, so that they '
+                      'seldom wait for each other.')),
+    cfg.IntOpt('reservation_cleanup_interval',
+               default=60, min=1,
+               help=_('Seconds between the removals of expired quota '
+                      'reservations, which are done by a dedicated worker '
+                      'for all tenants at once.')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -271,6 +283,11 @@ class QuotaEngine(object):
     def cancel_reservation(self, context, reservation_id):
         self.get_driver().cancel_reservation(context, reservation_id)
 
+    def get_workers(self):
+        """Return the NeutronWorker instances required by the quota driver.
+        """
+        return getattr(self.get_driver(), 'get_workers', tuple)()
+
     def limit_check(self, context, tenant_id, **values):
         """Check simple quota limits.
 
@@ -12,6 +12,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import random
+
 from oslo_config import cfg
 from oslo_db import api as oslo_db_api
 from oslo_db import exception as oslo_db_exception
@@ -196,14 +198,27 @@ class TrackedResource(BaseResource):
         self._out_of_sync_tenants |= dirty_tenants_snap
         self._dirty_tenants -= dirty_tenants_snap
 
-    def _db_event_handler(self, mapper, _conn, target):
+    def _db_event_handler(self, connection, target, delta):
         try:
             tenant_id = target['tenant_id']
         except AttributeError:
             with excutils.save_and_reraise_exception():
                 LOG.error(_LE("Model class %s does not have a tenant_id "
                               "attribute"), target)
-        self._dirty_tenants.add(tenant_id)
+        # The usage is updated in the transaction creating or deleting the
+        # resource, on a random shard so that concurrent transactions for the
+        # same tenant seldom wait for each other. Tenants whose usage has no
+        # such shard yet are marked dirty, so that their usage is counted
+        shard = random.randrange(cfg.CONF.QUOTAS.quota_usage_shards)
+        if not quota_api.update_quota_usage_shard(
+                connection, self.name, tenant_id, shard, delta):
+            self._dirty_tenants.add(tenant_id)
+
+    def _db_insert_event_handler(self, mapper, connection, target):
+        self._db_event_handler(connection, target, 1)
+
+    def _db_delete_event_handler(self, mapper, connection, target):
+        self._db_event_handler(connection, target, -1)
 
     # Retry the operation if a duplicate entry exception is raised. This
     # can happen is two or more workers are trying to create a resource of a
@@ -215,8 +230,13 @@ class TrackedResource(BaseResource):
         isinstance(exc, (oslo_db_exception.DBDuplicateEntry,
                          oslo_db_exception.DBDeadlock)))
     def _set_quota_usage(self, context, tenant_id, in_use):
-        return quota_api.set_quota_usage(
-            context, self.name, tenant_id, in_use=in_use)
+        with db_api.autonested_transaction(context.session):
+            usage_info = quota_api.set_quota_usage(
+                context, self.name, tenant_id, in_use=in_use)
+            quota_api.create_quota_usage_shards(
+                context, self.name, tenant_id,
+                cfg.CONF.QUOTAS.quota_usage_shards)
+        return usage_info
 
     def _resync(self, context, tenant_id, in_use):
         # Update quota usage
@@ -244,7 +264,8 @@ class TrackedResource(BaseResource):
         """Return the current usage count for the resource.
 
         This method will fetch aggregate information for resource usage
-        data, unless usage data are marked as "dirty".
+        data, summing the usage counter and its shards, unless usage data
+        are marked as "dirty".
         In the latter case resource usage will be calculated counting
         rows for tenant_id in the resource's database model.
         Active reserved amount are instead always calculated by summing
@@ -254,9 +275,10 @@ class TrackedResource(BaseResource):
         compatibility with the signature of the count method for
         CountableResource instances.
         """
-        # Load current usage data, setting a row-level lock on the DB
+        # Load current usage data. No lock is set on the usage counter, as
+        # concurrent transactions update its shards rather than the counter
         usage_info = quota_api.get_quota_usage_by_resource_and_tenant(
-            context, self.name, tenant_id, lock_for_update=True)
+            context, self.name, tenant_id)
         # Always fetch reservations, as they are not tracked by usage counters
         reservations = quota_api.get_reservations_for_resources(
             context, tenant_id, [self.name])
@@ -296,9 +318,13 @@ class TrackedResource(BaseResource):
         return usage_info.used + reserved
 
     def register_events(self):
-        event.listen(self._model_class, 'after_insert', self._db_event_handler)
-        event.listen(self._model_class, 'after_delete', self._db_event_handler)
+        event.listen(self._model_class, 'after_insert',
+                     self._db_insert_event_handler)
+        event.listen(self._model_class, 'after_delete',
+                     self._db_delete_event_handler)
 
     def unregister_events(self):
-        event.remove(self._model_class, 'after_insert', self._db_event_handler)
-        event.remove(self._model_class, 'after_delete', self._db_event_handler)
+        event.remove(self._model_class, 'after_insert',
+                     self._db_insert_event_handler)
+        event.remove(self._model_class, 'after_delete',
+                     self._db_delete_event_handler)
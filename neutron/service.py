@@ -32,6 +32,7 @@ from neutron import context
 from neutron.db import api as session
 from neutron.i18n import _LE, _LI
 from neutron import manager
+from neutron import quota
 from neutron import worker
 from neutron import wsgi
 
@@ -120,6 +121,10 @@ def start_plugin_workers():
             launcher = common_service.ProcessLauncher(cfg.CONF)
             launcher.launch_service(plugin_worker)
             launchers.append(launcher)
+    for quota_worker in quota.QUOTAS.get_workers():
+        launcher = common_service.ProcessLauncher(cfg.CONF)
+        launcher.launch_service(quota_worker)
+        launchers.append(launcher)
     return launchers
 
 
@@ -55,6 +55,12 @@ class L3RouterPlugin(service_base.ServicePluginBase,
                                    "extraroute", "l3_agent_scheduler",
                                    "l3-ha"]
 
+    # This attribute specifies whether the plugin supports or not
+    # pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     @resource_registry.tracked_resources(router=l3_db.Router,
                                          floatingip=l3_db.FloatingIP)
     def __init__(self):
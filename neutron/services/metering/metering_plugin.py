@@ -24,6 +24,12 @@ class MeteringPlugin(metering_db.MeteringDbMixin):
     supported_extension_aliases = ["metering"]
     path_prefix = "/metering"
 
+    # This attribute specifies whether the plugin supports or not
+    # pagination/sorting operations. Name mangling is used in
+    # order to ensure it is qualified by class
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     def __init__(self):
         super(MeteringPlugin, self).__init__()
 
@@ -0,0 +1,179 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from neutron.agent.linux import iptables_firewall
+from neutron.agent.linux import nftables_firewall
+from neutron.agent import securitygroups_rpc as sg_cfg
+from neutron.tests.common import machine_fixtures
+from neutron.tests.common import net_helpers
+from neutron.tests.functional import base
+
+LOG = logging.getLogger(__name__)
+
+
+class NftablesFirewallTestCase(base.BaseSudoTestCase):
+    MAC_REAL = "fa:16:3e:9a:2f:49"
+    MAC_SPOOFED = "fa:16:3e:9a:2f:48"
+    FAKE_SECURITY_GROUP_ID = "fake_sg_id"
+
+    def _set_src_mac(self, mac):
+        self.client.port.link.set_down()
+        self.client.port.link.set_address(mac)
+        self.client.port.link.set_up()
+
+    def setUp(self):
+        cfg.CONF.register_opts(sg_cfg.security_group_opts, 'SECURITYGROUP')
+        super(NftablesFirewallTestCase, self).setUp()
+        self.check_command(['nft', '--version'], 'Exit code: 127',
+                           'nft is not installed', run_as_root=True)
+
+        bridge = self.useFixture(net_helpers.LinuxBridgeFixture()).bridge
+        self.client, self.server = self.useFixture(
+            machine_fixtures.PeerMachines(bridge)).machines
+
+        self.firewall = nftables_firewall.NftablesFirewallDriver(
+            namespace=bridge.namespace)
+
+        self._set_src_mac(self.MAC_REAL)
+
+        client_br_port_name = net_helpers.VethFixture.get_peer_name(
+            self.client.port.name)
+        self.src_port_desc = {'admin_state_up': True,
+                              'device': client_br_port_name,
+                              'device_owner': 'compute:None',
+                              'fixed_ips': [self.client.ip],
+                              'mac_address': self.MAC_REAL,
+                              'port_security_enabled': True,
+                              'security_groups': [self.FAKE_SECURITY_GROUP_ID],
+                              'status': 'ACTIVE'}
+
+    def test_port_sec_within_firewall(self):
+        sg_rules = [{'ethertype': 'IPv4', 'direction': 'ingress',
+                     'source_ip_prefix': '0.0.0.0/0', 'protocol': 'icmp'},
+                    {'ethertype': 'IPv4', 'direction': 'egress'}]
+
+        with self.firewall.defer_apply():
+            self.firewall.update_security_group_rules(
+                self.FAKE_SECURITY_GROUP_ID, sg_rules)
+        self.firewall.prepare_port_filter(self.src_port_desc)
+        self.client.assert_ping(self.server.ip)
+
+        # modify the src_veth's MAC and test again
+        self._set_src_mac(self.MAC_SPOOFED)
+        self.client.assert_no_ping(self.server.ip)
+
+        # update the port's port_security_enabled value and test again
+        self.src_port_desc['port_security_enabled'] = False
+        self.firewall.update_port_filter(self.src_port_desc)
+        self.client.assert_ping(self.server.ip)
+
+    def test_remote_group_member_update(self):
+        sg_rules = [{'ethertype': 'IPv4', 'direction': 'egress',
+                     'remote_group_id': self.FAKE_SECURITY_GROUP_ID}]
+        self.firewall.update_security_group_rules(
+            self.FAKE_SECURITY_GROUP_ID, sg_rules)
+        self.firewall.update_security_group_members(
+            self.FAKE_SECURITY_GROUP_ID, {'IPv4': []})
+        self.firewall.prepare_port_filter(self.src_port_desc)
+        self.client.assert_no_ping(self.server.ip)
+
+        self.firewall.update_security_group_members(
+            self.FAKE_SECURITY_GROUP_ID, {'IPv4': [self.server.ip]})
+        self.firewall.update_port_filter(self.src_port_desc)
+        self.client.assert_ping(self.server.ip)
+
+
+class FirewallDriverScaleTestCase(base.BaseSudoTestCase):
+    """Compare the time needed to program many ports with each driver.
+
+    The timings are logged, this is a benchmark rather than a pass/fail
+    test.
+    """
+    PORTS = 500
+    RULES_PER_PORT = 50
+
+    def setUp(self):
+        cfg.CONF.register_opts(sg_cfg.security_group_opts, 'SECURITYGROUP')
+        super(FirewallDriverScaleTestCase, self).setUp()
+        self.check_command(['nft', '--version'], 'Exit code: 127',
+                           'nft is not installed', run_as_root=True)
+        self.namespace = self.useFixture(net_helpers.NamespaceFixture()).name
+
+    def _sg_rules(self, sg_index):
+        rules = [{'ethertype': 'IPv4', 'direction': 'ingress',
+                  'protocol': 'tcp', 'port_range_min': 1000 + i,
+                  'port_range_max': 1000 + i,
+                  'source_ip_prefix': '10.%d.%d.0/24' % (sg_index % 256, i)}
+                 for i in range(self.RULES_PER_PORT - 2)]
+        rules += [{'ethertype': 'IPv4', 'direction': 'ingress',
+                   'remote_group_id': 'sg-%d' % sg_index},
+                  {'ethertype': 'IPv4', 'direction': 'egress'}]
+        return rules
+
+    def _port(self, index):
+        return {'device': 'tap%011d' % index,
+                'mac_address': 'fa:16:3e:00:%02x:%02x' % (index // 256,
+                                                          index % 256),
+                'fixed_ips': ['10.%d.%d.%d' % (200 + index // 65536,
+                                               index // 256 % 256,
+                                               index % 256)],
+                'security_groups': ['sg-%d' % (index % 10)]}
+
+    def _program_ports(self, firewall):
+        for sg_index in range(10):
+            sg_id = 'sg-%d' % sg_index
+            firewall.update_security_group_rules(
+                sg_id, self._sg_rules(sg_index))
+            firewall.update_security_group_members(
+                sg_id, {'IPv4': [self._port(i)['fixed_ips'][0]
+                                 for i in range(sg_index, self.PORTS, 10)]})
+        start = time.time()
+        with firewall.defer_apply():
+            for index in range(self.PORTS):
+                firewall.prepare_port_filter(self._port(index))
+        return time.time() - start
+
+    def _update_members(self, firewall):
+        start = time.time()
+        with firewall.defer_apply():
+            firewall.security_group_updated('sg_member', ['sg-0'])
+            firewall.update_security_group_members(
+                'sg-0', {'IPv4': ['10.250.0.1']})
+            for index in range(0, self.PORTS, 10):
+                firewall.update_port_filter(self._port(index))
+        return time.time() - start
+
+    def test_scale(self):
+        results = {}
+        for name, firewall in (
+                ('iptables', iptables_firewall.IptablesFirewallDriver(
+                    namespace=self.namespace)),
+                ('nftables', nftables_firewall.NftablesFirewallDriver(
+                    namespace=self.namespace))):
+            results[name] = (self._program_ports(firewall),
+                             self._update_members(firewall))
+            self.assertEqual(self.PORTS, len(firewall.ports))
+        for name, (programming, member_update) in sorted(results.items()):
+            LOG.info("%(name)s: %(ports)d ports x %(rules)d rules "
+                     "programmed in %(programming).2fs, member update "
+                     "applied in %(member_update).2fs",
+                     {'name': name, 'ports': self.PORTS,
+                      'rules': self.RULES_PER_PORT,
+                      'programming': programming,
+                      'member_update': member_update})
@@ -550,9 +550,10 @@ class L3AgentTestCase(L3AgentTestFramework):
             deleted_routers_info.append(ri)
             ns_names_to_retrieve.add(ri.ns_name)
 
-        mocked_get_routers = self.mock_plugin_api.get_routers
-        mocked_get_routers.return_value = (routers_to_keep +
-                                           routers_deleted_during_resync)
+        mocked_get_routers_page = self.mock_plugin_api.get_routers_page
+        mocked_get_routers_page.return_value = {
+            'routers': routers_to_keep + routers_deleted_during_resync,
+            'snapshot': _uuid(), 'next_marker': None}
         # clear agent router_info as it will be after restart
         self.agent.router_info = {}
 
@@ -579,7 +580,7 @@ class L3AgentTestCase(L3AgentTestFramework):
             self.agent.router_deleted(self.agent.context, r['id'])
 
         # make sure all events are processed
-        while not self.agent._queue._queue.empty():
+        while not self.agent._queue.empty():
             self.agent._process_router_update()
 
         for r in routers_to_keep:
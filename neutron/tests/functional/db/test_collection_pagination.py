@@ -0,0 +1,112 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import operator
+
+from oslo_log import log as logging
+from oslo_utils import timeutils
+from oslo_utils import uuidutils
+
+from neutron.db import common_db_mixin
+from neutron.db import l3_db
+from neutron.db import model_base
+from neutron.tests import base
+from neutron.tests.common import base as common_base
+from neutron.tests.functional.db import test_ipam
+
+LOG = logging.getLogger(__name__)
+
+
+class RouterPlugin(common_db_mixin.CommonDbMixin,
+                   l3_db.L3_NAT_dbonly_mixin):
+    pass
+
+
+class CollectionPaginationScaleTestCase(object):
+    """List pages of a large collection of routers.
+
+    Pages are fetched in primary key order, the default order of the API,
+    with sorting and pagination done in SQL as the API does for plugins
+    supporting native pagination, and by loading the whole collection then
+    sorting and paging it, as the API does otherwise. The
+    timings are logged, this is a benchmark rather than a pass/fail test.
+    """
+    ROWS = 100000
+    PAGE_SIZE = 100
+    PAGES = 10
+    CHUNK_SIZE = 5000
+
+    def setUp(self):
+        super(CollectionPaginationScaleTestCase, self).setUp()
+        model_base.BASEV2.metadata.create_all(self.engine)
+        rows = [{'id': uuidutils.generate_uuid(),
+                 'tenant_id': 'tenant-%d' % (i % 10),
+                 'name': 'router-%d' % i,
+                 'status': 'ACTIVE',
+                 'admin_state_up': True} for i in range(self.ROWS)]
+        for i in range(0, self.ROWS, self.CHUNK_SIZE):
+            self.engine.execute(l3_db.Router.__table__.insert(),
+                                rows[i:i + self.CHUNK_SIZE])
+        self.ctx = test_ipam.get_admin_test_context(self.engine.url)
+        self.addCleanup(self.ctx.session.close)
+        self.plugin = RouterPlugin()
+
+    def _get_native_page(self, marker):
+        return self.plugin.get_routers(
+            self.ctx, sorts=[('id', True)], limit=self.PAGE_SIZE,
+            marker=marker)
+
+    def _get_emulated_page(self, marker):
+        routers = sorted(self.plugin.get_routers(self.ctx),
+                         key=operator.itemgetter('id'))
+        start = 0
+        if marker:
+            start = [r['id'] for r in routers].index(marker) + 1
+        return routers[start:start + self.PAGE_SIZE]
+
+    def _list_pages(self, get_page):
+        ids = []
+        marker = None
+        start = timeutils.utcnow()
+        for i in range(self.PAGES):
+            page = get_page(marker)
+            marker = page[-1]['id']
+            ids.extend(r['id'] for r in page)
+        elapsed = timeutils.delta_seconds(start, timeutils.utcnow())
+        return ids, elapsed
+
+    def test_list_pages(self):
+        native_ids, native_elapsed = self._list_pages(self._get_native_page)
+        emulated_ids, emulated_elapsed = self._list_pages(
+            self._get_emulated_page)
+
+        LOG.info("Listing %(pages)d pages of %(size)d routers out of "
+                 "%(rows)d took %(native).3fs with SQL pagination and "
+                 "%(emulated).3fs with emulated pagination",
+                 {'pages': self.PAGES, 'size': self.PAGE_SIZE,
+                  'rows': self.ROWS, 'native': native_elapsed,
+                  'emulated': emulated_elapsed})
+        self.assertEqual(emulated_ids, native_ids)
+
+
+class CollectionPaginationScaleMySql(CollectionPaginationScaleTestCase,
+                                     common_base.MySQLTestCase,
+                                     base.BaseTestCase):
+    pass
+
+
+class CollectionPaginationScalePsql(CollectionPaginationScaleTestCase,
+                                    common_base.PostgreSQLTestCase,
+                                    base.BaseTestCase):
+    pass
@@ -0,0 +1,107 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from oslo_db import exception as db_exc
+from oslo_log import log as logging
+from oslo_utils import timeutils
+
+from neutron.db import model_base
+from neutron.ipam.drivers.neutrondb_ipam import driver
+from neutron.ipam import requests as ipam_req
+from neutron.tests import base
+from neutron.tests.common import base as common_base
+from neutron.tests.functional.db import test_ipam
+
+LOG = logging.getLogger(__name__)
+
+
+class IpamAllocationScaleTestCase(object):
+    """Allocate IP addresses of a subnet concurrently from many API workers.
+
+    Each worker has its own database session, as separate neutron-server
+    processes would, and retries its transaction when it fails on a
+    concurrent update. The allocations made with availability ranges and
+    with allocation bitmaps are timed, and the number of retries is
+    logged, this is a benchmark rather than a pass/fail test.
+    """
+    WORKERS = 50
+    ALLOCATIONS = 10
+    CIDR = '10.0.0.0/16'
+
+    def setUp(self):
+        super(IpamAllocationScaleTestCase, self).setUp()
+        model_base.BASEV2.metadata.create_all(self.engine)
+
+    def _create_subnet(self, pool_class, subnet_id):
+        ctx = test_ipam.get_admin_test_context(self.engine.url)
+        self.addCleanup(ctx.session.close)
+        subnet_req = ipam_req.SpecificSubnetRequest(
+            'test_tenant', subnet_id, self.CIDR, gateway_ip='10.0.0.1')
+        with ctx.session.begin(subtransactions=True):
+            pool_class(None, ctx).allocate_subnet(subnet_req)
+
+    def _allocate(self, pool_class, subnet_id, retries):
+        ctx = test_ipam.get_admin_test_context(self.engine.url)
+        ip_addresses = []
+        try:
+            while len(ip_addresses) < self.ALLOCATIONS:
+                try:
+                    with ctx.session.begin(subtransactions=True):
+                        subnet = pool_class(None, ctx).get_subnet(subnet_id)
+                        ip_addresses.append(
+                            subnet.allocate(ipam_req.AnyAddressRequest))
+                except (db_exc.RetryRequest, db_exc.DBDeadlock):
+                    retries.append(subnet_id)
+        finally:
+            ctx.session.close()
+        return ip_addresses
+
+    def _test_concurrent_allocations(self, pool_class, subnet_id):
+        self._create_subnet(pool_class, subnet_id)
+        retries = []
+        pool = eventlet.GreenPool(self.WORKERS)
+        start = timeutils.utcnow()
+        results = [pool.spawn(self._allocate, pool_class, subnet_id, retries)
+                   for i in range(self.WORKERS)]
+        ip_addresses = [ip_address for result in results
+                        for ip_address in result.wait()]
+        elapsed = timeutils.delta_seconds(start, timeutils.utcnow())
+
+        LOG.info("%(count)d concurrent allocations with %(driver)s took "
+                 "%(elapsed).3fs with %(retries)d retries",
+                 {'count': len(ip_addresses), 'driver': pool_class.__name__,
+                  'elapsed': elapsed, 'retries': len(retries)})
+        self.assertEqual(self.WORKERS * self.ALLOCATIONS,
+                         len(set(ip_addresses)))
+
+    def test_concurrent_range_allocations(self):
+        self._test_concurrent_allocations(driver.NeutronDbPool,
+                                          'range_subnet_id')
+
+    def test_concurrent_block_allocations(self):
+        self._test_concurrent_allocations(driver.NeutronDbBlockPool,
+                                          'block_subnet_id')
+
+
+class IpamAllocationScaleMySql(IpamAllocationScaleTestCase,
+                               common_base.MySQLTestCase,
+                               base.BaseTestCase):
+    pass
+
+
+class IpamAllocationScalePsql(IpamAllocationScaleTestCase,
+                              common_base.PostgreSQLTestCase,
+                              base.BaseTestCase):
+    pass
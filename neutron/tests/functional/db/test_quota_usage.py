@@ -0,0 +1,104 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+from oslo_db.sqlalchemy import session
+from oslo_log import log as logging
+from oslo_utils import timeutils
+
+from neutron import context
+from neutron.db import model_base
+from neutron.db import models_v2
+from neutron.db.quota import driver
+from neutron import quota  # noqa
+from neutron.quota import resource
+from neutron.tests import base
+from neutron.tests.common import base as common_base
+
+LOG = logging.getLogger(__name__)
+
+
+class QuotaUsageScaleTestCase(object):
+    """Create the networks of a tenant concurrently from many API workers.
+
+    Each worker has its own database session, as separate neutron-server
+    processes would, and reserves quota for every network it creates then
+    commits the reservation, as the API does. The timings are logged, this
+    is a benchmark rather than a pass/fail test.
+    """
+    WORKERS = 50
+    CREATIONS = 4
+    TENANT_ID = 'test_tenant'
+
+    def setUp(self):
+        super(QuotaUsageScaleTestCase, self).setUp()
+        model_base.BASEV2.metadata.create_all(self.engine)
+        self.facade = session.EngineFacade(self.engine.url)
+        self.config(quota_network=2 * self.WORKERS * self.CREATIONS,
+                    group='QUOTAS')
+        self.resource = resource.TrackedResource(
+            'network', models_v2.Network, 'quota_network')
+        self.resource.register_events()
+        self.addCleanup(self.resource.unregister_events)
+        self.driver = driver.DbQuotaDriver()
+        # Create the usage counter of the tenant and its shards
+        self.resource.count(self._get_context(), None, self.TENANT_ID)
+
+    def _get_context(self):
+        ctx = context.get_admin_context()
+        ctx._session = self.facade.get_session()
+        return ctx
+
+    def _create_networks(self, worker):
+        ctx = self._get_context()
+        try:
+            for i in range(self.CREATIONS):
+                reservation = self.driver.make_reservation(
+                    ctx, self.TENANT_ID, {'network': self.resource},
+                    {'network': 1}, None)
+                with ctx.session.begin():
+                    ctx.session.add(models_v2.Network(
+                        tenant_id=self.TENANT_ID,
+                        name='net-%d-%d' % (worker, i),
+                        status='ACTIVE', admin_state_up=True))
+                self.driver.commit_reservation(ctx,
+                                               reservation.reservation_id)
+        finally:
+            ctx.session.close()
+
+    def test_concurrent_network_creations(self):
+        pool = eventlet.GreenPool(self.WORKERS)
+        start = timeutils.utcnow()
+        list(pool.imap(self._create_networks, range(self.WORKERS)))
+        elapsed = timeutils.delta_seconds(start, timeutils.utcnow())
+
+        LOG.info("%(count)d concurrent network creations with quota "
+                 "reservations took %(elapsed).3fs",
+                 {'count': self.WORKERS * self.CREATIONS,
+                  'elapsed': elapsed})
+        self.assertEqual(self.WORKERS * self.CREATIONS,
+                         self.resource.count(self._get_context(), None,
+                                             self.TENANT_ID))
+
+
+class QuotaUsageScaleMySql(QuotaUsageScaleTestCase,
+                           common_base.MySQLTestCase,
+                           base.BaseTestCase):
+    pass
+
+
+class QuotaUsageScalePsql(QuotaUsageScaleTestCase,
+                          common_base.PostgreSQLTestCase,
+                          base.BaseTestCase):
+    pass
@@ -0,0 +1,147 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import resource
+
+import eventlet
+import mock
+from oslo_db.sqlalchemy import session
+from oslo_log import log as logging
+from oslo_utils import timeutils
+
+from neutron.db import model_base
+from neutron.plugins.ml2 import config  # noqa
+from neutron.plugins.ml2.drivers import helpers
+from neutron.plugins.ml2.drivers import type_tunnel
+from neutron.plugins.ml2.drivers import type_vxlan
+from neutron.tests import base
+from neutron.tests.common import base as common_base
+
+LOG = logging.getLogger(__name__)
+
+
+class SegmentAllocationScaleTestCase(object):
+    """Allocate tenant segments concurrently from many API workers.
+
+    Each worker has its own type driver and database session, as separate
+    neutron-server processes would. The timings and the number of
+    collisions are logged, this is a benchmark rather than a pass/fail test.
+    """
+    WORKERS = 50
+    VNI_MIN = 1
+    VNI_MAX = 4096
+
+    def setUp(self):
+        super(SegmentAllocationScaleTestCase, self).setUp()
+        model_base.BASEV2.metadata.create_all(self.engine)
+        self.facade = session.EngineFacade(self.engine.url)
+        db_session = self.facade.get_session()
+        with db_session.begin():
+            for vni in range(self.VNI_MIN, self.VNI_MAX + 1):
+                db_session.add(type_vxlan.VxlanAllocation(
+                    vxlan_vni=vni, allocated=False))
+
+    def _allocate(self, driver):
+        db_session = self.facade.get_session()
+        try:
+            segment = driver.allocate_tenant_segment(db_session)
+        finally:
+            db_session.close()
+        return segment['segmentation_id']
+
+    def test_concurrent_tenant_segment_allocations(self):
+        drivers = [type_vxlan.VxlanTypeDriver() for i in range(self.WORKERS)]
+        collisions = []
+        try_allocate = helpers.SegmentTypeDriver._try_allocate_segment
+
+        def _try_allocate_segment(driver, db_session, raw_segment):
+            allocated = try_allocate(driver, db_session, raw_segment)
+            if not allocated:
+                collisions.append(raw_segment)
+            return allocated
+
+        pool = eventlet.GreenPool(self.WORKERS)
+        with mock.patch.object(helpers.SegmentTypeDriver,
+                               '_try_allocate_segment',
+                               autospec=True,
+                               side_effect=_try_allocate_segment):
+            start = timeutils.utcnow()
+            vnis = list(pool.imap(self._allocate, drivers))
+            elapsed = timeutils.delta_seconds(start, timeutils.utcnow())
+
+        LOG.info("%(workers)d concurrent allocations took %(elapsed).3fs "
+                 "with %(collisions)d collisions",
+                 {'workers': self.WORKERS, 'elapsed': elapsed,
+                  'collisions': len(collisions)})
+        self.assertEqual(self.WORKERS, len(set(vnis)))
+
+
+class TunnelSyncAllocationsScaleTestCase(object):
+    """Sync the allocations of the full VXLAN range at startup.
+
+    The first sync populates the table, the second one finds it complete as
+    on every later server restart. The timings and the peak RSS of the
+    process are logged, this is a benchmark rather than a pass/fail test.
+    """
+    VNI_MIN = 1
+    VNI_MAX = 2 ** 24 - 1
+
+    def setUp(self):
+        super(TunnelSyncAllocationsScaleTestCase, self).setUp()
+        model_base.BASEV2.metadata.create_all(self.engine)
+        self.facade = session.EngineFacade(self.engine.url)
+        mock.patch.object(type_tunnel.db_api, 'get_session',
+                          new=self.facade.get_session).start()
+
+    def _sync_allocations(self, driver):
+        start = timeutils.utcnow()
+        driver.sync_allocations()
+        elapsed = timeutils.delta_seconds(start, timeutils.utcnow())
+        LOG.info("Sync of %(count)d VNIs took %(elapsed).3fs, peak RSS is "
+                 "%(rss)d KiB",
+                 {'count': self.VNI_MAX - self.VNI_MIN + 1,
+                  'elapsed': elapsed,
+                  'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+
+    def test_sync_full_range(self):
+        driver = type_vxlan.VxlanTypeDriver()
+        driver.tunnel_ranges = [(self.VNI_MIN, self.VNI_MAX)]
+        self._sync_allocations(driver)
+        self._sync_allocations(driver)
+        self.assertIsNotNone(driver.get_allocation(
+            self.facade.get_session(), self.VNI_MAX))
+
+
+class SegmentAllocationScaleMySql(SegmentAllocationScaleTestCase,
+                                  common_base.MySQLTestCase,
+                                  base.BaseTestCase):
+    pass
+
+
+class SegmentAllocationScalePsql(SegmentAllocationScaleTestCase,
+                                 common_base.PostgreSQLTestCase,
+                                 base.BaseTestCase):
+    pass
+
+
+class TunnelSyncAllocationsScaleMySql(TunnelSyncAllocationsScaleTestCase,
+                                      common_base.MySQLTestCase,
+                                      base.BaseTestCase):
+    pass
+
+
+class TunnelSyncAllocationsScalePsql(TunnelSyncAllocationsScaleTestCase,
+                                     common_base.PostgreSQLTestCase,
+                                     base.BaseTestCase):
+    pass
@@ -558,6 +558,8 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         cfg.CONF.set_override('interface_driver',
                               'neutron.agent.linux.interface.NullDriver')
         entry.register_options(cfg.CONF)  # register all dhcp cfg options
+        # reload the allocations right away, see the port_events_batch tests
+        cfg.CONF.set_override('port_events_batch_interval', 0)
 
         self.plugin_p = mock.patch(DHCP_PLUGIN)
         plugin_cls = self.plugin_p.start()
@@ -981,6 +983,38 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.call_driver.assert_has_calls(
             [mock.call.call_driver('reload_allocations', fake_network)])
 
+    def test_port_events_batch(self):
+        cfg.CONF.set_override('port_events_batch_interval', 0.5)
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        with mock.patch.object(eventlet, 'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, dict(port=fake_port2))
+            self.dhcp.port_update_end(None, dict(port=fake_port1))
+            self.dhcp.port_delete_end(None, dict(port_id=fake_port2.id))
+        self.assertFalse(self.call_driver.called)
+        spawn_after.assert_called_once_with(
+            0.5, self.dhcp._reload_allocations, fake_network.id)
+
+        self.dhcp._reload_allocations(fake_network.id)
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+        # a new port event schedules a new reload
+        with mock.patch.object(eventlet, 'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, dict(port=fake_port2))
+        self.assertTrue(spawn_after.called)
+
+    def test_port_events_batch_other_driver_action(self):
+        cfg.CONF.set_override('port_events_batch_interval', 0.5)
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        self.call_driver_p.stop()
+        with mock.patch.object(eventlet, 'spawn_after'),\
+                mock.patch.object(self.dhcp, 'dhcp_driver_cls') as driver:
+            self.dhcp.port_update_end(None, dict(port=fake_port2))
+            self.dhcp.call_driver('restart', fake_network)
+            self.dhcp._reload_allocations(fake_network.id)
+        self.assertFalse(driver.return_value.reload_allocations.called)
+
     def test_port_delete_end_unknown_port(self):
         payload = dict(port_id='unknown')
         self.cache.get_port_by_id.return_value = None
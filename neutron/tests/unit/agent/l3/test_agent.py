@@ -36,6 +36,7 @@ from neutron.agent.l3 import legacy_router
 from neutron.agent.l3 import link_local_allocator as lla
 from neutron.agent.l3 import namespaces
 from neutron.agent.l3 import router_info as l3router
+from neutron.agent.l3 import router_processing_queue as l3_queue
 from neutron.agent.linux import dibbler
 from neutron.agent.linux import external_process
 from neutron.agent.linux import interface
@@ -180,7 +181,7 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
 
     def test_periodic_sync_routers_task_raise_exception(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
-        self.plugin_api.get_routers.side_effect = ValueError
+        self.plugin_api.get_routers_page.side_effect = ValueError
         self.assertRaises(ValueError,
                           agent.periodic_sync_routers_task,
                           agent.context)
@@ -212,17 +213,84 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
                                                  use_call_arg)
             self.assertIsNone(agent.agent_state.get('start_flag'))
 
+    def test_l3_report_state_router_processing(self):
+        with mock.patch.object(agent_rpc.PluginReportStateAPI,
+                               'report_state'):
+            agent = l3_agent.L3NATAgentWithStateReport(host=HOSTNAME,
+                                                       conf=self.conf)
+            agent._queue.add(l3_queue.RouterUpdate(
+                _uuid(), l3_queue.PRIORITY_SYNC_ROUTERS_TASK))
+            agent._report_state()
+            router_processing = (
+                agent.agent_state['configurations']['router_processing'])
+            self.assertEqual({'queued': 0},
+                             router_processing[l3_queue.LANE_UPDATE])
+            self.assertEqual({'queued': 1},
+                             router_processing[l3_queue.LANE_RESYNC])
+
     def test_periodic_sync_routers_task_call_clean_stale_namespaces(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
-        self.plugin_api.get_routers.return_value = []
+        self.plugin_api.get_routers_page.return_value = {
+            'routers': [], 'snapshot': _uuid(), 'next_marker': None}
         agent.periodic_sync_routers_task(agent.context)
         self.assertFalse(agent.namespaces_manager._clean_stale)
 
+    def test_periodic_sync_routers_task_pages(self):
+        self.conf.set_override('sync_routers_page_size', 2)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
+        stale_router_id = _uuid()
+        agent.router_info[stale_router_id] = mock.Mock()
+        routers = [{'id': _uuid()} for i in range(3)]
+        snapshot_id = _uuid()
+        queued = []
+
+        def get_routers_page(context, marker=None, snapshot=None,
+                             page_size=None):
+            # the routers of the previous pages are already queued
+            queued.append(agent._queue.add.call_count)
+            if not marker:
+                return {'routers': routers[:2], 'snapshot': snapshot_id,
+                        'next_marker': routers[1]['id']}
+            return {'routers': routers[2:], 'snapshot': snapshot_id,
+                    'next_marker': None}
+
+        self.plugin_api.get_routers_page.side_effect = get_routers_page
+        agent.periodic_sync_routers_task(agent.context)
+
+        self.assertEqual([0, 2], queued)
+        self.plugin_api.get_routers_page.assert_has_calls([
+            mock.call(agent.context, marker=None, snapshot=None,
+                      page_size=2),
+            mock.call(agent.context, marker=routers[1]['id'],
+                      snapshot=snapshot_id, page_size=2)])
+        updates = [c[0][0] for c in agent._queue.add.call_args_list]
+        self.assertEqual([r['id'] for r in routers] + [stale_router_id],
+                         [u.id for u in updates])
+        self.assertEqual(l3_queue.DELETE_ROUTER, updates[-1].action)
+        self.assertFalse(agent.fullsync)
+
+    def test_periodic_sync_routers_task_page_rpc_error(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
+        agent.router_info[_uuid()] = mock.Mock()
+        router = {'id': _uuid()}
+        self.plugin_api.get_routers_page.side_effect = [
+            {'routers': [router], 'snapshot': _uuid(),
+             'next_marker': router['id']},
+            oslo_messaging.MessagingTimeout]
+        agent.periodic_sync_routers_task(agent.context)
+        # no router is deleted on the ground of an incomplete sync
+        self.assertEqual(1, agent._queue.add.call_count)
+        self.assertTrue(agent.fullsync)
+
     def test_periodic_sync_routers_task_call_clean_stale_meta_proxies(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         stale_router_ids = [_uuid(), _uuid()]
         active_routers = [{'id': _uuid()}, {'id': _uuid()}]
-        self.plugin_api.get_routers.return_value = active_routers
+        self.plugin_api.get_routers_page.return_value = {
+            'routers': active_routers, 'snapshot': _uuid(),
+            'next_marker': None}
         namespace_list = [namespaces.NS_PREFIX + r_id
                           for r_id in stale_router_ids]
         namespace_list += [namespaces.NS_PREFIX + r['id']
@@ -1801,6 +1869,43 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
         router_processor.fetched_and_processed.assert_called_once_with(
             update.timestamp)
 
+    def test_process_routers_update_records_metrics(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router = {'id': _uuid()}
+        agent._process_router_if_compatible = mock.Mock()
+        agent.router_info[router['id']] = mock.Mock()
+        agent._queue.add(l3_queue.RouterUpdate(
+            router['id'], l3_queue.PRIORITY_RPC, router=router))
+
+        agent._process_router_update([l3_queue.LANE_UPDATE])
+        agent._process_router_if_compatible.assert_called_once_with(router)
+        self.assertEqual(
+            1, agent._queue.metrics.get_router_stats(router['id'])['updates'])
+        self.assertEqual(1, agent._queue.metrics.get_lane_stats()[
+            l3_queue.LANE_UPDATE]['updates'])
+
+    def test_process_routers_update_forgets_removed_router_metrics(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        agent._safe_router_removed = mock.Mock(return_value=True)
+        agent._queue.add(l3_queue.RouterUpdate(
+            router_id, l3_queue.PRIORITY_RPC,
+            action=l3_queue.DELETE_ROUTER))
+
+        agent._process_router_update()
+        agent._safe_router_removed.assert_called_once_with(router_id)
+        self.assertIsNone(agent._queue.metrics.get_router_stats(router_id))
+
+    def test_process_routers_loop(self):
+        self.conf.set_override('router_update_workers', 2)
+        self.conf.set_override('router_resync_workers', 3)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        with mock.patch.object(eventlet, 'spawn_n') as spawn_n,\
+                mock.patch.object(agent, '_process_routers_pool') as pool:
+            agent._process_routers_loop()
+        spawn_n.assert_called_once_with(pool, 2, [l3_queue.LANE_UPDATE])
+        pool.assert_called_once_with(3, l3_queue.LANES)
+
     def test_process_router_if_compatible_with_no_ext_net_in_conf(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         self.plugin_api.get_external_network_id.return_value = 'aaa'
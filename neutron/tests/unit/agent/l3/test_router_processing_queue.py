@@ -101,3 +101,106 @@ class TestExclusiveRouterProcessor(base.BaseTestCase):
             raise Exception("Only the master should process a router")
 
         self.assertEqual(2, len([i for i in master.updates()]))
+
+
+class TestRouterProcessingQueue(base.BaseTestCase):
+    def setUp(self):
+        super(TestRouterProcessingQueue, self).setUp()
+        self.queue = l3_queue.RouterProcessingQueue()
+        self.router_id = _uuid()
+        self.router_id_2 = _uuid()
+
+    def _updates(self, lanes=l3_queue.LANES):
+        return [update for rp, update in
+                self.queue.each_update_to_next_router(lanes)]
+
+    def test_lane(self):
+        rpc = l3_queue.RouterUpdate(self.router_id, l3_queue.PRIORITY_RPC)
+        sync = l3_queue.RouterUpdate(self.router_id,
+                                     l3_queue.PRIORITY_SYNC_ROUTERS_TASK)
+        pd = l3_queue.RouterUpdate(None, l3_queue.PRIORITY_PD_UPDATE)
+        self.assertEqual(l3_queue.LANE_UPDATE, rpc.lane)
+        self.assertEqual(l3_queue.LANE_RESYNC, sync.lane)
+        self.assertEqual(l3_queue.LANE_RESYNC, pd.lane)
+
+    def test_add(self):
+        self.assertTrue(self.queue.empty())
+        update = l3_queue.RouterUpdate(self.router_id, l3_queue.PRIORITY_RPC)
+        self.queue.add(update)
+        self.queue.add(l3_queue.RouterUpdate(
+            self.router_id_2, l3_queue.PRIORITY_SYNC_ROUTERS_TASK))
+        self.assertFalse(self.queue.empty())
+        self.assertIsNotNone(update.enqueued_at)
+        self.assertEqual(2, self.queue.qsize())
+        self.assertEqual(1, self.queue.qsize(l3_queue.LANE_UPDATE))
+        self.assertEqual(1, self.queue.qsize(l3_queue.LANE_RESYNC))
+
+    def test_each_update_to_next_router_priority_across_lanes(self):
+        self.queue.add(l3_queue.RouterUpdate(
+            self.router_id, l3_queue.PRIORITY_SYNC_ROUTERS_TASK))
+        self.queue.add(l3_queue.RouterUpdate(self.router_id_2,
+                                             l3_queue.PRIORITY_RPC))
+        self.assertEqual([self.router_id_2], [u.id for u in self._updates()])
+        self.assertEqual([self.router_id], [u.id for u in self._updates()])
+        self.assertTrue(self.queue.empty())
+
+    def test_each_update_to_next_router_lanes(self):
+        self.queue.add(l3_queue.RouterUpdate(
+            self.router_id, l3_queue.PRIORITY_SYNC_ROUTERS_TASK))
+        self.queue.add(l3_queue.RouterUpdate(self.router_id_2,
+                                             l3_queue.PRIORITY_RPC))
+        self.assertEqual([self.router_id_2], [u.id for u in self._updates(
+            [l3_queue.LANE_UPDATE])])
+        self.assertEqual(1, self.queue.qsize(l3_queue.LANE_RESYNC))
+
+    def test_each_update_to_next_router_exclusive(self):
+        router_id = _uuid()
+        self.queue.add(l3_queue.RouterUpdate(router_id,
+                                             l3_queue.PRIORITY_RPC))
+        self.queue.add(l3_queue.RouterUpdate(router_id,
+                                             l3_queue.PRIORITY_RPC))
+        master = self.queue.each_update_to_next_router()
+        next(master)
+        # Another worker grabbing an update for the router being processed
+        # hands it over to the master instead of processing it.
+        self.assertEqual([], self._updates())
+        self.assertEqual(1, len(list(master)))
+
+
+class TestRouterProcessingMetrics(base.BaseTestCase):
+    def setUp(self):
+        super(TestRouterProcessingMetrics, self).setUp()
+        self.metrics = l3_queue.RouterProcessingMetrics()
+        self.now = datetime.datetime.utcnow()
+
+    def _record(self, router_id, priority, wait, processing):
+        update = l3_queue.RouterUpdate(router_id, priority)
+        update.enqueued_at = self.now - datetime.timedelta(seconds=wait)
+        self.metrics.record(update, self.now,
+                            self.now + datetime.timedelta(seconds=processing))
+
+    def test_record(self):
+        self._record(FAKE_ID, l3_queue.PRIORITY_RPC, 1, 2)
+        self._record(FAKE_ID, l3_queue.PRIORITY_SYNC_ROUTERS_TASK, 3, 4)
+        self._record(FAKE_ID_2, l3_queue.PRIORITY_RPC, 5, 6)
+        self.assertEqual({'updates': 2, 'avg_wait': 2.0, 'max_wait': 3.0,
+                          'avg_processing': 3.0, 'max_processing': 4.0},
+                         self.metrics.get_router_stats(FAKE_ID))
+        lanes = self.metrics.get_lane_stats()
+        self.assertEqual({'updates': 2, 'avg_wait': 3.0, 'max_wait': 5.0,
+                          'avg_processing': 4.0, 'max_processing': 6.0},
+                         lanes[l3_queue.LANE_UPDATE])
+        self.assertEqual(1, lanes[l3_queue.LANE_RESYNC]['updates'])
+
+    def test_record_not_queued(self):
+        update = l3_queue.RouterUpdate(FAKE_ID, l3_queue.PRIORITY_RPC)
+        self.metrics.record(update, self.now, self.now)
+        self.assertEqual(0.0,
+                         self.metrics.get_router_stats(FAKE_ID)['max_wait'])
+
+    def test_forget(self):
+        self._record(FAKE_ID, l3_queue.PRIORITY_RPC, 1, 2)
+        self.metrics.forget(FAKE_ID)
+        self.assertIsNone(self.metrics.get_router_stats(FAKE_ID))
+        self.assertEqual(
+            1, self.metrics.get_lane_stats()[l3_queue.LANE_UPDATE]['updates'])
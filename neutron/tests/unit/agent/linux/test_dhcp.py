@@ -825,6 +825,7 @@ class TestBase(TestConfBase):
 
         self.external_process = mock.patch(
             'neutron.agent.linux.external_process.ProcessManager').start()
+        mock.patch.dict(dhcp.Dnsmasq._host_indexes, clear=True).start()
 
         self.mock_mgr.return_value.driver.bridged = True
 
@@ -1801,6 +1802,37 @@ class TestDnsmasq(TestBase):
         # file.
         self.assertEqual(2, len(logger.method_calls))
 
+    def test__output_hosts_file_reuses_unchanged_ports(self):
+        network = FakeDualNetwork()
+        dm = self._get_dnsmasq(network)
+        dm._output_hosts_file()
+        expected = self.safe.call_args
+        updated_port = FakeDualPort()
+        network.ports[2] = updated_port
+        with mock.patch.object(dm, '_iter_port_hosts',
+                               wraps=dm._iter_port_hosts) as iter_port_hosts:
+            dm._output_hosts_file()
+            dm._output_addn_hosts_file()
+        iter_port_hosts.assert_called_once_with(updated_port, mock.ANY)
+        self.assertEqual(expected, self.safe.call_args_list[1])
+
+    def test__output_hosts_file_subnets_change(self):
+        network = FakeDualNetwork()
+        dm = self._get_dnsmasq(network)
+        dm._output_hosts_file()
+        network.subnets = [FakeV4Subnet()]
+        with mock.patch.object(dm, '_iter_port_hosts',
+                               return_value=[]) as iter_port_hosts:
+            dm._output_hosts_file()
+        self.assertEqual(len(network.ports), iter_port_hosts.call_count)
+
+    def test_disable_drops_host_index(self):
+        dm = self._get_dnsmasq(FakeDualNetwork())
+        dm._output_hosts_file()
+        self.assertIn(dm.network.id, dhcp.Dnsmasq._host_indexes)
+        dm.disable()
+        self.assertNotIn(dm.network.id, dhcp.Dnsmasq._host_indexes)
+
     def test_only_populates_dhcp_enabled_subnets(self):
         exp_host_name = '/dhcp/eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee/host'
         exp_host_data = ('00:00:80:aa:bb:cc,host-192-168-0-2.openstacklocal.,'
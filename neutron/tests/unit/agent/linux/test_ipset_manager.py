@@ -162,3 +162,77 @@ class IpsetManagerTestCase(BaseIpsetManagerTest):
         self.expect_destroy()
         self.ipset.destroy(TEST_SET_ID, ETHERTYPE)
         self.verify_mock_calls()
+
+    def expect_restore(self, commands):
+        self.expected_calls.append(
+            mock.call(['ipset', 'restore', '-exist'],
+                      process_input='\n'.join(commands),
+                      run_as_root=True,
+                      check_exit_code=True))
+
+    def refresh_commands(self, set_name, addresses):
+        new_set_name = set_name + ipset_manager.SWAP_SUFFIX
+        commands = ['create %s hash:net family inet' % new_set_name,
+                    'flush %s' % new_set_name]
+        commands.extend('add %s %s' % (new_set_name, ip)
+                        for ip in self.ipset._sanitize_addresses(addresses))
+        commands.extend(['swap %s %s' % (new_set_name, set_name),
+                         'destroy %s' % new_set_name])
+        return commands
+
+    def test_defer_apply_batches_new_sets(self):
+        other_set_name = self.ipset.get_name('other_sgid', ETHERTYPE)
+        self.expected_calls = []
+        self.expect_restore(
+            ['create %s hash:net family inet' % TEST_SET_NAME] +
+            self.refresh_commands(TEST_SET_NAME, FAKE_IPS[0:2]) +
+            ['create %s hash:net family inet' % other_set_name] +
+            self.refresh_commands(other_set_name, FAKE_IPS[2:3]))
+        with self.ipset.defer_apply():
+            self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:2])
+            self.ipset.set_members('other_sgid', ETHERTYPE, FAKE_IPS[2:3])
+            self.assertTrue(self.ipset.set_exists(TEST_SET_ID, ETHERTYPE))
+            self.assertFalse(self.execute.called)
+        self.assertEqual(self.expected_calls, self.execute.call_args_list)
+
+    def test_defer_apply_adding_and_deleting_less_than_5(self):
+        self.add_first_ip()
+        self.execute.reset_mock()
+        self.expected_calls = []
+        self.expect_restore(['add %s %s/32' % (TEST_SET_NAME, FAKE_IPS[1]),
+                             'del %s %s/32' % (TEST_SET_NAME, FAKE_IPS[0])])
+        with self.ipset.defer_apply():
+            self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[1:2])
+        self.assertEqual(self.expected_calls, self.execute.call_args_list)
+
+    def test_defer_apply_adding_more_than_5(self):
+        self.add_first_ip()
+        self.execute.reset_mock()
+        self.expected_calls = []
+        self.expect_restore(self.refresh_commands(TEST_SET_NAME, FAKE_IPS))
+        with self.ipset.defer_apply():
+            self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS)
+        self.assertEqual(self.expected_calls, self.execute.call_args_list)
+
+    def test_defer_apply_without_changes(self):
+        with self.ipset.defer_apply():
+            pass
+        self.assertFalse(self.execute.called)
+
+    def test_defer_apply_failure_forgets_sets(self):
+        self.execute.side_effect = RuntimeError
+        self.ipset.defer_apply_on()
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:1])
+        self.assertRaises(RuntimeError, self.ipset.defer_apply_off)
+        self.assertFalse(self.ipset.set_exists(TEST_SET_ID, ETHERTYPE))
+
+    def test_destroy_while_deferred_applies_pending_changes(self):
+        self.expected_calls = []
+        self.expect_restore(
+            ['create %s hash:net family inet' % TEST_SET_NAME] +
+            self.refresh_commands(TEST_SET_NAME, FAKE_IPS[0:1]))
+        self.expect_destroy()
+        with self.ipset.defer_apply():
+            self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:1])
+            self.ipset.destroy(TEST_SET_ID, ETHERTYPE)
+        self.assertEqual(self.expected_calls, self.execute.call_args_list)
@@ -1777,6 +1777,23 @@ class IptablesFirewallEnhancedIpsetTestCase(BaseIptablesFirewallTestCase):
 
         self.firewall.ipset.assert_has_calls(calls, any_order=True)
 
+    def test_filter_defer_apply_applies_ipsets_before_iptables(self):
+        self.firewall.sg_rules = self._fake_sg_rules()
+        self.firewall.sg_members = self._fake_sg_members()
+        parent = mock.Mock()
+        parent.attach_mock(self.firewall.ipset, 'ipset')
+        parent.attach_mock(self.iptables_inst, 'iptables')
+        with self.firewall.defer_apply():
+            self.firewall.prepare_port_filter(self._fake_port())
+
+        calls = [call[0] for call in parent.mock_calls]
+        self.assertLess(calls.index('ipset.defer_apply_on'),
+                        calls.index('ipset.set_members'))
+        self.assertLess(calls.index('ipset.set_members'),
+                        calls.index('ipset.defer_apply_off'))
+        self.assertLess(calls.index('ipset.defer_apply_off'),
+                        calls.index('iptables.defer_apply_off'))
+
     def test_filter_defer_apply_off_with_sg_only_ipv6_rule(self):
         self.firewall.sg_rules = self._fake_sg_rules()
         self.firewall.pre_sg_rules = self._fake_sg_rules()
@@ -1050,6 +1050,203 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
                          filter_map['-A INPUT -d 192.168.0.2 -j DROP'][0])
 
 
+class IptablesManagerIncrementalTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalTestCase, self).setUp()
+        cfg.CONF.set_override('comment_iptables_rules', False, 'AGENT')
+        cfg.CONF.set_override('iptables_incremental_apply', True, 'AGENT')
+        cfg.CONF.set_override('iptables_state_check_interval', 0, 'AGENT')
+        self.iptables = iptables_manager.IptablesManager()
+        self.execute = mock.patch.object(self.iptables, "execute").start()
+
+    def _apply_with_kernel_state(self, filter_dump=FILTER_DUMP):
+        # make the kernel look like what a full apply would have left
+        self.execute.return_value = (RAW_DUMP + NAT_DUMP + MANGLE_DUMP +
+                                     filter_dump)
+        self.iptables.apply()
+
+    def _add_filter_rules(self):
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.ipv4['filter'].add_rule('INPUT',
+                                              '-s 0/0 -d 192.168.0.2 -j '
+                                              '$filter')
+
+    def _filter_dump_with_rules(self):
+        iptables_args = dict(IPTABLES_ARG)
+        iptables_args['filter_rules'] = (
+            '[0:0] -A %(bn)s-filter -j DROP\n'
+            '[0:0] -A %(bn)s-INPUT -s 0/0 -d 192.168.0.2 -j '
+            '%(bn)s-filter\n' % iptables_args)
+        return FILTER_WITH_RULES_TEMPLATE % iptables_args
+
+    def test_apply_in_sync_does_not_restore(self):
+        self._apply_with_kernel_state()
+        self.execute.assert_called_once_with(['iptables-save', '-c'],
+                                             run_as_root=True)
+
+    def test_apply_without_changes_skips_save(self):
+        self._apply_with_kernel_state()
+        self.execute.reset_mock()
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_apply_only_sends_changed_chains(self):
+        self._apply_with_kernel_state()
+        self.execute.reset_mock()
+        self._add_filter_rules()
+        self._apply_with_kernel_state()
+
+        expected_input = ('# Generated by iptables_manager\n'
+                          '*filter\n'
+                          '-N %(bn)s-filter\n'
+                          '-A %(bn)s-INPUT -s 0/0 -d 192.168.0.2 -j '
+                          '%(bn)s-filter\n'
+                          '-A %(bn)s-filter -j DROP\n'
+                          'COMMIT\n'
+                          '# Completed by iptables_manager\n'
+                          % IPTABLES_ARG)
+        self.assertEqual(
+            [mock.call(['iptables-save', '-c'], run_as_root=True),
+             mock.call(['iptables-restore', '-n'],
+                       process_input=expected_input, run_as_root=True)],
+            self.execute.call_args_list)
+
+    def test_apply_removed_chain(self):
+        self._add_filter_rules()
+        self._apply_with_kernel_state(self._filter_dump_with_rules())
+        self.execute.reset_mock()
+        self.iptables.ipv4['filter'].remove_chain('filter')
+        self._apply_with_kernel_state(self._filter_dump_with_rules())
+
+        expected_input = ('# Generated by iptables_manager\n'
+                          '*filter\n'
+                          '-D %(bn)s-INPUT 1\n'
+                          '-F %(bn)s-filter\n'
+                          '-X %(bn)s-filter\n'
+                          'COMMIT\n'
+                          '# Completed by iptables_manager\n'
+                          % IPTABLES_ARG)
+        self.execute.assert_called_with(['iptables-restore', '-n'],
+                                        process_input=expected_input,
+                                        run_as_root=True)
+
+    def test_apply_drifted_chain_does_full_resync(self):
+        self._apply_with_kernel_state()
+        self.execute.reset_mock()
+        self._add_filter_rules()
+        # someone else removed one of our rules from an unchanged chain
+        drifted_dump = FILTER_DUMP.replace(
+            '[0:0] -A neutron-filter-top -j %(bn)s-local\n' % IPTABLES_ARG,
+            '')
+        self._apply_with_kernel_state(drifted_dump)
+
+        self.assertEqual(2, self.execute.call_count)
+        args, kwargs = self.execute.call_args
+        self.assertEqual(['iptables-restore', '-c'], args[0])
+        self.assertIn('*filter', kwargs['process_input'])
+        self.assertNotIn('*nat', kwargs['process_input'])
+        self.assertIn('-A neutron-filter-top -j %(bn)s-local' % IPTABLES_ARG,
+                      kwargs['process_input'])
+
+    def test_apply_failed_delta_does_full_resync(self):
+        self._apply_with_kernel_state()
+        self._add_filter_rules()
+
+        def iptables_restore_failer(*args, **kwargs):
+            if args[0] == ['iptables-restore', '-n']:
+                raise RuntimeError()
+            return RAW_DUMP + NAT_DUMP + MANGLE_DUMP + FILTER_DUMP
+        self.execute.side_effect = iptables_restore_failer
+        self.execute.reset_mock()
+        self.iptables.apply()
+
+        self.assertEqual(3, self.execute.call_count)
+        args, kwargs = self.execute.call_args
+        self.assertEqual(['iptables-restore', '-c'], args[0])
+        self.assertIn('-A %(bn)s-filter -j DROP' % IPTABLES_ARG,
+                      kwargs['process_input'])
+        self.assertFalse(self.iptables.ipv4['filter'].dirty_chains)
+
+    def _expected_filter_delta(self):
+        return ('# Generated by iptables_manager\n'
+                '*filter\n'
+                '-N %(bn)s-filter\n'
+                '-A %(bn)s-INPUT -s 0/0 -d 192.168.0.2 -j %(bn)s-filter\n'
+                '-A %(bn)s-filter -j DROP\n'
+                'COMMIT\n'
+                '# Completed by iptables_manager\n' % IPTABLES_ARG)
+
+    def test_apply_uses_snapshot(self):
+        cfg.CONF.set_override('iptables_state_check_interval', 60, 'AGENT')
+        self._apply_with_kernel_state()
+        self.execute.reset_mock()
+        self._add_filter_rules()
+        self.iptables.apply()
+
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '-n'],
+            process_input=self._expected_filter_delta(), run_as_root=True)
+
+    def test_apply_expired_snapshot_runs_save(self):
+        cfg.CONF.set_override('iptables_state_check_interval', 60, 'AGENT')
+        with mock.patch('time.time', return_value=1000):
+            self._apply_with_kernel_state()
+        self.execute.reset_mock()
+        self._add_filter_rules()
+        with mock.patch('time.time', return_value=1060):
+            self._apply_with_kernel_state()
+
+        self.assertEqual(
+            [mock.call(['iptables-save', '-c'], run_as_root=True),
+             mock.call(['iptables-restore', '-n'],
+                       process_input=self._expected_filter_delta(),
+                       run_as_root=True)],
+            self.execute.call_args_list)
+
+    def test_apply_shared_chain_does_not_use_snapshot(self):
+        cfg.CONF.set_override('iptables_state_check_interval', 60, 'AGENT')
+        self._apply_with_kernel_state()
+        self.execute.reset_mock()
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP',
+                                              wrap=False)
+        self._apply_with_kernel_state()
+
+        self.assertEqual(mock.call(['iptables-save', '-c'], run_as_root=True),
+                         self.execute.call_args_list[0])
+
+    def test_apply_stale_snapshot_runs_save(self):
+        cfg.CONF.set_override('iptables_state_check_interval', 60, 'AGENT')
+        self._apply_with_kernel_state()
+        self._add_filter_rules()
+        self.execute.reset_mock()
+        self.execute.side_effect = [
+            RuntimeError(),
+            RAW_DUMP + NAT_DUMP + MANGLE_DUMP + FILTER_DUMP,
+            None]
+        self.iptables.apply()
+
+        restore_call = mock.call(['iptables-restore', '-n'],
+                                 process_input=self._expected_filter_delta(),
+                                 run_as_root=True)
+        self.assertEqual(
+            [restore_call,
+             mock.call(['iptables-save', '-c'], run_as_root=True),
+             restore_call],
+            self.execute.call_args_list)
+
+    def test_generate_chain_diff_iptables_commands(self):
+        gen = iptables_manager._generate_chain_diff_iptables_commands
+        self.assertEqual(['-D c 2', '-A c d'],
+                         gen('c', ['a', 'b', 'c'], ['a', 'c', 'd']))
+        self.assertEqual(['-I c 1 b'],
+                         gen('c', ['a', 'c'], ['b', 'a', 'c']))
+        self.assertEqual(['-D c 2', '-I c 2 y'],
+                         gen('c', ['a', 'x', 'c'], ['a', 'y', 'c']))
+        self.assertEqual([], gen('c', ['a'], ['a']))
+
+
 class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def setUp(self):
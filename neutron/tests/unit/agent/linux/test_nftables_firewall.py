@@ -0,0 +1,256 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import nftables_firewall
+from neutron.common import constants
+from neutron.tests import base
+
+FAKE_SGID = 'fake_sgid'
+OTHER_SGID = 'other_sgid'
+_IPv6 = constants.IPv6
+_IPv4 = constants.IPv4
+
+
+class BaseNftablesFirewallTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(BaseNftablesFirewallTestCase, self).setUp()
+        self.utils_exec = mock.patch(
+            'neutron.agent.linux.utils.execute').start()
+        self.firewall = nftables_firewall.NftablesFirewallDriver()
+
+    def _fake_port(self, device='tapfake_dev', sg_ids=None):
+        return {'device': device,
+                'mac_address': 'ff:ff:ff:ff:ff:ff',
+                'network_id': 'fake_net',
+                'security_groups': sg_ids or [],
+                'fixed_ips': ['10.0.0.1', 'fe80::1']}
+
+    def _last_input(self):
+        kwargs = self.utils_exec.call_args[1]
+        return kwargs['process_input'].splitlines()
+
+    def _assert_chain(self, lines, chain_name, rules):
+        start = lines.index('chain %s {' % chain_name)
+        self.assertEqual(rules, lines[start + 1:start + 1 + len(rules)])
+        self.assertEqual('}', lines[start + 1 + len(rules)])
+
+
+class NftablesFirewallTestCase(BaseNftablesFirewallTestCase):
+
+    def test_prepare_port_filter_replaces_table_atomically(self):
+        self.firewall.prepare_port_filter(self._fake_port())
+        self.utils_exec.assert_called_once_with(
+            ['nft', '-f', '-'], process_input=mock.ANY, run_as_root=True)
+        lines = self._last_input()
+        self.assertEqual(['add table bridge neutron',
+                          'delete table bridge neutron',
+                          'table bridge neutron {'], lines[:3])
+        self.assertEqual('}', lines[-1])
+        self.assertIn('elements = { "tapfake_dev" : jump ifake_dev }', lines)
+        self.assertIn('elements = { "tapfake_dev" : jump ofake_dev }', lines)
+
+    def test_execute_in_namespace(self):
+        self.firewall = nftables_firewall.NftablesFirewallDriver(
+            namespace='ns')
+        self.firewall.prepare_port_filter(self._fake_port())
+        self.utils_exec.assert_called_once_with(
+            ['ip', 'netns', 'exec', 'ns', 'nft', '-f', '-'],
+            process_input=mock.ANY, run_as_root=True)
+
+    def test_port_chains(self):
+        self.firewall.prepare_port_filter(self._fake_port())
+        lines = self._last_input()
+        self._assert_chain(lines, 'ifake_dev', [
+            'ip6 nexthdr icmpv6 icmpv6 type { 130, 131, 132, 135, 136 } '
+            'return',
+            'ct state established,related return',
+            'drop'])
+        self._assert_chain(lines, 'ofake_dev', [
+            'ip protocol udp udp sport 68 udp dport 67 return',
+            'ether type ip jump sfake_dev',
+            'ip6 nexthdr icmpv6 icmpv6 type 134 drop',
+            'ip6 nexthdr icmpv6 return',
+            'ip6 nexthdr udp udp sport 546 udp dport 547 return',
+            'ether type ip6 jump sfake_dev',
+            'ip protocol udp udp sport 67 udp dport 68 drop',
+            'ip6 nexthdr udp udp sport 547 udp dport 546 drop',
+            'ct state established,related return',
+            'drop'])
+        self._assert_chain(lines, 'sfake_dev', [
+            'ether saddr ff:ff:ff:ff:ff:ff ip saddr 10.0.0.1/32 return',
+            'ether saddr ff:ff:ff:ff:ff:ff ip6 saddr fe80::1/128 return',
+            'drop'])
+        # the spoof chain is defined before the chain jumping to it
+        self.assertTrue(lines.index('chain sfake_dev {') <
+                        lines.index('chain ofake_dev {'))
+
+    def test_spoof_chain_with_address_pairs_and_no_fixed_ips(self):
+        port = self._fake_port()
+        port['fixed_ips'] = []
+        port['allowed_address_pairs'] = [
+            {'mac_address': 'aa:bb:cc:dd:ee:ff',
+             'ip_address': '10.0.1.0/24'}]
+        self.firewall.prepare_port_filter(port)
+        self._assert_chain(self._last_input(), 'sfake_dev', [
+            'ether saddr aa:bb:cc:dd:ee:ff ip saddr 10.0.1.0/24 return',
+            'ether saddr ff:ff:ff:ff:ff:ff return',
+            'drop'])
+
+    def test_security_group_rules(self):
+        self.firewall.update_security_group_rules(FAKE_SGID, [
+            {'ethertype': _IPv4, 'direction': 'ingress',
+             'protocol': 'tcp', 'port_range_min': 22,
+             'port_range_max': 22},
+            {'ethertype': _IPv4, 'direction': 'ingress',
+             'protocol': 'udp', 'port_range_min': 1000,
+             'port_range_max': 2000, 'source_ip_prefix': '10.0.0.0/24'},
+            {'ethertype': _IPv6, 'direction': 'ingress',
+             'protocol': 'icmp', 'port_range_min': 8,
+             'port_range_max': 0},
+            {'ethertype': _IPv4, 'direction': 'egress'},
+            {'ethertype': _IPv6, 'direction': 'egress',
+             'dest_ip_prefix': '::/0'}])
+        self.firewall.prepare_port_filter(
+            self._fake_port(sg_ids=[FAKE_SGID]))
+        lines = self._last_input()
+        self._assert_chain(lines, 'ifake_dev', [
+            'ip6 nexthdr icmpv6 icmpv6 type { 130, 131, 132, 135, 136 } '
+            'return',
+            'ct state established,related return',
+            'ip protocol tcp tcp dport 22 return',
+            'ip saddr 10.0.0.0/24 ip protocol udp udp dport 1000-2000 '
+            'return',
+            'ip6 nexthdr icmpv6 icmpv6 type 8 icmpv6 code 0 return',
+            'drop'])
+        start = lines.index('chain ofake_dev {')
+        self.assertEqual(['ct state established,related return',
+                          'ether type ip return',
+                          'ether type ip6 return',
+                          'drop'], lines[start + 9:start + 13])
+
+    def test_remote_group_rules_use_sets(self):
+        self.firewall.update_security_group_rules(FAKE_SGID, [
+            {'ethertype': _IPv4, 'direction': 'ingress',
+             'remote_group_id': OTHER_SGID},
+            {'ethertype': _IPv6, 'direction': 'egress',
+             'remote_group_id': OTHER_SGID}])
+        self.firewall.update_security_group_members(OTHER_SGID, {
+            _IPv4: ['10.0.0.2', '10.0.0.3', '10.0.0.0/24'],
+            _IPv6: []})
+        self.firewall.prepare_port_filter(
+            self._fake_port(sg_ids=[FAKE_SGID]))
+        lines = self._last_input()
+        self.assertIn('ip saddr @v4-other_sgid return', lines)
+        self.assertIn('ip6 daddr @v6-other_sgid return', lines)
+        # overlapping members are merged, empty sets have no elements
+        self._assert_chain(lines, 'ifake_dev', [
+            'ip6 nexthdr icmpv6 icmpv6 type { 130, 131, 132, 135, 136 } '
+            'return',
+            'ct state established,related return',
+            'ip saddr @v4-other_sgid return',
+            'drop'])
+        start = lines.index('set v4-other_sgid {')
+        self.assertEqual(['type ipv4_addr', 'flags interval',
+                          'elements = { 10.0.0.0/24 }', '}'],
+                         lines[start + 1:start + 5])
+        start = lines.index('set v6-other_sgid {')
+        self.assertEqual(['type ipv6_addr', 'flags interval', '}'],
+                         lines[start + 1:start + 4])
+
+    def test_member_update_only_sends_set_delta(self):
+        self.firewall.update_security_group_rules(FAKE_SGID, [
+            {'ethertype': _IPv4, 'direction': 'ingress',
+             'remote_group_id': FAKE_SGID}])
+        self.firewall.update_security_group_members(FAKE_SGID, {
+            _IPv4: ['10.0.0.1', '10.0.0.2']})
+        port = self._fake_port(sg_ids=[FAKE_SGID])
+        self.firewall.prepare_port_filter(port)
+        self.firewall.update_security_group_members(FAKE_SGID, {
+            _IPv4: ['10.0.0.1', '10.0.0.3']})
+        self.firewall.update_port_filter(port)
+        self.assertEqual(
+            ['delete element bridge neutron v4-fake_sgid { 10.0.0.2/32 }',
+             'add element bridge neutron v4-fake_sgid { 10.0.0.3/32 }'],
+            self._last_input())
+
+    def test_unchanged_ruleset_is_not_reapplied(self):
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.firewall.update_port_filter(port)
+        self.assertEqual(1, self.utils_exec.call_count)
+
+    def test_rule_update_rebuilds_table(self):
+        port = self._fake_port(sg_ids=[FAKE_SGID])
+        self.firewall.update_security_group_rules(FAKE_SGID, [])
+        self.firewall.prepare_port_filter(port)
+        self.firewall.update_security_group_rules(FAKE_SGID, [
+            {'ethertype': _IPv4, 'direction': 'ingress'}])
+        self.firewall.update_port_filter(port)
+        self.assertEqual(2, self.utils_exec.call_count)
+        self.assertIn('ether type ip return', self._last_input())
+
+    def test_failed_apply_is_retried(self):
+        port = self._fake_port()
+        self.utils_exec.side_effect = [RuntimeError, '']
+        self.assertRaises(RuntimeError,
+                          self.firewall.prepare_port_filter, port)
+        self.firewall.update_port_filter(port)
+        self.assertEqual(2, self.utils_exec.call_count)
+
+    def test_port_security_disabled_port_is_not_dispatched(self):
+        port = self._fake_port()
+        port['port_security_enabled'] = False
+        self.firewall.prepare_port_filter(port)
+        lines = self._last_input()
+        self.assertNotIn('chain ifake_dev {', lines)
+        self.assertEqual(['map ingress-ports {', 'type ifname : verdict',
+                          '}'],
+                         lines[3:6])
+        self.assertIn('tapfake_dev', self.firewall.ports)
+
+    def test_remove_port_filter(self):
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.firewall.remove_port_filter(port)
+        self.assertNotIn('chain ifake_dev {', self._last_input())
+        self.assertEqual({}, self.firewall.ports)
+
+    def test_remove_unknown_port_filter(self):
+        self.firewall.remove_port_filter(self._fake_port())
+        self.assertFalse(self.utils_exec.called)
+
+    def test_defer_apply(self):
+        with self.firewall.defer_apply():
+            self.firewall.prepare_port_filter(self._fake_port('tapdev1'))
+            self.firewall.prepare_port_filter(self._fake_port('tapdev2'))
+            self.assertFalse(self.utils_exec.called)
+        self.utils_exec.assert_called_once_with(
+            ['nft', '-f', '-'], process_input=mock.ANY, run_as_root=True)
+        self.assertIn('elements = { "tapdev1" : jump idev1, '
+                      '"tapdev2" : jump idev2 }', self._last_input())
+
+
+class OVSHybridNftablesFirewallTestCase(BaseNftablesFirewallTestCase):
+    def setUp(self):
+        super(OVSHybridNftablesFirewallTestCase, self).setUp()
+        self.firewall = nftables_firewall.OVSHybridNftablesFirewallDriver()
+
+    def test_port_dispatched_on_tap_device(self):
+        self.firewall.prepare_port_filter(
+            self._fake_port(device='e804433b-61f1-4f2f-a4c1-07bbd49a9e3c'))
+        self.assertIn('elements = { "tape804433b-61" : jump '
+                      'ie804433b-61f1-4f2f-a4c1-07bbd4 }',
+                      self._last_input())
@@ -0,0 +1,338 @@
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.common import ovs_lib
+from neutron.agent.linux import openvswitch_firewall as ovsfw
+from neutron.common import constants
+from neutron.plugins.ml2.drivers.openvswitch.agent.common import constants \
+    as ovs_consts
+from neutron.tests import base
+
+FAKE_SGID = 'fake_sgid'
+OTHER_SGID = 'other_sgid'
+_IPv4 = constants.IPv4
+_IPv6 = constants.IPv6
+
+
+class PortRuleMaskingTestCase(base.BaseTestCase):
+    def test_single_port(self):
+        self.assertEqual(['22'], ovsfw.port_rule_masking(22, 22))
+
+    def test_aligned_range(self):
+        self.assertEqual(['0x0400/0xfc00'],
+                         ovsfw.port_rule_masking(1024, 2047))
+
+    def test_unaligned_range(self):
+        self.assertEqual(['5', '0x0006/0xfffe', '0x0008/0xfff8',
+                          '0x0010/0xfffc', '20'],
+                         ovsfw.port_rule_masking(5, 20))
+
+    def test_full_range(self):
+        self.assertEqual(['0x0000/0x0000'],
+                         ovsfw.port_rule_masking(0, 65535))
+
+
+class OVSFirewallDriverTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(OVSFirewallDriverTestCase, self).setUp()
+        self.int_br = mock.Mock()
+        self.deferred_br = self.int_br.deferred.return_value
+        self.deferred_br.__enter__ = mock.Mock(
+            return_value=self.deferred_br)
+        self.deferred_br.__exit__ = mock.Mock(return_value=None)
+        self.int_br.get_vif_port_by_id.return_value = ovs_lib.VifPort(
+            'tapfake_dev', 12, 'fake_dev', 'fa:16:3e:00:00:01', self.int_br)
+        self.int_br.get_ports_attributes.return_value = [
+            {'name': 'tapfake_dev', 'tag': [], 'other_config': {'tag': '3'}}]
+        self.firewall = ovsfw.OVSFirewallDriver(self.int_br)
+        self.deferred_br.reset_mock()
+
+    def _fake_port(self, sg_ids=None):
+        return {'device': 'fake_dev',
+                'mac_address': 'fa:16:3e:00:00:01',
+                'network_id': 'fake_net',
+                'security_groups': sg_ids or [],
+                'fixed_ips': ['10.0.0.1', 'fe80::1']}
+
+    def _added_flows(self, table=None):
+        flows = [c[2] for c in self.deferred_br.mock_calls
+                 if c[0] == 'add_flow']
+        if table is not None:
+            flows = [f for f in flows if f['table'] == table]
+        return flows
+
+    def _deleted_flows(self):
+        return [c[2] for c in self.deferred_br.mock_calls
+                if c[0] == 'delete_flows']
+
+    def test_init_installs_default_flows(self):
+        int_br = mock.MagicMock()
+        ovsfw.OVSFirewallDriver(int_br)
+        deferred_br = int_br.deferred.return_value.__enter__.return_value
+        deferred_br.add_flow.assert_any_call(
+            table=ovs_consts.ACCEPT_OR_INGRESS_TABLE, priority=0,
+            actions='normal')
+        deferred_br.add_flow.assert_any_call(
+            table=ovs_consts.RULES_INGRESS_TABLE, priority=0,
+            actions='drop')
+
+    def test_prepare_port_filter_classification(self):
+        self.firewall.prepare_port_filter(self._fake_port())
+        flows = self._added_flows(ovs_consts.TRANSIENT_TABLE)
+        self.assertIn(
+            {'table': 60, 'priority': 100, 'in_port': 12,
+             'actions': 'load:12->NXM_NX_REG5[],load:3->NXM_NX_REG6[],'
+                        'resubmit(,71)'}, flows)
+        self.assertIn(
+            {'table': 60, 'priority': 90, 'dl_vlan': 3,
+             'dl_dst': 'fa:16:3e:00:00:01',
+             'actions': 'load:12->NXM_NX_REG5[],load:3->NXM_NX_REG6[],'
+                        'strip_vlan,resubmit(,81)'}, flows)
+        self.assertIn(
+            {'table': ovs_consts.ACCEPT_OR_INGRESS_TABLE, 'priority': 100,
+             'dl_dst': 'fa:16:3e:00:00:01', 'reg6': 3,
+             'actions': 'load:12->NXM_NX_REG5[],resubmit(,81)'},
+            self._added_flows(ovs_consts.ACCEPT_OR_INGRESS_TABLE))
+        self.int_br.run_ofctl.assert_called_once_with(
+            'mod-port', ['tapfake_dev', 'no-flood'])
+
+    def test_prepare_port_filter_allowed_address_pair_macs(self):
+        port = self._fake_port()
+        port['allowed_address_pairs'] = [
+            {'mac_address': 'fa:16:3e:00:00:02', 'ip_address': '10.0.0.5'}]
+        self.firewall.prepare_port_filter(port)
+        self.assertIn(
+            {'table': 60, 'priority': 90, 'dl_vlan': 3,
+             'dl_dst': 'fa:16:3e:00:00:02',
+             'actions': 'load:12->NXM_NX_REG5[],load:3->NXM_NX_REG6[],'
+                        'strip_vlan,resubmit(,81)'},
+            self._added_flows(ovs_consts.TRANSIENT_TABLE))
+
+    def test_prepare_port_filter_uses_local_vlan_of_binding(self):
+        self.int_br.get_ports_attributes.return_value = [
+            {'name': 'tapfake_dev', 'tag': 5, 'other_config': {}}]
+        self.firewall.prepare_port_filter(self._fake_port())
+        self.assertIn(
+            {'table': 60, 'priority': 100, 'in_port': 12,
+             'actions': 'load:12->NXM_NX_REG5[],load:5->NXM_NX_REG6[],'
+                        'resubmit(,71)'},
+            self._added_flows(ovs_consts.TRANSIENT_TABLE))
+
+    def test_prepare_port_filter_without_local_vlan(self):
+        self.int_br.get_ports_attributes.return_value = [
+            {'name': 'tapfake_dev', 'tag': [], 'other_config': {}}]
+        self.firewall.prepare_port_filter(self._fake_port())
+        self.assertFalse(self._added_flows(ovs_consts.TRANSIENT_TABLE))
+        self.assertIn('fake_dev', self.firewall.ports)
+
+    def test_broadcast_goes_through_ingress_of_filtered_ports(self):
+        self.firewall.prepare_port_filter(self._fake_port())
+        self.int_br.get_vif_port_by_id.return_value = ovs_lib.VifPort(
+            'tapother_dev', 13, 'other_dev', 'fa:16:3e:00:00:03',
+            self.int_br)
+        self.int_br.get_ports_attributes.return_value = [
+            {'name': 'tapother_dev', 'tag': [], 'other_config': {'tag': '3'}}]
+        other_port = dict(self._fake_port(), device='other_dev',
+                          mac_address='fa:16:3e:00:00:03')
+        self.firewall.prepare_port_filter(other_port)
+        to_ingress = ('load:12->NXM_NX_REG5[],resubmit(,81),'
+                      'load:13->NXM_NX_REG5[],resubmit(,81),')
+        self.assertIn(
+            {'table': 60, 'priority': 80, 'dl_vlan': 3,
+             'dl_dst': ovsfw.MULTICAST_MAC,
+             'actions': 'load:3->NXM_NX_REG6[],strip_vlan,' + to_ingress +
+                        'mod_vlan_vid:3,normal'},
+            self._added_flows(ovs_consts.TRANSIENT_TABLE))
+        self.assertIn(
+            {'table': 73, 'priority': 90, 'reg6': 3,
+             'dl_dst': ovsfw.MULTICAST_MAC,
+             'actions': to_ingress + 'normal'},
+            self._added_flows(ovs_consts.ACCEPT_OR_INGRESS_TABLE))
+
+    def test_prepare_port_filter_anti_spoofing(self):
+        self.firewall.prepare_port_filter(self._fake_port())
+        flows = self._added_flows(ovs_consts.BASE_EGRESS_TABLE)
+        self.assertIn(
+            {'table': 71, 'priority': 65, 'reg5': 12, 'proto': 'ip',
+             'dl_src': 'fa:16:3e:00:00:01', 'nw_src': '10.0.0.1/32',
+             'actions': 'ct(table=72,zone=NXM_NX_REG6[0..15])'}, flows)
+        self.assertIn(
+            {'table': 71, 'priority': 65, 'reg5': 12, 'proto': 'arp',
+             'dl_src': 'fa:16:3e:00:00:01', 'arp_spa': '10.0.0.1/32',
+             'actions': 'resubmit(,73)'}, flows)
+        self.assertIn(
+            {'table': 71, 'priority': 65, 'reg5': 12, 'proto': 'ipv6',
+             'dl_src': 'fa:16:3e:00:00:01', 'ipv6_src': 'fe80::1/128',
+             'actions': 'ct(table=72,zone=NXM_NX_REG6[0..15])'}, flows)
+        self.assertIn(
+            {'table': 71, 'priority': 95, 'reg5': 12, 'proto': 'icmp6',
+             'icmp_type': constants.ICMPV6_TYPE_RA, 'actions': 'drop'},
+            flows)
+
+    def test_rules_flows(self):
+        self.firewall.update_security_group_rules(FAKE_SGID, [
+            {'ethertype': _IPv4, 'direction': 'ingress',
+             'protocol': 'tcp', 'port_range_min': 22,
+             'port_range_max': 23, 'source_ip_prefix': '10.0.0.0/24'},
+            {'ethertype': _IPv6, 'direction': 'egress'}])
+        self.firewall.prepare_port_filter(self._fake_port([FAKE_SGID]))
+        self.assertIn(
+            {'table': 82, 'priority': 70, 'reg5': 12, 'ct_state': '+new-est',
+             'proto': 'tcp', 'nw_src': '10.0.0.0/24',
+             'tp_dst': '0x0016/0xfffe',
+             'actions': 'ct(commit,zone=NXM_NX_REG6[0..15]),output:12'},
+            self._added_flows(ovs_consts.RULES_INGRESS_TABLE))
+        self.assertIn(
+            {'table': 72, 'priority': 70, 'reg5': 12, 'ct_state': '+new-est',
+             'proto': 'ipv6',
+             'actions': 'ct(commit,zone=NXM_NX_REG6[0..15]),resubmit(,73)'},
+            self._added_flows(ovs_consts.RULES_EGRESS_TABLE))
+
+    def test_remote_group_rules_use_conjunctions(self):
+        self.firewall.update_security_group_rules(FAKE_SGID, [
+            {'ethertype': _IPv4, 'direction': 'ingress', 'protocol': 'tcp',
+             'port_range_min': 80, 'port_range_max': 80,
+             'remote_group_id': OTHER_SGID},
+            {'ethertype': _IPv4, 'direction': 'ingress', 'protocol': 'udp',
+             'remote_group_id': OTHER_SGID}])
+        self.firewall.update_security_group_members(OTHER_SGID, {
+            _IPv4: ['10.0.0.2', '10.0.0.3']})
+        self.firewall.prepare_port_filter(self._fake_port([FAKE_SGID]))
+        flows = [f for f in self._added_flows(82)
+                 if f['priority'] in (70, 71)]
+        # one flow per rule, one per member and the conjunction one
+        self.assertEqual(5, len(flows))
+        self.assertIn({'table': 82, 'priority': 70, 'conj_id': 1,
+                       'actions': 'ct(commit,zone=NXM_NX_REG6[0..15]),'
+                                  'output:12'}, flows)
+        self.assertIn({'table': 82, 'priority': 71, 'reg5': 12,
+                       'ct_state': '+new-est', 'proto': 'ip',
+                       'nw_src': '10.0.0.2',
+                       'actions': 'conjunction(1,1/2)'}, flows)
+        self.assertIn({'table': 82, 'priority': 71, 'reg5': 12,
+                       'ct_state': '+new-est', 'proto': 'tcp',
+                       'tp_dst': '80',
+                       'actions': 'conjunction(1,2/2)'}, flows)
+
+    def test_shared_conjunction_matches_are_merged(self):
+        self.firewall.update_security_group_rules(FAKE_SGID, [
+            {'ethertype': _IPv4, 'direction': 'ingress',
+             'remote_group_id': FAKE_SGID},
+            {'ethertype': _IPv4, 'direction': 'ingress',
+             'remote_group_id': OTHER_SGID}])
+        self.firewall.update_security_group_members(FAKE_SGID, {
+            _IPv4: ['10.0.0.2']})
+        self.firewall.update_security_group_members(OTHER_SGID, {
+            _IPv4: ['10.0.0.2']})
+        self.firewall.prepare_port_filter(self._fake_port([FAKE_SGID]))
+        flows = [f for f in self._added_flows(82) if f['priority'] == 71]
+        self.assertEqual(
+            ['conjunction(1,1/2),conjunction(2,1/2)',
+             'conjunction(1,2/2),conjunction(2,2/2)'],
+            sorted(f['actions'] for f in flows))
+
+    def test_update_port_filter_only_sends_changes(self):
+        port = self._fake_port([FAKE_SGID])
+        self.firewall.update_security_group_rules(FAKE_SGID, [
+            {'ethertype': _IPv4, 'direction': 'ingress',
+             'remote_group_id': FAKE_SGID}])
+        self.firewall.update_security_group_members(FAKE_SGID, {
+            _IPv4: ['10.0.0.2']})
+        self.firewall.prepare_port_filter(port)
+        self.deferred_br.reset_mock()
+        self.firewall.update_security_group_members(FAKE_SGID, {
+            _IPv4: ['10.0.0.2', '10.0.0.3']})
+        self.firewall.update_port_filter(port)
+        self.assertEqual([], self._deleted_flows())
+        self.assertEqual(
+            [{'table': 82, 'priority': 71, 'reg5': 12,
+              'ct_state': '+new-est', 'proto': 'ip', 'nw_src': '10.0.0.3',
+              'actions': 'conjunction(1,1/2)'}],
+            self._added_flows())
+
+    def test_update_port_filter_removes_stale_flows(self):
+        port = self._fake_port([FAKE_SGID])
+        self.firewall.update_security_group_rules(FAKE_SGID, [
+            {'ethertype': _IPv4, 'direction': 'ingress', 'protocol': 'tcp'}])
+        self.firewall.prepare_port_filter(port)
+        self.deferred_br.reset_mock()
+        self.firewall.update_security_group_rules(FAKE_SGID, [])
+        self.firewall.update_port_filter(port)
+        self.assertEqual([{'table': 82, 'reg5': 12, 'ct_state': '+new-est',
+                           'proto': 'tcp'}], self._deleted_flows())
+        # the remaining flows are re-added in case the delete matched them
+        self.assertTrue(self._added_flows(ovs_consts.TRANSIENT_TABLE))
+
+    def test_remove_port_filter(self):
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.deferred_br.reset_mock()
+        self.firewall.remove_port_filter(port)
+        deleted = self._deleted_flows()
+        self.assertIn({'table': 60, 'in_port': 12}, deleted)
+        self.assertIn({'table': 60, 'dl_vlan': 3,
+                       'dl_dst': ovsfw.MULTICAST_MAC}, deleted)
+        self.assertFalse(self._added_flows())
+        self.assertEqual({}, self.firewall.ports)
+
+    def _assert_port_not_filtered(self, port):
+        self.firewall.prepare_port_filter(port)
+        self.assertEqual(
+            [{'table': 60, 'priority': 100, 'in_port': 12,
+              'actions': 'load:3->NXM_NX_REG6[],resubmit(,73)'}],
+            self._added_flows(ovs_consts.TRANSIENT_TABLE))
+        self.assertFalse([f for f in self._added_flows()
+                          if f.get('reg5') == 12])
+        self.assertFalse(self.int_br.run_ofctl.called)
+        self.assertIn('fake_dev', self.firewall.ports)
+
+    def test_port_security_disabled(self):
+        port = self._fake_port()
+        port['port_security_enabled'] = False
+        self._assert_port_not_filtered(port)
+
+    def test_trusted_port(self):
+        port = self._fake_port()
+        port['device_owner'] = constants.DEVICE_OWNER_ROUTER_INTF
+        self._assert_port_not_filtered(port)
+
+    def test_port_security_disabled_on_update(self):
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.int_br.run_ofctl.reset_mock()
+        self.deferred_br.reset_mock()
+        port['port_security_enabled'] = False
+        self.firewall.update_port_filter(port)
+        self.int_br.run_ofctl.assert_called_once_with(
+            'mod-port', ['tapfake_dev', 'flood'])
+        self.assertIn({'table': 60, 'dl_vlan': 3,
+                       'dl_dst': ovsfw.MULTICAST_MAC},
+                      self._deleted_flows())
+
+    def test_port_not_on_bridge_is_retried(self):
+        self.int_br.get_vif_port_by_id.return_value = None
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.assertFalse(self._added_flows(ovs_consts.TRANSIENT_TABLE))
+        self.assertEqual(port, self.firewall.ports['fake_dev'])
+
+    def test_defer_apply(self):
+        self.int_br.deferred.reset_mock()
+        with self.firewall.defer_apply():
+            self.firewall.prepare_port_filter(self._fake_port())
+            self.assertFalse(self.deferred_br.apply_flows.called)
+        self.int_br.deferred.assert_called_once_with(full_ordered=True)
+        self.deferred_br.apply_flows.assert_called_once_with()
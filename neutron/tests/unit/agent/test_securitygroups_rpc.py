@@ -182,6 +182,55 @@ class SGServerRpcCallBackTestCase(test_sg.SecurityGroupDBTestCase):
             '192.168.1.3')
         self.assertFalse(self.notifier.security_groups_provider_updated.called)
 
+    def test_notify_security_group_member_updates(self):
+        with self.network() as n,\
+                self.subnet(n),\
+                self.security_group() as sg:
+            sg_id = sg['security_group']['id']
+            port = self._make_port(self.fmt, n['network']['id'],
+                                   security_groups=[sg_id])['port']
+            ip = port['fixed_ips'][0]['ip_address']
+            member_updates = self.notifier.security_groups_member_updated.\
+                call_args[1]['member_updates']
+            version = member_updates[sg_id]['version']
+            self.assertEqual({sg_id: {'version': version,
+                                      'added': {const.IPv4: [ip],
+                                                const.IPv6: []},
+                                      'removed': {const.IPv4: [],
+                                                  const.IPv6: []}}},
+                             member_updates)
+
+            self._delete('ports', port['id'])
+            member_updates = self.notifier.security_groups_member_updated.\
+                call_args[1]['member_updates']
+            self.assertEqual({sg_id: {'version': version + 1,
+                                      'added': {const.IPv4: [],
+                                                const.IPv6: []},
+                                      'removed': {const.IPv4: [ip],
+                                                  const.IPv6: []}}},
+                             member_updates)
+
+    def test_security_group_info_for_devices_member_versions(self):
+        with self.network() as n,\
+                self.subnet(n),\
+                self.security_group() as sg:
+            sg_id = sg['security_group']['id']
+            rule = self._build_security_group_rule(
+                sg_id, 'ingress', const.PROTO_NAME_TCP, '22', '22',
+                remote_group_id=sg_id)
+            self._make_security_group_rule(self.fmt, rule)
+            port = self._make_port(self.fmt, n['network']['id'],
+                                   security_groups=[sg_id])['port']
+            self.rpc.devices = {port['id']: port}
+            ctx = context.get_admin_context()
+            sg_info = self.rpc.security_group_info_for_devices(
+                ctx, devices=[port['id']])
+            member_updates = self.notifier.security_groups_member_updated.\
+                call_args[1]['member_updates']
+            self.assertEqual(member_updates[sg_id]['version'],
+                             sg_info['sg_member_versions'][sg_id])
+            self._delete('ports', port['id'])
+
     def _test_sg_rules_for_devices_ipv4_ingress_port_range(
             self, min_port, max_port):
         fake_prefix = FAKE_PREFIX[const.IPv4]
@@ -1097,6 +1146,23 @@ class SecurityGroupAgentRpcTestCaseForNoneDriver(base.BaseTestCase):
         self.assertEqual(agent.firewall.__class__.__name__,
                          'NoopFirewallDriver')
 
+    def test_init_firewall_with_integration_bridge(self):
+        set_firewall_driver(
+            'neutron.agent.linux.openvswitch_firewall.OVSFirewallDriver')
+        int_br = mock.MagicMock()
+        agent = sg_rpc.SecurityGroupAgentRpc(
+                context=None, plugin_rpc=mock.Mock(),
+                integration_bridge=int_br)
+        self.assertIs(int_br, agent.firewall.int_br)
+
+    def test_init_firewall_without_integration_bridge_support(self):
+        set_firewall_driver(FIREWALL_NOOP_DRIVER)
+        agent = sg_rpc.SecurityGroupAgentRpc(
+                context=None, plugin_rpc=mock.Mock(),
+                integration_bridge=mock.Mock())
+        self.assertEqual(agent.firewall.__class__.__name__,
+                         'NoopFirewallDriver')
+
 
 class BaseSecurityGroupAgentRpcTestCase(base.BaseTestCase):
     def setUp(self, defer_refresh_firewall=False):
@@ -1358,6 +1424,90 @@ class SecurityGroupAgentEnhancedRpcTestCase(
         self.agent.refresh_firewall([])
         self.assertFalse(self.firewall.called)
 
+    def _prepare_devices_filter_with_member_version(self, version):
+        sg_info = (
+            self.agent.plugin_rpc.security_group_info_for_devices.return_value)
+        sg_info['sg_member_ips'] = {'fake_sgid2': {'IPv4': ['10.0.0.2'],
+                                                   'IPv6': []}}
+        sg_info['sg_member_versions'] = {'fake_sgid2': version}
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.firewall.reset_mock()
+        self.agent.refresh_firewall = mock.Mock()
+
+    def _fake_member_updates(self, version, added=(), removed=()):
+        return {'fake_sgid2': {'version': version,
+                               'added': {'IPv4': list(added), 'IPv6': []},
+                               'removed': {'IPv4': list(removed),
+                                           'IPv6': []}}}
+
+    def test_security_groups_member_updated_delta_enhanced_rpc(self):
+        self._prepare_devices_filter_with_member_version(3)
+        self.agent.security_groups_member_updated(
+            ['fake_sgid2'], member_updates=self._fake_member_updates(
+                4, added=['10.0.0.3'], removed=['10.0.0.2']))
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.firewall.assert_has_calls([
+            mock.call.security_group_updated('sg_member',
+                                             set(['fake_sgid2'])),
+            mock.call.defer_apply(),
+            mock.call.update_security_group_members(
+                'fake_sgid2', {'IPv4': ['10.0.0.3'], 'IPv6': []}),
+            mock.call.update_port_filter(self.fake_device)])
+        self.assertEqual(4, self.agent.sg_member_versions['fake_sgid2'])
+
+    def test_security_groups_member_updated_outdated_enhanced_rpc(self):
+        self._prepare_devices_filter_with_member_version(3)
+        self.agent.security_groups_member_updated(
+            ['fake_sgid2'], member_updates=self._fake_member_updates(
+                3, added=['10.0.0.3']))
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.assertFalse(self.firewall.update_security_group_members.called)
+        self.assertEqual(set(['10.0.0.2']),
+                         self.agent.sg_member_ips['fake_sgid2']['IPv4'])
+
+    def test_security_groups_member_updated_gap_enhanced_rpc(self):
+        self._prepare_devices_filter_with_member_version(3)
+        self.agent.security_groups_member_updated(
+            ['fake_sgid2'], member_updates=self._fake_member_updates(
+                5, added=['10.0.0.3']))
+        self.agent.refresh_firewall.assert_called_once_with(
+            [self.fake_device['device']])
+        self.assertFalse(self.firewall.update_security_group_members.called)
+        self.assertNotIn('fake_sgid2', self.agent.sg_member_versions)
+
+    def test_security_groups_member_updated_unversioned_enhanced_rpc(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.security_groups_member_updated(
+            ['fake_sgid2'], member_updates=self._fake_member_updates(
+                4, added=['10.0.0.3']))
+        self.agent.refresh_firewall.assert_called_once_with(
+            [self.fake_device['device']])
+
+    def test_security_groups_member_updated_delta_deferred_enhanced_rpc(self):
+        self._prepare_devices_filter_with_member_version(3)
+        self.agent.defer_refresh_firewall = True
+        self.agent.security_groups_member_updated(
+            ['fake_sgid2'], member_updates=self._fake_member_updates(
+                4, added=['10.0.0.3']))
+        self.assertFalse(self.firewall.update_security_group_members.called)
+        self.assertTrue(self.agent.firewall_refresh_needed())
+
+        self.agent.setup_port_filters(set(), set())
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', {'IPv4': ['10.0.0.2', '10.0.0.3'], 'IPv6': []})
+        self.firewall.update_port_filter.assert_called_once_with(
+            self.fake_device)
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.assertFalse(self.agent.firewall_refresh_needed())
+
+    def test_remove_devices_filter_prunes_member_ips_enhanced_rpc(self):
+        self._prepare_devices_filter_with_member_version(3)
+        self.firewall.ports = {}
+        self.agent.remove_devices_filter(['fake_device'])
+        self.assertNotIn('fake_sgid2', self.agent.sg_member_ips)
+        self.assertNotIn('fake_sgid2', self.agent.sg_member_versions)
+
 
 class SecurityGroupAgentRpcWithDeferredRefreshTestCase(
     SecurityGroupAgentRpcTestCase):
@@ -1623,6 +1773,18 @@ class SecurityGroupAgentRpcApiTestCase(base.BaseTestCase):
             [mock.call(None, 'security_groups_member_updated',
                        security_groups=['fake_sgid'])])
 
+    def test_security_groups_member_updated_with_member_updates(self):
+        member_updates = {'fake_sgid': {'version': 1,
+                                        'added': {'IPv4': ['10.0.0.3']},
+                                        'removed': {}}}
+        self.notifier.security_groups_member_updated(
+            None, security_groups=['fake_sgid'],
+            member_updates=member_updates)
+        self.mock_cast.assert_has_calls(
+            [mock.call(None, 'security_groups_member_updated',
+                       security_groups=['fake_sgid'],
+                       member_updates=member_updates)])
+
     def test_security_groups_rule_not_updated(self):
         self.notifier.security_groups_rule_updated(
             None, security_groups=[])
@@ -2946,7 +3108,7 @@ class SGNotificationTestMixin(object):
                     self._delete('ports', port['port']['id'])
                     self.notifier.assert_has_calls(
                         [mock.call.security_groups_member_updated(
-                            mock.ANY, [mock.ANY])])
+                            mock.ANY, [mock.ANY], member_updates=mock.ANY)])
 
 
 class TestSecurityGroupAgentWithOVSIptables(
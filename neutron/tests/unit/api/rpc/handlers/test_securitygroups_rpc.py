@@ -53,6 +53,17 @@ class SGAgentRpcCallBackMixinTestCase(base.BaseTestCase):
         self.rpc.sg_agent.assert_has_calls(
             [mock.call.security_groups_member_updated(['fake_sgid'])])
 
+    def test_security_groups_member_updated_with_member_updates(self):
+        member_updates = {'fake_sgid': {'version': 2,
+                                        'added': {'IPv4': ['10.0.0.3']},
+                                        'removed': {}}}
+        self.rpc.security_groups_member_updated(
+            None, security_groups=['fake_sgid'],
+            member_updates=member_updates)
+        self.rpc.sg_agent.assert_has_calls(
+            [mock.call.security_groups_member_updated(
+                ['fake_sgid'], member_updates=member_updates)])
+
     def test_security_groups_provider_updated(self):
         self.rpc.security_groups_provider_updated(None)
         self.rpc.sg_agent.assert_has_calls(
@@ -173,6 +173,13 @@ class TestMetering(MeteringPluginDbTestCase):
 
             self._test_list_resources('metering-label', metering_label)
 
+    def test_list_metering_label_with_pagination(self):
+        with self.metering_label('label1') as v1,\
+                self.metering_label('label2') as v2,\
+                self.metering_label('label3') as v3:
+            self._test_list_with_pagination('metering-label', (v1, v2, v3),
+                                            ('name', 'asc'), 2, 2)
+
     def test_create_metering_label_rule(self):
         name = 'my label'
         description = 'my metering label'
@@ -190,6 +190,91 @@ class TestQuotaDbApi(testlib_api.SqlTestCaseLight):
                                  expected_resource='goals',
                                  expected_used=26)
 
+    def _update_quota_usage_shard(self, resource, shard, delta):
+        with self.context.session.begin(subtransactions=True):
+            return quota_api.update_quota_usage_shard(
+                self.context.session.connection(), resource, self.tenant_id,
+                shard, delta)
+
+    def test_get_quota_usage_with_shards(self):
+        self._create_quota_usage('goals', 26)
+        quota_api.create_quota_usage_shards(
+            self.context, 'goals', self.tenant_id, 2)
+        self.assertEqual(1, self._update_quota_usage_shard('goals', 0, 2))
+        self.assertEqual(1, self._update_quota_usage_shard('goals', 1, -1))
+        usage_info = quota_api.get_quota_usage_by_resource_and_tenant(
+            self.context, 'goals', self.tenant_id)
+        self._verify_quota_usage(usage_info, expected_used=27)
+        usage_infos = quota_api.get_quota_usage_by_resource(
+            self.context, 'goals')
+        self._verify_quota_usage(usage_infos[0], expected_used=27)
+        usage_infos = quota_api.get_quota_usage_by_tenant_id(
+            self.context, self.tenant_id)
+        self._verify_quota_usage(usage_infos[0], expected_used=27)
+
+    def test_update_non_existing_quota_usage_shard(self):
+        self._create_quota_usage('goals', 26)
+        quota_api.create_quota_usage_shards(
+            self.context, 'goals', self.tenant_id, 2)
+        self.assertEqual(0, self._update_quota_usage_shard('goals', 2, 1))
+        self.assertEqual(0, self._update_quota_usage_shard('assists', 0, 1))
+
+    def test_create_quota_usage_shards_adds_missing_shards(self):
+        quota_api.create_quota_usage_shards(
+            self.context, 'goals', self.tenant_id, 2)
+        self._update_quota_usage_shard('goals', 1, 3)
+        quota_api.create_quota_usage_shards(
+            self.context, 'goals', self.tenant_id, 4)
+        self.assertEqual(1, self._update_quota_usage_shard('goals', 3, 1))
+        self._create_quota_usage('goals', 26)
+        self.assertEqual(26, quota_api.get_quota_usage_by_resource_and_tenant(
+            self.context, 'goals', self.tenant_id).used)
+
+    def test_set_quota_usage_resets_shards(self):
+        self._create_quota_usage('goals', 26)
+        quota_api.create_quota_usage_shards(
+            self.context, 'goals', self.tenant_id, 2)
+        self._update_quota_usage_shard('goals', 0, 2)
+        usage_info = quota_api.set_quota_usage(
+            self.context, 'goals', self.tenant_id, in_use=30)
+        self._verify_quota_usage(usage_info, expected_used=30)
+        usage_info = quota_api.get_quota_usage_by_resource_and_tenant(
+            self.context, 'goals', self.tenant_id)
+        self._verify_quota_usage(usage_info, expected_used=30)
+
+    def test_set_quota_usage_keeps_concurrent_shard_updates(self):
+        self._create_quota_usage('goals', 26)
+        quota_api.create_quota_usage_shards(
+            self.context, 'goals', self.tenant_id, 2)
+        self._update_quota_usage_shard('goals', 0, 2)
+        get_shards = quota_api._get_quota_usage_shards
+
+        def _get_shards_concurrent_update(*args):
+            shards = get_shards(*args)
+            # A resource is created after the shards are read
+            self._update_quota_usage_shard('goals', 0, 1)
+            return shards
+
+        with mock.patch.object(quota_api, '_get_quota_usage_shards',
+                               side_effect=_get_shards_concurrent_update):
+            quota_api.set_quota_usage(
+                self.context, 'goals', self.tenant_id, in_use=30)
+        usage_info = quota_api.get_quota_usage_by_resource_and_tenant(
+            self.context, 'goals', self.tenant_id)
+        self._verify_quota_usage(usage_info, expected_used=31)
+
+    def test_update_quota_usage_with_deltas_and_shards(self):
+        self._create_quota_usage('goals', 26)
+        quota_api.create_quota_usage_shards(
+            self.context, 'goals', self.tenant_id, 2)
+        self._update_quota_usage_shard('goals', 1, 2)
+        usage_info = quota_api.set_quota_usage(
+            self.context, 'goals', self.tenant_id, in_use=1, delta=True)
+        self._verify_quota_usage(usage_info, expected_used=29)
+        usage_info = quota_api.get_quota_usage_by_resource_and_tenant(
+            self.context, 'goals', self.tenant_id)
+        self._verify_quota_usage(usage_info, expected_used=29)
+
     def test_get_non_existing_quota_usage_returns_none(self):
         self.assertIsNone(quota_api.get_quota_usage_by_resource_and_tenant(
             self.context, 'goals', self.tenant_id))
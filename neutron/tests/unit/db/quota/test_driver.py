@@ -13,10 +13,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+
+import mock
+
 from neutron.common import exceptions
 from neutron import context
 from neutron.db import db_base_plugin_v2 as base_plugin
+from neutron.db.quota import api as quota_api
 from neutron.db.quota import driver
+from neutron import quota as quota_conf
 from neutron.tests.unit import testlib_api
 
 
@@ -198,3 +204,52 @@ class TestDbQuotaDriver(testlib_api.SqlTestCase):
                           resources,
                           deltas,
                           self.plugin)
+
+    def test_make_reservation_keeps_expired_reservations(self):
+        quota_driver = driver.DbQuotaDriver()
+        resources = {RESOURCE: TestResource(RESOURCE, 2)}
+        self.plugin.update_quota_limit(self.context, PROJECT, RESOURCE, 2)
+        expiration = datetime.datetime(2015, 3, 31, 14, 30)
+        expired_resv = quota_api.create_reservation(
+            self.context, self.context.tenant_id, {RESOURCE: 2}, expiration)
+        quota_driver.make_reservation(
+            self.context, self.context.tenant_id, resources, {RESOURCE: 2},
+            self.plugin)
+        self.assertIsNotNone(quota_api.get_reservation(
+            self.context, expired_resv.reservation_id))
+
+    def test_get_workers(self):
+        workers = driver.DbQuotaDriver().get_workers()
+        self.assertEqual(1, len(workers))
+        self.assertIsInstance(workers[0], driver.ReservationCleanupWorker)
+
+    def test_reservation_cleanup_interval_not_positive(self):
+        opt = [opt for opt in quota_conf.quota_opts
+               if opt.name == 'reservation_cleanup_interval'][0]
+        self.assertRaises(ValueError, opt.type, 0)
+
+    def test_quota_usage_shards_not_positive(self):
+        opt = [opt for opt in quota_conf.quota_opts
+               if opt.name == 'quota_usage_shards'][0]
+        self.assertRaises(ValueError, opt.type, 0)
+
+
+class TestReservationCleanupWorker(testlib_api.SqlTestCase):
+
+    def test_remove_expired_reservations(self):
+        ctx = context.get_admin_context()
+        with mock.patch('neutron.db.quota.api.utcnow') as mock_utcnow:
+            mock_utcnow.return_value = datetime.datetime(2015, 5, 20, 0, 0)
+            active_resv = quota_api.create_reservation(
+                ctx, PROJECT, {RESOURCE: 1},
+                datetime.datetime(2016, 3, 31, 14, 30))
+            expired_resvs = [quota_api.create_reservation(
+                ctx, tenant_id, {RESOURCE: 1},
+                datetime.datetime(2015, 3, 31, 14, 30))
+                for tenant_id in (PROJECT, 'other_prj')]
+            driver.ReservationCleanupWorker(60)._remove_expired_reservations()
+        self.assertIsNotNone(quota_api.get_reservation(
+            ctx, active_resv.reservation_id))
+        for resv in expired_resvs:
+            self.assertIsNone(quota_api.get_reservation(
+                ctx, resv.reservation_id))
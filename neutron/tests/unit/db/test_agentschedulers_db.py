@@ -728,6 +728,40 @@ class OvsAgentSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
             ret_b = l3_rpc_cb.sync_routers(self.adminContext, host=L3_HOSTB)
         self.assertEqual(ret_b, ret_a)
 
+    def _sync_routers_page_ids(self, l3_rpc_cb, **kwargs):
+        page = l3_rpc_cb.sync_routers_page(self.adminContext, host=L3_HOSTA,
+                                           page_size=2, **kwargs)
+        return page, sorted(r['id'] for r in page['routers'])
+
+    def test_sync_routers_page(self):
+        l3_rpc_cb = l3_rpc.L3RpcCallback()
+        self._register_agent_states()
+        with self.router() as r1, self.router() as r2, self.router() as r3:
+            router_ids = sorted(r['router']['id'] for r in (r1, r2, r3))
+            page, ids = self._sync_routers_page_ids(l3_rpc_cb)
+            self.assertEqual(router_ids[:2], ids)
+            self.assertEqual(router_ids[1], page['next_marker'])
+
+            with self.router():
+                # routers created during the sync are left to the next one
+                page, ids = self._sync_routers_page_ids(
+                    l3_rpc_cb, marker=page['next_marker'],
+                    snapshot=page['snapshot'])
+            self.assertEqual(router_ids[2:], ids)
+            self.assertIsNone(page['next_marker'])
+            self.assertEqual({}, l3_rpc_cb._sync_snapshots)
+
+    def test_sync_routers_page_unknown_snapshot(self):
+        l3_rpc_cb = l3_rpc.L3RpcCallback()
+        self._register_agent_states()
+        with self.router() as r1, self.router() as r2, self.router() as r3:
+            router_ids = sorted(r['router']['id'] for r in (r1, r2, r3))
+            page, ids = self._sync_routers_page_ids(
+                l3_rpc_cb, marker=router_ids[0], snapshot='unknown')
+            self.assertEqual(router_ids[1:], ids)
+            self.assertNotEqual('unknown', page['snapshot'])
+            self.assertIsNone(page['next_marker'])
+
     def test_router_no_reschedule_from_dead_admin_down_agent(self):
         with self.router() as r:
             l3_rpc_cb = l3_rpc.L3RpcCallback()
@@ -40,6 +40,7 @@ from neutron.common import test_lib
 from neutron.common import utils
 from neutron import context
 from neutron.db import db_base_plugin_common
+from neutron.db import db_base_plugin_v2
 from neutron.db import ipam_non_pluggable_backend as non_ipam
 from neutron.db import models_v2
 from neutron import manager
@@ -1066,6 +1067,46 @@ fixed_ips=ip_address%%3D%s&fixed_ips=ip_address%%3D%s&fixed_ips=subnet_id%%3D%s
             self._test_list_resources('port', [port1],
                                       query_params=query_params)
 
+    def test_list_ports_with_column_fields(self):
+        plugin = manager.NeutronManager.get_plugin()
+        with self.port() as port:
+            with mock.patch.object(plugin, '_make_port_dict') as make_port:
+                ports = plugin.get_ports(context.get_admin_context(),
+                                         fields=['id', 'status'])
+        self.assertFalse(make_port.called)
+        self.assertEqual([{'id': port['port']['id'],
+                           'status': port['port']['status']}], ports)
+
+    def test_list_ports_with_column_fields_filtered_by_fixed_ips(self):
+        plugin = manager.NeutronManager.get_plugin()
+        with self.subnet() as subnet:
+            subnet_id = subnet['subnet']['id']
+            fixed_ips = [{'subnet_id': subnet_id}, {'subnet_id': subnet_id}]
+            with self.port(subnet, fixed_ips=fixed_ips) as port:
+                ports = plugin.get_ports(
+                    context.get_admin_context(),
+                    filters={'fixed_ips': {'subnet_id': [subnet_id]}},
+                    fields=['id'])
+        self.assertEqual([{'id': port['port']['id']}], ports)
+
+    def test_list_ports_skips_extend_funcs_of_other_fields(self):
+        plugin = manager.NeutronManager.get_plugin()
+        plugin_class = db_base_plugin_v2.NeutronDbPluginV2
+        extend_funcs = plugin_class._dict_extend_functions
+        extend_port = mock.Mock()
+        with mock.patch.dict(extend_funcs, {attributes.PORTS: list(
+                extend_funcs.get(attributes.PORTS, []))}),\
+                mock.patch.dict(plugin_class._dict_extend_fields):
+            plugin_class.register_dict_extend_funcs(
+                attributes.PORTS, [extend_port], fields=['fake_field'])
+            with self.port():
+                ctx = context.get_admin_context()
+                extend_port.reset_mock()
+                plugin.get_ports(ctx, fields=['id', 'fixed_ips'])
+                self.assertFalse(extend_port.called)
+                plugin.get_ports(ctx, fields=['id', 'fake_field'])
+                self.assertTrue(extend_port.called)
+
     def test_list_ports_public_network(self):
         with self.network(shared=True) as network:
             with self.subnet(network) as subnet:
@@ -5258,6 +5299,28 @@ class TestSubnetPoolsV2(NeutronDbPluginV2TestCase):
             self.assertEqual(subnet.prefixlen,
                              int(sp['subnetpool']['default_prefixlen']))
 
+    def test_allocate_any_subnet_after_delete(self):
+        with self.network() as network:
+            sp = self._test_create_subnetpool(['10.10.0.0/16'],
+                                              tenant_id=self._tenant_id,
+                                              name=self._POOL_NAME,
+                                              min_prefixlen='21')
+
+            data = {'subnet': {'network_id': network['network']['id'],
+                               'subnetpool_id': sp['subnetpool']['id'],
+                               'prefixlen': 24,
+                               'ip_version': 4,
+                               'tenant_id': network['network']['tenant_id']}}
+            req = self.new_create_request('subnets', data)
+            res = self.deserialize(self.fmt, req.get_response(self.api))
+            self.assertEqual('10.10.0.0/24', res['subnet']['cidr'])
+            self._delete('subnets', res['subnet']['id'])
+
+            # The prefix of the deleted subnet is given back to the pool
+            req = self.new_create_request('subnets', data)
+            res = self.deserialize(self.fmt, req.get_response(self.api))
+            self.assertEqual('10.10.0.0/24', res['subnet']['cidr'])
+
     def test_allocate_specific_subnet_with_mismatch_prefixlen(self):
         with self.network() as network:
             sp = self._test_create_subnetpool(['10.10.0.0/16'],
@@ -5581,6 +5644,42 @@ class NeutronDbPluginV2AsMixinTestCase(NeutronDbPluginV2TestCase,
                           self.plugin.ipam._validate_network_subnetpools,
                           network, new_subnetpool_id, 4)
 
+    def test__repair_availability_ranges_failure(self):
+        with mock.patch.object(self.plugin.ipam,
+                               'repair_availability_ranges',
+                               side_effect=RuntimeError) as repair,\
+                mock.patch.object(db_base_plugin_v2.LOG,
+                                  'exception') as log_exception:
+            self.plugin._repair_availability_ranges()
+        self.assertTrue(repair.called)
+        self.assertTrue(log_exception.called)
+
+    def test_get_availability_ranges_repair_workers(self):
+        workers = self.plugin.get_availability_ranges_repair_workers()
+        self.assertEqual(1, len(workers))
+        self.assertIsInstance(workers[0],
+                              db_base_plugin_v2.AvailabilityRangesRepairWorker)
+
+    def test_get_availability_ranges_repair_workers_disabled(self):
+        cfg.CONF.set_override('availability_ranges_repair_interval', 0)
+        self.assertEqual([],
+                         self.plugin.get_availability_ranges_repair_workers())
+
+    def test_availability_ranges_repair_worker(self):
+        worker = db_base_plugin_v2.AvailabilityRangesRepairWorker(
+            self.plugin, 600)
+        with mock.patch.object(db_base_plugin_v2.loopingcall,
+                               'FixedIntervalLoopingCall') as loop_cls:
+            worker.start()
+            worker.stop()
+            worker.wait()
+        loop_cls.assert_called_once_with(
+            self.plugin._repair_availability_ranges)
+        loop = loop_cls.return_value
+        self.assertEqual(600, loop.start.call_args[1]['interval'])
+        self.assertTrue(loop.stop.called)
+        self.assertTrue(loop.wait.called)
+
 
 class TestNetworks(testlib_api.SqlTestCase):
     def setUp(self):
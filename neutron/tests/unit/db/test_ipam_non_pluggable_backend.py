@@ -14,17 +14,21 @@
 #    under the License.
 
 import mock
+import netaddr
 from oslo_config import cfg
 
 from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as n_exc
 from neutron.common import ipv6_utils
+from neutron import context
 from neutron.db import db_base_plugin_common
 from neutron.db import db_base_plugin_v2
 from neutron.db import ipam_non_pluggable_backend as non_ipam
 from neutron.db import models_v2
+from neutron import manager
 from neutron.tests import base
+from neutron.tests.unit.db import test_db_base_plugin_v2 as test_db_base
 
 
 class TestIpamNonPluggableBackend(base.BaseTestCase):
@@ -218,3 +222,88 @@ class TestIpamNonPluggableBackend(base.BaseTestCase):
             expected.append({'ip_address': addr, 'subnet_id': subnet['id']})
 
         self._test__allocate_ips_for_port(subnets, port, expected)
+
+
+class TestIpamNonPluggableBackendRanges(
+        test_db_base.NeutronDbPluginV2TestCase):
+    """Availability ranges maintenance of the non pluggable IPAM."""
+
+    def _get_ranges(self, subnet_id):
+        ctx = context.get_admin_context()
+        ranges = ctx.session.query(models_v2.IPAvailabilityRange).join(
+            models_v2.IPAllocationPool).filter_by(subnet_id=subnet_id)
+        return sorted(((r['first_ip'], r['last_ip']) for r in ranges),
+                      key=lambda r: netaddr.IPAddress(r[0]))
+
+    def _create_ports(self, subnet, count):
+        return [self._make_port(self.fmt, subnet['network_id'])['port']
+                for i in range(count)]
+
+    def test_delete_port_releases_ip(self):
+        with self.subnet() as subnet:
+            subnet = subnet['subnet']
+            ports = self._create_ports(subnet, 3)
+            self.assertEqual(
+                ['10.0.0.2', '10.0.0.3', '10.0.0.4'],
+                [port['fixed_ips'][0]['ip_address'] for port in ports])
+
+            self._delete('ports', ports[1]['id'])
+            self.assertEqual([('10.0.0.3', '10.0.0.3'),
+                              ('10.0.0.5', '10.0.0.254')],
+                             self._get_ranges(subnet['id']))
+            self._delete('ports', ports[2]['id'])
+            self.assertEqual([('10.0.0.3', '10.0.0.254')],
+                             self._get_ranges(subnet['id']))
+            self._delete('ports', ports[0]['id'])
+            self.assertEqual([('10.0.0.2', '10.0.0.254')],
+                             self._get_ranges(subnet['id']))
+
+    def test_delete_port_releases_ip_merges_ranges(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            subnet = subnet['subnet']
+            ports = self._create_ports(subnet, 5)
+            self.assertEqual([], self._get_ranges(subnet['id']))
+            self._delete('ports', ports[1]['id'])
+            self._delete('ports', ports[3]['id'])
+            self.assertEqual([('10.0.0.3', '10.0.0.3'),
+                              ('10.0.0.5', '10.0.0.5')],
+                             self._get_ranges(subnet['id']))
+            self._delete('ports', ports[2]['id'])
+            self.assertEqual([('10.0.0.3', '10.0.0.5')],
+                             self._get_ranges(subnet['id']))
+
+    def test_update_port_releases_removed_ip(self):
+        with self.subnet() as subnet:
+            subnet = subnet['subnet']
+            port = self._create_ports(subnet, 2)[0]
+            data = {'port': {'fixed_ips': [{'subnet_id': subnet['id'],
+                                            'ip_address': '10.0.0.10'}]}}
+            self._update('ports', port['id'], data)
+            self.assertEqual([('10.0.0.2', '10.0.0.2'),
+                              ('10.0.0.4', '10.0.0.9'),
+                              ('10.0.0.11', '10.0.0.254')],
+                             self._get_ranges(subnet['id']))
+
+    def test_repair_availability_ranges(self):
+        ctx = context.get_admin_context()
+        with self.subnet() as subnet:
+            subnet = subnet['subnet']
+            self._create_ports(subnet, 2)
+            with ctx.session.begin():
+                ctx.session.query(models_v2.IPAvailabilityRange).delete()
+                ctx.session.add(models_v2.IPAvailabilityRange(
+                    allocation_pool_id=ctx.session.query(
+                        models_v2.IPAllocationPool).one()['id'],
+                    first_ip='10.0.0.3', last_ip='10.0.0.200'))
+
+            plugin = manager.NeutronManager.get_plugin()
+            with mock.patch.object(
+                    non_ipam.IpamNonPluggableBackend,
+                    '_rebuild_availability_ranges',
+                    wraps=plugin.ipam._rebuild_availability_ranges) as rebuild:
+                plugin.ipam.repair_availability_ranges(ctx)
+                self.assertEqual([('10.0.0.4', '10.0.0.254')],
+                                 self._get_ranges(subnet['id']))
+                # The ranges are in sync now, there is nothing to repair
+                plugin.ipam.repair_availability_ranges(ctx)
+            self.assertEqual(1, rebuild.call_count)
@@ -220,6 +220,14 @@ class TestAddressScope(AddressScopeTestCase):
         res = self._list('address-scopes')
         self.assertEqual(2, len(res['address_scopes']))
 
+    def test_list_address_scopes_with_pagination(self):
+        with self.address_scope(name='as1') as as1,\
+                self.address_scope(name='as2') as as2,\
+                self.address_scope(name='as3') as as3:
+            self._test_list_with_pagination('address-scope',
+                                            (as1, as2, as3),
+                                            ('name', 'asc'), 2, 2)
+
     def test_list_address_scopes_different_tenants_shared(self):
         self._test_create_address_scope(name='foo-address-scope', shared=True,
                                         admin=True)
@@ -338,6 +338,17 @@ class FlavorManagerTestCase(test_db_base_plugin_v2.NeutronDbPluginV2TestCase,
         show_fl = self.plugin.get_flavors(self.ctx)
         self.assertEqual(2, len(show_fl))
 
+    def test_get_flavors_with_pagination(self):
+        fl, flavor = self._create_flavor()
+        flavor['flavor']['name'] = 'SILVER'
+        self.plugin.create_flavor(self.ctx, flavor)
+        sorts = [('name', True), ('id', True)]
+        page = self.plugin.get_flavors(self.ctx, sorts=sorts, limit=1)
+        self.assertEqual([fl], page)
+        page = self.plugin.get_flavors(self.ctx, sorts=sorts, limit=1,
+                                       marker=fl['id'])
+        self.assertEqual(['SILVER'], [f['name'] for f in page])
+
     def _create_service_profile(self, description=None):
         data = {'service_profile':
                 {'description': description or 'the best sp',
@@ -382,6 +393,14 @@ class FlavorManagerTestCase(test_db_base_plugin_v2.NeutronDbPluginV2TestCase,
         self._create_service_profile(description='another sp')
         self.assertEqual(2, len(self.plugin.get_service_profiles(self.ctx)))
 
+    def test_get_service_profiles_with_pagination(self):
+        sp1, data = self._create_service_profile(description='sp1')
+        sp2, data = self._create_service_profile(description='sp2')
+        sorts = [('description', False), ('id', True)]
+        page = self.plugin.get_service_profiles(self.ctx, sorts=sorts,
+                                                limit=1, marker=sp2['id'])
+        self.assertEqual([sp1], page)
+
     def test_associate_service_profile_with_flavor(self):
         sp, data = self._create_service_profile()
         fl, data = self._create_flavor()
@@ -292,6 +292,9 @@ class TestL3NatServicePlugin(common_db_mixin.CommonDbMixin,
                              l3_dvr_db.L3_NAT_with_dvr_db_mixin,
                              l3_db.L3_NAT_db_mixin):
 
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     supported_extension_aliases = ["router"]
 
     def get_plugin_type(self):
@@ -2223,6 +2226,13 @@ class L3NatTestCaseBase(L3NatTestCaseMixin):
             self._test_list_with_sort('floatingip', (fp3, fp2, fp1),
                                       [('floating_ip_address', 'desc')])
 
+    def test_floatingip_list_with_sort_by_port_id(self):
+        with self.floatingip_with_assoc() as fp1,\
+                self.subnet(cidr='10.1.0.0/24') as private_sub,\
+                self.floatingip_no_assoc(private_sub) as fp2:
+            self._test_list_with_sort('floatingip', (fp1, fp2),
+                                      [('port_id', 'desc')])
+
     def test_floatingip_list_with_port_id(self):
         with self.floatingip_with_assoc() as fip:
             port_id = fip['floatingip']['port_id']
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
+from oslo_db import exception as db_exc
 from oslo_utils import uuidutils
 
 from neutron import context
@@ -175,3 +177,68 @@ class TestIpamSubnetManager(testlib_api.SqlTestCase):
         allocs = self.ctx.session.query(db_models.IpamAllocation).filter_by(
             ipam_subnet_id=self.ipam_subnet_id).all()
         self.assertEqual(0, len(allocs))
+
+    def _create_blocks(self, indexes):
+        pool = self._create_pools([self.single_pool])[0]
+        self.ctx.session.flush()
+        for block_index in indexes:
+            self.subnet_manager.create_block(self.ctx.session, pool.id,
+                                             block_index, 1, 0)
+        return pool
+
+    def test_create_block_deletes_ranges(self):
+        pool = self._create_blocks([0])
+        block = self.subnet_manager.get_block(self.ctx.session, pool.id, 0)
+        self.assertEqual(1, block.free)
+        self.assertEqual('0' * 64, block.bitmap)
+        ranges = self.ctx.session.query(db_models.IpamAvailabilityRange).\
+            filter_by(allocation_pool_id=pool.id).all()
+        self.assertEqual([], ranges)
+
+    def test_create_block_duplicate(self):
+        pool = self._create_blocks([0])
+        block = self.subnet_manager.create_block(self.ctx.session, pool.id,
+                                                 0, 0, 1)
+        self.assertEqual(1, block.free)
+
+    def test_create_block_duplicate_not_visible(self):
+        pool = self._create_blocks([0])
+        with mock.patch.object(self.subnet_manager, 'get_block',
+                               return_value=None):
+            self.assertRaises(db_exc.RetryRequest,
+                              self.subnet_manager.create_block,
+                              self.ctx.session, pool.id, 0, 0, 1)
+
+    def test_get_missing_block_index(self):
+        pool = self._create_blocks([0, 1, 3])
+        self.assertEqual(2, self.subnet_manager.get_missing_block_index(
+            self.ctx.session, pool.id, 5))
+
+    def test_get_missing_block_index_first_block(self):
+        pool = self._create_blocks([1])
+        self.assertEqual(0, self.subnet_manager.get_missing_block_index(
+            self.ctx.session, pool.id, 2))
+
+    def test_get_missing_block_index_all_blocks_exist(self):
+        pool = self._create_blocks([0, 1])
+        self.assertIsNone(self.subnet_manager.get_missing_block_index(
+            self.ctx.session, pool.id, 2))
+
+    def test_get_next_free_block_wraps_around(self):
+        pool = self._create_blocks([0, 1, 2])
+        block = self.subnet_manager.get_block(self.ctx.session, pool.id, 2)
+        self.subnet_manager.update_block(self.ctx.session, block, 1, 0)
+        block = self.subnet_manager.get_next_free_block(self.ctx.session,
+                                                        pool.id, 2)
+        self.assertEqual(0, block.block_index)
+
+    def test_update_block_compare_and_swap(self):
+        pool = self._create_blocks([0])
+        block = self.subnet_manager.get_block(self.ctx.session, pool.id, 0)
+        self.assertTrue(self.subnet_manager.update_block(
+            self.ctx.session, block, 1, 0))
+        # block still holds the bitmap it was read with
+        self.assertFalse(self.subnet_manager.update_block(
+            self.ctx.session, block, 2, 0))
+        block = self.subnet_manager.get_block(self.ctx.session, pool.id, 0)
+        self.assertEqual(1, int(block.bitmap, 16))
@@ -13,12 +13,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
 import netaddr
+from oslo_db import exception as db_exc
 
 from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as n_exc
+from neutron.common import ipv6_utils
 from neutron import context
+from neutron.ipam.drivers.neutrondb_ipam import db_api as ipam_db_api
+from neutron.ipam.drivers.neutrondb_ipam import db_models
 from neutron.ipam.drivers.neutrondb_ipam import driver
 from neutron.ipam import exceptions as ipam_exc
 from neutron.ipam import requests as ipam_req
@@ -427,6 +432,60 @@ class TestNeutronDbIpamSubnet(testlib_api.SqlTestCase,
         # future proofing in case v6-specific logic will be added.
         self._test_deallocate_address('fde3:abcd:4321:1::/64', 6)
 
+    def _get_ranges(self, ipam_subnet):
+        av_ranges = ipam_subnet.subnet_manager.list_ranges_by_subnet_id(
+            self.ctx.session)
+        return [(r['first_ip'], r['last_ip']) for r in
+                sorted(av_ranges, key=convert_firstip_to_ipaddress)]
+
+    def test_deallocate_address_releases_ip(self):
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '192.168.0.0/29', ip_version=4)[0]
+        ip_addresses = [ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+                        for i in range(5)]
+        self.assertEqual([], self._get_ranges(ipam_subnet))
+        ipam_subnet.deallocate(ip_addresses[1])
+        ipam_subnet.deallocate(ip_addresses[3])
+        self.assertEqual([('192.168.0.3', '192.168.0.3'),
+                          ('192.168.0.5', '192.168.0.5')],
+                         self._get_ranges(ipam_subnet))
+        ipam_subnet.deallocate(ip_addresses[2])
+        self.assertEqual([('192.168.0.3', '192.168.0.5')],
+                         self._get_ranges(ipam_subnet))
+        ipam_subnet.deallocate(ip_addresses[4])
+        ipam_subnet.deallocate(ip_addresses[0])
+        self.assertEqual([('192.168.0.2', '192.168.0.6')],
+                         self._get_ranges(ipam_subnet))
+
+    def test_allocate_rebuilds_missing_ranges(self):
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '10.0.0.0/24', ip_version=4)[0]
+        ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        # No range is left, as for a subnet switched back from the
+        # allocation blocks driver
+        with self.ctx.session.begin():
+            self.ctx.session.query(db_models.IpamAvailabilityRange).delete()
+        ip_address = ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        self.assertEqual('10.0.0.3', ip_address)
+        self.assertEqual([('10.0.0.4', '10.0.0.254')],
+                         self._get_ranges(ipam_subnet))
+
+    def test_repair_availability_ranges(self):
+        ipam_subnet = self._create_and_allocate_ipam_subnet(
+            '10.0.0.0/24', ip_version=4)[0]
+        ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        ipam_subnet.allocate(ipam_req.SpecificAddressRequest('10.0.0.9'))
+        with self.ctx.session.begin():
+            self.ctx.session.query(db_models.IpamAvailabilityRange).delete()
+        self.ipam_pool.repair_availability_ranges()
+        self.assertEqual([('10.0.0.3', '10.0.0.8'),
+                          ('10.0.0.10', '10.0.0.254')],
+                         self._get_ranges(ipam_subnet))
+        with mock.patch.object(driver.NeutronDbSubnet,
+                               '_rebuild_availability_ranges') as rebuild:
+            self.ipam_pool.repair_availability_ranges()
+        self.assertFalse(rebuild.called)
+
     def test_allocate_unallocated_address_fails(self):
         ipam_subnet = self._create_and_allocate_ipam_subnet(
             '10.0.0.0/24', ip_version=4)[0]
@@ -444,3 +503,189 @@ class TestNeutronDbIpamSubnet(testlib_api.SqlTestCase,
         subnet_req = ipam_req.SpecificSubnetRequest(
             'tenant_id', 'meh', '192.168.0.0/24')
         self.ipam_pool.allocate_subnet(subnet_req)
+
+
+class TestNeutronDbBlockIpamSubnet(testlib_api.SqlTestCase,
+                                   TestNeutronDbIpamMixin):
+    """Test case for the Subnet interface using allocation bitmaps."""
+
+    def setUp(self):
+        super(TestNeutronDbBlockIpamSubnet, self).setUp()
+        self._tenant_id = 'test-tenant'
+        self.setup_coreplugin(test_db_plugin.DB_PLUGIN_KLASS)
+        self.plugin = manager.NeutronManager.get_plugin()
+        self.ctx = context.get_admin_context()
+        self.network, self.net_id = self._create_network(self.plugin,
+                                                         self.ctx)
+        self.ipam_pool = driver.NeutronDbBlockPool(None, self.ctx)
+
+    def _create_ipam_subnet(self, cidr, ipam_pool=None, ip_version=4,
+                            allocation_pools=attributes.ATTR_NOT_SPECIFIED):
+        subnet = self._create_subnet(self.plugin, self.ctx, self.net_id,
+                                     cidr, ip_version=ip_version,
+                                     allocation_pools=allocation_pools)
+        subnet_req = ipam_req.SpecificSubnetRequest(
+            self._tenant_id,
+            subnet['id'],
+            cidr,
+            gateway_ip=subnet['gateway_ip'],
+            allocation_pools=[netaddr.IPRange(pool['start'], pool['end'])
+                              for pool in subnet['allocation_pools']])
+        return (ipam_pool or self.ipam_pool).allocate_subnet(subnet_req)
+
+    def _get_blocks(self):
+        return self.ctx.session.query(
+            db_models.IpamAllocationBlock).populate_existing().all()
+
+    def _get_ranges(self):
+        return self.ctx.session.query(db_models.IpamAvailabilityRange).all()
+
+    def test_get_subnet(self):
+        ipam_subnet = self._create_ipam_subnet('10.0.0.0/24')
+        subnet_id = ipam_subnet.get_details().subnet_id
+        self.assertIsInstance(self.ipam_pool.get_subnet(subnet_id),
+                              driver.NeutronDbBlockSubnet)
+
+    def test_allocate_subnet_creates_no_range(self):
+        self._create_ipam_subnet('10.0.0.0/24')
+        self.assertEqual([], self._get_ranges())
+        self.assertEqual([], self._get_blocks())
+
+    def test_allocate_any_address_creates_block(self):
+        ipam_subnet = self._create_ipam_subnet('10.0.0.0/24')
+        ip_address = ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        self.assertIn(netaddr.IPAddress(ip_address),
+                      netaddr.IPRange('10.0.0.2', '10.0.0.254'))
+        blocks = self._get_blocks()
+        self.assertEqual(1, len(blocks))
+        self.assertEqual(252, blocks[0].free)
+        offset = int(netaddr.IPAddress(ip_address)) - int(
+            netaddr.IPAddress('10.0.0.2'))
+        self.assertEqual(1 << offset, int(blocks[0].bitmap, 16))
+
+    def test_allocate_any_v6_address(self):
+        ipam_subnet = self._create_ipam_subnet('fde3:abcd:4321:1::/64',
+                                               ip_version=6)
+        ip_address = ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        self.assertIn(netaddr.IPAddress(ip_address),
+                      netaddr.IPNetwork('fde3:abcd:4321:1::/64'))
+        self.assertEqual(1, len(self._get_blocks()))
+
+    def test_allocate_all_addresses(self):
+        ipam_subnet = self._create_ipam_subnet(
+            '10.0.0.0/22',
+            allocation_pools=[{'start': '10.0.0.250', 'end': '10.0.1.5'},
+                              {'start': '10.0.3.0', 'end': '10.0.3.3'}])
+        ip_addresses = [ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+                        for i in range(16)]
+        self.assertEqual(16, len(set(ip_addresses)))
+        self.assertRaises(ipam_exc.IpAddressGenerationFailure,
+                          ipam_subnet.allocate,
+                          ipam_req.AnyAddressRequest)
+        self.assertEqual(
+            [0, 0], [block.free for block in self._get_blocks()])
+
+    def test_allocate_any_address_skips_specific_address(self):
+        ipam_subnet = self._create_ipam_subnet('192.168.0.0/29')
+        ipam_subnet.allocate(ipam_req.SpecificAddressRequest('192.168.0.3'))
+        ip_addresses = [ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+                        for i in range(4)]
+        self.assertNotIn('192.168.0.3', ip_addresses)
+        self.assertEqual(4, len(set(ip_addresses)))
+
+    def test_allocate_specific_address_in_use_fails(self):
+        ipam_subnet = self._create_ipam_subnet('10.0.0.0/24')
+        addr_req = ipam_req.SpecificAddressRequest('10.0.0.33')
+        ipam_subnet.allocate(addr_req)
+        self.assertRaises(ipam_exc.IpAddressAlreadyAllocated,
+                          ipam_subnet.allocate,
+                          addr_req)
+
+    def test_allocate_specific_address_outside_pools(self):
+        ipam_subnet = self._create_ipam_subnet(
+            '10.0.0.0/24',
+            allocation_pools=[{'start': '10.0.0.10', 'end': '10.0.0.19'}])
+        ipam_subnet.allocate(ipam_req.SpecificAddressRequest('10.0.0.33'))
+        self.assertEqual([], self._get_blocks())
+
+    def test_allocate_eui64_address_marks_block(self):
+        ipam_subnet = self._create_ipam_subnet('fde3:abcd:4321:1::/64',
+                                               ip_version=6)
+        ip_address = str(ipv6_utils.get_ipv6_addr_by_EUI64(
+            'fde3:abcd:4321:1::/64', 'fa:16:3e:00:00:01'))
+        ipam_subnet.allocate(ipam_req.SpecificAddressRequest(ip_address))
+        blocks = self._get_blocks()
+        self.assertEqual(1, len(blocks))
+        self.assertEqual(1, bin(int(blocks[0].bitmap, 16)).count('1'))
+        self.assertRaises(ipam_exc.IpAddressAlreadyAllocated,
+                          ipam_subnet.allocate,
+                          ipam_req.SpecificAddressRequest(ip_address))
+
+    def test_deallocate_address(self):
+        ipam_subnet = self._create_ipam_subnet('192.168.0.0/30')
+        ip_address = ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        self.assertRaises(ipam_exc.IpAddressGenerationFailure,
+                          ipam_subnet.allocate,
+                          ipam_req.AnyAddressRequest)
+        ipam_subnet.deallocate(ip_address)
+        self.assertEqual(1, self._get_blocks()[0].free)
+        self.assertEqual(ip_address,
+                         ipam_subnet.allocate(ipam_req.AnyAddressRequest))
+
+    def test_deallocate_unallocated_address_fails(self):
+        ipam_subnet = self._create_ipam_subnet('10.0.0.0/24')
+        self.assertRaises(ipam_exc.IpAddressAllocationNotFound,
+                          ipam_subnet.deallocate, '10.0.0.2')
+
+    def test_blocks_created_from_range_allocations(self):
+        ipam_subnet = self._create_ipam_subnet(
+            '192.168.0.0/29', ipam_pool=driver.NeutronDbPool(None, self.ctx))
+        ip_addresses = set(ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+                           for i in range(3))
+        subnet_id = ipam_subnet.get_details().subnet_id
+        ipam_subnet = self.ipam_pool.get_subnet(subnet_id)
+        ip_addresses.update(ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+                            for i in range(2))
+        self.assertEqual(5, len(ip_addresses))
+        self.assertEqual([], self._get_ranges())
+        self.assertRaises(ipam_exc.IpAddressGenerationFailure,
+                          ipam_subnet.allocate,
+                          ipam_req.AnyAddressRequest)
+
+    def test_allocate_any_address_block_updated_concurrently(self):
+        ipam_subnet = self._create_ipam_subnet('10.0.0.0/24')
+        update_block = ipam_db_api.IpamSubnetManager.update_block
+        results = [False]
+
+        def _update_block(*args):
+            return results.pop() if results else update_block(*args)
+
+        with mock.patch.object(ipam_db_api.IpamSubnetManager,
+                               'update_block', autospec=True,
+                               side_effect=_update_block) as update:
+            ip_address = ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        self.assertEqual(2, update.call_count)
+        block = self._get_blocks()[0]
+        self.assertEqual(252, block.free)
+        offset = int(netaddr.IPAddress(ip_address)) - int(
+            netaddr.IPAddress('10.0.0.2'))
+        self.assertEqual(1 << offset, int(block.bitmap, 16))
+
+    def test_allocate_any_address_retries_transaction(self):
+        ipam_subnet = self._create_ipam_subnet('10.0.0.0/24')
+        with mock.patch.object(ipam_db_api.IpamSubnetManager,
+                               'update_block', return_value=False):
+            self.assertRaises(db_exc.RetryRequest,
+                              ipam_subnet.allocate,
+                              ipam_req.AnyAddressRequest)
+
+    def test_update_allocation_pools_deletes_blocks(self):
+        ipam_subnet = self._create_ipam_subnet('10.0.0.0/24')
+        ipam_subnet.allocate(ipam_req.AnyAddressRequest)
+        subnet_id = ipam_subnet.get_details().subnet_id
+        subnet_req = ipam_req.SpecificSubnetRequest(
+            self._tenant_id, subnet_id, '10.0.0.0/24',
+            allocation_pools=[netaddr.IPRange('10.0.0.100', '10.0.0.200')])
+        self.ipam_pool.update_subnet(subnet_req)
+        self.assertEqual([], self._get_blocks())
+        self.assertEqual([], self._get_ranges())
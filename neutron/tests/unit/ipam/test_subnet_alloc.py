@@ -21,6 +21,7 @@ from neutron.api.v2 import attributes
 from neutron.common import constants
 from neutron.common import exceptions as n_exc
 from neutron import context
+from neutron.db import models_v2
 from neutron.ipam import requests as ipam_req
 from neutron.ipam import subnet_alloc
 from neutron import manager
@@ -57,6 +58,17 @@ class TestSubnetAllocation(testlib_api.SqlTestCase):
     def _get_subnetpool(self, ctx, plugin, id):
         return plugin.get_subnetpool(ctx, id)
 
+    def _get_free_prefixes(self, subnetpool_id):
+        query = self.ctx.session.query(models_v2.SubnetPoolFreePrefix)
+        free_prefixes = query.filter_by(subnetpool_id=subnetpool_id)
+        return sorted(x.cidr for x in free_prefixes)
+
+    def _allocate_any_subnet(self, sa, prefixlen):
+        req = ipam_req.AnySubnetRequest(self._tenant_id,
+                                        uuidutils.generate_uuid(),
+                                        constants.IPv4, prefixlen)
+        return str(sa.allocate_subnet(req).get_details().subnet_cidr)
+
     def test_allocate_any_subnet(self):
         prefix_list = ['10.1.0.0/16', '192.168.1.0/24']
         sp = self._create_subnet_pool(self.plugin, self.ctx, 'test-sp',
@@ -183,3 +195,70 @@ class TestSubnetAllocation(testlib_api.SqlTestCase):
         self.assertRaises(n_exc.SubnetPoolQuotaExceeded,
                           sa.allocate_subnet,
                           req)
+
+    def test_allocate_any_subnet_smallest_free_prefix(self):
+        sp = self._create_subnet_pool(self.plugin, self.ctx, 'test-sp',
+                                      ['10.1.0.0/16', '192.168.1.0/24'],
+                                      21, 4)
+        sp = self.plugin._get_subnetpool(self.ctx, sp['id'])
+        sa = subnet_alloc.SubnetAllocator(sp, self.ctx)
+        self.assertEqual('192.168.1.0/25', self._allocate_any_subnet(sa, 25))
+        self.assertEqual('192.168.1.128/25',
+                         self._allocate_any_subnet(sa, 25))
+        self.assertEqual('10.1.0.0/25', self._allocate_any_subnet(sa, 25))
+
+    def test_allocate_any_subnet_splits_free_prefix(self):
+        sp = self._create_subnet_pool(self.plugin, self.ctx, 'test-sp',
+                                      ['10.1.0.0/16'], 16, 4)
+        sp = self.plugin._get_subnetpool(self.ctx, sp['id'])
+        sa = subnet_alloc.SubnetAllocator(sp, self.ctx)
+        self.assertEqual('10.1.0.0/19', self._allocate_any_subnet(sa, 19))
+        self.assertEqual(['10.1.128.0/17', '10.1.32.0/19', '10.1.64.0/18'],
+                         self._get_free_prefixes(sp['id']))
+
+    def test_allocate_specific_subnet_splits_free_prefix(self):
+        sp = self._create_subnet_pool(self.plugin, self.ctx, 'test-sp',
+                                      ['10.1.0.0/16'], 16, 4)
+        sp = self.plugin._get_subnetpool(self.ctx, sp['id'])
+        sa = subnet_alloc.SubnetAllocator(sp, self.ctx)
+        req = ipam_req.SpecificSubnetRequest(self._tenant_id,
+                                             uuidutils.generate_uuid(),
+                                             '10.1.96.0/19')
+        sa.allocate_subnet(req)
+        self.assertEqual(['10.1.0.0/18', '10.1.128.0/17', '10.1.64.0/19'],
+                         self._get_free_prefixes(sp['id']))
+
+    def test_allocate_rebuilds_free_prefixes(self):
+        sp = self._create_subnet_pool(self.plugin, self.ctx, 'test-sp',
+                                      ['10.1.0.0/23'], 24, 4)
+        sp = self.plugin._get_subnetpool(self.ctx, sp['id'])
+        sa = subnet_alloc.SubnetAllocator(sp, self.ctx)
+        self.assertEqual('10.1.0.0/24', self._allocate_any_subnet(sa, 24))
+        # Free prefixes not tracked yet are rebuilt from the pool subnets
+        with self.ctx.session.begin(subtransactions=True):
+            self.ctx.session.query(models_v2.SubnetPoolFreePrefix).delete()
+            self.ctx.session.add(models_v2.Subnet(
+                id=uuidutils.generate_uuid(), tenant_id=self._tenant_id,
+                subnetpool_id=sp['id'], ip_version=4, cidr='10.1.0.0/24'))
+        self.assertEqual('10.1.1.0/24', self._allocate_any_subnet(sa, 24))
+        self.assertEqual([], self._get_free_prefixes(sp['id']))
+
+    def test_release_subnet_merges_buddies(self):
+        sp = self._create_subnet_pool(self.plugin, self.ctx, 'test-sp',
+                                      ['10.1.0.0/16'], 16, 4)
+        sp = self.plugin._get_subnetpool(self.ctx, sp['id'])
+        sa = subnet_alloc.SubnetAllocator(sp, self.ctx)
+        cidrs = [self._allocate_any_subnet(sa, 24) for i in range(3)]
+        sa.release_subnet(cidrs[0])
+        self.assertEqual('10.1.0.0/24', self._allocate_any_subnet(sa, 24))
+        for cidr in cidrs:
+            sa.release_subnet(cidr)
+        self.assertEqual(['10.1.0.0/16'], self._get_free_prefixes(sp['id']))
+
+    def test_release_subnet_free_prefixes_not_tracked(self):
+        sp = self._create_subnet_pool(self.plugin, self.ctx, 'test-sp',
+                                      ['10.1.0.0/16'], 16, 4)
+        sp = self.plugin._get_subnetpool(self.ctx, sp['id'])
+        sa = subnet_alloc.SubnetAllocator(sp, self.ctx)
+        sa.release_subnet('10.1.0.0/24')
+        self.assertEqual([], self._get_free_prefixes(sp['id']))
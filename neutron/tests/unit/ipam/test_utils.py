@@ -87,3 +87,54 @@ class TestIpamUtils(base.BaseTestCase):
         cidr = '::/64'
         expected = [netaddr.IPRange('::1', '::FFFF:FFFF:FFFF:FFFF')]
         self.assertEqual(expected, utils.generate_pools(cidr, None))
+
+    def _get_adjacent_ranges(self, ip_address):
+        ip_ranges = [{'first_ip': '10.0.0.2', 'last_ip': '10.0.0.4'},
+                     {'first_ip': '10.0.0.6', 'last_ip': '10.0.0.6'},
+                     {'first_ip': '10.0.0.9', 'last_ip': '10.0.0.20'}]
+        return utils.get_adjacent_ranges(ip_ranges, ip_address)
+
+    def test_get_adjacent_ranges_both(self):
+        self.assertEqual(({'first_ip': '10.0.0.2', 'last_ip': '10.0.0.4'},
+                          {'first_ip': '10.0.0.6', 'last_ip': '10.0.0.6'}),
+                         self._get_adjacent_ranges('10.0.0.5'))
+
+    def test_get_adjacent_ranges_before(self):
+        self.assertEqual(({'first_ip': '10.0.0.6', 'last_ip': '10.0.0.6'},
+                          None),
+                         self._get_adjacent_ranges('10.0.0.7'))
+
+    def test_get_adjacent_ranges_after(self):
+        self.assertEqual((None,
+                          {'first_ip': '10.0.0.9', 'last_ip': '10.0.0.20'}),
+                         self._get_adjacent_ranges('10.0.0.8'))
+
+    def test_get_adjacent_ranges_none(self):
+        self.assertEqual((None, None), self._get_adjacent_ranges('10.0.0.30'))
+
+    def test_get_adjacent_ranges_already_available(self):
+        self.assertIsNone(self._get_adjacent_ranges('10.0.0.10'))
+
+    def test_check_availability_ranges(self):
+        pools = [netaddr.IPRange('10.0.0.2', '10.0.0.20')]
+        allocations = ['10.0.0.1', '10.0.0.5']
+        self.assertTrue(utils.check_availability_ranges(
+            pools, [netaddr.IPRange('10.0.0.2', '10.0.0.4'),
+                    netaddr.IPRange('10.0.0.6', '10.0.0.20')], allocations))
+        self.assertFalse(utils.check_availability_ranges(
+            pools, [netaddr.IPRange('10.0.0.2', '10.0.0.20')], allocations))
+        self.assertFalse(utils.check_availability_ranges(
+            pools, [netaddr.IPRange('10.0.0.2', '10.0.0.4')], allocations))
+
+    def test_check_availability_ranges_ignores_eui64(self):
+        pools = [netaddr.IPRange('2001:db8::2',
+                                 '2001:db8::ffff:ffff:ffff:ffff')]
+        allocations = ['2001:db8::f816:3eff:fe00:1']
+        self.assertTrue(utils.check_availability_ranges(
+            pools, pools, allocations))
+        self.assertTrue(utils.check_availability_ranges(
+            pools, [netaddr.IPRange('2001:db8::2',
+                                    '2001:db8::f816:3eff:fe00:0'),
+                    netaddr.IPRange('2001:db8::f816:3eff:fe00:2',
+                                    '2001:db8::ffff:ffff:ffff:ffff')],
+            allocations))
@@ -14,6 +14,8 @@
 # limitations under the License.
 
 import mock
+from oslo_config import cfg
+from oslo_db import exception as exc_db
 from six import moves
 import testtools
 from testtools import matchers
@@ -112,15 +114,58 @@ class TunnelTypeTestMixin(object):
         self._test_sync_allocations_and_allocated(TUN_MAX + 2)
 
     def test_sync_allocations_no_op(self):
-
-        def verify_no_chunk(iterable, chunk_size):
+        with mock.patch.object(type_tunnel, 'chunks') as chunks:
+            self.driver.sync_allocations()
             # no segment removed/added
-            self.assertEqual(0, len(list(iterable)))
-            return []
-        with mock.patch.object(
-                type_tunnel, 'chunks', side_effect=verify_no_chunk) as chunks:
+            self.assertFalse(chunks.called)
+
+    def test_sync_allocations_fills_holes(self):
+        self.driver.tunnel_ranges = [(TUN_MIN, TUN_MAX + 20)]
+        self.driver.sync_allocations()
+        tunnel_col = getattr(self.driver.model, self.driver.segmentation_key)
+        with self.session.begin():
+            self.session.query(self.driver.model).filter(
+                tunnel_col.in_([TUN_MIN + 1, TUN_MAX + 2, TUN_MAX + 3])
+            ).delete(synchronize_session=False)
+
+        added = []
+
+        def record_chunks(iterable, chunk_size):
+            chunk = list(iterable)
+            added.extend(chunk)
+            return [chunk]
+        with mock.patch.object(self.driver, 'SYNC_WINDOW_SIZE', 4),\
+                mock.patch.object(type_tunnel, 'chunks',
+                                  side_effect=record_chunks):
             self.driver.sync_allocations()
-            self.assertEqual(2, len(chunks.mock_calls))
+        self.assertEqual([TUN_MIN + 1, TUN_MAX + 2, TUN_MAX + 3],
+                         sorted(added))
+        for tunnel_id in moves.range(TUN_MIN, TUN_MAX + 21):
+            self.assertFalse(
+                self.driver.get_allocation(self.session, tunnel_id).allocated)
+
+    def test_sync_allocations_overlapping_ranges(self):
+        self.driver.tunnel_ranges = [(TUN_MAX + 5, TUN_MAX + 10),
+                                     (TUN_MIN, TUN_MAX),
+                                     (TUN_MAX - 2, TUN_MAX + 2)]
+        self.driver.sync_allocations()
+
+        self.assertIsNone(
+            self.driver.get_allocation(self.session, TUN_MIN - 1))
+        self.assertIsNotNone(
+            self.driver.get_allocation(self.session, TUN_MAX + 2))
+        self.assertIsNone(
+            self.driver.get_allocation(self.session, TUN_MAX + 3))
+        self.assertIsNotNone(
+            self.driver.get_allocation(self.session, TUN_MAX + 10))
+        self.assertIsNone(
+            self.driver.get_allocation(self.session, TUN_MAX + 11))
+
+    def test_merge_tunnel_ranges(self):
+        self.assertEqual(
+            [(1, 20), (30, 40)],
+            type_tunnel.TunnelTypeDriver._merge_tunnel_ranges(
+                [(30, 40), (10, 20), (1, 9), (5, 12)]))
 
     def test_partial_segment_is_partial_segment(self):
         segment = {api.NETWORK_TYPE: self.TYPE,
@@ -302,6 +347,85 @@ class TunnelTypeMultiRangeTestMixin(object):
             self.assertFalse(alloc.allocated)
 
 
+class TunnelTypeSparseTestMixin(object):
+    DRIVER_CLASS = None
+    TYPE = None
+
+    def setUp(self):
+        super(TunnelTypeSparseTestMixin, self).setUp()
+        self.driver = self.DRIVER_CLASS()
+        self.driver.tunnel_ranges = TUNNEL_RANGES
+        self.driver.sync_allocations()
+        self.session = db.get_session()
+        self.driver.allocate_fully_specified_segment(
+            self.session, **{self.driver.segmentation_key: TUN_MIN + 1})
+        cfg.CONF.set_override('tunnel_allocation_layout', 'sparse',
+                              group='ml2')
+        self.driver.sync_allocations()
+
+    def _allocated_ids(self):
+        tunnel_col = getattr(self.driver.model, self.driver.segmentation_key)
+        return sorted(x for x, in self.session.query(tunnel_col))
+
+    def test_sync_allocations_keeps_only_allocated(self):
+        self.assertEqual([TUN_MIN + 1], self._allocated_ids())
+        self.assertTrue(
+            self.driver.get_allocation(self.session, TUN_MIN + 1).allocated)
+
+    def test_sync_allocations_back_to_dense(self):
+        cfg.CONF.set_override('tunnel_allocation_layout', 'dense',
+                              group='ml2')
+        self.driver.sync_allocations()
+        self.assertEqual(list(moves.range(TUN_MIN, TUN_MAX + 1)),
+                         self._allocated_ids())
+        self.assertTrue(
+            self.driver.get_allocation(self.session, TUN_MIN + 1).allocated)
+        self.assertFalse(
+            self.driver.get_allocation(self.session, TUN_MIN).allocated)
+
+    def test_allocate_tenant_segment(self):
+        tunnel_ids = set()
+        for x in moves.range(TUN_MIN, TUN_MAX):
+            segment = self.driver.allocate_tenant_segment(self.session)
+            tunnel_ids.add(segment[api.SEGMENTATION_ID])
+        self.assertEqual(set(moves.range(TUN_MIN, TUN_MAX + 1)) -
+                         set([TUN_MIN + 1]), tunnel_ids)
+        self.assertIsNone(self.driver.allocate_tenant_segment(self.session))
+
+        segment[api.SEGMENTATION_ID] = TUN_MIN + 5
+        self.driver.release_segment(self.session, segment)
+        self.assertIsNone(self.driver.get_allocation(self.session,
+                                                     TUN_MIN + 5))
+        segment = self.driver.allocate_tenant_segment(self.session)
+        self.assertEqual(TUN_MIN + 5, segment[api.SEGMENTATION_ID])
+
+    def test_allocate_tenant_segment_starts_at_random_point(self):
+        with mock.patch.object(type_tunnel.random, 'randrange',
+                               return_value=TUN_MAX - TUN_MIN):
+            observed = [
+                self.driver.allocate_tenant_segment(
+                    self.session)[api.SEGMENTATION_ID] for i in range(3)]
+        self.assertEqual([TUN_MAX, TUN_MIN, TUN_MIN + 2], observed)
+
+    def test_allocate_tenant_segment_collision(self):
+        with mock.patch.object(type_tunnel.db_api, 'autonested_transaction',
+                               side_effect=exc_db.DBDuplicateEntry):
+            self.assertRaises(exc_db.RetryRequest,
+                              self.driver.allocate_tenant_segment,
+                              self.session)
+
+    def test_reserve_provider_segment_full_specs(self):
+        segment = {api.NETWORK_TYPE: self.TYPE,
+                   api.PHYSICAL_NETWORK: None,
+                   api.SEGMENTATION_ID: TUN_MAX + 5}
+        self.driver.reserve_provider_segment(self.session, segment)
+        with testtools.ExpectedException(exc.TunnelIdInUse):
+            self.driver.reserve_provider_segment(self.session, segment)
+
+        self.driver.release_segment(self.session, segment)
+        self.assertEqual([TUN_MIN + 1], self._allocated_ids())
+
+
 class TunnelRpcCallbackTestMixin(object):
 
     DRIVER_CLASS = None
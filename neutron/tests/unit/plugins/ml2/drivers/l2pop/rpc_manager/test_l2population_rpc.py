@@ -164,6 +164,44 @@ class TestL2populationRpcCallBackTunnelMixin(
         mock_cleanup_tunnel_port.assert_called_once_with(
             self.fakebr, self.ports[1].ofport, self.lvm1.network_type)
 
+    def test_fdb_add_tun_flooding_entries(self):
+        self.agent_ports[self.ports[0].ip].append(n_const.FLOODING_ENTRY)
+        self.agent_ports[self.ports[1].ip] = [n_const.FLOODING_ENTRY]
+        with mock.patch.object(self.fakeagent, 'add_fdb_flow'
+                               ) as mock_add_fdb_flow,\
+                mock.patch.object(self.fakeagent, 'add_fdb_flood_flows'
+                                  ) as mock_add_fdb_flood_flows:
+            self.fakeagent.fdb_add_tun('context', self.fakebr, self.lvm1,
+                                       self.agent_ports,
+                                       self._tunnel_port_lookup)
+        expected = [
+            mock.call(self.fakebr, (self.lvms[0].mac, self.lvms[0].ip),
+                      self.ports[0].ip, self.lvm1, self.ports[0].ofport),
+            mock.call(self.fakebr, (self.lvms[2].mac, self.lvms[2].ip),
+                      self.ports[2].ip, self.lvm1, self.ports[2].ofport),
+        ]
+        self.assertEqual(sorted(expected),
+                         sorted(mock_add_fdb_flow.call_args_list))
+        mock_add_fdb_flood_flows.assert_called_once_with(
+            self.fakebr, self.lvm1, mock.ANY)
+        self.assertEqual(
+            sorted([(self.ports[0].ip, self.ports[0].ofport),
+                    (self.ports[1].ip, self.ports[1].ofport)]),
+            sorted(mock_add_fdb_flood_flows.call_args[0][2]))
+
+    def test_add_fdb_flood_flows(self):
+        flood_ports = [(self.ports[0].ip, self.ports[0].ofport),
+                       (self.ports[1].ip, self.ports[1].ofport)]
+        with mock.patch.object(self.fakeagent, 'add_fdb_flow'
+                               ) as mock_add_fdb_flow:
+            self.fakeagent.add_fdb_flood_flows(self.fakebr, self.lvm1,
+                                               flood_ports)
+        mock_add_fdb_flow.assert_has_calls([
+            mock.call(self.fakebr, n_const.FLOODING_ENTRY, self.ports[0].ip,
+                      self.lvm1, self.ports[0].ofport),
+            mock.call(self.fakebr, n_const.FLOODING_ENTRY, self.ports[1].ip,
+                      self.lvm1, self.ports[1].ofport)])
+
     def test_fdb_remove_tun_non_existence_key_in_ofports(self):
         del self.ofports[self.type_gre][self.ports[1].ip]
         with mock.patch.object(
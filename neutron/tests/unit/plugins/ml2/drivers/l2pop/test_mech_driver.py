@@ -13,9 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import testtools
-
 import mock
+from oslo_config import cfg
+import testtools
 
 from neutron.common import constants
 from neutron.common import topics
@@ -102,6 +102,12 @@ class TestL2PopulationRpcTestCase(test_plugin.Ml2PluginV2TestCase):
         uptime_patch = mock.patch(uptime, return_value=190)
         uptime_patch.start()
 
+        # Send the fdb entries of each port event immediately, on the
+        # fanout topic
+        cfg.CONF.set_override('fdb_batch_interval', 0, group='l2pop')
+        cfg.CONF.set_override('targeted_fdb_notifications', False,
+                              group='l2pop')
+
     def _register_ml2_agents(self):
         helpers.register_ovs_agent(host=HOST, tunneling_ip='20.0.0.1')
         helpers.register_ovs_agent(host=HOST_2, tunneling_ip='20.0.0.2')
@@ -348,6 +354,51 @@ class TestL2PopulationRpcTestCase(test_plugin.Ml2PluginV2TestCase):
                     self.mock_fanout.assert_called_with(
                         mock.ANY, 'add_fdb_entries', expected2)
 
+    def test_fdb_add_targeted_to_network_hosts(self):
+        cfg.CONF.set_override('targeted_fdb_notifications', True,
+                              group='l2pop')
+        self._register_ml2_agents()
+
+        with self.subnet(network=self._network) as subnet:
+            host_arg = {portbindings.HOST_ID: HOST,
+                        'admin_state_up': True}
+            with self.port(subnet=subnet,
+                           device_owner=DEVICE_OWNER_COMPUTE,
+                           arg_list=(portbindings.HOST_ID, 'admin_state_up',),
+                           **host_arg) as port1:
+                host_arg = {portbindings.HOST_ID: HOST_2,
+                            'admin_state_up': True}
+                with self.port(subnet=subnet,
+                               device_owner=DEVICE_OWNER_COMPUTE,
+                               arg_list=(portbindings.HOST_ID,
+                                         'admin_state_up',),
+                               **host_arg) as port2:
+                    p1 = port1['port']
+                    p2 = port2['port']
+
+                    self.callbacks.update_device_up(self.adminContext,
+                                                    agent_id=HOST_2,
+                                                    device='tap' + p2['id'])
+                    self.mock_cast.reset_mock()
+                    self.callbacks.update_device_up(self.adminContext,
+                                                    agent_id=HOST,
+                                                    device='tap' + p1['id'])
+
+                    p1_ips = [p['ip_address'] for p in p1['fixed_ips']]
+                    expected = {p1['network_id']:
+                                {'ports':
+                                 {'20.0.0.1': [constants.FLOODING_ENTRY,
+                                               l2pop_rpc.PortInfo(
+                                                   p1['mac_address'],
+                                                   p1_ips[0])]},
+                                 'network_type': 'vxlan',
+                                 'segment_id': 1}}
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, 'add_fdb_entries', expected, HOST)
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, 'add_fdb_entries', expected, HOST_2)
+                    self.assertFalse(self.mock_fanout.called)
+
     def test_fdb_add_called_two_networks(self):
         self._register_ml2_agents()
 
@@ -795,6 +846,40 @@ class TestL2PopulationRpcTestCase(test_plugin.Ml2PluginV2TestCase):
 
 class TestL2PopulationMechDriver(base.BaseTestCase):
 
+    def test_get_network_hosts(self):
+        mech_driver = l2pop_mech_driver.L2populationMechanismDriver()
+        mech_driver.initialize()
+        with mock.patch.object(mech_driver, 'get_active_network_hosts',
+                               return_value=set([HOST])) as get_hosts:
+            self.assertEqual({'net1': set([HOST])},
+                             mech_driver._get_network_hosts('net1'))
+            self.assertEqual({'net1': set([HOST])},
+                             mech_driver._get_network_hosts('net1'))
+        self.assertEqual(2, get_hosts.call_count)
+        self.assertEqual({}, mech_driver.network_hosts)
+
+    def test_get_network_hosts_cached(self):
+        cfg.CONF.set_override('network_hosts_cache_ttl', 60, group='l2pop')
+        mech_driver = l2pop_mech_driver.L2populationMechanismDriver()
+        mech_driver.initialize()
+        with mock.patch.object(mech_driver, 'get_active_network_hosts',
+                               return_value=set([HOST])) as get_hosts:
+            mech_driver._get_network_hosts('net1')
+            mech_driver._update_network_hosts('net1', HOST_2, True)
+            self.assertEqual({'net1': set([HOST, HOST_2])},
+                             mech_driver._get_network_hosts('net1'))
+            mech_driver._update_network_hosts('net1', HOST, False)
+            self.assertEqual({'net1': set([HOST_2])},
+                             mech_driver._get_network_hosts('net1'))
+        self.assertEqual(1, get_hosts.call_count)
+
+    def test_get_network_hosts_fanout(self):
+        cfg.CONF.set_override('targeted_fdb_notifications', False,
+                              group='l2pop')
+        mech_driver = l2pop_mech_driver.L2populationMechanismDriver()
+        mech_driver.initialize()
+        self.assertIsNone(mech_driver._get_network_hosts('net1'))
+
     def _test_get_tunnels(self, agent_ip, exclude_host=True):
         mech_driver = l2pop_mech_driver.L2populationMechanismDriver()
         agent = mock.Mock()
@@ -913,3 +998,119 @@ class TestL2PopulationMechDriver(base.BaseTestCase):
         mech_driver = l2pop_mech_driver.L2populationMechanismDriver()
         with testtools.ExpectedException(ml2_exc.MechanismDriverError):
             mech_driver.update_port_precommit(ctx)
+
+
+class TestL2populationAgentNotifyAPI(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestL2populationAgentNotifyAPI, self).setUp()
+        self.notifier = l2pop_rpc.L2populationAgentNotifyAPI()
+        self.mock_fanout = mock.patch.object(
+            self.notifier, '_notification_fanout').start()
+        self.spawn_after = mock.patch.object(
+            l2pop_rpc.eventlet, 'spawn_after').start()
+        self.port1 = l2pop_rpc.PortInfo('fa:16:3e:00:00:01', '10.0.0.1')
+        self.port2 = l2pop_rpc.PortInfo('fa:16:3e:00:00:02', '10.0.0.2')
+
+    def _fdb_entries(self, network_id, agent_ip, port_infos):
+        return {network_id: {'segment_id': 1,
+                             'network_type': 'vxlan',
+                             'ports': {agent_ip: port_infos}}}
+
+    def test_fdb_entries_sent_immediately_without_interval(self):
+        cfg.CONF.set_override('fdb_batch_interval', 0, group='l2pop')
+        fdb_entries = self._fdb_entries('net1', '20.0.0.1', [self.port1])
+        self.notifier.add_fdb_entries('ctx', fdb_entries)
+        self.mock_fanout.assert_called_once_with(
+            'ctx', 'add_fdb_entries', fdb_entries)
+        self.assertFalse(self.spawn_after.called)
+
+    def test_fdb_entries_merged_until_flush(self):
+        self.notifier.add_fdb_entries(
+            'ctx', self._fdb_entries('net1', '20.0.0.1',
+                                     [constants.FLOODING_ENTRY, self.port1]))
+        self.notifier.add_fdb_entries(
+            'ctx', self._fdb_entries('net1', '20.0.0.2', [self.port2]))
+        self.notifier.remove_fdb_entries(
+            'ctx', self._fdb_entries('net2', '20.0.0.1', [self.port2]))
+        self.assertFalse(self.mock_fanout.called)
+        self.spawn_after.assert_called_once_with(
+            0.5, self.notifier.flush_fdb_entries, 'ctx')
+
+        self.notifier.flush_fdb_entries('ctx')
+        self.mock_fanout.assert_has_calls([
+            mock.call('ctx', 'remove_fdb_entries',
+                      self._fdb_entries('net2', '20.0.0.1', [self.port2])),
+            mock.call('ctx', 'add_fdb_entries',
+                      {'net1': {'segment_id': 1,
+                                'network_type': 'vxlan',
+                                'ports': {'20.0.0.1':
+                                          [constants.FLOODING_ENTRY,
+                                           self.port1],
+                                          '20.0.0.2': [self.port2]}}})])
+        self.assertEqual({}, self.notifier._pending_fdb_entries)
+
+    def test_fdb_entry_cancels_opposite_pending_entry(self):
+        self.notifier.add_fdb_entries(
+            'ctx', self._fdb_entries('net1', '20.0.0.1',
+                                     [self.port1, self.port2]))
+        self.notifier.remove_fdb_entries(
+            'ctx', self._fdb_entries('net1', '20.0.0.1', [self.port1]))
+        self.notifier.flush_fdb_entries('ctx')
+        self.mock_fanout.assert_has_calls([
+            mock.call('ctx', 'remove_fdb_entries',
+                      self._fdb_entries('net1', '20.0.0.1', [self.port1])),
+            mock.call('ctx', 'add_fdb_entries',
+                      self._fdb_entries('net1', '20.0.0.1', [self.port2]))])
+
+    def test_host_fdb_entries_not_merged(self):
+        fdb_entries = self._fdb_entries('net1', '20.0.0.1', [self.port1])
+        with mock.patch.object(self.notifier,
+                               '_notification_host') as mock_host:
+            self.notifier.add_fdb_entries('ctx', fdb_entries, 'host1')
+        mock_host.assert_called_once_with(
+            'ctx', 'add_fdb_entries', fdb_entries, 'host1')
+        self.assertEqual({}, self.notifier._pending_fdb_entries)
+
+    def test_fdb_entries_sent_to_network_hosts(self):
+        cfg.CONF.set_override('fdb_batch_interval', 0, group='l2pop')
+        fdb_entries = self._fdb_entries('net1', '20.0.0.1', [self.port1])
+        fdb_entries.update(self._fdb_entries('net2', '20.0.0.1',
+                                             [self.port2]))
+        with mock.patch.object(self.notifier,
+                               '_notification_host') as mock_host:
+            self.notifier.add_fdb_entries(
+                'ctx', fdb_entries,
+                network_hosts={'net1': set(['host1', 'host2'])})
+        mock_host.assert_has_calls([
+            mock.call('ctx', 'add_fdb_entries', {'net1': fdb_entries['net1']},
+                      'host1'),
+            mock.call('ctx', 'add_fdb_entries', {'net1': fdb_entries['net1']},
+                      'host2')], any_order=True)
+        self.mock_fanout.assert_called_once_with(
+            'ctx', 'add_fdb_entries', {'net2': fdb_entries['net2']})
+
+    def test_merged_fdb_entries_sent_to_network_hosts(self):
+        self.notifier.add_fdb_entries(
+            'ctx', self._fdb_entries('net1', '20.0.0.1', [self.port1]),
+            network_hosts={'net1': set(['host1'])})
+        self.notifier.add_fdb_entries(
+            'ctx', self._fdb_entries('net1', '20.0.0.2', [self.port2]),
+            network_hosts={'net1': set(['host2'])})
+        with mock.patch.object(self.notifier,
+                               '_notification_host') as mock_host:
+            self.notifier.flush_fdb_entries('ctx')
+        self.assertEqual(set(['host1', 'host2']),
+                         set(call[0][3] for call in mock_host.call_args_list))
+        self.assertFalse(self.mock_fanout.called)
+
+    def test_update_fdb_entries_flushes_pending_entries(self):
+        self.notifier.add_fdb_entries(
+            'ctx', self._fdb_entries('net1', '20.0.0.1', [self.port1]))
+        upd_fdb_entries = {'chg_ip': {'net1': {'20.0.0.1': {
+            'before': [self.port1], 'after': [self.port2]}}}}
+        self.notifier.update_fdb_entries('ctx', upd_fdb_entries)
+        self.mock_fanout.assert_has_calls([
+            mock.call('ctx', 'add_fdb_entries',
+                      self._fdb_entries('net1', '20.0.0.1', [self.port1])),
+            mock.call('ctx', 'update_fdb_entries', upd_fdb_entries)])
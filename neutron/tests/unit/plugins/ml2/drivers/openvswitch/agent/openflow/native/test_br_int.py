@@ -32,6 +32,14 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
         self.br.setup_default_table()
         (dp, ofp, ofpp) = self._get_dp()
         expected = [
+            call._send_msg(ofpp.OFPFlowMod(dp,
+                cookie=0,
+                instructions=[
+                    ofpp.OFPInstructionGotoTable(table_id=60),
+                ],
+                match=ofpp.OFPMatch(),
+                priority=0,
+                table_id=0)),
             call._send_msg(ofpp.OFPFlowMod(dp,
                 cookie=0,
                 instructions=[
@@ -42,7 +50,7 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
                 ],
                 match=ofpp.OFPMatch(),
                 priority=0,
-                table_id=0)),
+                table_id=60)),
             call._send_msg(ofpp.OFPFlowMod(dp,
                 cookie=0,
                 instructions=[],
@@ -72,8 +80,8 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
                     ofpp.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS, [
                         ofpp.OFPActionSetField(
                             vlan_vid=lvid | ofp.OFPVID_PRESENT),
-                        ofpp.OFPActionOutput(ofp.OFPP_NORMAL, 0)
                     ]),
+                    ofpp.OFPInstructionGotoTable(table_id=60),
                 ],
                 match=ofpp.OFPMatch(
                     in_port=port,
@@ -98,8 +106,8 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
                         ofpp.OFPActionPushVlan(),
                         ofpp.OFPActionSetField(
                             vlan_vid=lvid | ofp.OFPVID_PRESENT),
-                        ofpp.OFPActionOutput(ofp.OFPP_NORMAL, 0),
                     ]),
+                    ofpp.OFPInstructionGotoTable(table_id=60),
                 ],
                 match=ofpp.OFPMatch(
                     in_port=port,
@@ -292,9 +300,7 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
             call._send_msg(ofpp.OFPFlowMod(dp,
                 cookie=0,
                 instructions=[
-                    ofpp.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS, [
-                        ofpp.OFPActionOutput(ofp.OFPP_NORMAL, 0),
-                    ]),
+                    ofpp.OFPInstructionGotoTable(table_id=60),
                 ],
                 match=ofpp.OFPMatch(
                     eth_type=self.ether_types.ETH_TYPE_IPV6,
@@ -308,9 +314,7 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
             call._send_msg(ofpp.OFPFlowMod(dp,
                 cookie=0,
                 instructions=[
-                    ofpp.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS, [
-                        ofpp.OFPActionOutput(ofp.OFPP_NORMAL, 0),
-                    ]),
+                    ofpp.OFPInstructionGotoTable(table_id=60),
                 ],
                 match=ofpp.OFPMatch(
                     eth_type=self.ether_types.ETH_TYPE_IPV6,
@@ -346,9 +350,7 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
             call._send_msg(ofpp.OFPFlowMod(dp,
                 cookie=0,
                 instructions=[
-                    ofpp.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS, [
-                        ofpp.OFPActionOutput(ofp.OFPP_NORMAL, 0),
-                    ]),
+                    ofpp.OFPInstructionGotoTable(table_id=60),
                 ],
                 match=ofpp.OFPMatch(
                     eth_type=self.ether_types.ETH_TYPE_ARP,
@@ -360,9 +362,7 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
             call._send_msg(ofpp.OFPFlowMod(dp,
                 cookie=0,
                 instructions=[
-                    ofpp.OFPInstructionActions(ofp.OFPIT_APPLY_ACTIONS, [
-                        ofpp.OFPActionOutput(ofp.OFPP_NORMAL, 0),
-                    ]),
+                    ofpp.OFPInstructionGotoTable(table_id=60),
                 ],
                 match=ofpp.OFPMatch(
                     eth_type=self.ether_types.ETH_TYPE_ARP,
@@ -32,7 +32,8 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
     def test_setup_default_table(self):
         self.br.setup_default_table()
         expected = [
-            call.add_flow(priority=0, table=0, actions='normal'),
+            call.add_flow(priority=0, table=0, actions='resubmit(,60)'),
+            call.add_flow(priority=0, table=60, actions='normal'),
             call.add_flow(priority=0, table=23, actions='drop'),
             call.add_flow(priority=0, table=24, actions='drop'),
         ]
@@ -47,7 +48,7 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
         expected = [
             call.add_flow(priority=3, dl_vlan=segmentation_id,
                           in_port=port,
-                          actions='mod_vlan_vid:%s,normal' % lvid),
+                          actions='mod_vlan_vid:%s,resubmit(,60)' % lvid),
         ]
         self.assertEqual(expected, self.mock.mock_calls)
 
@@ -60,7 +61,7 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
         expected = [
             call.add_flow(priority=3, dl_vlan=0xffff,
                           in_port=port,
-                          actions='mod_vlan_vid:%s,normal' % lvid),
+                          actions='mod_vlan_vid:%s,resubmit(,60)' % lvid),
         ]
         self.assertEqual(expected, self.mock.mock_calls)
 
@@ -192,12 +193,14 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
         ip_addresses = ['2001:db8::1', 'fdf8:f53b:82e4::1/128']
         self.br.install_icmpv6_na_spoofing_protection(port, ip_addresses)
         expected = [
-            call.add_flow(dl_type=const.ETHERTYPE_IPV6, actions='normal',
+            call.add_flow(dl_type=const.ETHERTYPE_IPV6,
+                          actions='resubmit(,60)',
                           icmp_type=const.ICMPV6_TYPE_NA,
                           nw_proto=const.PROTO_NUM_ICMP_V6,
                           nd_target='2001:db8::1',
                           priority=2, table=24, in_port=8888),
-            call.add_flow(dl_type=const.ETHERTYPE_IPV6, actions='normal',
+            call.add_flow(dl_type=const.ETHERTYPE_IPV6,
+                          actions='resubmit(,60)',
                           icmp_type=const.ICMPV6_TYPE_NA,
                           nw_proto=const.PROTO_NUM_ICMP_V6,
                           nd_target='fdf8:f53b:82e4::1/128',
@@ -215,10 +218,10 @@ class OVSIntegrationBridgeTest(ovs_bridge_test_base.OVSBridgeTestBase):
         ip_addresses = ['192.0.2.1', '192.0.2.2/32']
         self.br.install_arp_spoofing_protection(port, ip_addresses)
         expected = [
-            call.add_flow(proto='arp', actions='normal',
+            call.add_flow(proto='arp', actions='resubmit(,60)',
                           arp_spa='192.0.2.1',
                           priority=2, table=24, in_port=8888),
-            call.add_flow(proto='arp', actions='normal',
+            call.add_flow(proto='arp', actions='resubmit(,60)',
                           arp_spa='192.0.2.2/32',
                           priority=2, table=24, in_port=8888),
             call.add_flow(priority=10, table=0, in_port=8888,
@@ -150,6 +150,7 @@ class TestOvsNeutronAgent(object):
             self.agent.use_call = True
             self.agent.tun_br = self.br_tun_cls(br_name='br-tun')
         self.agent.sg_agent = mock.Mock()
+        self.agent.sg_agent.firewall.requires_integration_bridge = False
 
     def _mock_port_bound(self, ofport=None, new_local_vlan=None,
                          old_local_vlan=None):
@@ -170,7 +171,8 @@ class TestOvsNeutronAgent(object):
         vlan_mapping = {'net_uuid': net_uuid,
                         'network_type': 'local',
                         'physical_network': None,
-                        'segmentation_id': None}
+                        'segmentation_id': None,
+                        'tag': str(self.agent.local_vlan_map[net_uuid].vlan)}
         int_br.set_db_attribute.assert_called_once_with(
             "Port", mock.ANY, "other_config", vlan_mapping)
 
@@ -686,6 +688,63 @@ class TestOvsNeutronAgent(object):
             setup_port_filters.assert_called_once_with(
                 set(), port_info.get('updated', set()))
 
+    def test_process_network_ports_with_insecure_ports_bridge_firewall(self):
+        port_info = {'current': set(['tap0', 'tap1']),
+                     'updated': set(['tap1']),
+                     'removed': set([]),
+                     'added': set(['eth1'])}
+        with mock.patch.object(self.agent.sg_agent,
+                               "setup_port_filters") as setup_port_filters,\
+                mock.patch.object(
+                    self.agent,
+                    "treat_devices_added_or_updated",
+                    return_value=([], [], ['eth1'])),\
+                mock.patch.object(self.agent.sg_agent.firewall,
+                                  "requires_integration_bridge", True):
+            self.assertFalse(self.agent.process_network_ports(port_info,
+                                                              False))
+            # the firewall gets the ports with port security disabled too
+            setup_port_filters.assert_called_once_with(
+                set(['eth1']), port_info.get('updated', set()))
+
+    def test_process_network_ports_prepares_rebound_ports(self):
+        port_info = {'current': set(['tap0', 'tap1']),
+                     'updated': set(['tap1']),
+                     'removed': set([]),
+                     'added': set(['tap0'])}
+        vif_port = mock.Mock(port_name='tap1', ofport=2)
+        need_binding = [{'network_id': 'netuid12345',
+                         'device': 'tap1',
+                         'vif_port': vif_port}]
+        self.agent.local_vlan_map['netuid12345'] = mock.Mock(vlan=1)
+        with mock.patch.object(self.agent.sg_agent,
+                               "setup_port_filters") as setup_port_filters,\
+                mock.patch.object(
+                    self.agent,
+                    "treat_devices_added_or_updated",
+                    return_value=([], need_binding, [])),\
+                mock.patch.object(self.agent, "_bind_devices"),\
+                mock.patch.object(self.agent, "int_br") as int_br:
+            int_br.get_ports_attributes.return_value = [
+                {'name': 'tap1', 'tag': 2}]
+            self.assertFalse(self.agent.process_network_ports(port_info,
+                                                              False))
+            int_br.delete_flows.assert_called_once_with(in_port=2)
+            setup_port_filters.assert_called_once_with(
+                set(['tap0', 'tap1']), set(['tap1']))
+            self.assertEqual(set(['tap0']), port_info['added'])
+
+    def test_remove_stale_port_flows_keeps_flows_of_same_vlan(self):
+        vif_port = mock.Mock(port_name='tap1', ofport=2)
+        self.agent.local_vlan_map['netuid12345'] = mock.Mock(vlan=1)
+        with mock.patch.object(self.agent, "int_br") as int_br:
+            int_br.get_ports_attributes.return_value = [
+                {'name': 'tap1', 'tag': 1}]
+            self.assertEqual(set(), self.agent._remove_stale_port_flows(
+                [{'network_id': 'netuid12345', 'device': 'tap1',
+                  'vif_port': vif_port}]))
+            self.assertFalse(int_br.delete_flows.called)
+
     def test_report_state(self):
         with mock.patch.object(self.agent.state_rpc,
                                "report_state") as report_st:
@@ -1103,6 +1162,47 @@ class TestOvsNeutronAgent(object):
             ]
             br_tun.assert_has_calls(expected_calls)
 
+    def test_fdb_add_flows_several_agents_and_networks(self):
+        self._prepare_l2_pop_ofports()
+        self.agent.local_vlan_map['net1'].tun_ofports = set()
+        fdb_entry = {'net1':
+                     {'network_type': 'gre',
+                      'segment_id': 'tun1',
+                      'ports':
+                      {'1.1.1.1': [n_const.FLOODING_ENTRY],
+                       '2.2.2.2': [n_const.FLOODING_ENTRY]}},
+                     'net2':
+                     {'network_type': 'gre',
+                      'segment_id': 'tun2',
+                      'ports':
+                      {'2.2.2.2':
+                       [l2pop_rpc.PortInfo(FAKE_MAC, FAKE_IP1)]}}}
+
+        with mock.patch.object(self.agent, 'tun_br', autospec=True) as tun_br:
+            self.agent.fdb_add(None, fdb_entry)
+            self.assertEqual(1, tun_br.deferred.call_count)
+            deferred_br = tun_br.deferred().__enter__()
+            deferred_br.install_flood_to_tun.assert_called_once_with(
+                'vlan1', 'seg1', set(['1', '2']))
+            deferred_br.install_unicast_to_tun.assert_called_once_with(
+                'vlan2', 'seg2', '2', FAKE_MAC)
+
+    def test_fdb_del_flows_several_agents(self):
+        self._prepare_l2_pop_ofports()
+        fdb_entry = {'net2':
+                     {'network_type': 'gre',
+                      'segment_id': 'tun2',
+                      'ports':
+                      {'1.1.1.1': [n_const.FLOODING_ENTRY],
+                       '2.2.2.2': [n_const.FLOODING_ENTRY]}}}
+        with mock.patch.object(self.agent, 'tun_br', autospec=True) as tun_br:
+            self.agent.fdb_remove(None, fdb_entry)
+            deferred_br = tun_br.deferred().__enter__()
+            self.assertFalse(deferred_br.install_flood_to_tun.called)
+            deferred_br.delete_flood_to_tun.assert_called_once_with('vlan2')
+        self.assertEqual(set(),
+                         self.agent.local_vlan_map['net2'].tun_ofports)
+
     def test_fdb_add_port(self):
         self._prepare_l2_pop_ofports()
         fdb_entry = {'net1':
@@ -1727,6 +1827,7 @@ class TestOvsDvrNeutronAgent(object):
             self.agent.use_call = True
             self.agent.tun_br = self.br_tun_cls(br_name='br-tun')
         self.agent.sg_agent = mock.Mock()
+        self.agent.sg_agent.firewall.requires_integration_bridge = False
 
     def _setup_for_dvr_test(self):
         self._port = mock.Mock()
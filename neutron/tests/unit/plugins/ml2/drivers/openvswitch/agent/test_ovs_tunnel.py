@@ -430,7 +430,8 @@ class TunnelTest(object):
         vlan_mapping = {'segmentation_id': LS_ID,
                         'physical_network': None,
                         'net_uuid': NET_UUID,
-                        'network_type': 'gre'}
+                        'network_type': 'gre',
+                        'tag': str(self.LVM.vlan)}
         self.mock_int_bridge_expected += [
             mock.call.db_get_val('Port', 'port', 'other_config'),
             mock.call.set_db_attribute('Port', VIF_PORT.port_name,
@@ -134,10 +134,64 @@ class HelpersTest(testlib_api.SqlTestCase):
     def test_allocate_partial_segment_first_attempt_fails(self):
         expected = dict(physical_network=TENANT_NET)
         with mock.patch.object(query.Query, 'update', side_effect=[0, 1]):
+            observed = self.driver.allocate_partially_specified_segment(
+                self.session, **expected)
+            self.check_raw_segment(expected, observed)
+
+    def test_allocate_partial_segment_whole_batch_fails(self):
+        expected = dict(physical_network=TENANT_NET)
+        with mock.patch.object(query.Query, 'update', return_value=0):
             self.assertRaises(
                 exc.RetryRequest,
                 self.driver.allocate_partially_specified_segment,
                 self.session, **expected)
+        observed = self.driver.allocate_partially_specified_segment(
+            self.session, **expected)
+        self.check_raw_segment(expected, observed)
+
+    def test_allocate_partial_segment_starts_at_random_point(self):
+        with mock.patch.object(helpers.random, 'randint',
+                               return_value=VLAN_MIN + 5):
             observed = self.driver.allocate_partially_specified_segment(
-                self.session, **expected)
-            self.check_raw_segment(expected, observed)
+                self.session)
+        self.assertEqual(VLAN_MIN + 5, observed.vlan_id)
+
+    def test_allocate_partial_segment_walks_and_wraps(self):
+        with mock.patch.object(helpers.random, 'randint',
+                               return_value=VLAN_MAX - 1):
+            observed = [self.driver.allocate_partially_specified_segment(
+                self.session).vlan_id for i in range(VLAN_MIN, VLAN_MAX + 1)]
+        self.assertEqual([VLAN_MAX - 1, VLAN_MAX] +
+                         list(range(VLAN_MIN, VLAN_MAX - 1)), observed)
+
+    def test_allocate_partial_segment_claims_batches(self):
+        with mock.patch.object(helpers, 'IDPOOL_SELECT_SIZE', 3),\
+                mock.patch.object(self.driver, '_claim_free_segments',
+                                  wraps=self.driver._claim_free_segments) as (
+                    claim):
+            for i in range(4):
+                self.driver.allocate_partially_specified_segment(
+                    self.session)
+        self.assertEqual(2, claim.call_count)
+
+    def test_allocate_partial_segment_skips_segments_allocated_elsewhere(self):
+        other = type_vlan.VlanTypeDriver()
+        with mock.patch.object(helpers.random, 'randint',
+                               return_value=VLAN_MIN):
+            first = self.driver.allocate_partially_specified_segment(
+                self.session)
+            stolen = other.allocate_partially_specified_segment(self.session)
+            observed = self.driver.allocate_partially_specified_segment(
+                self.session)
+        self.assertEqual(VLAN_MIN, first.vlan_id)
+        self.assertEqual(VLAN_MIN + 1, stolen.vlan_id)
+        self.assertEqual(VLAN_MIN + 2, observed.vlan_id)
+
+    def test_segment_pools_reset_in_forked_process(self):
+        self.driver.allocate_partially_specified_segment(self.session)
+        self.assertTrue(self.driver._segment_pools)
+        with mock.patch.object(helpers.os, 'getpid',
+                               return_value=self.driver._pools_pid + 1):
+            self.driver._get_segment_pool({})
+        self.assertEqual({(): []}, self.driver._segment_pools)
+        self.assertEqual({}, self.driver._segment_cursors)
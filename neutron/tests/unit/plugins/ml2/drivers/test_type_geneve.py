@@ -48,6 +48,12 @@ class GeneveTypeMultiRangeTest(base_type_tunnel.TunnelTypeMultiRangeTestMixin,
     DRIVER_CLASS = type_geneve.GeneveTypeDriver
 
 
+class GeneveTypeSparseTest(base_type_tunnel.TunnelTypeSparseTestMixin,
+                           testlib_api.SqlTestCase):
+    DRIVER_CLASS = type_geneve.GeneveTypeDriver
+    TYPE = p_const.TYPE_GENEVE
+
+
 class GeneveTypeRpcCallbackTest(base_type_tunnel.TunnelRpcCallbackTestMixin,
                                 test_rpc.RpcCallbacksTestCase,
                                 testlib_api.SqlTestCase):
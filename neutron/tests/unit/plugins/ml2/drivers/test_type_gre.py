@@ -85,6 +85,12 @@ class GreTypeMultiRangeTest(base_type_tunnel.TunnelTypeMultiRangeTestMixin,
     DRIVER_CLASS = type_gre.GreTypeDriver
 
 
+class GreTypeSparseTest(base_type_tunnel.TunnelTypeSparseTestMixin,
+                        testlib_api.SqlTestCase):
+    DRIVER_CLASS = type_gre.GreTypeDriver
+    TYPE = p_const.TYPE_GRE
+
+
 class GreTypeRpcCallbackTest(base_type_tunnel.TunnelRpcCallbackTestMixin,
                              test_rpc.RpcCallbacksTestCase,
                              testlib_api.SqlTestCase):
@@ -95,6 +95,12 @@ class VxlanTypeMultiRangeTest(base_type_tunnel.TunnelTypeMultiRangeTestMixin,
     DRIVER_CLASS = type_vxlan.VxlanTypeDriver
 
 
+class VxlanTypeSparseTest(base_type_tunnel.TunnelTypeSparseTestMixin,
+                          testlib_api.SqlTestCase):
+    DRIVER_CLASS = type_vxlan.VxlanTypeDriver
+    TYPE = p_const.TYPE_VXLAN
+
+
 class VxlanTypeRpcCallbackTest(base_type_tunnel.TunnelRpcCallbackTestMixin,
                                test_rpc.RpcCallbacksTestCase,
                                testlib_api.SqlTestCase):
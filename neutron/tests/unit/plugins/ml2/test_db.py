@@ -15,6 +15,7 @@
 
 import mock
 from oslo_utils import uuidutils
+import sqlalchemy as sa
 from sqlalchemy.orm import query
 
 from neutron import context
@@ -194,6 +195,25 @@ class Ml2DBTestCase(testlib_api.SqlTestCase):
         port = ml2_db.get_port(self.ctx.session, port_id)
         self.assertIsNone(port)
 
+    def test_get_ports_by_ids(self):
+        network_id = 'foo-network-id'
+        self._setup_neutron_network(network_id)
+        for port_id in ('foo-port-id-one', 'foo-port-id-two'):
+            self._setup_neutron_port(network_id, port_id)
+            self._setup_neutron_portbinding(port_id, 'vif_type', 'host')
+        self.ctx.session.expunge_all()
+
+        ports = ml2_db.get_ports_by_ids(
+            self.ctx.session, ['foo-port-id-one', 'foo-port-id-two'])
+        self.assertEqual(set(['foo-port-id-one', 'foo-port-id-two']),
+                         set(port.id for port in ports))
+        # the bindings are loaded by the same query
+        for port in ports:
+            self.assertNotIn('port_binding', sa.inspect(port).unloaded)
+
+    def test_get_ports_by_ids_without_ids(self):
+        self.assertEqual([], ml2_db.get_ports_by_ids(self.ctx.session, []))
+
     def test_get_port_from_device_mac(self):
         network_id = 'foo-network-id'
         port_id = 'foo-port-id'
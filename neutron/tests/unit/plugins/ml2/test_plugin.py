@@ -472,6 +472,39 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
                                           network=net)
                 self.assertFalse(get_net.called)
 
+    def _test_update_port_statuses(self, host):
+        ctx = context.get_admin_context()
+        plugin = manager.NeutronManager.get_plugin()
+        host_arg = {portbindings.HOST_ID: HOST}
+        with self.subnet() as subnet,\
+                self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                          **host_arg) as port1,\
+                self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                          **host_arg) as port2:
+            port_ids = [port1['port']['id'], port2['port']['id']]
+            with mock.patch.object(plugin, 'get_network',
+                                   wraps=plugin.get_network) as get_net:
+                updated = plugin.update_port_statuses(
+                    ctx, port_ids + [port_ids[0][:11], 'fake_port_id'],
+                    constants.PORT_STATUS_ACTIVE, host)
+            statuses = [plugin.get_port(ctx, port_id)['status']
+                        for port_id in port_ids]
+            return updated, statuses, get_net.call_count
+
+    def test_update_port_statuses(self):
+        updated, statuses, get_net_count = self._test_update_port_statuses(
+            HOST)
+        self.assertEqual(2, len(updated))
+        self.assertEqual([constants.PORT_STATUS_ACTIVE] * 2, statuses)
+        self.assertEqual(1, get_net_count)
+
+    def test_update_port_statuses_bound_to_other_host(self):
+        updated, statuses, get_net_count = self._test_update_port_statuses(
+            'other_host')
+        self.assertEqual(set(), updated)
+        self.assertEqual([constants.PORT_STATUS_DOWN] * 2, statuses)
+        self.assertFalse(get_net_count)
+
     def test_update_port_mac(self):
         self.check_update_port_mac(
             host_arg={portbindings.HOST_ID: HOST},
@@ -515,14 +548,14 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
         with self.network() as net:
             plugin = manager.NeutronManager.get_plugin()
 
-            with mock.patch.object(plugin, '_bind_port_if_needed',
+            with mock.patch.object(plugin, '_bind_ports_if_needed',
                 side_effect=ml2_exc.MechanismDriverError(
-                    method='create_port_bulk')) as _bind_port_if_needed:
+                    method='create_port_bulk')) as _bind_ports_if_needed:
 
                 res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
                                              'test', True, context=ctx)
 
-                self.assertTrue(_bind_port_if_needed.called)
+                self.assertTrue(_bind_ports_if_needed.called)
                 # We expect a 500 as we injected a fault in the plugin
                 self._validate_behavior_on_bulk_failure(
                     res, 'ports', webob.exc.HTTPServerError.code)
@@ -540,7 +573,8 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
                                          'test', True, context=ctx)
             ports = self.deserialize(self.fmt, res)
             used_sg = ports['ports'][0]['security_groups']
-            m_upd.assert_called_once_with(ctx, used_sg)
+            m_upd.assert_called_once_with(ctx, used_sg,
+                                          member_updates=mock.ANY)
             self.assertFalse(p_upd.called)
 
     def _check_security_groups_provider_updated_args(self, p_upd_mock, net_id):
@@ -577,7 +611,8 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
                                               data, context=ctx)
             ports = self.deserialize(self.fmt, res)
             used_sg = ports['ports'][0]['security_groups']
-            m_upd.assert_called_once_with(ctx, used_sg)
+            m_upd.assert_called_once_with(ctx, used_sg,
+                                          member_updates=mock.ANY)
             self._check_security_groups_provider_updated_args(p_upd, net_id)
             m_upd.reset_mock()
             p_upd.reset_mock()
@@ -753,6 +788,13 @@ class TestMl2PluginOnly(Ml2PluginV2TestCase):
         self.assertEqual(port_id, ml2_plugin.Ml2Plugin._device_to_port_id(
             self.context, port_id))
 
+    def test_get_workers_availability_ranges_repair(self):
+        plugin = manager.NeutronManager.get_plugin()
+        workers = plugin.get_workers()
+        self.assertEqual(1, len([
+            w for w in workers
+            if isinstance(w, base_plugin.AvailabilityRangesRepairWorker)]))
+
 
 class TestMl2DvrPortsV2(TestMl2PortsV2):
     def setUp(self):
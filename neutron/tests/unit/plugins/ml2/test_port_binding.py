@@ -20,8 +20,10 @@ from neutron import context
 from neutron.extensions import portbindings
 from neutron import manager
 from neutron.plugins.ml2 import config as config
+from neutron.plugins.ml2 import db as ml2_db
 from neutron.plugins.ml2 import models as ml2_models
 from neutron.tests.unit.db import test_db_base_plugin_v2 as test_plugin
+from neutron.tests.unit.plugins.ml2.drivers import mechanism_test
 
 
 PLUGIN_NAME = 'neutron.plugins.ml2.plugin.Ml2Plugin'
@@ -103,6 +105,70 @@ class PortBindingTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                 portbindings.VIF_TYPE_OVS,
                                 True, True, 'ACTIVE')
 
+    def _create_ports_bulk_with_hosts(self, hosts, bulk_binding):
+        bind_port = mechanism_test.TestMechanismDriver.bind_port
+        if bulk_binding:
+            # The test driver records the ports it bound in bind_port,
+            # which isn't called for the ports bound as part of a group.
+            mock.patch.object(mechanism_test.TestMechanismDriver,
+                              '_check_port_context').start()
+        with self.network() as net,\
+                mock.patch.object(self.plugin.mechanism_manager,
+                                  '_supports_bulk_binding',
+                                  return_value=bulk_binding),\
+                mock.patch.object(mechanism_test.TestMechanismDriver,
+                                  'bind_port', autospec=True,
+                                  side_effect=bind_port) as bind_mock:
+            ports = [{'network_id': net['network']['id'],
+                      'tenant_id': self._tenant_id,
+                      portbindings.HOST_ID: host} for host in hosts]
+            res = self._create_bulk_from_list(self.fmt, 'port', ports)
+            self.assertEqual(201, res.status_int)
+            return self.deserialize(self.fmt, res)['ports'], bind_mock
+
+    def test_bulk_binding_once_per_group(self):
+        hosts = ['host-ovs-no_filter'] * 3 + ['host-bridge-filter'] * 2
+        ports, bind_mock = self._create_ports_bulk_with_hosts(hosts, True)
+        self.assertEqual(2, bind_mock.call_count)
+        ctx = context.get_admin_context()
+        for port, host in zip(ports, hosts):
+            if host == 'host-ovs-no_filter':
+                self._check_response(port, portbindings.VIF_TYPE_OVS,
+                                     False, True, None)
+            else:
+                self._check_response(port, portbindings.VIF_TYPE_BRIDGE,
+                                     True, True, None)
+            levels = ml2_db.get_binding_levels(ctx.session, port['id'], host)
+            self.assertEqual(1, len(levels))
+
+    def test_bulk_binding_hierarchical(self):
+        hosts = ['host-hierarchical'] * 2
+        ports, bind_mock = self._create_ports_bulk_with_hosts(hosts, True)
+        # Both levels of the first port only.
+        self.assertEqual(2, bind_mock.call_count)
+        ctx = context.get_admin_context()
+        for port in ports:
+            self._check_response(port, portbindings.VIF_TYPE_OVS,
+                                 False, True, None)
+            levels = ml2_db.get_binding_levels(ctx.session, port['id'],
+                                               'host-hierarchical')
+            self.assertEqual([0, 1], [level.level for level in levels])
+
+    def test_bulk_binding_not_supported(self):
+        hosts = ['host-ovs-no_filter'] * 3
+        ports, bind_mock = self._create_ports_bulk_with_hosts(hosts, False)
+        self.assertEqual(3, bind_mock.call_count)
+        for port in ports:
+            self._check_response(port, portbindings.VIF_TYPE_OVS,
+                                 False, True, None)
+
+    def test_bulk_binding_failed(self):
+        hosts = ['host-fail'] * 2
+        ports, bind_mock = self._create_ports_bulk_with_hosts(hosts, True)
+        for port in ports:
+            self._check_response(port, portbindings.VIF_TYPE_BINDING_FAILED,
+                                 False, False, None)
+
     def test_update_port_binding_no_binding(self):
         ctx = context.get_admin_context()
         with self.port(name='name') as port:
@@ -294,6 +294,56 @@ class RpcCallbacksTestCase(base.BaseTestCase):
                                       devices_down_side_effect,
                                       expected)
 
+    def test_update_device_list_updates_devices_in_bulk(self):
+        self.plugin._device_to_port_id.side_effect = (
+            lambda context, device: device)
+        self.plugin.update_port_statuses.side_effect = [
+            set(['up1', 'up2']), set(['down1'])]
+        ports = [mock.Mock(), mock.Mock()]
+        kwargs = {'host': 'fake_host', 'agent_id': 'fake_agent_id'}
+        with mock.patch.object(self.callbacks, 'update_device_up',
+                               return_value=None) as f_up,\
+                mock.patch.object(self.callbacks, 'update_device_down',
+                                  return_value={'device': 'down2',
+                                                'exists': False}) as f_down,\
+                mock.patch.object(plugin_rpc.ml2_db, 'get_ports_by_ids',
+                                  return_value=ports),\
+                mock.patch.object(plugin_rpc.registry, 'notify') as notify:
+            res = self.callbacks.update_device_list(
+                mock.Mock(), devices_up=['up1', 'up2', 'up3'],
+                devices_down=['down1', 'down2'], **kwargs)
+        self.assertEqual(
+            {'devices_up': ['up1', 'up2', 'up3'],
+             'failed_devices_up': [],
+             'devices_down': [{'device': 'down1', 'exists': True},
+                              {'device': 'down2', 'exists': False}],
+             'failed_devices_down': []}, res)
+        self.plugin.update_port_statuses.assert_has_calls([
+            mock.call(mock.ANY, mock.ANY, constants.PORT_STATUS_ACTIVE,
+                      'fake_host'),
+            mock.call(mock.ANY, mock.ANY, constants.PORT_STATUS_DOWN,
+                      'fake_host')])
+        self.assertEqual(1, f_up.call_count)
+        self.assertEqual('up3', f_up.call_args[1]['device'])
+        self.assertEqual(1, f_down.call_count)
+        self.assertEqual('down2', f_down.call_args[1]['device'])
+        self.assertEqual(
+            [mock.call('port', 'after_update', self.plugin,
+                       context=mock.ANY, port=port, update_device_up=True)
+             for port in ports], notify.call_args_list)
+
+    def test_update_device_list_bulk_failure(self):
+        self.plugin.update_port_statuses.side_effect = exc.StaleDataError
+        self._test_update_device_list([1, 2, 3],
+                                      [{'device': 4, 'exists': True},
+                                       {'device': 5, 'exists': True}],
+                                      {'devices_up': [1, 2, 3],
+                                       'failed_devices_up': [],
+                                       'devices_down':
+                                           [{'device': 4, 'exists': True},
+                                            {'device': 5, 'exists': True}],
+                                       'failed_devices_down': []})
+
     def test_update_device_list_empty_devices(self):
 
         expected = {'devices_up': [],
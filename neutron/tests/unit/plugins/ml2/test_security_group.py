@@ -14,11 +14,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import math
+
 import mock
 
 from neutron.common import constants as const
 from neutron import context
+from neutron.db import securitygroups_db as sg_db
 from neutron.extensions import securitygroup as ext_sg
 from neutron import manager
 from neutron.tests import tools
@@ -153,4 +156,131 @@ class TestMl2SecurityGroups(Ml2SecurityGroupsTestCase,
 class TestMl2SGServerRpcCallBack(
     Ml2SecurityGroupsTestCase,
     test_sg_rpc.SGServerRpcCallBackTestCase):
-    pass
+
+    def setUp(self):
+        super(TestMl2SGServerRpcCallBack, self).setUp()
+        self.ctx = context.get_admin_context()
+        self.plugin = manager.NeutronManager.get_plugin()
+
+    @contextlib.contextmanager
+    def _port_in_self_referencing_group(self):
+        with self.network() as n,\
+                self.subnet(n),\
+                self.security_group() as sg:
+            sg_id = sg['security_group']['id']
+            rule = self._build_security_group_rule(
+                sg_id, 'ingress', const.PROTO_NAME_TCP, '22', '22',
+                remote_group_id=sg_id)
+            self._make_security_group_rule(self.fmt, rule)
+            port = self._make_port(self.fmt, n['network']['id'],
+                                   security_groups=[sg_id])
+            yield n, sg_id, port['port']
+
+    def _get_sg_info(self, port_id):
+        return self.rpc.security_group_info_for_devices(
+            self.ctx, devices=[port_id])
+
+    def test_security_group_info_served_from_cache(self):
+        with self._port_in_self_referencing_group() as (n, sg_id, port):
+            with mock.patch.object(
+                    self.plugin, '_select_ips_for_remote_group',
+                    wraps=self.plugin._select_ips_for_remote_group) as sel:
+                first = self._get_sg_info(port['id'])
+                second = self._get_sg_info(port['id'])
+                self.assertEqual(1, sel.call_count)
+                self.assertEqual(first['security_groups'],
+                                 second['security_groups'])
+                self.assertEqual(first['sg_member_ips'],
+                                 second['sg_member_ips'])
+
+                # another server bumping the version invalidates the entry
+                query = self.ctx.session.query(sg_db.SecurityGroup)
+                query.filter_by(id=sg_id).update(
+                    {'version': sg_db.SecurityGroup.version + 1})
+                self._get_sg_info(port['id'])
+                self.assertEqual(2, sel.call_count)
+
+    def test_security_group_info_cache_rules_version(self):
+        with self._port_in_self_referencing_group() as (n, sg_id, port):
+            with mock.patch.object(
+                    self.plugin, '_select_ips_for_remote_group',
+                    wraps=self.plugin._select_ips_for_remote_group) as sel:
+                first = self._get_sg_info(port['id'])
+                # another server changing the rules only reloads the rules
+                query = self.ctx.session.query(sg_db.SecurityGroup)
+                query.filter_by(id=sg_id).update(
+                    {'rules_version': sg_db.SecurityGroup.rules_version + 1})
+                with mock.patch.object(
+                        self.plugin, '_make_rule_dict_for_agent',
+                        wraps=self.plugin._make_rule_dict_for_agent) as mk:
+                    second = self._get_sg_info(port['id'])
+                    self.assertTrue(mk.called)
+                self.assertEqual(1, sel.call_count)
+                self.assertEqual(first['security_groups'],
+                                 second['security_groups'])
+
+    def test_security_group_info_cache_rule_added(self):
+        with self._port_in_self_referencing_group() as (n, sg_id, port):
+            self._get_sg_info(port['id'])
+            rule = self._build_security_group_rule(
+                sg_id, 'ingress', const.PROTO_NAME_UDP, '53', '53')
+            self._make_security_group_rule(self.fmt, rule)
+            sg_rules = self._get_sg_info(port['id'])['security_groups']
+            self.assertIn({'direction': 'ingress',
+                           'ethertype': const.IPv4,
+                           'protocol': const.PROTO_NAME_UDP,
+                           'port_range_min': 53,
+                           'port_range_max': 53}, sg_rules[sg_id])
+
+    def test_security_group_rule_added_keeps_member_version(self):
+        with self._port_in_self_referencing_group() as (n, sg_id, port):
+            versions = self._get_sg_info(port['id'])['sg_member_versions']
+            rule = self._build_security_group_rule(
+                sg_id, 'ingress', const.PROTO_NAME_UDP, '53', '53')
+            sgr = self._make_security_group_rule(self.fmt, rule)
+            self._delete('security-group-rules',
+                         sgr['security_group_rule']['id'])
+            # agents knowing the group as a remote group only keep applying
+            # the member deltas in sequence
+            self.assertEqual(
+                versions,
+                self._get_sg_info(port['id'])['sg_member_versions'])
+
+    def test_security_group_info_cache_member_added(self):
+        with self._port_in_self_referencing_group() as (n, sg_id, port):
+            self._get_sg_info(port['id'])
+            port2 = self._make_port(self.fmt, n['network']['id'],
+                                    security_groups=[sg_id])['port']
+            member_ips = self._get_sg_info(port['id'])['sg_member_ips']
+            self.assertEqual(
+                set([port['fixed_ips'][0]['ip_address'],
+                     port2['fixed_ips'][0]['ip_address']]),
+                member_ips[sg_id][const.IPv4])
+
+    def test_security_group_info_cache_address_pairs_updated(self):
+        with self._port_in_self_referencing_group() as (n, sg_id, port):
+            self._get_sg_info(port['id'])
+            data = {'port': {'allowed_address_pairs': [
+                {'ip_address': '10.0.1.0/24'}]}}
+            req = self.new_update_request('ports', data, port['id'])
+            req.get_response(self.api)
+            member_ips = self._get_sg_info(port['id'])['sg_member_ips']
+            self.assertIn('10.0.1.0/24', member_ips[sg_id][const.IPv4])
+
+    def test_security_group_info_cache_auto_address_subnet(self):
+        with self._port_in_self_referencing_group() as (n, sg_id, port):
+            rule = self._build_security_group_rule(
+                sg_id, 'ingress', const.PROTO_NAME_TCP, '22', '22',
+                remote_group_id=sg_id, ethertype=const.IPv6)
+            self._make_security_group_rule(self.fmt, rule)
+            self._get_sg_info(port['id'])
+            subnet = self._make_subnet(
+                self.fmt, n, 'fe80::1', 'fe80::/64', ip_version=6,
+                ipv6_ra_mode=const.IPV6_SLAAC,
+                ipv6_address_mode=const.IPV6_SLAAC)
+            member_ips = self._get_sg_info(port['id'])['sg_member_ips']
+            self.assertEqual(1, len(member_ips[sg_id][const.IPv6]))
+
+            self._delete('subnets', subnet['subnet']['id'])
+            member_ips = self._get_sg_info(port['id'])['sg_member_ips']
+            self.assertEqual(set(), member_ips[sg_id][const.IPv6])
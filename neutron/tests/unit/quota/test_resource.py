@@ -120,10 +120,41 @@ class TestTrackedResource(testlib_api.SqlTestCaseLight):
         # explicitly set dirty flag to False
         quota_api.set_all_quota_usage_dirty(
             self.context, self.resource, dirty=False)
-        # Expect correct count to be returned anyway since the first call to
-        # count() always resyncs with the db
+        # Expect correct count to be returned anyway since the usage has no
+        # shard to be updated by the event handler, and is therefore
+        # resynced with the db
         self.assertEqual(2, res.count(self.context, None, self.tenant_id))
 
+    def test_count_with_usage_shards(self):
+        res = self._create_resource()
+        self._add_data()
+        self.assertEqual(2, res.count(self.context, None, self.tenant_id))
+        self._add_data()
+        self._add_data('someone_else')
+        # The usage shards of self.tenant_id are updated, no count of the
+        # model class is needed
+        self.assertEqual({'someone_else'}, res._dirty_tenants)
+        with mock.patch.object(res, '_resync') as mock_resync:
+            self.assertEqual(4, res.count(self.context, None,
+                                          self.tenant_id))
+            self.assertFalse(mock_resync.called)
+        self._delete_data()
+        self.assertEqual(0, res.count(self.context, None, self.tenant_id))
+
+    def test_usage_shards_rolled_back_with_data(self):
+        res = self._create_resource()
+        self.assertEqual(0, res.count(self.context, None, self.tenant_id))
+        session = db_api.get_session()
+        try:
+            with session.begin():
+                session.add(test_quota.MehModel(meh='meh_%s' % uuid.uuid4(),
+                                                tenant_id=self.tenant_id))
+                session.flush()
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(0, res.count(self.context, None, self.tenant_id))
+
     def _test_count(self):
         res = self._create_resource()
         quota_api.set_quota_usage(
@@ -489,6 +489,55 @@ class NeutronPolicyTestCase(base.BaseTestCase):
         result = policy.enforce(self.context, action, target)
         self.assertTrue(result)
 
+    def test_compile_check_matches_check(self):
+        action = "get_network"
+        check = policy.compile_check(self.context, action)
+        for target in ({'tenant_id': 'fake'},
+                       {'shared': False, 'tenant_id': 'somebody_else'},
+                       {'shared': True, 'tenant_id': 'somebody_else'}):
+            self.assertEqual(policy.check(self.context, action, target),
+                             check(target))
+
+    def test_compile_check_admin_context(self):
+        check = policy.compile_check(context.get_admin_context(),
+                                     "get_network:provider:network_type")
+        self.assertTrue(check({'tenant_id': 'somebody_else'}))
+
+    def test_compile_check_might_not_exist(self):
+        check = policy.compile_check(self.context, "get_network:unknown",
+                                     might_not_exist=True)
+        self.assertTrue(check({'tenant_id': 'somebody_else'}))
+
+    def test_compile_check_credentials_only_rule(self):
+        self._set_rules(**{"get_network:provider:network_type":
+                           "rule:admin_only"})
+        policy.init()
+        with mock.patch.object(oslo_policy._checks.RoleCheck, '__call__',
+                               return_value=False) as role_check:
+            check = policy.compile_check(self.context,
+                                         "get_network:provider:network_type")
+            self.assertFalse(check({'tenant_id': 'fake'}))
+            self.assertFalse(check({'tenant_id': 'somebody_else'}))
+        self.assertEqual(1, role_check.call_count)
+
+    def test_is_credentials_only_rule(self):
+        rules = self.rules
+        self.assertTrue(policy._is_credentials_only_rule(
+            oslo_policy.RuleCheck('rule', 'admin_only'), rules))
+        self.assertTrue(policy._is_credentials_only_rule(
+            oslo_policy.RuleCheck('rule', 'unknown'), rules))
+        self.assertFalse(policy._is_credentials_only_rule(
+            oslo_policy.RuleCheck('rule', 'admin_or_owner'), rules))
+        self.assertFalse(policy._is_credentials_only_rule(
+            oslo_policy.RuleCheck('rule', 'get_network'), rules))
+
+    def test_is_credentials_only_rule_constant_rules(self):
+        self._set_rules(never="!", not_admin="not rule:admin_only")
+        rules = self.rules
+        for name in ('default', 'never', 'not_admin', 'regular_user'):
+            self.assertTrue(policy._is_credentials_only_rule(
+                oslo_policy.RuleCheck('rule', name), rules))
+
     def test_enforce_firewall_policy_shared(self):
         action = "get_firewall_policy"
         target = {'shared': True, 'tenant_id': 'somebody_else'}
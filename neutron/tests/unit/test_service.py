@@ -16,6 +16,7 @@
 import mock
 
 from neutron import service
+from neutron.tests import base
 from neutron.tests.unit import test_wsgi
 
 
@@ -25,3 +26,20 @@ class TestRpcWorker(test_wsgi.TestServiceBase):
         _plugin = mock.Mock()
         rpc_worker = service.RpcWorker(_plugin)
         self._test_reset(rpc_worker)
+
+
+class TestStartPluginWorkers(base.BaseTestCase):
+
+    def test_start_quota_workers(self):
+        quota_worker = mock.Mock()
+        with mock.patch.object(service.manager.NeutronManager,
+                               'get_unique_service_plugins',
+                               return_value=[]),\
+                mock.patch.object(service.quota.QUOTAS, 'get_workers',
+                                  return_value=[quota_worker]),\
+                mock.patch.object(service.common_service,
+                                  'ProcessLauncher') as launcher:
+            launchers = service.start_plugin_workers()
+        launcher.return_value.launch_service.assert_called_once_with(
+            quota_worker)
+        self.assertEqual([launcher.return_value], launchers)